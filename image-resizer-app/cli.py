@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画像リサイズ & 圧縮アプリ（コマンドライン版）
+GUIを使わずにバッチ処理などを実行する
+"""
+
+import argparse
+import multiprocessing
+import sys
+from typing import Callable, List, Optional, TextIO
+
+from models.settings import (
+    AUTO_FORMAT,
+    SUBSAMPLING_OPTIONS,
+    AppSettings,
+    CompressionSettings,
+    ResizeSettings,
+)
+from models.image_processor import ImageProcessor
+from models.archive_sink import ARCHIVE_FORMATS, ArchiveSink, detect_archive_format
+from models.batch_estimate import DEFAULT_WORKER_COUNTS, BatchEstimator
+from models.batch_pipeline import DEFAULT_IO_WORKERS
+from models.batch_processor import BatchProcessor
+from models.distributed_batch import collect_summary, create_job, run_worker
+from models.lease_queue import DEFAULT_LEASE_SECONDS, LeaseQueue
+from models.metadata_scan import (
+    SORT_KEYS,
+    ImageRecord,
+    RecordFilter,
+    scan_directory,
+    sort_records,
+    write_csv,
+    write_json,
+)
+from utils.file_utils import get_directory_images
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser):
+    """リサイズ・圧縮設定の引数を追加"""
+    parser.add_argument("--width", type=int, default=ResizeSettings.width, help="幅")
+    parser.add_argument("--height", type=int, default=ResizeSettings.height, help="高さ")
+    parser.add_argument("--no-ratio", action="store_true", help="比率を維持しない")
+    parser.add_argument("--method", default=ResizeSettings.method,
+                        choices=["LANCZOS", "BICUBIC", "BILINEAR", "NEAREST"],
+                        help="リサイズ方法")
+    parser.add_argument("--no-srgb", action="store_true",
+                        help="ICCプロファイルに従ったsRGBへの変換を行わない")
+    parser.add_argument("--format", dest="format_type",
+                        default=CompressionSettings.format_type,
+                        choices=AppSettings.get_supported_output_formats() + [AUTO_FORMAT],
+                        help="出力形式（AUTO で候補の中から最も小さい形式を選択）")
+    parser.add_argument("--auto-formats", nargs="+",
+                        default=list(CompressionSettings.auto_format_candidates),
+                        choices=AppSettings.get_supported_output_formats(),
+                        help="AUTO で比較する形式")
+    parser.add_argument("--min-ssim", type=float,
+                        help="AUTO で非可逆形式に求める最低SSIM")
+    parser.add_argument("--quality", type=int, default=CompressionSettings.quality,
+                        help="品質（JPEG・WEBP）")
+    parser.add_argument("--auto-quality", action="store_true",
+                        help="目標SSIMを満たす最小の品質を自動選択")
+    parser.add_argument("--target-ssim", type=float,
+                        default=CompressionSettings.target_ssim, help="自動品質の目標SSIM")
+    parser.add_argument("--progressive", action="store_true", help="プログレッシブJPEGで保存")
+    parser.add_argument("--subsampling", choices=SUBSAMPLING_OPTIONS,
+                        help="JPEGのクロマサブサンプリング")
+    parser.add_argument("--lossless", action="store_true", help="WEBPをロスレスで保存")
+    parser.add_argument("--keep-icc", action="store_true", help="ICCプロファイルを残す")
+    parser.add_argument("--keep-orientation", action="store_true",
+                        help="EXIFの向き情報を残す（その他のメタデータは削除）")
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    """メタデータによる絞り込みの引数を追加"""
+    parser.add_argument("--min-width", type=int, help="この幅（px）以上の画像のみ")
+    parser.add_argument("--max-width", type=int, help="この幅（px）以下の画像のみ")
+    parser.add_argument("--min-height", type=int, help="この高さ（px）以上の画像のみ")
+    parser.add_argument("--max-height", type=int, help="この高さ（px）以下の画像のみ")
+    parser.add_argument("--only-format", action="append", help="指定した形式の画像のみ（複数指定可）")
+    parser.add_argument("--only-mode", action="append", help="指定したモードの画像のみ（複数指定可）")
+
+
+def build_record_filter(args: argparse.Namespace) -> Optional[RecordFilter]:
+    """引数から絞り込み条件を作成（条件がなければNone）"""
+    record_filter = RecordFilter(
+        min_width=args.min_width,
+        max_width=args.max_width,
+        min_height=args.min_height,
+        max_height=args.max_height,
+        formats=args.only_format,
+        modes=args.only_mode,
+    )
+    if record_filter == RecordFilter():
+        return None
+    return record_filter
+
+
+def build_settings(args: argparse.Namespace):
+    """引数からリサイズ・圧縮設定を作成"""
+    resize_settings = ResizeSettings(
+        width=args.width,
+        height=args.height,
+        maintain_ratio=not args.no_ratio,
+        method=args.method,
+        convert_to_srgb=not args.no_srgb,
+    )
+    compression_settings = CompressionSettings(
+        format_type=args.format_type,
+        quality=args.quality,
+        auto_quality=args.auto_quality,
+        target_ssim=args.target_ssim,
+        progressive=args.progressive,
+        subsampling=args.subsampling,
+        lossless=args.lossless,
+        keep_icc_profile=args.keep_icc,
+        keep_exif_orientation=args.keep_orientation,
+        auto_format_candidates=tuple(args.auto_formats),
+        format_min_ssim=args.min_ssim,
+    )
+    return resize_settings, compression_settings
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """batchサブコマンドを実行"""
+    resize_settings, compression_settings = build_settings(args)
+    memory_budget = args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb else None
+    if args.dry_run:
+        return run_batch_estimate(args, resize_settings, compression_settings, memory_budget)
+
+    archive = None
+    if args.archive:
+        archive_format = args.archive_format or (
+            "zip" if args.archive == "-" else detect_archive_format(args.archive)
+        )
+        destination = sys.stdout.buffer if args.archive == "-" else args.archive
+        archive = ArchiveSink(destination, archive_format)
+    # アーカイブを標準出力に書き出す場合、メッセージは標準エラー出力に出す
+    out = sys.stderr if args.archive == "-" else sys.stdout
+    processor = BatchProcessor(
+        resize_settings,
+        compression_settings,
+        suffix=args.suffix,
+        detect_duplicates=not args.no_dedup,
+        detect_near_duplicates=args.near_dedup,
+        max_workers=args.workers,
+        measure_savings=args.report_savings,
+        memory_budget=memory_budget,
+        archive=archive,
+        pipelined=args.pipeline,
+        io_workers=args.io_workers,
+    )
+    try:
+        summary = processor.process_files(collect_batch_paths(args), args.output_dir)
+    finally:
+        if archive:
+            archive.close()
+
+    print(summary.format_summary(), file=out)
+    if archive and args.archive != "-":
+        print(f"アーカイブを保存しました: {args.archive} ({archive.entry_count}件)", file=out)
+    for result in summary.results:
+        if result.error:
+            print(f"エラー: {result.source_path}: {result.error}", file=sys.stderr)
+
+    report = summary.duplicate_report
+    if report and args.duplicate_report:
+        report.write_json(args.duplicate_report)
+        print(f"重複レポートを保存しました: {args.duplicate_report}", file=out)
+    elif report:
+        for group in report.near_groups:
+            print("類似: " + ", ".join(group), file=out)
+
+    return 1 if any(result.error for result in summary.results) else 0
+
+
+def collect_batch_paths(args: argparse.Namespace) -> List[str]:
+    """バッチ処理の対象ファイルを取得"""
+    record_filter = build_record_filter(args)
+    if record_filter:
+        # ヘッダーだけを読んで対象を絞り込む
+        records = record_filter.apply(scan_directory(args.input_dir))
+        return [record.path for record in records]
+    return get_directory_images(args.input_dir)
+
+
+def run_batch_estimate(args: argparse.Namespace, resize_settings: ResizeSettings,
+                       compression_settings: CompressionSettings,
+                       memory_budget: Optional[int]) -> int:
+    """標本だけを処理してバッチ全体を見積もる（ファイルは出力しない）"""
+    estimator = BatchEstimator(
+        resize_settings,
+        compression_settings,
+        sample_size=args.sample_size,
+        confidence=args.confidence,
+        memory_budget=memory_budget,
+    )
+    worker_counts = sorted(set(DEFAULT_WORKER_COUNTS) | ({args.workers} if args.workers else set()))
+    estimate = estimator.estimate(collect_batch_paths(args), worker_counts)
+    print(estimate.format_report())
+    for sample in estimate.samples:
+        if sample.error:
+            print(f"エラー: {sample.path}: {sample.error}", file=sys.stderr)
+    return 0
+
+
+def _write_records(records: List[ImageRecord], destination: str,
+                   writer: Callable[[List[ImageRecord], TextIO], None]):
+    """レコードをファイルまたは標準出力に書き出す"""
+    if destination == "-":
+        writer(records, sys.stdout)
+        return
+    with open(destination, "w", encoding="utf-8", newline="") as stream:
+        writer(records, stream)
+
+
+def run_scan(args: argparse.Namespace) -> int:
+    """scanサブコマンドを実行"""
+    records = scan_directory(args.input_dir, recursive=args.recursive)
+    errors = [record for record in records if record.error]
+    record_filter = build_record_filter(args)
+    if record_filter:
+        records = record_filter.apply(records)
+    records = sort_records(records, args.sort, descending=args.desc)
+
+    if args.csv:
+        _write_records(records, args.csv, write_csv)
+    if args.json:
+        _write_records(records, args.json, write_json)
+    if not args.csv and not args.json:
+        for record in records:
+            print(f"{record.path}\t{record.width}x{record.height}\t{record.mode}\t"
+                  f"{record.format}\t{record.file_size}")
+
+    # 標準出力にデータを書き出す場合は件数を標準エラーに出す
+    info: TextIO = sys.stderr if "-" in (args.csv, args.json) else sys.stdout
+    print(f"{len(records)}件（読み込みエラー {len(errors)}件）", file=info)
+    return 0
+
+
+def run_convert(args: argparse.Namespace) -> int:
+    """convertサブコマンドを実行（"-" で標準入出力を使用）"""
+    resize_settings, compression_settings = build_settings(args)
+    try:
+        with ImageProcessor() as processor:
+            if args.input == "-":
+                processor.load_image_from_buffer(sys.stdin.buffer)
+            else:
+                processor.load_image(args.input)
+
+            # 出力が大きい場合は1枚の画像に組み立てずに帯ごとに書き出す
+            if args.output == "-":
+                processor.write_resized(sys.stdout.buffer, resize_settings, compression_settings)
+                sys.stdout.buffer.flush()
+            else:
+                output_path = processor.save_resized(args.output, resize_settings,
+                                                     compression_settings)
+                if processor.last_format_selection:
+                    print(f"{output_path}\n" + processor.last_format_selection.format_report())
+    except ValueError as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_enqueue(args: argparse.Namespace) -> int:
+    """enqueueサブコマンドを実行"""
+    resize_settings, compression_settings = build_settings(args)
+    paths = collect_batch_paths(args)
+    queue = create_job(args.queue_dir, paths, args.output_dir, resize_settings,
+                       compression_settings, suffix=args.suffix,
+                       measure_savings=args.report_savings)
+    print(f"{len(paths)}件をキューに追加しました: {args.queue_dir}")
+    print(queue.get_status().format_status())
+    return 0
+
+
+def _work(queue_dir: str, worker_id: Optional[str], lease_seconds: float,
+          poll_interval: float) -> int:
+    """1つのワーカープロセスでキューを処理"""
+    return run_worker(queue_dir, worker_id=worker_id, lease_seconds=lease_seconds,
+                      poll_interval=poll_interval)
+
+
+def run_work(args: argparse.Namespace) -> int:
+    """workサブコマンドを実行"""
+    if args.processes > 1:
+        worker_ids = [f"{args.worker_id}-{index}" if args.worker_id else None
+                      for index in range(args.processes)]
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            counts = pool.starmap(_work, [
+                (args.queue_dir, worker_id, args.lease_seconds, args.poll_interval)
+                for worker_id in worker_ids
+            ])
+        processed = sum(counts)
+    else:
+        processed = _work(args.queue_dir, args.worker_id, args.lease_seconds,
+                          args.poll_interval)
+    print(f"{processed}件を処理しました")
+    print(LeaseQueue(args.queue_dir).get_status().format_status())
+    return 0
+
+
+def run_queue_status(args: argparse.Namespace) -> int:
+    """queue-statusサブコマンドを実行"""
+    status = LeaseQueue(args.queue_dir).get_status()
+    print(status.format_status())
+    if args.summary:
+        summary = collect_summary(args.queue_dir)
+        print(summary.format_summary())
+        for result in summary.results:
+            if result.error:
+                print(f"エラー: {result.source_path}: {result.error}", file=sys.stderr)
+    return 0 if status.is_complete else 1
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    """serveサブコマンドを実行"""
+    # サーバー関連のモジュールはserve実行時のみ読み込む
+    from server.resize_server import run_server
+
+    run_server(
+        args.root,
+        host=args.host,
+        port=args.port,
+        max_workers=args.workers,
+        max_concurrency=args.max_concurrency,
+        memory_limit=args.memory_cache_mb * 1024 * 1024,
+        cache_dir=args.cache_dir,
+    )
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """引数パーサーを作成"""
+    parser = argparse.ArgumentParser(description="画像リサイズ & 圧縮アプリ（コマンドライン版）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="ディレクトリ内の画像をまとめて処理")
+    batch_parser.add_argument("input_dir", help="入力ディレクトリ")
+    batch_parser.add_argument("-o", "--output-dir", help="出力ディレクトリ（省略時は入力と同じ場所）")
+    batch_parser.add_argument("--suffix", default="_resized", help="出力ファイル名の接尾辞")
+    batch_parser.add_argument("--archive",
+                              help="ファイルを作らずZIP/TARに書き出す（-で標準出力）")
+    batch_parser.add_argument("--archive-format", choices=ARCHIVE_FORMATS,
+                              help="アーカイブ形式（省略時は拡張子から判定、標準出力はzip）")
+    batch_parser.add_argument("--workers", type=int, help="並列数")
+    batch_parser.add_argument("--pipeline", action="store_true",
+                              help="読み込み・変換・書き出しを別々のスレッドで重ねて実行（段階ごとの使用率を表示）")
+    batch_parser.add_argument("--io-workers", type=int, default=DEFAULT_IO_WORKERS,
+                              help="--pipeline での読み込みスレッド数")
+    batch_parser.add_argument("--memory-budget-mb", type=int,
+                              help="同時処理する画像のメモリ上限（MB、省略時はメモリ上限の半分）")
+    batch_parser.add_argument("--no-dedup", action="store_true", help="重複検出を行わない")
+    batch_parser.add_argument("--near-dedup", action="store_true",
+                              help="類似画像を検出してレポートに出力する（全画像のデコードが必要）")
+    batch_parser.add_argument("--duplicate-report", help="重複レポート（JSON）の出力先")
+    batch_parser.add_argument("--dry-run", action="store_true",
+                              help="標本だけを処理して出力サイズ・処理時間・メモリを見積もる")
+    batch_parser.add_argument("--sample-size", type=int,
+                              help="見積もりに使う標本数（省略時は許容誤差10%%から決定）")
+    batch_parser.add_argument("--confidence", type=float, default=0.95,
+                              help="見積もりの信頼水準")
+    batch_parser.add_argument("--report-savings", action="store_true",
+                              help="出力オプションごとの削減量を計測して表示")
+    add_settings_arguments(batch_parser)
+    add_filter_arguments(batch_parser)
+    batch_parser.set_defaults(handler=run_batch)
+
+    scan_parser = subparsers.add_parser("scan", help="画像のヘッダーを読み込んで一覧を作成")
+    scan_parser.add_argument("input_dir", help="入力ディレクトリ")
+    scan_parser.add_argument("-r", "--recursive", action="store_true", help="サブディレクトリも対象にする")
+    scan_parser.add_argument("--sort", default="path", choices=SORT_KEYS, help="並べ替えのキー")
+    scan_parser.add_argument("--desc", action="store_true", help="降順に並べ替え")
+    scan_parser.add_argument("--csv", help="CSVの出力先（- で標準出力）")
+    scan_parser.add_argument("--json", help="JSONの出力先（- で標準出力）")
+    add_filter_arguments(scan_parser)
+    scan_parser.set_defaults(handler=run_scan)
+
+    convert_parser = subparsers.add_parser("convert", help="1枚の画像を変換（標準入出力対応）")
+    convert_parser.add_argument("input", help="入力ファイル（- で標準入力）")
+    convert_parser.add_argument("output", help="出力ファイル（- で標準出力）")
+    add_settings_arguments(convert_parser)
+    convert_parser.set_defaults(handler=run_convert)
+
+    enqueue_parser = subparsers.add_parser(
+        "enqueue", help="複数ホストで処理するジョブを共有ディレクトリのキューに追加"
+    )
+    enqueue_parser.add_argument("queue_dir", help="キューのディレクトリ（全ホストから見える場所）")
+    enqueue_parser.add_argument("input_dir", help="入力ディレクトリ")
+    enqueue_parser.add_argument("-o", "--output-dir", help="出力ディレクトリ（省略時は入力と同じ場所）")
+    enqueue_parser.add_argument("--suffix", default="_resized", help="出力ファイル名の接尾辞")
+    enqueue_parser.add_argument("--report-savings", action="store_true",
+                                help="出力オプションごとの削減量を計測")
+    add_settings_arguments(enqueue_parser)
+    add_filter_arguments(enqueue_parser)
+    enqueue_parser.set_defaults(handler=run_enqueue)
+
+    work_parser = subparsers.add_parser("work", help="キューの項目を処理するワーカーを起動")
+    work_parser.add_argument("queue_dir", help="キューのディレクトリ")
+    work_parser.add_argument("--worker-id", help="ワーカーID（省略時はホスト名とプロセスID）")
+    work_parser.add_argument("--processes", type=int, default=1, help="起動するワーカープロセス数")
+    work_parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                             help="ハートビートが途絶えてから他のワーカーが回収するまでの秒数")
+    work_parser.add_argument("--poll-interval", type=float, default=1.0,
+                             help="他のワーカーの処理中の項目を待つ間隔（秒）")
+    work_parser.set_defaults(handler=run_work)
+
+    status_parser = subparsers.add_parser("queue-status", help="キューの進捗を表示")
+    status_parser.add_argument("queue_dir", help="キューのディレクトリ")
+    status_parser.add_argument("--summary", action="store_true", help="処理結果のサマリーも表示")
+    status_parser.set_defaults(handler=run_queue_status)
+
+    serve_parser = subparsers.add_parser("serve", help="オンデマンドのリサイズHTTPサーバーを起動")
+    serve_parser.add_argument("root", help="配信する画像のルートディレクトリ")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス")
+    serve_parser.add_argument("--port", type=int, default=8080, help="待ち受けポート")
+    serve_parser.add_argument("--workers", type=int, help="ワーカープロセス数")
+    serve_parser.add_argument("--max-concurrency", type=int, help="同時レンダリング数の上限")
+    serve_parser.add_argument("--memory-cache-mb", type=int, default=128, help="メモリキャッシュの上限（MB）")
+    serve_parser.add_argument("--cache-dir", help="ディスクキャッシュのディレクトリ")
+    serve_parser.set_defaults(handler=run_serve)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン関数"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
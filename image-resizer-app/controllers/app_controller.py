@@ -2,14 +2,47 @@
 アプリケーションコントローラー
 """
 
+import dataclasses
+import io
+import os
+import tempfile
 import threading
+from collections import OrderedDict
 from tkinter import filedialog
-from typing import Optional
+from typing import List, Optional, Union
 
-from models.settings import AppSettings
-from models.image_processor import ImageProcessor
+from models.settings import AppSettings, CompressionSettings
+from models.batch_processor import BatchProcessor, BatchSummary
+from models.image_compare import encode_candidate, error_stats
+from models.image_processor import ImageProcessor, open_image_eagerly
+from models.image_session import ImageSession
+from models.output_savings import OptionSavings, format_savings
+from models.processing import (
+    EncodeDetails,
+    ProcessResult,
+    encode,
+    measure_savings,
+    save_result,
+)
+from models.priority_scheduler import PRIORITY_EXPORT, PRIORITY_INTERACTIVE, PriorityScheduler
+from models.shared_pixels import SharedMemoryResampler, default_resample_workers
+from models.tile_pyramid import TilePyramid
+from models.worker_pool import WarmWorkerPool
+from views.compare_viewer import CompareViewer
+from views.diagnostics_window import DiagnosticsWindow
 from views.main_window import MainWindow
+from views.zoom_viewer import ZoomViewer
 from utils.file_utils import extract_file_path_from_drop_data, validate_output_path
+from utils.ui_watchdog import UIWatchdog
+
+# UIの応答遅延ログのデフォルトの出力先
+DEFAULT_UI_LOG_PATH = os.path.join(tempfile.gettempdir(), "image-resizer-ui.log")
+
+# 比較表示中に圧縮設定が変わってからエンコードし直すまでの待ち時間（ミリ秒）
+COMPARE_REFRESH_DELAY_MS = 150
+
+# 比較表示で圧縮設定ごとに保持しておくエンコード結果の数
+COMPARE_CACHE_SIZE = 8
 
 
 class AppController:
@@ -18,7 +51,42 @@ class AppController:
     def __init__(self, window: MainWindow, settings: AppSettings):
         self.window = window
         self.settings = settings
-        self.image_processor = ImageProcessor()
+        # 大きな画像のリサンプリングと一括処理はワーカープロセスに任せ、
+        # GUIのプロセスのGILを占有しないようにする。プロセスはウィンドウの表示後に
+        # start_worker_poolで起動しておき、最初の書き出しで起動を待たないようにする
+        self.worker_pool = WarmWorkerPool(
+            max_workers=settings.worker_pool_size or default_resample_workers(),
+            max_jobs_per_worker=settings.worker_max_jobs,
+            formats=settings.worker_preload_formats,
+        )
+        # 複数の画像を開いておき、メモリ予算を超えたら古いものから画素データを解放する
+        budget_mb = settings.session_memory_budget_mb
+        self.session = ImageSession(
+            memory_budget=budget_mb * 1024 * 1024 if budget_mb else None,
+            thumbnail_size=settings.preview_size,
+            processor_factory=lambda: ImageProcessor(
+                resampler=SharedMemoryResampler(self.worker_pool)
+            ),
+        )
+        # プレビュー・保存・一括処理で共有するスケジューラー
+        # （一括処理中でもプレビューが書き出しの後ろで待たないようにする）
+        self.scheduler = PriorityScheduler()
+        # 古いプレビュー結果を捨てるための世代番号
+        self._preview_generation = 0
+        # 比較表示（圧縮設定の変更に合わせてエンコード結果を更新する）
+        self.compare_viewer: Optional[CompareViewer] = None
+        self._compare_generation = 0
+        self._compare_refresh_id: Optional[str] = None
+        # 圧縮設定 -> (エンコード結果, 誤差)（スライダーを戻したときにエンコードし直さない）
+        self._compare_results: "OrderedDict[CompressionSettings, tuple]" = OrderedDict()
+        
+        # イベントループの停止を監視し、UIを止めているハンドラーを記録する
+        self.watchdog = UIWatchdog(
+            window.root,
+            stall_threshold_ms=settings.ui_stall_threshold_ms,
+            log_path=settings.ui_log_path or DEFAULT_UI_LOG_PATH,
+        )
+        self.watchdog.start()
         
         # ビューのコールバックを設定
         self.setup_callbacks()
@@ -32,6 +100,40 @@ class AppController:
         self.window.on_save_as = self.handle_save_as
         self.window.on_reset = self.handle_reset
         self.window.on_settings_change = self.handle_settings_change
+        self.window.on_batch = self.handle_batch
+        self.window.on_show_diagnostics = self.handle_show_diagnostics
+        self.window.on_zoom_view = self.handle_zoom_view
+        self.window.on_compare = self.handle_compare
+        self.window.on_compression_change = self.handle_compression_change
+        self.window.on_edit = self.handle_edit
+        self.window.on_image_switch = self.handle_image_switch
+        self.window.on_close_image = self.handle_close_image
+    
+    def start_worker_pool(self):
+        """ワーカープロセスの起動をバックグラウンドで開始"""
+        try:
+            self.worker_pool.start()
+        except RuntimeError:
+            # 終了処理の後に呼ばれた
+            pass
+    
+    @property
+    def image_processor(self) -> ImageProcessor:
+        """表示中の画像のプロセッサー
+        
+        GUIのスレッドから使うため画素データは読み直さない（編集履歴・サイズ・パスは
+        解放済みでも使える）。画素が必要な処理はスケジューラー上でensure_loadedを呼ぶ。
+        """
+        return self.session.active_processor
+    
+    def has_image(self) -> bool:
+        """表示中の画像があるか（画素データの読み直しは行わない）"""
+        return self.session.active_path is not None
+    
+    def _snapshot_edits(self, path: str) -> tuple:
+        """バックグラウンドの処理に渡す、依頼した時点の編集履歴"""
+        entry = self.session.get(path)
+        return tuple(entry.processor.edits.operations) if entry else ()
     
     def handle_file_select(self, file_path: str):
         """ファイル選択時の処理"""
@@ -48,52 +150,117 @@ class AppController:
     def load_image(self, file_path: str):
         """画像を読み込み"""
         try:
-            self.image_processor.load_image(file_path)
-            original_size = self.image_processor.get_original_size()
+            entry = self.session.open(file_path)
+            self.window.update_open_images(self.session.paths, file_path)
+            original_size = entry.original_size
             
             if original_size:
                 width, height = original_size
                 # UIの設定を更新
                 self.window.update_size_fields(width, height)
                 # 設定オブジェクトも更新
-                self.settings.resize_settings.width = width
-                self.settings.resize_settings.height = height
+                self.settings.resize_settings = dataclasses.replace(
+                    self.settings.resize_settings, width=width, height=height
+                )
                 
                 # プレビューを更新
                 self.update_preview()
                 
                 self.window.show_message(
                     "成功", 
-                    f"画像を読み込みました\nサイズ: {width} x {height}",
+                    f"画像を読み込みました\nサイズ: {width} x {height}\n"
+                    f"{self.session.format_status()}",
                     "info"
                 )
                 
         except Exception as e:
             self.window.show_message("エラー", str(e), "error")
     
+    def handle_image_switch(self, file_path: str):
+        """開いている画像の切り替え"""
+        try:
+            entry = self.session.activate(file_path)
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
+        
+        # 縮小画像をすぐに表示し、プレビューは画素データの読み直しを含めて裏で作る
+        if entry.thumbnail:
+            self.window.update_preview_image(entry.thumbnail)
+        self.window.update_open_images(self.session.paths, file_path)
+        self.update_preview()
+    
+    def handle_close_image(self):
+        """表示中の画像を閉じる"""
+        if not self.has_image():
+            return
+        self.session.close(self.session.active_path)
+        self._preview_generation += 1
+        self.window.update_open_images(self.session.paths, self.session.active_path)
+        if self.session.active_path:
+            self.handle_image_switch(self.session.active_path)
+        else:
+            self.window.clear_preview()
+    
     def handle_preview_update(self):
         """プレビュー更新時の処理"""
         self.update_preview()
     
     def update_preview(self):
         """プレビューを更新"""
-        if not self.image_processor.has_image():
+        if not self.has_image():
             return
         
         try:
             # UIから設定を取得
             self.window.get_resize_settings_from_ui()
-            
-            # 画像をリサイズ
-            resized_image = self.image_processor.resize_image(self.settings.resize_settings)
-            
-            # プレビュー用画像を作成
-            preview_image = self.image_processor.create_preview(self.settings.preview_size)
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
+        
+        self._preview_generation += 1
+        generation = self._preview_generation
+        resize_settings = self.settings.resize_settings
+        preview_size = self.settings.preview_size
+        path = self.session.active_path
+        edits = self._snapshot_edits(path)
+        # 処理が終わるまで画素データを解放しないようにする
+        self.session.pin(path)
+        
+        def render():
+            try:
+                # 解放済みの画像はここで読み直してから、リサイズしてプレビュー用画像を作成
+                # （保存などと並行して動くため、プロセッサーのcurrent_imageは変更しない。
+                # 帯単位で処理する巨大画像は出力の解像度の画像を作らず縮小版から作る）
+                processor = self.session.ensure_loaded(path)
+                return processor.render_preview(resize_settings, preview_size, edits)
+            finally:
+                self.session.unpin(path)
+        
+        # 対話的な処理として最優先で実行
+        future = self.scheduler.submit_with_priority(PRIORITY_INTERACTIVE, render)
+        future.add_done_callback(
+            lambda f: self.window.root.after(
+                0, lambda: self._on_preview_done(f, generation, path)
+            )
+        )
+    
+    def _on_preview_done(self, future, generation: int, path: str):
+        """プレビュー作成完了時の処理（メインスレッドで実行）"""
+        # 後から要求されたプレビューがある場合は古い結果を捨てる
+        if generation != self._preview_generation:
+            return
+        
+        try:
+            preview_image, new_size = future.result()
             if preview_image:
                 self.window.update_preview_image(preview_image)
+                # 切り替え時にすぐ表示できるよう縮小画像を更新
+                entry = self.session.get(path)
+                if entry:
+                    entry.thumbnail = preview_image
             
             # 新しいサイズをUIに反映
-            new_size = self.image_processor.get_current_size()
             if new_size:
                 self.window.update_size_fields(new_size[0], new_size[1])
                 
@@ -104,7 +271,7 @@ class AppController:
     
     def handle_settings_change(self):
         """設定変更時の処理（比率維持など）"""
-        if not self.image_processor.has_image():
+        if not self.has_image():
             return
         
         try:
@@ -112,7 +279,7 @@ class AppController:
             
             if self.settings.resize_settings.maintain_ratio:
                 # 幅を基準に高さを自動調整
-                original_size = self.image_processor.get_original_size()
+                original_size = self.image_processor.get_edited_size()
                 if original_size:
                     original_width, original_height = original_size
                     target_width = self.settings.resize_settings.width
@@ -120,7 +287,9 @@ class AppController:
                     ratio = target_width / original_width
                     new_height = int(original_height * ratio)
                     
-                    self.settings.resize_settings.height = new_height
+                    self.settings.resize_settings = dataclasses.replace(
+                        self.settings.resize_settings, height=new_height
+                    )
                     self.window.update_size_fields(target_width, new_height)
                     
         except ValueError:
@@ -128,7 +297,7 @@ class AppController:
     
     def handle_save(self):
         """保存時の処理"""
-        if not self.image_processor.has_image():
+        if not self.has_image():
             self.window.show_message("警告", "保存する画像がありません", "warning")
             return
         
@@ -149,12 +318,16 @@ class AppController:
     
     def handle_save_as(self):
         """名前を付けて保存時の処理"""
-        if not self.image_processor.has_image():
+        if not self.has_image():
             self.window.show_message("警告", "保存する画像がありません", "warning")
             return
         
         # UIから設定を取得
-        self.window.get_compression_settings_from_ui()
+        try:
+            self.window.get_compression_settings_from_ui()
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
         
         # ファイル保存ダイアログ
         ext = self.settings.compression_settings.get_file_extension()
@@ -172,37 +345,351 @@ class AppController:
     
     def _save_image_async(self, file_path: str):
         """画像を非同期で保存"""
+        path = self.session.active_path
+        # 設定は変更できないため、保存中にUIで変更されても保存開始時の設定が使われる
+        resize_settings = self.settings.resize_settings
+        compression_settings = self.settings.compression_settings
+        edits = self._snapshot_edits(path)
+        # 保存中に別の画像へ切り替えても画素データを解放しないようにする
+        self.session.pin(path)
+        
         def save_thread():
             try:
                 # 進捗バー開始
                 self.window.root.after(0, self.window.start_progress)
+                processor = self.session.ensure_loaded(path)
+                
+                if processor.requires_streaming(resize_settings, edits):
+                    # 出力が大きい場合は1枚の画像に組み立てずに帯ごとに書き出す（PNGのみ）
+                    saved_path, details = processor.save_streamed(
+                        file_path, resize_settings, compression_settings, edits
+                    )
+                    self.window.root.after(
+                        0, lambda: self._on_save_success(saved_path, [], details)
+                    )
+                    return
                 
-                # 保存処理
-                self.image_processor.save_image(file_path, self.settings.compression_settings)
+                # プレビューなどと並行して動くため、保存開始時の設定と編集履歴で
+                # この処理専用の画像を作り、保存と削減量の計測の両方に使う
+                resized = processor.render_resized(resize_settings, edits)
+                try:
+                    result = encode(resized, compression_settings)
+                    # 形式を自動選択した場合は拡張子が変わる
+                    saved_path = save_result(
+                        result, file_path, compression_settings.is_auto_format()
+                    )
+                    # 出力オプションごとの削減量を計測
+                    savings = measure_savings(resized, compression_settings, result)
+                finally:
+                    resized.close()
                 
                 # 成功メッセージ
-                self.window.root.after(0, lambda: self._on_save_success(file_path))
+                self.window.root.after(
+                    0, lambda: self._on_save_success(saved_path, savings, result)
+                )
                 
             except Exception as e:
                 # エラーメッセージ
                 self.window.root.after(0, lambda: self._on_save_error(str(e)))
+            finally:
+                self.session.unpin(path)
         
-        # バックグラウンドで保存処理を実行
-        threading.Thread(target=save_thread, daemon=True).start()
+        # 書き出しの優先度で保存処理を実行
+        self.scheduler.submit_with_priority(PRIORITY_EXPORT, save_thread)
     
-    def _on_save_success(self, file_path: str):
+    def _on_save_success(self, file_path: str, savings: List[OptionSavings],
+                         result: Union[ProcessResult, EncodeDetails]):
         """保存成功時の処理"""
         self.window.stop_progress(100)
-        self.window.show_message("成功", f"画像を保存しました:\n{file_path}", "info")
+        message = f"画像を保存しました:\n{file_path}"
+        auto_quality = result.auto_quality
+        if auto_quality:
+            message += f"\n自動品質: {auto_quality.quality}% (SSIM {auto_quality.ssim:.4f})"
+        selection = result.format_selection
+        if selection:
+            message += "\n\n出力形式の比較:\n" + selection.format_report()
+        if savings:
+            message += "\n\n出力オプションによる削減:\n" + format_savings(savings)
+        self.window.show_message("成功", message, "info")
     
     def _on_save_error(self, error_message: str):
         """保存エラー時の処理"""
         self.window.stop_progress(0)
         self.window.show_message("エラー", f"保存に失敗しました:\n{error_message}", "error")
     
+    def handle_batch(self, directory: str):
+        """フォルダの一括処理"""
+        try:
+            self.window.get_resize_settings_from_ui()
+            self.window.get_compression_settings_from_ui()
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
+        
+        processor = BatchProcessor(
+            self.settings.resize_settings,
+            self.settings.compression_settings,
+            executor=self.scheduler,
+            process_pool=self.worker_pool,
+            # 一括処理のジョブは書き出しの優先度でプールに入り、プレビューのリサンプリング
+            # （対話的な優先度）は待っているジョブより先に渡される。実行中のジョブの終わりも
+            # 待たずに済むよう、同時に実行する数を1つ減らしてワーカーを1つ空けておく
+            max_workers=max(1, self.worker_pool.max_workers - 1),
+        )
+        
+        def batch_thread():
+            try:
+                self.window.root.after(0, self.window.start_progress)
+                summary = processor.process_directory(directory)
+                self.window.root.after(0, lambda: self._on_batch_done(summary))
+            except Exception as e:
+                self.window.root.after(0, lambda: self._on_save_error(str(e)))
+        
+        # ジョブの投入と完了待ちはスケジューラーのワーカーを使わない
+        threading.Thread(target=batch_thread, daemon=True).start()
+    
+    def _on_batch_done(self, summary: BatchSummary):
+        """一括処理完了時の処理"""
+        self.window.stop_progress(100)
+        message = summary.format_summary()
+        message += "\n\nスケジューラー:\n" + self.scheduler.format_stats()
+        message += "\n" + self.worker_pool.format_status()
+        self.window.show_message("一括処理", message, "info")
+    
+    def handle_edit(self, action: str):
+        """編集操作（回転・反転・元に戻す・やり直し）の処理"""
+        if not self.has_image():
+            return
+        
+        # 操作はパラメーターとして記録され、プレビュー時にまとめて評価される
+        actions = {
+            "rotate_left": lambda: self.image_processor.rotate(90),
+            "rotate_right": lambda: self.image_processor.rotate(-90),
+            "flip": lambda: self.image_processor.flip(horizontal=True),
+            "undo": self.image_processor.undo_edit,
+            "redo": self.image_processor.redo_edit,
+        }
+        try:
+            actions[action]()
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
+        
+        # 縦横が入れ替わった場合に備えて編集後のサイズに合わせる
+        edited_size = self.image_processor.get_edited_size()
+        if edited_size:
+            self.window.update_size_fields(edited_size[0], edited_size[1])
+            self.update_preview()
+    
+    def handle_show_diagnostics(self):
+        """診断情報の表示"""
+        DiagnosticsWindow(self.window.root, self.watchdog)
+    
+    def handle_zoom_view(self):
+        """出力画像の拡大表示"""
+        if not self.has_image():
+            self.window.show_message("警告", "表示する画像がありません", "warning")
+            return
+        
+        try:
+            # UIから設定を取得
+            self.window.get_resize_settings_from_ui()
+            self.window.get_compression_settings_from_ui()
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
+        
+        resize_settings = self.settings.resize_settings
+        compression_settings = self.settings.compression_settings
+        path = self.session.active_path
+        edits = self._snapshot_edits(path)
+        self.session.pin(path)
+        
+        def render():
+            try:
+                # 保存される内容を確認できるよう、エンコードした結果をデコードして表示する
+                processor = self.session.ensure_loaded(path)
+                resized = processor.render_resized(resize_settings, edits)
+                try:
+                    data = encode(resized, compression_settings).data
+                finally:
+                    resized.close()
+                return open_image_eagerly(io.BytesIO(data))
+            finally:
+                self.session.unpin(path)
+        
+        future = self.scheduler.submit_with_priority(PRIORITY_INTERACTIVE, render)
+        future.add_done_callback(
+            lambda f: self.window.root.after(0, lambda: self._on_zoom_view_ready(f, path))
+        )
+    
+    def _on_zoom_view_ready(self, future, path: str):
+        """拡大表示の準備完了時の処理（メインスレッドで実行）"""
+        try:
+            image = future.result()
+        except Exception as e:
+            self.window.show_message("エラー", f"拡大表示に失敗しました: {str(e)}", "error")
+            return
+        
+        width, height = image.size
+        title = f"拡大表示 - {os.path.basename(path)}（{width} x {height}）"
+        ZoomViewer(self.window.root, TilePyramid(image), self.scheduler, title)
+    
+    def handle_compare(self):
+        """エンコード前後の比較表示"""
+        if not self.has_image():
+            self.window.show_message("警告", "比較する画像がありません", "warning")
+            return
+        
+        try:
+            # UIから設定を取得
+            self.window.get_resize_settings_from_ui()
+            self.window.get_compression_settings_from_ui()
+        except ValueError as e:
+            self.window.show_message("エラー", str(e), "error")
+            return
+        
+        resize_settings = self.settings.resize_settings
+        compression_settings = self.settings.compression_settings
+        path = self.session.active_path
+        edits = self._snapshot_edits(path)
+        self.session.pin(path)
+        self._compare_generation += 1
+        
+        def render():
+            try:
+                processor = self.session.ensure_loaded(path)
+                # リサイズ結果は別のオブジェクトになるため、以降の編集の影響を受けない
+                before = processor.render_resized(resize_settings, edits)
+                candidate = encode_candidate(before, compression_settings)
+                return before, candidate, error_stats(before, candidate.image)
+            finally:
+                self.session.unpin(path)
+        
+        future = self.scheduler.submit_with_priority(PRIORITY_INTERACTIVE, render)
+        future.add_done_callback(
+            lambda f: self.window.root.after(
+                0, lambda: self._on_compare_ready(f, path, compression_settings)
+            )
+        )
+    
+    def _on_compare_ready(self, future, path: str, compression_settings):
+        """比較表示の準備完了時の処理（メインスレッドで実行）"""
+        try:
+            before, candidate, stats = future.result()
+        except Exception as e:
+            self.window.show_message("エラー", f"比較表示に失敗しました: {str(e)}", "error")
+            return
+        
+        if self.compare_viewer is not None:
+            self.compare_viewer.close()
+        self._compare_results.clear()
+        self._remember_comparison(compression_settings, (candidate, stats))
+        width, height = before.size
+        self.compare_viewer = CompareViewer(
+            self.window.root, before, candidate.image, self.scheduler,
+            title=f"比較表示 - {os.path.basename(path)}（{width} x {height}）",
+            description=self._describe_candidate(compression_settings, candidate, stats),
+            on_close=self._on_compare_closed,
+        )
+    
+    def _on_compare_closed(self):
+        """比較表示が閉じられた"""
+        self.compare_viewer = None
+        self._compare_generation += 1
+        self._compare_results.clear()
+    
+    def _remember_comparison(self, compression_settings: CompressionSettings, result: tuple):
+        """圧縮設定ごとのエンコード結果を保持（設定は変更できないためそのままキーにする）"""
+        self._compare_results[compression_settings] = result
+        self._compare_results.move_to_end(compression_settings)
+        while len(self._compare_results) > COMPARE_CACHE_SIZE:
+            self._compare_results.popitem(last=False)
+    
+    def handle_compression_change(self):
+        """圧縮設定の変更時の処理（比較表示中はエンコード結果を更新）"""
+        if self.compare_viewer is None:
+            return
+        # スライダーの操作中は操作が止まるまでまとめる
+        if self._compare_refresh_id is not None:
+            self.window.root.after_cancel(self._compare_refresh_id)
+        self._compare_refresh_id = self.window.root.after(
+            COMPARE_REFRESH_DELAY_MS, self._refresh_comparison
+        )
+    
+    def _refresh_comparison(self):
+        """現在の圧縮設定でエンコードし直して比較表示を更新"""
+        self._compare_refresh_id = None
+        viewer = self.compare_viewer
+        if viewer is None:
+            return
+        try:
+            self.window.get_compression_settings_from_ui()
+        except ValueError:
+            return  # 無効な値の場合は無視
+        
+        compression_settings = self.settings.compression_settings
+        self._compare_generation += 1
+        generation = self._compare_generation
+        cached = self._compare_results.get(compression_settings)
+        if cached is not None:
+            # 同じ設定でエンコード済みの結果を使う
+            self._compare_results.move_to_end(compression_settings)
+            candidate, stats = cached
+            viewer.set_after(
+                candidate.image,
+                self._describe_candidate(compression_settings, candidate, stats),
+            )
+            return
+        before = viewer.before_image
+        viewer.set_status("エンコード中...")
+        
+        def encode():
+            # 実行を待つ間に新しい設定が来た場合はエンコードしない
+            if generation != self._compare_generation:
+                return None
+            candidate = encode_candidate(before, compression_settings)
+            return candidate, error_stats(before, candidate.image)
+        
+        future = self.scheduler.submit_with_priority(PRIORITY_INTERACTIVE, encode)
+        future.add_done_callback(
+            lambda f: self.window.root.after(
+                0, lambda: self._on_comparison_refreshed(f, generation, compression_settings)
+            )
+        )
+    
+    def _on_comparison_refreshed(self, future, generation: int, compression_settings):
+        """エンコードし直した結果を比較表示に反映（メインスレッドで実行）"""
+        viewer = self.compare_viewer
+        if generation != self._compare_generation or viewer is None:
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            viewer.set_status(f"エンコードに失敗しました: {str(e)}")
+            return
+        if result is None:
+            return
+        self._remember_comparison(compression_settings, result)
+        candidate, stats = result
+        viewer.set_after(
+            candidate.image,
+            self._describe_candidate(compression_settings, candidate, stats),
+        )
+    
+    @staticmethod
+    def _describe_candidate(compression_settings, candidate, stats) -> str:
+        """比較表示に出すエンコード結果の説明"""
+        if compression_settings.uses_auto_quality():
+            quality = "自動"
+        else:
+            quality = str(compression_settings.quality)
+        return (f"{compression_settings.format_type} 品質 {quality}  "
+                f"{candidate.size_bytes / 1024:.1f} KB  {stats.format()}")
+    
     def handle_reset(self):
         """リセット時の処理"""
-        if self.image_processor.has_image():
+        if self.has_image():
             # 元の画像に戻す
             self.image_processor.reset_to_original()
             original_size = self.image_processor.get_original_size()
@@ -210,8 +697,9 @@ class AppController:
             if original_size:
                 width, height = original_size
                 self.window.update_size_fields(width, height)
-                self.settings.resize_settings.width = width
-                self.settings.resize_settings.height = height
+                self.settings.resize_settings = dataclasses.replace(
+                    self.settings.resize_settings, width=width, height=height
+                )
                 
                 # プレビューを更新
                 self.update_preview()
@@ -223,4 +711,7 @@ class AppController:
     def shutdown(self):
         """アプリケーション終了時の処理"""
         # 必要に応じて設定の保存やリソースのクリーンアップを行う
-        pass 
\ No newline at end of file
+        self.watchdog.stop()
+        self.scheduler.shutdown(wait=False)
+        self.session.close_all()
+        self.worker_pool.shutdown(wait=False, cancel_futures=True) 
\ No newline at end of file
@@ -35,6 +35,9 @@ def main():
         # コントローラーを作成
         controller = AppController(window, settings)
         
+        # ウィンドウの表示が済んでからワーカープロセスをバックグラウンドで起動する
+        root.after_idle(controller.start_worker_pool)
+        
         # アプリケーションを開始
         root.mainloop()
         
@@ -0,0 +1,143 @@
+"""
+バッチ出力のアーカイブへの書き出し
+
+ワーカーがエンコードしたバイト列を上限付きのキューで書き込みスレッドに渡し、
+一時ファイルを作らずにZIP（無圧縮）またはTARへ直接書き出す。
+出力先にはファイルパスのほか、標準出力などのシークできないストリームも使える。
+"""
+
+import io
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from typing import BinaryIO, Optional, Set, Tuple, Union
+
+# 対応するアーカイブ形式
+ARCHIVE_FORMATS = ["zip", "tar"]
+
+# キューに溜めておけるエントリ数（これを超えるとワーカーは書き込みを待つ）
+DEFAULT_QUEUE_SIZE = 8
+
+# 書き込みスレッドに終了を伝える番兵
+_CLOSE = None
+
+
+def detect_archive_format(path: str) -> str:
+    """拡張子からアーカイブ形式を判定（不明な場合はzip）"""
+    return "tar" if path.lower().endswith(".tar") else "zip"
+
+
+class ArchiveSink:
+    """エンコード済みのデータをアーカイブに書き出すシンク
+
+    putは複数のスレッドから呼べる。書き込みは専用のスレッドで順に行う。
+    """
+
+    def __init__(self, destination: Union[str, BinaryIO], archive_format: str = "zip",
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"サポートされていないアーカイブ形式です: {archive_format}")
+        self.archive_format = archive_format
+        self._owns_stream = isinstance(destination, str)
+        self._stream: BinaryIO = open(destination, "wb") if self._owns_stream else destination
+        self._queue: "queue.Queue[Optional[Tuple[str, bytes]]]" = queue.Queue(maxsize=queue_size)
+        self._names: Set[str] = set()
+        self._names_lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        # 書き出したエントリ数と合計バイト数
+        self.entry_count = 0
+        self.total_bytes = 0
+        self._writer = threading.Thread(target=self._write_loop, name="archive-writer",
+                                        daemon=True)
+        self._writer.start()
+
+    def unique_name(self, name: str) -> str:
+        """アーカイブ内で重複しないエントリ名を予約"""
+        stem, ext = os.path.splitext(name)
+        with self._names_lock:
+            candidate = name
+            counter = 1
+            while candidate in self._names:
+                candidate = f"{stem}_{counter}{ext}"
+                counter += 1
+            self._names.add(candidate)
+        return candidate
+
+    def put(self, name: str, data: bytes):
+        """エントリを書き込みキューに追加（キューが満杯の場合は待つ）"""
+        if self._closed:
+            raise ValueError("アーカイブは既に閉じられています")
+        if self._error is not None:
+            raise ValueError(f"アーカイブの書き込みに失敗しました: {self._error}")
+        self._queue.put((name, data))
+
+    def _write_loop(self):
+        """キューからエントリを取り出して書き込む（書き込みスレッド）"""
+        try:
+            if self.archive_format == "zip":
+                self._write_zip()
+            else:
+                self._write_tar()
+        except BaseException as e:
+            self._error = e
+            # 書き込みに失敗してもワーカーが待ち続けないようにキューを空にする
+            while self._queue.get() is not _CLOSE:
+                pass
+
+    def _entries(self):
+        """キューのエントリを順に取り出す"""
+        while True:
+            entry = self._queue.get()
+            if entry is _CLOSE:
+                return
+            yield entry
+
+    def _write_zip(self):
+        """ZIP（無圧縮）で書き込む"""
+        # JPEG・WEBPは圧縮済みのため再圧縮しない
+        with zipfile.ZipFile(self._stream, "w", compression=zipfile.ZIP_STORED) as archive:
+            for name, data in self._entries():
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                archive.writestr(info, data)
+                self._count(data)
+
+    def _write_tar(self):
+        """TARでストリームとして書き込む（シークしない）"""
+        with tarfile.open(fileobj=self._stream, mode="w|") as archive:
+            for name, data in self._entries():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                archive.addfile(info, io.BytesIO(data))
+                self._count(data)
+
+    def _count(self, data: bytes):
+        """書き込んだエントリを集計"""
+        self.entry_count += 1
+        self.total_bytes += len(data)
+
+    def close(self):
+        """残りのエントリを書き込んでアーカイブを閉じる"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._writer.join()
+        try:
+            self._stream.flush()
+        finally:
+            if self._owns_stream:
+                self._stream.close()
+        if self._error is not None:
+            raise ValueError(f"アーカイブの書き込みに失敗しました: {self._error}")
+
+    def __enter__(self) -> "ArchiveSink":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,342 @@
+"""
+巨大画像の帯（バンド）単位リサイズ
+
+TIFF/BMPのラスタを横方向の帯ごとに読み込み、フィルタカーネルの
+サポート幅ぶんの重なりを付けてリサイズすることで、ピークメモリを
+画像全体ではなく帯のサイズに抑える。出力も大きい場合は1枚の画像に
+組み立てず、帯ごとにPNGとして書き出す。
+"""
+
+import math
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import BmpImagePlugin, Image, ImageFile, TiffImagePlugin
+
+# 帯単位読み込みに切り替える画素数のしきい値
+BANDED_LOAD_THRESHOLD = 64 * 1024 * 1024
+
+# 1つの帯で読み込む入力ラスタの目安サイズ（バイト）
+DEFAULT_BAND_BYTES = 64 * 1024 * 1024
+
+# 1枚の画像として組み立てる出力の最大画素数（これ以上は帯ごとに書き出す）
+STREAMING_OUTPUT_THRESHOLD = BANDED_LOAD_THRESHOLD
+
+# プレビュー用の縮小画像の最大辺
+PROXY_MAX_SIZE = 2048
+
+# 帯ごとに書き出すPNGのカラータイプ（モード -> カラータイプ）
+_PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+
+# 帯ごとの書き出しでIDATチャンクにまとめる圧縮済みデータの目安サイズ
+_PNG_CHUNK_BYTES = 1024 * 1024
+
+# リサンプリングフィルタのサポート半径（縮小時は倍率を掛ける）
+FILTER_SUPPORT = {
+    Image.NEAREST: 0.5,
+    Image.BOX: 0.5,
+    Image.BILINEAR: 1.0,
+    Image.HAMMING: 1.0,
+    Image.BICUBIC: 2.0,
+    Image.LANCZOS: 3.0,
+}
+
+# TIFFタグ番号
+_TAG_PLANAR_CONFIGURATION = 284
+_TAG_STRIP_OFFSETS = 273
+_TAG_STRIP_BYTE_COUNTS = 279
+_TAG_TILE_OFFSETS = 324
+_TAG_TILE_BYTE_COUNTS = 325
+
+_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "LA": 2, "PA": 2, "I;16": 2,
+                    "RGB": 3, "YCbCr": 3, "LAB": 3, "HSV": 3,
+                    "RGBA": 4, "RGBX": 4, "CMYK": 4, "I": 4, "F": 4}
+
+
+class BandedImageReader:
+    """TIFF/BMPを帯単位で読み込むリーダー"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        image = self._open()
+        try:
+            self.size: Tuple[int, int] = image.size
+            self.mode: str = image.mode
+            self.format: Optional[str] = image.format
+            self.info: dict = dict(image.info)
+            self.supports_banded_read = self._check_tiles(image)
+        finally:
+            image.close()
+
+    def _open(self) -> ImageFile.ImageFile:
+        """デコードせずにヘッダーだけを読み込む
+
+        プラグインクラスを直接使うため、Image.openの
+        DecompressionBombチェックを経由しない。
+        """
+        with open(self.file_path, "rb") as fp:
+            prefix = fp.read(4)
+        if prefix[:2] == b"BM":
+            return BmpImagePlugin.BmpImageFile(self.file_path)
+        if prefix in (b"II*\x00", b"MM\x00*"):
+            return TiffImagePlugin.TiffImageFile(self.file_path)
+        raise ValueError("帯単位の読み込みはTIFF/BMPのみ対応しています")
+
+    def _check_tiles(self, image: ImageFile.ImageFile) -> bool:
+        """帯単位でデコードできるタイル構成かチェック"""
+        if not image.tile:
+            return False
+        if isinstance(image, TiffImagePlugin.TiffImageFile):
+            if image.tag_v2.get(_TAG_PLANAR_CONFIGURATION, 1) != 1:
+                return False
+            # 向き情報で縦横が入れ替わる画像は対象外
+            if getattr(image, "_tile_size", image.size) != image.size:
+                return False
+        return all(tile[0] == "raw" for tile in image.tile)
+
+    @property
+    def pixel_count(self) -> int:
+        """画素数を取得"""
+        return self.size[0] * self.size[1]
+
+    def estimate_row_bytes(self) -> int:
+        """1行あたりのデコード後メモリ量を推定"""
+        return self.size[0] * _BYTES_PER_PIXEL.get(self.mode, 4)
+
+    def read_rows(self, top: int, bottom: int) -> Image.Image:
+        """指定した行範囲 [top, bottom) だけをデコード"""
+        width, height = self.size
+        top = max(0, top)
+        bottom = min(height, bottom)
+        if top >= bottom:
+            raise ValueError("読み込む行範囲が不正です")
+        if not self.supports_banded_read:
+            raise ValueError("この画像は帯単位で読み込めません")
+
+        image = self._open()
+        try:
+            byte_counts = self._get_byte_counts(image)
+            tiles: List[tuple] = []
+            band_top = height
+            band_bottom = 0
+            for tile in image.tile:
+                codec, (x0, y0, x1, y1), offset, args = tile
+                if y1 <= top or y0 >= bottom:
+                    continue
+                if x0 == 0 and x1 == width:
+                    # 全幅のストリップは必要な行だけに切り詰める
+                    tile, y0, y1 = self._slice_strip(
+                        tile, max(y0, top), min(y1, bottom), byte_counts
+                    )
+                    _, (x0, _, x1, _), offset, args = tile
+                tiles.append((codec, (x0, y0, x1, y1), offset, args))
+                band_top = min(band_top, y0)
+                band_bottom = max(band_bottom, y1)
+
+            # 帯の原点に合わせてタイル座標を平行移動
+            image.tile = [
+                (codec, (x0, y0 - band_top, x1, y1 - band_top), offset, args)
+                for codec, (x0, y0, x1, y1), offset, args in tiles
+            ]
+            image._size = (width, band_bottom - band_top)
+            if hasattr(image, "_tile_size"):
+                image._tile_size = image._size
+            image.load()
+
+            if band_top == top and band_bottom == bottom:
+                return image.copy()
+            return image.crop((0, top - band_top, width, bottom - band_top))
+        finally:
+            image.close()
+
+    def _get_byte_counts(self, image: ImageFile.ImageFile) -> Dict[int, int]:
+        """ストリップのオフセットからバイト数への対応表を作成"""
+        if not isinstance(image, TiffImagePlugin.TiffImageFile):
+            return {}
+        for offsets_tag, counts_tag in ((_TAG_STRIP_OFFSETS, _TAG_STRIP_BYTE_COUNTS),
+                                        (_TAG_TILE_OFFSETS, _TAG_TILE_BYTE_COUNTS)):
+            if offsets_tag in image.tag_v2 and counts_tag in image.tag_v2:
+                offsets = image.tag_v2[offsets_tag]
+                counts = image.tag_v2[counts_tag]
+                if isinstance(offsets, int):
+                    offsets, counts = (offsets,), (counts,)
+                return dict(zip(offsets, counts))
+        return {}
+
+    def _slice_strip(self, tile: tuple, top: int, bottom: int,
+                     byte_counts: Dict[int, int]) -> Tuple[tuple, int, int]:
+        """rawストリップを [top, bottom) の行だけ読むように変換"""
+        codec, (x0, y0, x1, y1), offset, args = tile
+        rawmode, stride, ystep = args[0], args[1], args[2]
+        if not stride:
+            byte_count = byte_counts.get(offset)
+            if not byte_count:
+                # 行の長さが分からない場合はストリップ全体を読む
+                return tile, y0, y1
+            stride = byte_count // (y1 - y0)
+
+        if ystep < 0:
+            # ボトムアップ形式（BMP）は下の行から格納されている
+            skip_rows = y1 - bottom
+        else:
+            skip_rows = top - y0
+        sliced = (codec, (x0, top, x1, bottom), offset + skip_rows * stride,
+                  (rawmode, stride, ystep))
+        return sliced, top, bottom
+
+    def create_proxy(self, max_size: int = PROXY_MAX_SIZE,
+                     band_bytes: int = DEFAULT_BAND_BYTES) -> Image.Image:
+        """プレビュー用の縮小画像を帯単位で作成"""
+        width, height = self.size
+        ratio = min(1.0, max_size / max(width, height))
+        proxy_size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+        return resize_banded(self, proxy_size, Image.BOX, band_bytes)
+
+
+def open_banded_reader(file_path: str) -> Optional[BandedImageReader]:
+    """帯単位で読み込めるTIFF/BMPならリーダーを返す"""
+    try:
+        reader = BandedImageReader(file_path)
+    except Exception:
+        return None
+    return reader if reader.supports_banded_read else None
+
+
+def calculate_band_height(reader: BandedImageReader, output_height: int,
+                          band_bytes: int = DEFAULT_BAND_BYTES,
+                          source_height: Optional[int] = None) -> int:
+    """入力帯のメモリ量が目安に収まる出力側の帯の高さを計算
+
+    source_heightには読み込む範囲の高さを指定する（省略時は画像全体）。
+    """
+    scale_y = (source_height or reader.size[1]) / output_height
+    input_rows = max(1, band_bytes // max(1, reader.estimate_row_bytes()))
+    return max(1, int(input_rows / max(scale_y, 1.0)))
+
+
+def iter_resized_bands(reader: BandedImageReader, size: Tuple[int, int],
+                       resample: int = Image.LANCZOS,
+                       band_bytes: int = DEFAULT_BAND_BYTES,
+                       box: Optional[Tuple[int, int, int, int]] = None
+                       ) -> Iterator[Tuple[int, Image.Image]]:
+    """リサイズ済みの帯を (出力側のy座標, 画像) として順に生成
+
+    boxを指定すると元画像のその範囲 (left, top, right, bottom) の行だけを読み込む。
+    """
+    output_width, output_height = size
+    left, box_top, right, box_bottom = box or (0, 0) + reader.size
+    source_height = reader.size[1]
+    if output_width <= 0 or output_height <= 0:
+        raise ValueError("無効なサイズが指定されました")
+    if not (0 <= left < right <= reader.size[0] and 0 <= box_top < box_bottom <= source_height):
+        raise ValueError(f"読み込む範囲が画像の外にあります: {box}")
+
+    scale_y = (box_bottom - box_top) / output_height
+    support = FILTER_SUPPORT.get(resample, 3.0) * max(scale_y, 1.0)
+    band_height = calculate_band_height(reader, output_height, band_bytes,
+                                        box_bottom - box_top)
+
+    for out_top in range(0, output_height, band_height):
+        out_bottom = min(out_top + band_height, output_height)
+        source_top = box_top + out_top * scale_y
+        source_bottom = box_top + out_bottom * scale_y
+
+        # カーネルが参照する範囲＋余白を読み込む
+        read_top = max(0, int(math.floor(source_top - support)) - 1)
+        read_bottom = min(source_height, int(math.ceil(source_bottom + support)) + 1)
+        band = reader.read_rows(read_top, read_bottom)
+
+        resized = band.resize(
+            (output_width, out_bottom - out_top),
+            resample,
+            box=(left, source_top - read_top, right, source_bottom - read_top),
+        )
+        band.close()
+        yield out_top, resized
+
+
+def resize_banded(reader: BandedImageReader, size: Tuple[int, int],
+                  resample: int = Image.LANCZOS,
+                  band_bytes: int = DEFAULT_BAND_BYTES,
+                  max_output_pixels: int = STREAMING_OUTPUT_THRESHOLD,
+                  box: Optional[Tuple[int, int, int, int]] = None) -> Image.Image:
+    """帯単位でリサイズし、出力画像を組み立てる（boxは元画像の読み込む範囲）
+
+    出力がmax_output_pixels以上になる場合は組み立てずにValueErrorを送出する
+    （write_png_bandsで帯ごとに書き出す）。
+    """
+    if size[0] * size[1] >= max_output_pixels:
+        raise ValueError(
+            f"出力サイズ {size[0]} x {size[1]} は大きすぎるため1枚の画像として処理できません"
+            "（編集なしのPNG出力のみ帯ごとに書き出せます）"
+        )
+    output: Optional[Image.Image] = None
+    for out_top, band in iter_resized_bands(reader, size, resample, band_bytes, box):
+        if output is None:
+            output = Image.new(band.mode, size)
+            if band.mode == "P" and band.palette is not None:
+                output.putpalette(band.getpalette())
+        output.paste(band, (0, out_top))
+    if output is None:
+        raise ValueError("リサイズする画像がありません")
+    return output
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """PNGのチャンクを作成"""
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
+def png_band_mode(mode: str) -> str:
+    """帯ごとに書き出すPNGのモード（対応していないモードは変換する）"""
+    if mode in _PNG_COLOR_TYPES:
+        return mode
+    return "RGBA" if mode in ("PA", "RGBa", "La") else "RGB"
+
+
+def write_png_bands(bands: Iterable[Tuple[int, Image.Image]], size: Tuple[int, int],
+                    mode: str, stream: BinaryIO, compress_level: int = 6,
+                    icc_profile: Optional[bytes] = None):
+    """iter_resized_bandsなどで生成した帯を順にPNGとして書き出す
+
+    画素データは帯ごとに圧縮して書き出すため、出力画像全体をメモリに持たない。
+    modeはpng_band_modeで決めたモードで、異なるモードの帯は変換する。
+    """
+    width, height = size
+    stream.write(b"\x89PNG\r\n\x1a\n")
+    stream.write(_png_chunk(b"IHDR", struct.pack(
+        ">IIBBBBB", width, height, 8, _PNG_COLOR_TYPES[mode], 0, 0, 0
+    )))
+    if icc_profile:
+        stream.write(_png_chunk(b"iCCP", b"ICC Profile\x00\x00" + zlib.compress(icc_profile)))
+
+    compressor = zlib.compressobj(compress_level)
+    pending: List[bytes] = []
+    pending_bytes = 0
+    written_rows = 0
+    for _, band in bands:
+        if band.mode != mode:
+            converted = band.convert(mode)
+            band.close()
+            band = converted
+        data = band.tobytes()
+        stride = len(data) // band.height
+        for row in range(band.height):
+            # 各行の先頭にフィルタ（なし）を付ける
+            chunk = compressor.compress(b"\x00" + data[row * stride:(row + 1) * stride])
+            if chunk:
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+        written_rows += band.height
+        band.close()
+        if pending_bytes >= _PNG_CHUNK_BYTES:
+            stream.write(_png_chunk(b"IDAT", b"".join(pending)))
+            pending, pending_bytes = [], 0
+
+    if written_rows != height:
+        raise ValueError("書き出した行数が出力サイズと一致しません")
+    pending.append(compressor.flush())
+    stream.write(_png_chunk(b"IDAT", b"".join(pending)))
+    stream.write(_png_chunk(b"IEND", b""))
@@ -0,0 +1,248 @@
+"""
+バッチ処理の事前見積もり（ドライラン）
+
+入力から無作為に選んだ標本だけを実際にリサイズ・エンコード（メモリ上）し、
+全体の出力サイズと処理時間を信頼区間付きで推定する。
+標本数は出力サイズの変動係数から、平均の相対誤差が許容誤差に収まるように決める。
+ピークメモリは全ファイルのヘッダーから見積もる。
+"""
+
+import io
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence
+
+from .batch_processor import BatchProcessor
+from .image_processor import ImageProcessor
+from .memory_scheduler import MemoryBudgetScheduler
+from .settings import CompressionSettings, ResizeSettings
+
+# 標本数の決定に使う許容誤差（平均に対する相対誤差の目安）
+DEFAULT_MARGIN_OF_ERROR = 0.1
+
+# 最初の標本数を決めるときに仮定する出力サイズの変動係数（標準偏差 / 平均）
+DEFAULT_COEFFICIENT_OF_VARIATION = 0.5
+
+# 見積もる並列数
+DEFAULT_WORKER_COUNTS = (1, 2, 4, 8)
+
+
+@dataclass
+class Estimate:
+    """推定値と信頼区間"""
+    value: float
+    low: float
+    high: float
+
+
+@dataclass
+class SampleMeasurement:
+    """標本1ファイル分の計測結果"""
+    path: str
+    output_bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchEstimate:
+    """バッチ処理全体の見積もり結果"""
+    file_count: int
+    total_input_bytes: int
+    confidence: float
+    output_bytes: Estimate
+    # 1並列で処理した場合の合計時間
+    cpu_seconds: Estimate
+    samples: List[SampleMeasurement] = field(default_factory=list)
+    # 並列数 -> 推定処理時間
+    seconds_by_workers: Dict[int, Estimate] = field(default_factory=dict)
+    # 並列数 -> 推定ピークメモリ
+    peak_memory_by_workers: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def failed_count(self) -> int:
+        """標本のうち処理に失敗した件数"""
+        return sum(1 for sample in self.samples if sample.error)
+
+    @property
+    def failure_rate(self) -> float:
+        """標本から推定した処理に失敗するファイルの割合"""
+        if not self.samples:
+            return 0.0
+        return self.failed_count / len(self.samples)
+
+    def format_report(self) -> str:
+        """表示用の文字列に整形"""
+        mb = 1024 * 1024
+        level = f"{self.confidence * 100:.0f}%"
+        output = self.output_bytes
+        lines = [
+            f"対象: {self.file_count}件（標本 {len(self.samples)}件、うち失敗 {self.failed_count}件）",
+            f"入力合計: {self.total_input_bytes / mb:.2f} MB",
+            f"推定出力合計: {output.value / mb:.2f} MB"
+            f"（{level}信頼区間 {output.low / mb:.2f}〜{output.high / mb:.2f} MB）",
+        ]
+        if self.failed_count:
+            lines.append(f"推定失敗件数: {self.failure_rate * self.file_count:.0f}件"
+                         f"（失敗率 {self.failure_rate:.1%}、出力合計には含めない）")
+        lines += [
+            "推定処理時間:",
+        ]
+        for workers, seconds in sorted(self.seconds_by_workers.items()):
+            lines.append(f"  {workers}並列: {seconds.value:.1f} 秒"
+                         f"（{seconds.low:.1f}〜{seconds.high:.1f} 秒）")
+        lines.append("推定ピークメモリ:")
+        for workers, peak in sorted(self.peak_memory_by_workers.items()):
+            lines.append(f"  {workers}並列: {peak / mb:.1f} MB")
+        return "\n".join(lines)
+
+
+def required_sample_size(population: int, margin_of_error: float = DEFAULT_MARGIN_OF_ERROR,
+                         confidence: float = 0.95,
+                         coefficient_of_variation: float = DEFAULT_COEFFICIENT_OF_VARIATION
+                         ) -> int:
+    """平均の相対誤差がmargin_of_error以内になる標本数（有限母集団修正付き）
+
+    n0 = (z × 変動係数 / 許容誤差)^2 を有限母集団修正する。
+    """
+    if population <= 0:
+        return 0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    n0 = (z * coefficient_of_variation / margin_of_error) ** 2
+    return min(population, math.ceil(n0 / (1 + (n0 - 1) / population)))
+
+
+def coefficient_of_variation(values: Sequence[float]) -> Optional[float]:
+    """標本の変動係数（2件未満または平均が0の場合はNone）"""
+    if len(values) < 2:
+        return None
+    mean = sum(values) / len(values)
+    if mean <= 0:
+        return None
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return math.sqrt(variance) / mean
+
+
+def estimate_total(values: Sequence[float], population: int, confidence: float) -> Estimate:
+    """標本の平均から母集団の合計を推定（有限母集団修正付きの正規近似）"""
+    n = len(values)
+    if n == 0:
+        return Estimate(0.0, 0.0, 0.0)
+    mean = sum(values) / n
+    total = mean * population
+    if n < 2 or n >= population:
+        return Estimate(total, total, total)
+    variance = sum((value - mean) ** 2 for value in values) / (n - 1)
+    correction = (population - n) / (population - 1)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    margin = z * population * math.sqrt(variance / n * correction)
+    return Estimate(total, max(0.0, total - margin), total + margin)
+
+
+class BatchEstimator:
+    """標本を実際に処理してバッチ全体を見積もるクラス
+
+    重複の再利用による削減は見積もりに含めない（上限側の見積もりになる）。
+    """
+
+    def __init__(self, resize_settings: ResizeSettings,
+                 compression_settings: CompressionSettings,
+                 sample_size: Optional[int] = None,
+                 margin_of_error: float = DEFAULT_MARGIN_OF_ERROR,
+                 confidence: float = 0.95,
+                 memory_budget: Optional[int] = None,
+                 seed: Optional[int] = None):
+        if not 0 < confidence < 1:
+            raise ValueError("信頼水準は0より大きく1未満で指定してください")
+        self.resize_settings = resize_settings
+        self.compression_settings = compression_settings
+        # Noneの場合は許容誤差から決める
+        self.sample_size = sample_size
+        self.margin_of_error = margin_of_error
+        self.confidence = confidence
+        self.memory_budget = memory_budget
+        self._random = random.Random(seed)
+
+    def choose_sample(self, paths: Sequence[str],
+                      coefficient: float = DEFAULT_COEFFICIENT_OF_VARIATION) -> List[str]:
+        """標本とするファイルを無作為に選ぶ（coefficientは仮定する出力サイズの変動係数）"""
+        size = self.sample_size
+        if size is None:
+            size = required_sample_size(len(paths), self.margin_of_error, self.confidence,
+                                        coefficient)
+        return self._random.sample(list(paths), min(size, len(paths)))
+
+    def _measure_samples(self, paths: Sequence[str]) -> List[SampleMeasurement]:
+        """標本を処理する（標本数を指定していない場合は最初の標本の変動係数で追加する）"""
+        chosen = self.choose_sample(paths)
+        # 時間の計測がぶれないよう標本は1つずつ処理する
+        samples = [self.measure(path) for path in chosen]
+        if self.sample_size is not None:
+            return samples
+
+        observed = coefficient_of_variation(
+            [sample.output_bytes for sample in samples if not sample.error]
+        )
+        if observed is None:
+            return samples
+        needed = required_sample_size(len(paths), self.margin_of_error, self.confidence,
+                                      observed)
+        if needed > len(chosen):
+            chosen_set = set(chosen)
+            remaining = [path for path in paths if path not in chosen_set]
+            extra = self._random.sample(remaining, min(needed - len(chosen), len(remaining)))
+            samples += [self.measure(path) for path in extra]
+        return samples
+
+    def measure(self, path: str) -> SampleMeasurement:
+        """1ファイルをメモリ上で処理して出力サイズと時間を計測"""
+        sample = SampleMeasurement(path=path)
+        start_time = time.perf_counter()
+        try:
+            with ImageProcessor() as processor:
+                processor.load_image(path)
+                # 実際のバッチと同じく、出力が大きい場合は帯ごとに書き出す
+                buffer = io.BytesIO()
+                processor.write_resized(buffer, self.resize_settings, self.compression_settings)
+                sample.output_bytes = buffer.tell()
+        except Exception as e:
+            sample.error = str(e)
+        sample.seconds = time.perf_counter() - start_time
+        return sample
+
+    def estimate(self, paths: Sequence[str],
+                 worker_counts: Sequence[int] = DEFAULT_WORKER_COUNTS) -> BatchEstimate:
+        """指定した画像全体の出力サイズ・処理時間・ピークメモリを見積もる"""
+        population = len(paths)
+        samples = self._measure_samples(paths)
+        # 失敗したファイルは出力がないため、成功すると推定される件数の合計として見積もる
+        succeeded = [s.output_bytes for s in samples if not s.error]
+        succeeded_population = (round(population * len(succeeded) / len(samples))
+                                if samples else 0)
+
+        result = BatchEstimate(
+            file_count=population,
+            total_input_bytes=sum(os.path.getsize(path) for path in paths),
+            confidence=self.confidence,
+            output_bytes=estimate_total(succeeded, succeeded_population, self.confidence),
+            cpu_seconds=estimate_total([s.seconds for s in samples], population,
+                                       self.confidence),
+            samples=samples,
+        )
+
+        jobs = BatchProcessor(self.resize_settings, self.compression_settings).build_jobs(paths)
+        cpu_count = os.cpu_count() or 1
+        for workers in worker_counts:
+            # CPU数までは並列数に比例して短縮されると仮定する
+            parallelism = min(workers, cpu_count, max(population, 1))
+            cpu = result.cpu_seconds
+            result.seconds_by_workers[workers] = Estimate(
+                cpu.value / parallelism, cpu.low / parallelism, cpu.high / parallelism
+            )
+            scheduler = MemoryBudgetScheduler(self.memory_budget, workers)
+            result.peak_memory_by_workers[workers] = scheduler.first_wave_bytes(jobs)
+        return result
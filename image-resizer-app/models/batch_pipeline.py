@@ -0,0 +1,231 @@
+"""
+段階的なバッチ処理パイプライン
+
+読み込み（I/Oスレッドでファイルを先読み）、変換（CPUワーカーでデコード・リサイズ・
+エンコード）、書き出し（専用の書き込みスレッド）の3段階を上限付きのキューでつなぎ、
+ディスクとCPUを同時に動かす。下流が詰まると上流はキューへの追加で待つため、
+先読みしたデータがメモリに溜まり続けることはない。
+"""
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .output_savings import OptionSavings
+
+# 段階の間のキューに溜めておける件数
+DEFAULT_QUEUE_SIZE = 8
+
+# 読み込みスレッドの数のデフォルト
+DEFAULT_IO_WORKERS = 4
+
+# これより大きいファイルは先読みせず、変換時にファイルから読む（帯単位の読み込みを使えるようにする）
+DEFAULT_MAX_PREFETCH_BYTES = 64 * 1024 * 1024
+
+# 段階の終了を伝える番兵
+_DONE = None
+
+# エンコード処理の型 (入力パス, 先読みしたデータ) -> (エンコード結果, 形式, 削減量)
+EncodeFunction = Callable[[str, Optional[bytes]], Tuple[bytes, str, List[OptionSavings]]]
+
+
+@dataclass
+class StageStats:
+    """1段階分の稼働状況"""
+    name: str
+    workers: int
+    items: int = 0
+    # 処理していた時間の合計（全スレッド分）
+    busy_seconds: float = 0.0
+    # 上流のキューが空で待っていた時間の合計
+    starved_seconds: float = 0.0
+    # 下流のキューが満杯で待っていた時間の合計
+    blocked_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def utilization(self, elapsed_seconds: float) -> float:
+        """使用率（処理していた時間 / スレッド数 × 経過時間）"""
+        if elapsed_seconds <= 0 or self.workers <= 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (self.workers * elapsed_seconds))
+
+    def format_stats(self, elapsed_seconds: float) -> str:
+        """表示用の文字列"""
+        capacity = max(self.workers * elapsed_seconds, 1e-9)
+        return (f"{self.name}: {self.workers}スレッド 使用率 {self.utilization(elapsed_seconds):.0%}"
+                f"（入力待ち {self.starved_seconds / capacity:.0%} / "
+                f"出力待ち {self.blocked_seconds / capacity:.0%}、{self.items}件）")
+
+    def add(self, busy: float = 0.0, starved: float = 0.0, blocked: float = 0.0,
+            items: int = 0):
+        """計測値を加算（複数のスレッドから呼べる）"""
+        with self._lock:
+            self.busy_seconds += busy
+            self.starved_seconds += starved
+            self.blocked_seconds += blocked
+            self.items += items
+
+
+@dataclass
+class PipelineItem:
+    """段階の間で受け渡す1ファイル分の作業と、その結果"""
+    source_path: str
+    output_path: str
+    input_bytes: int = 0
+    output_bytes: int = 0
+    format_type: Optional[str] = None
+    option_savings: List[OptionSavings] = field(default_factory=list)
+    error: Optional[str] = None
+    # 先読みしたデータとエンコード結果（次の段階に渡したら解放する）
+    data: Optional[bytes] = field(default=None, repr=False)
+    encoded: Optional[bytes] = field(default=None, repr=False)
+
+
+class BatchPipeline:
+    """読み込み・変換・書き出しを重ねて実行するパイプライン
+
+    encodeは入力パスと先読みしたデータ（先読みしない場合はNone）を受け取り、
+    エンコード結果を返す。storeは書き込みスレッドから順に呼ばれ、
+    (入力パス, 出力パス, エンコード結果, 形式) を受け取って書き出した出力パスを返す。
+    """
+
+    def __init__(self, encode: EncodeFunction,
+                 store: Callable[[str, str, bytes, str], str],
+                 io_workers: int = DEFAULT_IO_WORKERS,
+                 cpu_workers: Optional[int] = None,
+                 writer_workers: int = 1,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_prefetch_bytes: int = DEFAULT_MAX_PREFETCH_BYTES):
+        if io_workers < 1 or writer_workers < 1 or queue_size < 1:
+            raise ValueError("スレッド数とキューの大きさは1以上で指定してください")
+        self.encode = encode
+        self.store = store
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or min(4, os.cpu_count() or 1)
+        self.writer_workers = writer_workers
+        self.queue_size = queue_size
+        self.max_prefetch_bytes = max_prefetch_bytes
+        self.stages: List[StageStats] = []
+        self.elapsed_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def run(self, items: Sequence[Tuple[str, str]]) -> Dict[str, PipelineItem]:
+        """(入力パス, 出力パス) の組をすべて処理し、入力パスごとの結果を返す"""
+        read_stats = StageStats("読み込み", self.io_workers)
+        encode_stats = StageStats("変換", self.cpu_workers)
+        write_stats = StageStats("書き出し", self.writer_workers)
+        self.stages = [read_stats, encode_stats, write_stats]
+
+        pending: "queue.Queue[Optional[PipelineItem]]" = queue.Queue()
+        for source_path, output_path in items:
+            pending.put(PipelineItem(source_path, output_path))
+        read_queue: "queue.Queue[Optional[PipelineItem]]" = queue.Queue(maxsize=self.queue_size)
+        write_queue: "queue.Queue[Optional[PipelineItem]]" = queue.Queue(maxsize=self.queue_size)
+        results: Dict[str, PipelineItem] = {}
+
+        start_time = time.perf_counter()
+        stages = [
+            self._start(self.io_workers, "pipeline-read", self._read_loop,
+                        pending, read_queue, read_stats),
+            self._start(self.cpu_workers, "pipeline-encode", self._encode_loop,
+                        read_queue, write_queue, encode_stats),
+            self._start(self.writer_workers, "pipeline-write", self._write_loop,
+                        write_queue, results, write_stats),
+        ]
+        # 上流の段階がすべて終わってから、下流のスレッド数だけ番兵を送る
+        downstream = [pending, read_queue, write_queue]
+        counts = [self.io_workers, self.cpu_workers, self.writer_workers]
+        for index, threads in enumerate(stages):
+            for _ in range(counts[index]):
+                downstream[index].put(_DONE)
+            for thread in threads:
+                thread.join()
+        self.elapsed_seconds = time.perf_counter() - start_time
+        return results
+
+    def format_stats(self) -> str:
+        """段階ごとの稼働状況を表示用の文字列に整形"""
+        return "\n".join(stage.format_stats(self.elapsed_seconds) for stage in self.stages)
+
+    @staticmethod
+    def _start(count: int, name: str, target, *args) -> List[threading.Thread]:
+        """段階のスレッドを起動"""
+        threads = [threading.Thread(target=target, args=args, name=f"{name}-{i}", daemon=True)
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _take(self, source: queue.Queue, stats: StageStats) -> Optional[PipelineItem]:
+        """上流のキューから取り出す（待った時間を記録）"""
+        waited = time.perf_counter()
+        item = source.get()
+        stats.add(starved=time.perf_counter() - waited)
+        return item
+
+    def _pass(self, destination: queue.Queue, item: PipelineItem, stats: StageStats):
+        """下流のキューに渡す（満杯で待った時間を記録）"""
+        waited = time.perf_counter()
+        destination.put(item)
+        stats.add(blocked=time.perf_counter() - waited)
+
+    def _read_loop(self, pending: queue.Queue, read_queue: queue.Queue, stats: StageStats):
+        """ファイルの内容を先読みする（読み込みスレッド）"""
+        while True:
+            item = self._take(pending, stats)
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            try:
+                item.input_bytes = os.path.getsize(item.source_path)
+                if item.input_bytes <= self.max_prefetch_bytes:
+                    with open(item.source_path, "rb") as f:
+                        item.data = f.read()
+            except Exception as e:
+                item.error = str(e)
+            stats.add(busy=time.perf_counter() - started, items=1)
+            self._pass(read_queue, item, stats)
+
+    def _encode_loop(self, read_queue: queue.Queue, write_queue: queue.Queue,
+                     stats: StageStats):
+        """デコード・リサイズ・エンコードを行う（CPUワーカー）"""
+        while True:
+            item = self._take(read_queue, stats)
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            if item.error is None:
+                try:
+                    item.encoded, item.format_type, savings = self.encode(
+                        item.source_path, item.data
+                    )
+                    item.option_savings = list(savings)
+                except Exception as e:
+                    item.error = str(e)
+            # 先読みしたデータは変換が終われば不要
+            item.data = None
+            stats.add(busy=time.perf_counter() - started, items=1)
+            self._pass(write_queue, item, stats)
+
+    def _write_loop(self, write_queue: queue.Queue, results: Dict[str, PipelineItem],
+                    stats: StageStats):
+        """エンコード結果を書き出して結果を記録する（書き込みスレッド）"""
+        while True:
+            item = self._take(write_queue, stats)
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            if item.error is None:
+                try:
+                    item.output_path = self.store(item.source_path, item.output_path,
+                                                  item.encoded, item.format_type)
+                    item.output_bytes = len(item.encoded)
+                except Exception as e:
+                    item.error = str(e)
+            item.encoded = None
+            with self._lock:
+                results[item.source_path] = item
+            stats.add(busy=time.perf_counter() - started, items=1)
@@ -0,0 +1,417 @@
+"""
+バッチ処理モデル
+"""
+
+import io
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .archive_sink import ArchiveSink
+from .batch_pipeline import DEFAULT_IO_WORKERS, BatchPipeline, StageStats
+from .duplicates import DuplicateReport, find_duplicates
+from .image_processor import ImageProcessor
+from .memory_scheduler import MemoryBudgetScheduler, ScheduledJob, estimate_job_memory
+from .output_savings import OptionSavings, combine_savings, format_savings
+from .settings import FORMAT_EXTENSIONS, CompressionSettings, ResizeSettings
+from utils.file_utils import get_directory_images, link_or_copy, open_atomic
+
+# 処理結果のステータス
+STATUS_PROCESSED = "processed"
+STATUS_DUPLICATE = "duplicate"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class BatchItemResult:
+    """1ファイル分の処理結果"""
+    source_path: str
+    output_path: Optional[str] = None
+    status: str = STATUS_PROCESSED
+    error: Optional[str] = None
+    input_bytes: int = 0
+    output_bytes: int = 0
+    # 重複として再利用した場合の代表ファイル
+    duplicate_of: Optional[str] = None
+    # 出力オプションごとの削減量（計測した場合のみ）
+    option_savings: List[OptionSavings] = field(default_factory=list)
+    # 出力した形式（形式を自動選択した場合は選ばれた形式）
+    format_type: Optional[str] = None
+
+
+@dataclass
+class BatchSummary:
+    """バッチ処理全体の結果"""
+    results: List[BatchItemResult] = field(default_factory=list)
+    duplicate_report: Optional[DuplicateReport] = None
+    elapsed_seconds: float = 0.0
+    # スケジューラーが予約したメモリの最大値（見積もり）
+    peak_memory_bytes: int = 0
+    # 出力形式を自動選択したか
+    auto_format: bool = False
+    # パイプラインで処理した場合の段階ごとの稼働状況
+    stage_stats: List[StageStats] = field(default_factory=list)
+
+    def count(self, status: str) -> int:
+        """指定ステータスの件数を取得"""
+        return sum(1 for result in self.results if result.status == status)
+
+    @property
+    def total_input_bytes(self) -> int:
+        """入力ファイルの合計サイズ"""
+        return sum(result.input_bytes for result in self.results)
+
+    @property
+    def total_output_bytes(self) -> int:
+        """出力ファイルの合計サイズ"""
+        return sum(result.output_bytes for result in self.results
+                   if result.status != STATUS_FAILED)
+
+    def format_summary(self) -> str:
+        """表示用のサマリー文字列を作成"""
+        lines = [
+            f"処理: {self.count(STATUS_PROCESSED)}件",
+            f"重複の再利用: {self.count(STATUS_DUPLICATE)}件",
+            f"失敗: {self.count(STATUS_FAILED)}件",
+            f"入力合計: {self.total_input_bytes / (1024 * 1024):.2f} MB",
+            f"出力合計: {self.total_output_bytes / (1024 * 1024):.2f} MB",
+            f"処理時間: {self.elapsed_seconds:.2f} 秒",
+            f"推定ピークメモリ: {self.peak_memory_bytes / (1024 * 1024):.1f} MB",
+        ]
+        if self.duplicate_report and self.duplicate_report.near_groups:
+            lines.append(f"類似画像のグループ: {len(self.duplicate_report.near_groups)}件")
+        format_counts = self.get_format_counts()
+        if len(format_counts) > 1 or self.auto_format:
+            lines.append("出力形式: " + ", ".join(
+                f"{name} {count}件" for name, count in sorted(format_counts.items())
+            ))
+        if self.stage_stats:
+            lines.append("段階ごとの稼働状況:")
+            lines.extend("  " + stage.format_stats(self.elapsed_seconds)
+                         for stage in self.stage_stats)
+        savings = self.get_option_savings()
+        if savings:
+            lines.append("出力オプションによる削減:")
+            lines.extend("  " + line for line in format_savings(savings).splitlines())
+        return "\n".join(lines)
+
+    def get_format_counts(self) -> Dict[str, int]:
+        """出力形式ごとの件数を取得（失敗したファイルは除く）"""
+        counts: Dict[str, int] = {}
+        for result in self.results:
+            if result.status != STATUS_FAILED and result.format_type:
+                counts[result.format_type] = counts.get(result.format_type, 0) + 1
+        return counts
+
+    def get_option_savings(self) -> List[OptionSavings]:
+        """出力オプションごとの削減量を全ファイル分合算"""
+        return combine_savings(result.option_savings for result in self.results)
+
+
+def process_batch_file(resize_settings: ResizeSettings,
+                       compression_settings: CompressionSettings,
+                       source_path: str, output_path: str,
+                       measure_savings: bool = False) -> BatchItemResult:
+    """1ファイルをリサイズして保存（ワーカープロセスからも呼べるよう関数にしている）"""
+    result = BatchItemResult(source_path=source_path, output_path=output_path)
+    try:
+        result.input_bytes = os.path.getsize(source_path)
+        with ImageProcessor() as processor:
+            processor.load_image(source_path)
+            # 出力が大きい場合は1枚の画像に組み立てずに帯ごとに書き出す
+            streamed = processor.requires_streaming(resize_settings)
+            result.output_path = processor.save_resized(output_path, resize_settings,
+                                                        compression_settings)
+            result.format_type = processor.last_format_type
+            if measure_savings and not streamed:
+                result.option_savings = processor.measure_option_savings(compression_settings)
+        result.output_bytes = os.path.getsize(result.output_path)
+    except Exception as e:
+        result.status = STATUS_FAILED
+        result.error = str(e)
+    return result
+
+
+class BatchProcessor:
+    """複数の画像をまとめてリサイズ・圧縮するクラス"""
+
+    def __init__(self, resize_settings: ResizeSettings,
+                 compression_settings: CompressionSettings,
+                 suffix: str = "_resized",
+                 detect_duplicates: bool = True,
+                 detect_near_duplicates: bool = False,
+                 max_workers: Optional[int] = None,
+                 measure_savings: bool = False,
+                 memory_budget: Optional[int] = None,
+                 executor: Optional[Executor] = None,
+                 archive: Optional[ArchiveSink] = None,
+                 pipelined: bool = False,
+                 io_workers: int = DEFAULT_IO_WORKERS,
+                 process_pool: Optional[Executor] = None):
+        self.resize_settings = resize_settings
+        self.compression_settings = compression_settings
+        self.suffix = suffix
+        self.detect_duplicates = detect_duplicates
+        # 類似画像の検出は全画像のデコードが必要で、レポートにしか使わないため任意
+        self.detect_near_duplicates = detect_near_duplicates
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        # オプションごとの削減量の計測は追加のエンコードが必要なため任意
+        self.measure_savings = measure_savings
+        # 同時に処理する画像の展開後メモリの上限（Noneはコンテナの上限から決定）
+        self.memory_budget = memory_budget
+        # 共有のExecutor（GUIでは優先度スケジューラー）で処理する場合に指定
+        self.executor = executor
+        # 指定した場合はファイルを作らずアーカイブに書き出す（output_pathはエントリ名）
+        self.archive = archive
+        # 読み込み・変換・書き出しを別々のスレッドで重ねて実行する（ネットワークストレージ向け）
+        self.pipelined = pipelined
+        self.io_workers = io_workers
+        # 指定した場合は1ファイルの処理をワーカープロセス（起動済みのプール）で行う
+        self.process_pool = process_pool
+
+    def process_directory(self, directory: str,
+                          output_dir: Optional[str] = None) -> BatchSummary:
+        """ディレクトリ内の画像をまとめて処理"""
+        return self.process_files(get_directory_images(directory), output_dir)
+
+    def process_files(self, paths: Sequence[str],
+                      output_dir: Optional[str] = None) -> BatchSummary:
+        """指定した画像をまとめて処理"""
+        start_time = time.perf_counter()
+        # アーカイブに書き出す場合はファイル名だけをエントリ名として使う
+        output_paths = self.build_output_paths(paths, "." if self.archive else output_dir)
+
+        # 前処理: 重複の検出
+        report = None
+        duplicate_map: Dict[str, str] = {}
+        if self.detect_duplicates:
+            report = self._find_duplicates(paths)
+            duplicate_map = report.get_duplicate_map()
+
+        unique_paths = [path for path in paths if path not in duplicate_map]
+        # 重複のエントリは代表ファイルのエンコード結果を使って同時に書き出す
+        duplicate_names: Dict[str, List[str]] = {}
+        if self.archive:
+            for path, representative in duplicate_map.items():
+                duplicate_names.setdefault(representative, []).append(output_paths[path])
+        jobs = self.build_jobs(unique_paths)
+        stage_stats: List[StageStats] = []
+        if self.pipelined:
+            scheduler = MemoryBudgetScheduler(self.memory_budget, self.max_workers)
+            results, stage_stats = self._run_pipeline(jobs, scheduler, output_paths,
+                                                      duplicate_names)
+            peak_memory = scheduler.peak_reserved
+        else:
+            def process(path: str) -> BatchItemResult:
+                if self.archive:
+                    return self.archive_file(path, output_paths[path],
+                                             duplicate_names.get(path, []))
+                return self.process_file(path, output_paths[path])
+
+            scheduler = MemoryBudgetScheduler(self.memory_budget, self.max_workers,
+                                              executor=self.executor)
+            results = scheduler.run(jobs, process)
+            peak_memory = scheduler.peak_reserved
+
+        # 重複は代表ファイルの出力を再利用
+        for path, representative in duplicate_map.items():
+            results[path] = self._reuse_output(
+                path, output_paths[path], results[representative]
+            )
+
+        summary = BatchSummary(
+            results=[results[path] for path in paths],
+            duplicate_report=report,
+            peak_memory_bytes=peak_memory,
+            auto_format=self.compression_settings.is_auto_format(),
+            stage_stats=stage_stats,
+        )
+        summary.elapsed_seconds = time.perf_counter() - start_time
+        return summary
+
+    def _find_duplicates(self, paths: Sequence[str]) -> DuplicateReport:
+        """重複を検出（類似の検出のハッシュ計算はバッチのExecutorで並行して行う）"""
+        if not self.detect_near_duplicates:
+            return find_duplicates(paths)
+        if self.executor is not None:
+            return find_duplicates(paths, detect_near=True, executor=self.executor)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return find_duplicates(paths, detect_near=True, executor=executor)
+
+    def _run_pipeline(self, jobs: Sequence[ScheduledJob], scheduler: MemoryBudgetScheduler,
+                      output_paths: Dict[str, str], duplicate_names: Dict[str, List[str]]
+                      ) -> Tuple[Dict[str, BatchItemResult], List[StageStats]]:
+        """読み込み・変換・書き出しのパイプラインで処理
+
+        変換ワーカーはデコードの前にスケジューラーから見積もったメモリを予約し、
+        予算に空きがなければ待つ。ファイルは大きいものから順に流す。
+        """
+        memory = {job.key: job.memory_bytes for job in jobs}
+
+        def encode(source_path: str, data: Optional[bytes]):
+            scheduler.acquire(memory[source_path])
+            try:
+                return self.encode_file(source_path, data)
+            finally:
+                scheduler.release(memory[source_path])
+
+        pipeline = BatchPipeline(
+            encode,
+            lambda source, output, data, format_type: self.store_encoded(
+                output, data, format_type, duplicate_names.get(source, [])
+            ),
+            io_workers=self.io_workers,
+            cpu_workers=self.max_workers,
+        )
+        paths = [job.key for job in scheduler.order_jobs(jobs)]
+        items = pipeline.run([(path, output_paths[path]) for path in paths])
+        results = {
+            path: BatchItemResult(
+                source_path=path,
+                output_path=item.output_path,
+                status=STATUS_FAILED if item.error else STATUS_PROCESSED,
+                error=item.error,
+                input_bytes=item.input_bytes,
+                output_bytes=item.output_bytes,
+                option_savings=item.option_savings,
+                format_type=item.format_type,
+            )
+            for path, item in items.items()
+        }
+        return results, pipeline.stages
+
+    def build_jobs(self, paths: Sequence[str]) -> List[ScheduledJob]:
+        """画像ヘッダーからメモリ量を見積もってジョブを作成"""
+        output_size = (self.resize_settings.width, self.resize_settings.height)
+
+        def estimate(path: str) -> ScheduledJob:
+            try:
+                memory_bytes = estimate_job_memory(path, output_size)
+            except Exception:
+                # 読めないファイルは処理時にエラーとして記録される
+                memory_bytes = 0
+            return ScheduledJob(key=path, memory_bytes=memory_bytes)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(estimate, paths))
+
+    def process_file(self, source_path: str, output_path: str) -> BatchItemResult:
+        """1ファイルをリサイズして保存"""
+        args = (self.resize_settings, self.compression_settings, source_path, output_path,
+                self.measure_savings)
+        if self.process_pool is None:
+            return process_batch_file(*args)
+        try:
+            return self.process_pool.submit(process_batch_file, *args).result()
+        except Exception as e:
+            # ワーカープロセスの異常終了など
+            return BatchItemResult(source_path=source_path, output_path=output_path,
+                                   status=STATUS_FAILED, error=str(e))
+
+    def archive_file(self, source_path: str, entry_name: str,
+                     duplicate_names: Sequence[str] = ()) -> BatchItemResult:
+        """1ファイルをリサイズしてメモリ上でエンコードし、アーカイブに書き出す
+
+        duplicate_namesには同じ内容として書き出す重複ファイルのエントリ名を指定する。
+        """
+        result = BatchItemResult(source_path=source_path, output_path=entry_name)
+        try:
+            result.input_bytes = os.path.getsize(source_path)
+            data, result.format_type, result.option_savings = self.encode_file(source_path)
+            result.output_path = self.store_encoded(entry_name, data, result.format_type,
+                                                    duplicate_names)
+            result.output_bytes = len(data)
+        except Exception as e:
+            result.status = STATUS_FAILED
+            result.error = str(e)
+        return result
+
+    def encode_file(self, source_path: str, data: Optional[bytes] = None
+                    ) -> Tuple[bytes, str, List[OptionSavings]]:
+        """1ファイルをリサイズしてメモリ上でエンコードし、(データ, 形式, 削減量) を返す
+
+        dataを指定した場合はファイルを読まずに先読み済みの内容からデコードする。
+        """
+        with ImageProcessor() as processor:
+            if data is None:
+                processor.load_image(source_path)
+            else:
+                processor.load_image_from_buffer(data, name=source_path)
+            streamed = processor.requires_streaming(self.resize_settings)
+            buffer = io.BytesIO()
+            format_type = processor.write_resized(buffer, self.resize_settings,
+                                                  self.compression_settings)
+            encoded = buffer.getvalue()
+            savings = (processor.measure_option_savings(self.compression_settings)
+                       if self.measure_savings and not streamed else [])
+        return encoded, format_type, savings
+
+    def store_encoded(self, output_path: str, data: bytes, format_type: str,
+                      duplicate_names: Sequence[str] = ()) -> str:
+        """エンコード済みのデータをファイルまたはアーカイブに書き出し、出力パスを返す
+
+        拡張子は形式に合わせて付け直す。duplicate_namesはアーカイブの場合のみ使う。
+        """
+        ext = FORMAT_EXTENSIONS[format_type]
+        if self.archive:
+            stored = output_path
+            for name in [output_path, *duplicate_names]:
+                unique = self.archive.unique_name(os.path.splitext(name)[0] + ext)
+                if name == output_path:
+                    stored = unique
+                self.archive.put(unique, data)
+            return stored
+
+        output_path = os.path.splitext(output_path)[0] + ext
+        # 書きかけのファイルを残さず、書き終えてから置き換える
+        with open_atomic(output_path) as f:
+            f.write(data)
+        return output_path
+
+    def _reuse_output(self, source_path: str, output_path: str,
+                      representative: BatchItemResult) -> BatchItemResult:
+        """代表ファイルの出力をハードリンクまたはコピーで再利用"""
+        result = BatchItemResult(
+            source_path=source_path,
+            output_path=output_path,
+            status=STATUS_DUPLICATE,
+            duplicate_of=representative.source_path,
+        )
+        try:
+            result.input_bytes = os.path.getsize(source_path)
+            if representative.status == STATUS_FAILED:
+                raise ValueError(representative.error or "代表ファイルの処理に失敗しました")
+            # 形式を自動選択した場合は代表ファイルと同じ拡張子にする
+            output_path = (os.path.splitext(output_path)[0]
+                           + os.path.splitext(representative.output_path)[1])
+            result.output_path = output_path
+            if not self.archive:
+                # アーカイブのエントリは代表ファイルの処理時に書き出し済み
+                link_or_copy(representative.output_path, output_path)
+            result.output_bytes = representative.output_bytes
+            result.format_type = representative.format_type
+        except Exception as e:
+            result.status = STATUS_FAILED
+            result.error = str(e)
+        return result
+
+    def build_output_paths(self, paths: Sequence[str],
+                           output_dir: Optional[str] = None) -> Dict[str, str]:
+        """入力ファイルごとの出力パスを作成（バッチ内で重複しない名前にする）"""
+        ext = self.compression_settings.get_file_extension()
+        used = set()
+        output_paths = {}
+        for path in paths:
+            source = Path(path)
+            parent = Path(output_dir) if output_dir else source.parent
+            candidate = parent / f"{source.stem}{self.suffix}{ext}"
+            counter = 1
+            while str(candidate) in used:
+                candidate = parent / f"{source.stem}{self.suffix}_{counter}{ext}"
+                counter += 1
+            used.add(str(candidate))
+            output_paths[path] = str(candidate)
+        return output_paths
@@ -0,0 +1,137 @@
+"""
+ICCプロファイルからsRGBへの色変換
+
+変換（transform）の構築はコストが高いため、プロファイルのハッシュを
+キーにしたLRUキャッシュで再利用する。
+"""
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+try:
+    from PIL import ImageCms
+except ImportError:  # littlecmsなしでビルドされたPillow
+    ImageCms = None
+
+# 変換キャッシュのデフォルト件数
+DEFAULT_TRANSFORM_CACHE_SIZE = 32
+
+# 変換に対応するモードと出力モード
+_OUTPUT_MODES = {"RGB": "RGB", "RGBA": "RGBA", "CMYK": "RGB"}
+
+_srgb_profile = None
+_srgb_profile_bytes: Optional[bytes] = None
+_srgb_lock = threading.Lock()
+
+
+def _get_srgb_profile():
+    """sRGBプロファイルを取得（初回のみ作成）"""
+    global _srgb_profile, _srgb_profile_bytes
+    with _srgb_lock:
+        if _srgb_profile is None:
+            _srgb_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+            _srgb_profile_bytes = _srgb_profile.tobytes()
+        return _srgb_profile
+
+
+def get_srgb_profile_bytes() -> Optional[bytes]:
+    """sRGBプロファイルのバイト列を取得"""
+    if ImageCms is None:
+        return None
+    _get_srgb_profile()
+    return _srgb_profile_bytes
+
+
+def hash_profile(icc_profile: bytes) -> str:
+    """プロファイルのハッシュを計算"""
+    return hashlib.blake2b(icc_profile, digest_size=16).hexdigest()
+
+
+class TransformCache:
+    """プロファイルのハッシュをキーにした変換のLRUキャッシュ"""
+
+    def __init__(self, max_entries: int = DEFAULT_TRANSFORM_CACHE_SIZE):
+        self.max_entries = max_entries
+        # sRGBなど変換不要・構築失敗のプロファイルはNoneを保持する
+        self._entries: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_transform(self, icc_profile: bytes, mode: str):
+        """変換を取得（未構築ならビルドしてキャッシュ）"""
+        key = (hash_profile(icc_profile), mode)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key]
+            self.stats["misses"] += 1
+
+        # 構築は重いためロックの外で行う（同時に同じキーを構築しても結果は同じ）
+        transform = _build_transform(icc_profile, mode)
+        with self._lock:
+            self._entries[key] = transform
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return transform
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _build_transform(icc_profile: bytes, mode: str):
+    """埋め込みプロファイルからsRGBへの変換を構築"""
+    if icc_profile == get_srgb_profile_bytes():
+        return None
+    try:
+        source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        if "sRGB" in (ImageCms.getProfileDescription(source) or ""):
+            return None
+        return ImageCms.buildTransform(
+            source, _get_srgb_profile(), mode, _OUTPUT_MODES[mode],
+            renderingIntent=ImageCms.Intent.PERCEPTUAL,
+        )
+    except (ImageCms.PyCMSError, OSError, ValueError):
+        # 壊れたプロファイルは変換しない
+        return None
+
+
+_default_cache = TransformCache()
+
+
+def get_default_transform_cache() -> TransformCache:
+    """共有の変換キャッシュを取得"""
+    return _default_cache
+
+
+def convert_to_srgb(image: Image.Image, icc_profile: Optional[bytes] = None,
+                    cache: Optional[TransformCache] = None) -> Image.Image:
+    """埋め込みICCプロファイルに従って画像をsRGBに変換
+
+    変換が不要・不可能な場合は元の画像をそのまま返す。
+    """
+    icc_profile = icc_profile or image.info.get("icc_profile")
+    if ImageCms is None or not icc_profile or image.mode not in _OUTPUT_MODES:
+        return image
+
+    if cache is None:
+        cache = _default_cache
+    transform = cache.get_transform(icc_profile, image.mode)
+    if transform is None:
+        return image
+
+    converted = ImageCms.applyTransform(image, transform)
+    converted.info = dict(image.info)
+    converted.info["icc_profile"] = get_srgb_profile_bytes()
+    return converted
@@ -0,0 +1,135 @@
+"""
+共有ディレクトリを使った複数ホストでのバッチ処理
+
+ジョブの設定（job.json）と入力ファイルごとの作業項目をキューに置き、
+各ホストのワーカーがリースを取得して1ファイルずつ処理する。
+入出力のパスはすべてのワーカーから同じパスで見える必要がある。
+"""
+
+import hashlib
+import os
+from dataclasses import asdict, fields
+from typing import Optional, Sequence, Tuple
+
+from .batch_processor import STATUS_FAILED, BatchItemResult, BatchProcessor, BatchSummary
+from .lease_queue import (
+    DEFAULT_LEASE_SECONDS,
+    RESULT_DONE,
+    RESULT_FAILED,
+    LeaseQueue,
+    LeaseWorker,
+    read_json,
+    write_json_atomic,
+)
+from .output_savings import OptionSavings
+from .settings import CompressionSettings, ResizeSettings
+
+JOB_FILE = "job.json"
+
+
+def item_id_for(path: str) -> str:
+    """入力パスから作業項目のIDを作成（同じ入力は同じIDになる）"""
+    return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+
+
+def _settings_from_dict(cls, values: dict):
+    """辞書から設定を復元（JSONで配列になったタプルを戻す）"""
+    kwargs = {}
+    for field_info in fields(cls):
+        if field_info.name in values:
+            value = values[field_info.name]
+            kwargs[field_info.name] = tuple(value) if isinstance(value, list) else value
+    return cls(**kwargs)
+
+
+def create_job(queue_dir: str, paths: Sequence[str], output_dir: Optional[str],
+               resize_settings: ResizeSettings,
+               compression_settings: CompressionSettings,
+               suffix: str = "_resized",
+               measure_savings: bool = False) -> LeaseQueue:
+    """ジョブの設定と作業項目をキューに書き出す（作成済みの項目・結果はそのまま）"""
+    queue = LeaseQueue(queue_dir)
+    processor = BatchProcessor(resize_settings, compression_settings, suffix=suffix)
+    output_paths = processor.build_output_paths(paths, output_dir)
+    write_json_atomic(os.path.join(queue_dir, JOB_FILE), {
+        "resize_settings": asdict(resize_settings),
+        "compression_settings": asdict(compression_settings),
+        "measure_savings": measure_savings,
+    })
+    for path in paths:
+        queue.enqueue(item_id_for(path), {"source_path": path, "output_path": output_paths[path]})
+    return queue
+
+
+def load_job(queue_dir: str) -> Tuple[ResizeSettings, CompressionSettings, bool]:
+    """ジョブの設定を読み込む"""
+    job = read_json(os.path.join(queue_dir, JOB_FILE))
+    if job is None:
+        raise ValueError(f"ジョブが見つかりません: {queue_dir}")
+    return (
+        _settings_from_dict(ResizeSettings, job["resize_settings"]),
+        _settings_from_dict(CompressionSettings, job["compression_settings"]),
+        job.get("measure_savings", False),
+    )
+
+
+def run_worker(queue_dir: str, worker_id: Optional[str] = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               poll_interval: float = 1.0,
+               max_items: Optional[int] = None) -> int:
+    """キューが空になるまで項目を処理し、処理した件数を返す"""
+    resize_settings, compression_settings, measure_savings = load_job(queue_dir)
+    # 重複の検出はファイル全体を見る必要があるため分散処理では行わない
+    processor = BatchProcessor(resize_settings, compression_settings,
+                               detect_duplicates=False, measure_savings=measure_savings)
+
+    def process(item: dict) -> dict:
+        # 期限切れで回収した他のワーカーと同じパスに書き込むことがあるため、
+        # このリース専用の一時ファイルに書き、リースを保持している場合だけ置き換える
+        base, ext = os.path.splitext(item["output_path"])
+        partial_path = f"{base}.{worker.current_lease.token}.partial{ext}"
+        result = processor.process_file(item["source_path"], partial_path)
+        if result.error:
+            result.output_path = item["output_path"]
+        else:
+            written = result.output_path
+            # 形式を自動選択した場合は拡張子が変わる
+            result.output_path = base + os.path.splitext(written)[1]
+            if not worker.owns_lease():
+                os.remove(written)
+                raise ValueError("リースを失ったため出力を破棄しました")
+            os.replace(written, result.output_path)
+        return {"status": RESULT_FAILED if result.error else RESULT_DONE,
+                "item": asdict(result)}
+
+    queue = LeaseQueue(queue_dir, lease_seconds)
+    worker = LeaseWorker(queue, process, worker_id=worker_id, poll_interval=poll_interval)
+    return worker.run(max_items=max_items)
+
+
+def collect_summary(queue_dir: str) -> BatchSummary:
+    """記録済みの結果からバッチ処理のサマリーを作成"""
+    queue = LeaseQueue(queue_dir)
+    _, compression_settings, _ = load_job(queue_dir)
+    summary = BatchSummary(auto_format=compression_settings.is_auto_format())
+    results = queue.get_results()
+    for item_id, result in results.items():
+        if "item" in result:
+            values = dict(result["item"])
+            values["option_savings"] = [OptionSavings(**savings)
+                                        for savings in values.get("option_savings", [])]
+            summary.results.append(BatchItemResult(**values))
+        else:
+            # 処理の途中で例外になった項目
+            summary.results.append(BatchItemResult(
+                source_path=(queue.get_item(item_id) or {}).get("source_path", item_id),
+                status=STATUS_FAILED,
+                error=result.get("error"),
+            ))
+    if results:
+        # 最初の項目の開始から最後の項目の完了まで
+        summary.elapsed_seconds = (
+            max(result["finished_at"] for result in results.values())
+            - min(result["started_at"] for result in results.values())
+        )
+    return summary
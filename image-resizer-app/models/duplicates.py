@@ -0,0 +1,229 @@
+"""
+重複・類似画像の検出
+
+バッチ処理の前段で、ファイル内容のハッシュによる完全一致と
+縮小デコードから求めた知覚ハッシュ（dHash/pHash）による類似を検出する。
+"""
+
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import Executor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+# 知覚ハッシュの一辺（8なら64ビット）
+HASH_SIZE = 8
+
+# 類似とみなすハミング距離の上限（64ビット中）
+NEAR_DUPLICATE_DISTANCE = 6
+
+# ファイルハッシュの読み込み単位
+_CHUNK_SIZE = 1024 * 1024
+
+# 類似判定で一度に比較するハッシュの組み合わせ数の上限
+_MAX_BLOCK_PAIRS = 1 << 22
+
+# 1バイトごとの立っているビット数
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+@dataclass
+class DuplicateReport:
+    """重複検出の結果"""
+    # 内容が完全一致するファイルのグループ（先頭が代表）
+    exact_groups: List[List[str]] = field(default_factory=list)
+    # 知覚ハッシュが近いファイルのグループ（完全一致の代表同士）
+    near_groups: List[List[str]] = field(default_factory=list)
+
+    def get_duplicate_map(self) -> Dict[str, str]:
+        """重複ファイルから代表ファイルへの対応表を取得"""
+        mapping = {}
+        for group in self.exact_groups:
+            for path in group[1:]:
+                mapping[path] = group[0]
+        return mapping
+
+    def write_json(self, file_path: str):
+        """レポートをJSONで書き出す"""
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=2)
+
+
+def compute_content_hash(file_path: str) -> str:
+    """ファイル内容のハッシュを計算"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_reduced_luma(file_path: str, size: int) -> Image.Image:
+    """縮小デコードで輝度画像を読み込む"""
+    with Image.open(file_path) as image:
+        # JPEGはDCTスケーリングで縮小デコードされる
+        image.draft("L", (size * 4, size * 4))
+        return image.convert("L").resize((size, size), Image.BILINEAR)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    """真偽値の配列を整数ハッシュに変換"""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def compute_dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """差分ハッシュ（dHash）を計算"""
+    reduced = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(reduced, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """DCT-II変換行列を作成"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    return np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+
+
+def compute_phash(image: Image.Image, hash_size: int = HASH_SIZE,
+                  highfreq_factor: int = 4) -> int:
+    """知覚ハッシュ（pHash）を計算"""
+    size = hash_size * highfreq_factor
+    reduced = image.convert("L").resize((size, size), Image.BILINEAR)
+    pixels = np.asarray(reduced, dtype=np.float64)
+    dct = _dct_matrix(size)
+    coefficients = dct @ pixels @ dct.T
+    low = coefficients[:hash_size, :hash_size]
+    # 直流成分を除いた中央値で2値化
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+
+def compute_file_hash(file_path: str, method: str = "dhash") -> int:
+    """ファイルから縮小デコードで知覚ハッシュを計算"""
+    if method == "phash":
+        return compute_phash(_load_reduced_luma(file_path, HASH_SIZE * 4))
+    if method == "dhash":
+        return compute_dhash(_load_reduced_luma(file_path, HASH_SIZE + 1))
+    raise ValueError(f"未対応のハッシュ方式です: {method}")
+
+
+def _hamming_distances(block: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """ハッシュの組み合わせごとのハミング距離を計算（1バイトずつ表引きして足す）"""
+    xor = block[:, None] ^ values[None, :]
+    xor_bytes = xor.view(np.uint8).reshape(len(block), len(values), 8)
+    distances = np.zeros(xor.shape, dtype=np.uint8)
+    for index in range(8):
+        distances += _POPCOUNT[xor_bytes[..., index]]
+    return distances
+
+
+def compare_hashes(hash_a: int, hash_b: int) -> int:
+    """2つのハッシュのハミング距離を計算"""
+    return bin(hash_a ^ hash_b).count("1")
+
+
+def _group_by_size(paths: Sequence[str]) -> List[List[str]]:
+    """ファイルサイズが同じファイルをまとめる"""
+    by_size: Dict[int, List[str]] = defaultdict(list)
+    for path in paths:
+        try:
+            by_size[os.path.getsize(path)].append(path)
+        except OSError:
+            continue
+    return [group for group in by_size.values() if len(group) > 1]
+
+
+def find_exact_duplicates(paths: Sequence[str]) -> List[List[str]]:
+    """内容が完全一致するファイルのグループを検出
+
+    サイズが一致するファイルだけハッシュを計算する。
+    """
+    groups = []
+    for same_size in _group_by_size(paths):
+        by_hash: Dict[str, List[str]] = defaultdict(list)
+        for path in same_size:
+            try:
+                by_hash[compute_content_hash(path)].append(path)
+            except OSError:
+                continue
+        groups.extend(sorted(group) for group in by_hash.values() if len(group) > 1)
+    return sorted(groups)
+
+
+def find_near_duplicates(paths: Sequence[str],
+                         max_distance: int = NEAR_DUPLICATE_DISTANCE,
+                         method: str = "dhash",
+                         block_size: int = 512,
+                         executor: Optional[Executor] = None) -> List[List[str]]:
+    """知覚ハッシュが近いファイルのグループを検出
+
+    executorを指定するとハッシュの計算（画像のデコード）をそのExecutorで並行して行う。
+    """
+    if method not in ("dhash", "phash"):
+        raise ValueError(f"未対応のハッシュ方式です: {method}")
+
+    def hash_file(path: str) -> Tuple[str, Optional[int]]:
+        try:
+            return path, compute_file_hash(path, method)
+        except Exception:
+            return path, None
+
+    hashed = executor.map(hash_file, paths) if executor else map(hash_file, paths)
+    hashed_paths = []
+    hashes = []
+    for path, value in hashed:
+        if value is not None:
+            hashed_paths.append(path)
+            hashes.append(value)
+
+    # Union-Findで連結成分をまとめる
+    parent = list(range(len(hashes)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    values = np.array(hashes, dtype=np.uint64)
+    # ファイル数が多いときは一時配列が大きくならないよう1回に比較する行を減らす
+    block_size = max(1, min(block_size, _MAX_BLOCK_PAIRS // max(1, len(values))))
+    for start in range(0, len(values), block_size):
+        distances = _hamming_distances(values[start:start + block_size], values)
+        rows, cols = np.nonzero(distances <= max_distance)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            i, j = start + row, col
+            if i < j:
+                parent[find(j)] = find(i)
+
+    groups: Dict[int, List[str]] = defaultdict(list)
+    for index, path in enumerate(hashed_paths):
+        groups[find(index)].append(path)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+def find_duplicates(paths: Sequence[str], detect_near: bool = False,
+                    max_distance: int = NEAR_DUPLICATE_DISTANCE,
+                    method: str = "dhash",
+                    executor: Optional[Executor] = None) -> DuplicateReport:
+    """完全一致と類似の重複を検出
+
+    類似の検出は全画像のデコードが必要で、結果はレポートにしか使わないため
+    detect_nearを指定した場合だけ行う。
+    """
+    exact_groups = find_exact_duplicates(paths)
+    report = DuplicateReport(exact_groups=exact_groups)
+
+    if detect_near:
+        # 完全一致のグループは代表だけを類似判定にかける
+        duplicates = report.get_duplicate_map()
+        representatives = [path for path in paths if path not in duplicates]
+        report.near_groups = find_near_duplicates(representatives, max_distance, method,
+                                                  executor=executor)
+    return report
@@ -0,0 +1,325 @@
+"""
+非破壊・遅延評価の編集パイプライン
+
+切り抜き・回転・反転・EXIFの向きの補正・リサイズを操作のパラメーターとして
+積み上げておき、プレビューや保存のときに元画像から1回のリサンプリングで
+評価する。各操作は「出力座標 -> 入力座標」のアフィン変換として合成する。
+元に戻す・やり直しは操作の出し入れだけで行える。
+"""
+
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+from PIL import Image
+
+from .settings import EXIF_ORIENTATION_TAG
+
+# アフィン変換 (a, b, c, d, e, f): 入力x = a*x + b*y + c, 入力y = d*x + e*y + f
+Matrix = Tuple[float, float, float, float, float, float]
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+
+# EXIFの向きを補正する変換（ImageOps.exif_transposeと同じ対応）
+_ORIENTATION_TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# 90度単位の回転（反時計回り）に対応する変換
+_ROTATE_TRANSPOSES = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+# 任意角度の変換で使えるリサンプリング方法（それ以外はBICUBICで代用）
+_AFFINE_RESAMPLES = (Image.NEAREST, Image.BILINEAR, Image.BICUBIC)
+
+# 行列の比較に使う許容誤差
+_EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class CropOp:
+    """切り抜き（直前までの編集結果の座標で指定）"""
+    box: Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class RotateOp:
+    """回転（反時計回りの角度、画像全体が収まるよう拡張）"""
+    degrees: float
+
+
+@dataclass(frozen=True)
+class FlipOp:
+    """反転"""
+    horizontal: bool = True
+
+
+@dataclass(frozen=True)
+class AutoOrientOp:
+    """EXIFの向き情報に従って正立させる"""
+
+
+@dataclass(frozen=True)
+class ResizeOp:
+    """リサイズ"""
+    size: Tuple[int, int]
+
+
+Operation = Union[CropOp, RotateOp, FlipOp, AutoOrientOp, ResizeOp]
+
+
+def compose(outer: Matrix, inner: Matrix) -> Matrix:
+    """2つの変換を合成（inner で写した座標を outer で写す）"""
+    a1, b1, c1, d1, e1, f1 = outer
+    a2, b2, c2, d2, e2, f2 = inner
+    return (
+        a1 * a2 + b1 * d2, a1 * b2 + b1 * e2, a1 * c2 + b1 * f2 + c1,
+        d1 * a2 + e1 * d2, d1 * b2 + e1 * e2, d1 * c2 + e1 * f2 + f1,
+    )
+
+
+def _transpose_step(method: Image.Transpose,
+                    size: Tuple[int, int]) -> Tuple[Matrix, Tuple[int, int]]:
+    """90度単位の変換の行列と変換後のサイズ"""
+    w, h = size
+    steps = {
+        Image.Transpose.FLIP_LEFT_RIGHT: ((-1, 0, w, 0, 1, 0), (w, h)),
+        Image.Transpose.FLIP_TOP_BOTTOM: ((1, 0, 0, 0, -1, h), (w, h)),
+        Image.Transpose.ROTATE_90: ((0, -1, w, 1, 0, 0), (h, w)),
+        Image.Transpose.ROTATE_180: ((-1, 0, w, 0, -1, h), (w, h)),
+        Image.Transpose.ROTATE_270: ((0, 1, 0, -1, 0, h), (h, w)),
+        Image.Transpose.TRANSPOSE: ((0, 1, 0, 1, 0, 0), (h, w)),
+        Image.Transpose.TRANSVERSE: ((0, -1, w, -1, 0, h), (h, w)),
+    }
+    matrix, new_size = steps[method]
+    return tuple(float(value) for value in matrix), new_size
+
+
+def _rotate_step(degrees: float, size: Tuple[int, int]) -> Tuple[Matrix, Tuple[int, int]]:
+    """任意角度の回転の行列と変換後のサイズ（Image.rotateのexpand=Trueと同じ）"""
+    w, h = size
+    angle = -math.radians(degrees)
+    cos, sin = round(math.cos(angle), 15), round(math.sin(angle), 15)
+    new_w = math.ceil(round(abs(w * cos) + abs(h * sin), 6))
+    new_h = math.ceil(round(abs(w * sin) + abs(h * cos), 6))
+    cx_in, cy_in = w / 2, h / 2
+    cx_out, cy_out = new_w / 2, new_h / 2
+    matrix = (
+        cos, sin, cx_in - cos * cx_out - sin * cy_out,
+        -sin, cos, cy_in + sin * cx_out - cos * cy_out,
+    )
+    return matrix, (new_w, new_h)
+
+
+@dataclass(frozen=True)
+class FusedTransform:
+    """編集をまとめた変換（出力サイズと、出力座標から元画像の座標への行列）"""
+    size: Tuple[int, int]
+    matrix: Matrix
+    auto_oriented: bool = False
+
+    @property
+    def is_identity(self) -> bool:
+        """元画像をそのまま使えるか"""
+        return all(abs(a - b) < _EPSILON for a, b in zip(self.matrix, IDENTITY))
+
+    @property
+    def is_axis_aligned(self) -> bool:
+        """90度単位の変換と拡大縮小・平行移動だけで表せるか"""
+        a, b, _, d, e, _ = self.matrix
+        diagonal = abs(b) < _EPSILON and abs(d) < _EPSILON
+        anti_diagonal = abs(a) < _EPSILON and abs(e) < _EPSILON
+        return diagonal or anti_diagonal
+
+    @property
+    def scale(self) -> Tuple[float, float]:
+        """出力1画素あたりの元画像の画素数（出力のx方向, y方向）"""
+        a, b, _, d, e, _ = self.matrix
+        return math.hypot(a, d), math.hypot(b, e)
+
+
+def plan_operations(operations: List[Operation], source_size: Tuple[int, int],
+                    orientation: int = 1) -> FusedTransform:
+    """操作を1つの変換に合成"""
+    size = source_size
+    matrix = IDENTITY
+    auto_oriented = False
+    for operation in operations:
+        steps: List[Tuple[Matrix, Tuple[int, int]]] = []
+        if isinstance(operation, CropOp):
+            left, top, right, bottom = operation.box
+            if not (0 <= left < right <= size[0] and 0 <= top < bottom <= size[1]):
+                raise ValueError(f"切り抜き範囲が画像の外にあります: {operation.box}")
+            steps.append(((1.0, 0.0, left, 0.0, 1.0, top), (right - left, bottom - top)))
+        elif isinstance(operation, RotateOp):
+            degrees = operation.degrees % 360
+            if degrees in _ROTATE_TRANSPOSES:
+                steps.append(_transpose_step(_ROTATE_TRANSPOSES[degrees], size))
+            elif degrees:
+                steps.append(_rotate_step(degrees, size))
+        elif isinstance(operation, FlipOp):
+            method = (Image.Transpose.FLIP_LEFT_RIGHT if operation.horizontal
+                      else Image.Transpose.FLIP_TOP_BOTTOM)
+            steps.append(_transpose_step(method, size))
+        elif isinstance(operation, AutoOrientOp):
+            auto_oriented = True
+            if orientation in _ORIENTATION_TRANSPOSES:
+                steps.append(_transpose_step(_ORIENTATION_TRANSPOSES[orientation], size))
+        elif isinstance(operation, ResizeOp):
+            width, height = operation.size
+            if width <= 0 or height <= 0:
+                raise ValueError(f"リサイズ後のサイズが不正です: {operation.size}")
+            steps.append(((size[0] / width, 0.0, 0.0, 0.0, size[1] / height, 0.0),
+                          (width, height)))
+        else:
+            raise ValueError(f"不明な編集操作です: {operation!r}")
+
+        for step, new_size in steps:
+            matrix = compose(matrix, step)
+            size = new_size
+    return FusedTransform(size=size, matrix=matrix, auto_oriented=auto_oriented)
+
+
+def _axis_aligned_transpose(matrix: Matrix) -> Optional[Image.Transpose]:
+    """軸に沿った変換を「拡大縮小 + 90度単位の変換」に分解したときの変換"""
+    a, b, _, d, e, _ = matrix
+    if abs(b) < _EPSILON and abs(d) < _EPSILON:
+        methods = {
+            (True, True): None,
+            (False, True): Image.Transpose.FLIP_LEFT_RIGHT,
+            (True, False): Image.Transpose.FLIP_TOP_BOTTOM,
+            (False, False): Image.Transpose.ROTATE_180,
+        }
+        return methods[(a > 0, e > 0)]
+    methods = {
+        (True, True): Image.Transpose.TRANSPOSE,
+        (False, True): Image.Transpose.ROTATE_90,
+        (True, False): Image.Transpose.ROTATE_270,
+        (False, False): Image.Transpose.TRANSVERSE,
+    }
+    return methods[(b > 0, d > 0)]
+
+
+def _render_axis_aligned(image: Image.Image, transform: FusedTransform,
+                         resample: int) -> Image.Image:
+    """切り抜きとリサイズを1回のresizeで行い、90度単位の変換は縮小後に適用"""
+    a, b, c, d, e, f = transform.matrix
+    width, height = transform.size
+    xs = (c, a * width + b * height + c)
+    ys = (f, d * width + e * height + f)
+    box = (min(xs), min(ys), max(xs), max(ys))
+
+    method = _axis_aligned_transpose(transform.matrix)
+    swapped = abs(a) < _EPSILON
+    unoriented_size = (height, width) if swapped else (width, height)
+    if box == (0, 0, image.width, image.height) and unoriented_size == image.size:
+        resized = image.copy()
+    else:
+        resized = image.resize(unoriented_size, resample, box=box)
+    if method is None:
+        return resized
+    # 変換は出力サイズの画像に対して行うため、元画像の大きさの中間画像は作られない
+    return resized.transpose(method)
+
+
+def _render_affine(image: Image.Image, transform: FusedTransform,
+                   resample: int) -> Image.Image:
+    """任意角度を含む変換を1回のアフィン変換で行う"""
+    matrix = transform.matrix
+    # アフィン変換は縮小時に画素を間引くため、大きく縮小する場合は先に整数倍で縮小する
+    factor = int(min(transform.scale))
+    if factor >= 2:
+        image = image.reduce(factor)
+        matrix = tuple(value / factor for value in matrix)
+    if resample not in _AFFINE_RESAMPLES:
+        resample = Image.BICUBIC
+    return image.transform(transform.size, Image.AFFINE, matrix, resample)
+
+
+def render(image: Image.Image, transform: FusedTransform,
+           resample: int = Image.LANCZOS) -> Image.Image:
+    """合成した変換を画像に適用"""
+    if transform.is_axis_aligned:
+        output = _render_axis_aligned(image, transform, resample)
+    else:
+        output = _render_affine(image, transform, resample)
+
+    output.info = dict(image.info)
+    if transform.auto_oriented and "exif" in output.info:
+        # 向きを補正した画像に元の向き情報が残らないようにする
+        # （getexifは元画像がキャッシュしているExifを返すため、複製から取り除く）
+        exif = Image.Exif()
+        exif.load(output.info["exif"])
+        exif.pop(EXIF_ORIENTATION_TAG, None)
+        output.info["exif"] = exif.tobytes()
+    return output
+
+
+def get_orientation(image: Image.Image) -> int:
+    """画像のEXIFの向き情報を取得"""
+    try:
+        return image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+
+
+class EditPipeline:
+    """編集操作の履歴（元に戻す・やり直しに対応）"""
+
+    def __init__(self):
+        self.operations: List[Operation] = []
+        self._redo: List[Operation] = []
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def push(self, operation: Operation):
+        """操作を追加（やり直しの履歴は破棄）"""
+        self.operations.append(operation)
+        self._redo.clear()
+
+    def can_undo(self) -> bool:
+        """元に戻せるか"""
+        return bool(self.operations)
+
+    def can_redo(self) -> bool:
+        """やり直せるか"""
+        return bool(self._redo)
+
+    def undo(self) -> Optional[Operation]:
+        """最後の操作を取り消す"""
+        if not self.operations:
+            return None
+        operation = self.operations.pop()
+        self._redo.append(operation)
+        return operation
+
+    def redo(self) -> Optional[Operation]:
+        """取り消した操作をやり直す"""
+        if not self._redo:
+            return None
+        operation = self._redo.pop()
+        self.operations.append(operation)
+        return operation
+
+    def clear(self):
+        """すべての操作と履歴を破棄"""
+        self.operations.clear()
+        self._redo.clear()
+
+    def plan(self, source_size: Tuple[int, int], orientation: int = 1,
+             output_size: Optional[Tuple[int, int]] = None) -> FusedTransform:
+        """操作（と最後のリサイズ）を1つの変換に合成"""
+        operations = list(self.operations)
+        if output_size is not None:
+            operations.append(ResizeOp(output_size))
+        return plan_operations(operations, source_size, orientation)
@@ -0,0 +1,157 @@
+"""
+出力形式の自動選択
+
+リサイズ後の画像を候補の形式すべてでメモリ上に並列エンコードし、
+条件（透過の保持・最低SSIM）を満たす中で最も小さいものを選ぶ。
+"""
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import List, Optional
+
+from PIL import Image
+
+from .quality import AutoQualityResult, compute_ssim, find_auto_quality
+from .settings import AUTO_FORMAT, CompressionSettings
+
+# 透過を保存できない形式
+_NO_ALPHA_FORMATS = {"JPEG"}
+
+
+@dataclass
+class FormatCandidate:
+    """1形式分のエンコード結果"""
+    format_type: str
+    size_bytes: int = 0
+    data: bytes = b""
+    quality: Optional[int] = None
+    ssim: Optional[float] = None
+    # 条件を満たさなかった理由（採用可能な場合はNone）
+    rejected_reason: Optional[str] = None
+    auto_quality: Optional[AutoQualityResult] = None
+
+    @property
+    def accepted(self) -> bool:
+        """条件を満たしているか"""
+        return self.rejected_reason is None
+
+
+@dataclass
+class FormatSelection:
+    """形式の自動選択の結果"""
+    chosen: FormatCandidate
+    candidates: List[FormatCandidate]
+
+    @property
+    def format_type(self) -> str:
+        """選ばれた形式"""
+        return self.chosen.format_type
+
+    def format_report(self) -> str:
+        """候補ごとの結果を表示用の文字列に整形"""
+        lines = []
+        for candidate in sorted(self.candidates, key=lambda c: c.size_bytes):
+            mark = "*" if candidate is self.chosen else " "
+            line = f"{mark} {candidate.format_type}: {candidate.size_bytes / 1024:.1f} KB"
+            if candidate.ssim is not None:
+                line += f" (SSIM {candidate.ssim:.4f})"
+            if candidate.rejected_reason:
+                line += f" - {candidate.rejected_reason}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def has_transparency(image: Image.Image) -> bool:
+    """実際に透明な画素を含むか"""
+    if image.mode == "P":
+        return "transparency" in image.info
+    if "A" not in image.getbands():
+        return False
+    minimum, _ = image.getchannel("A").getextrema()
+    return minimum < 255
+
+
+def prepare_for_format(image: Image.Image, format_type: str) -> Image.Image:
+    """形式が扱えるモードに変換"""
+    if format_type == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        converted = image.convert("RGB")
+        converted.info = dict(image.info)
+        return converted
+    return image
+
+
+def encode_with_settings(image: Image.Image, settings: CompressionSettings) -> FormatCandidate:
+    """圧縮設定に従ってメモリ上でエンコード（自動品質にも対応）"""
+    image = prepare_for_format(image, settings.format_type)
+    save_kwargs = settings.get_save_kwargs()
+    save_kwargs.update(settings.get_metadata_kwargs(image))
+    candidate = FormatCandidate(format_type=settings.format_type)
+
+    if settings.uses_auto_quality():
+        result = find_auto_quality(image, settings.format_type, settings.target_ssim, save_kwargs)
+        candidate.data = result.data
+        candidate.quality = result.quality
+        candidate.ssim = result.ssim
+        candidate.auto_quality = result
+    else:
+        buffer = io.BytesIO()
+        image.save(buffer, format=settings.format_type, **save_kwargs)
+        candidate.data = buffer.getvalue()
+        if "quality" in save_kwargs and not save_kwargs.get("lossless"):
+            candidate.quality = save_kwargs["quality"]
+    candidate.size_bytes = len(candidate.data)
+    return candidate
+
+
+def is_lossy(settings: CompressionSettings) -> bool:
+    """非可逆な形式か"""
+    return settings.format_type == "JPEG" or (
+        settings.format_type == "WEBP" and not settings.lossless
+    )
+
+
+def _evaluate(image: Image.Image, settings: CompressionSettings,
+              transparent: bool) -> FormatCandidate:
+    """1形式をエンコードして条件を確認"""
+    if transparent and settings.format_type in _NO_ALPHA_FORMATS:
+        return FormatCandidate(format_type=settings.format_type,
+                               rejected_reason="透過を保存できません")
+
+    candidate = encode_with_settings(image, settings)
+    if settings.format_min_ssim is not None and is_lossy(settings):
+        if candidate.ssim is None:
+            with Image.open(io.BytesIO(candidate.data)) as decoded:
+                candidate.ssim = compute_ssim(image, decoded)
+        if candidate.ssim < settings.format_min_ssim:
+            candidate.rejected_reason = f"SSIMが下限 {settings.format_min_ssim} 未満です"
+    return candidate
+
+
+def select_smallest_format(image: Image.Image, settings: CompressionSettings,
+                           max_workers: Optional[int] = None) -> FormatSelection:
+    """候補の形式で並列にエンコードし、条件を満たす最小のものを選ぶ"""
+    formats = list(dict.fromkeys(settings.auto_format_candidates))
+    if not formats or AUTO_FORMAT in formats:
+        raise ValueError("自動選択の候補となる形式が不正です")
+
+    transparent = has_transparency(image)
+    workers = max_workers or min(len(formats), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_evaluate, image, replace(settings, format_type=format_type),
+                            transparent)
+            for format_type in formats
+        ]
+        candidates = [future.result() for future in futures]
+
+    accepted = [candidate for candidate in candidates if candidate.accepted]
+    if not accepted:
+        raise ValueError("条件を満たす出力形式がありません")
+    chosen = min(accepted, key=lambda candidate: candidate.size_bytes)
+    # 選ばれなかった候補のデータは保持しない
+    for candidate in candidates:
+        if candidate is not chosen:
+            candidate.data = b""
+    return FormatSelection(chosen=chosen, candidates=candidates)
@@ -0,0 +1,252 @@
+"""
+出力前後の画像の比較
+
+リサイズ後の画像（エンコード前）とエンコード結果を比較するためのタイルを作る。
+誤差は表示中の倍率で描画したタイル同士でNumPyを使って計算し、
+ブロックごとの平均誤差をヒートマップとして元画像に重ねる。
+画像全体の誤差（PSNR）は帯単位で計算し、全画素分の配列は作らない。
+"""
+
+import io
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .processing import encode, open_image_eagerly
+from .settings import CompressionSettings
+from .tile_pyramid import TileKey, TilePyramid, zoom_for_step
+
+# 比較の表示方法
+COMPARE_SIDE_BY_SIDE = "side_by_side"
+COMPARE_SPLIT = "split"
+COMPARE_HEATMAP = "heatmap"
+COMPARE_MODES = (COMPARE_SIDE_BY_SIDE, COMPARE_SPLIT, COMPARE_HEATMAP)
+
+# ヒートマップのブロックの大きさ（画面上のpx）
+DEFAULT_BLOCK_SIZE = 8
+
+# ヒートマップが最も赤くなる平均誤差（0〜255）
+DEFAULT_MAX_ERROR = 32
+
+# 比較元のタイルを保持する枚数（前・後それぞれ）
+DEFAULT_SOURCE_TILES = 128
+
+# PSNRを計算する帯の行数
+PSNR_BAND_ROWS = 256
+
+# 分割表示の境界線の色
+SPLIT_LINE_COLOR = (255, 255, 255)
+
+
+@dataclass
+class ErrorStats:
+    """画像全体の誤差"""
+    mean_error: float
+    max_error: int
+    psnr: float
+
+    def format(self) -> str:
+        """表示用の文字列"""
+        psnr = "∞" if math.isinf(self.psnr) else f"{self.psnr:.1f}"
+        return f"PSNR {psnr} dB  平均誤差 {self.mean_error:.2f}  最大誤差 {self.max_error}"
+
+
+@dataclass
+class EncodedCandidate:
+    """メモリ上でエンコードした結果"""
+    image: Image.Image
+    size_bytes: int
+
+
+def _as_rgb_array(image: Image.Image) -> np.ndarray:
+    """RGBのint16配列として取得（差を取っても桁あふれしない）"""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image, dtype=np.int16)
+
+
+def pixel_error(before: Image.Image, after: Image.Image) -> np.ndarray:
+    """画素ごとの誤差（RGBの各チャンネルの差の絶対値の最大、uint8）"""
+    if before.size != after.size:
+        raise ValueError("比較する画像のサイズが一致しません")
+    diff = np.abs(_as_rgb_array(before) - _as_rgb_array(after))
+    return diff.max(axis=2).astype(np.uint8)
+
+
+def block_error(error: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """ブロックごとの平均誤差（端の半端なブロックは含まれる画素だけで平均する）"""
+    height, width = error.shape
+    rows = -(-height // block_size)
+    columns = -(-width // block_size)
+    padded = np.zeros((rows * block_size, columns * block_size), dtype=np.float32)
+    padded[:height, :width] = error
+    sums = padded.reshape(rows, block_size, columns, block_size).sum(axis=(1, 3))
+    # ブロックに含まれる画素数
+    row_counts = np.minimum(block_size, height - np.arange(rows) * block_size)
+    column_counts = np.minimum(block_size, width - np.arange(columns) * block_size)
+    return sums / np.outer(row_counts, column_counts)
+
+
+def heatmap_overlay(base: Image.Image, blocks: np.ndarray,
+                    block_size: int = DEFAULT_BLOCK_SIZE,
+                    max_error: float = DEFAULT_MAX_ERROR) -> Image.Image:
+    """ブロックごとの誤差を黄色〜赤で、暗くしたグレースケールの画像に重ねる"""
+    width, height = base.size
+    strength = np.clip(blocks / max_error, 0.0, 1.0)
+    strength = np.repeat(np.repeat(strength, block_size, axis=0), block_size, axis=1)
+    strength = strength[:height, :width, None]
+    colors = np.empty((height, width, 3), dtype=np.float32)
+    colors[..., 0] = 255
+    colors[..., 1] = 255 * (1 - strength[..., 0])
+    colors[..., 2] = 0
+    gray = np.asarray(base.convert("L"), dtype=np.float32)[..., None] * 0.5
+    blended = gray * (1 - strength) + colors * strength
+    return Image.fromarray(blended.astype(np.uint8), "RGB")
+
+
+def error_stats(before: Image.Image, after: Image.Image,
+                band_rows: int = PSNR_BAND_ROWS) -> ErrorStats:
+    """画像全体の誤差を帯単位で計算"""
+    if before.size != after.size:
+        raise ValueError("比較する画像のサイズが一致しません")
+    width, height = before.size
+    squared = 0.0
+    absolute = 0.0
+    largest = 0
+    for top in range(0, height, band_rows):
+        box = (0, top, width, min(height, top + band_rows))
+        diff = _as_rgb_array(before.crop(box)) - _as_rgb_array(after.crop(box))
+        squared += float(np.square(diff, dtype=np.float64).sum())
+        absolute += float(np.abs(diff).sum())
+        largest = max(largest, int(np.abs(diff).max()))
+    count = width * height * 3
+    mse = squared / count
+    psnr = math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+    return ErrorStats(mean_error=absolute / count, max_error=largest, psnr=psnr)
+
+
+def encode_candidate(image: Image.Image,
+                     compression_settings: CompressionSettings) -> EncodedCandidate:
+    """保存時と同じ設定でメモリ上にエンコードし、デコードした結果を取得"""
+    result = encode(image, compression_settings)
+    return EncodedCandidate(open_image_eagerly(io.BytesIO(result.data)), result.size_bytes)
+
+
+class _SourceTiles:
+    """比較元のタイルを描画して保持する（最近使っていないものから捨てる）"""
+
+    def __init__(self, pyramid: TilePyramid, max_tiles: int):
+        self.pyramid = pyramid
+        self.max_tiles = max_tiles
+        self._tiles: "OrderedDict[TileKey, Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: TileKey) -> Image.Image:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+        tile = self.pyramid.render_tile(key)
+        with self._lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tiles)
+
+
+class ComparisonTiles:
+    """分割表示・ヒートマップのタイルを作るクラス（TilePyramidと同じくTileCacheから使う）
+
+    比較元のタイルは保持しておき、with_split・with_afterで作った新しいインスタンスと
+    共有するため、境界の移動や品質の変更では変わった側のタイルだけを描画し直す。
+    """
+
+    def __init__(self, before: TilePyramid, after: TilePyramid,
+                 mode: str = COMPARE_SPLIT, split: float = 0.5,
+                 block_size: int = DEFAULT_BLOCK_SIZE, max_error: float = DEFAULT_MAX_ERROR,
+                 max_source_tiles: int = DEFAULT_SOURCE_TILES,
+                 _before_tiles: Optional[_SourceTiles] = None,
+                 _after_tiles: Optional[_SourceTiles] = None):
+        if mode not in (COMPARE_SPLIT, COMPARE_HEATMAP):
+            raise ValueError(f"タイルで比較できない表示方法です: {mode}")
+        if before.size != after.size:
+            raise ValueError("比較する画像のサイズが一致しません")
+        if before.tile_size != after.tile_size:
+            raise ValueError("比較するタイルの大きさが一致しません")
+        if not 0.0 <= split <= 1.0:
+            raise ValueError("分割位置は0から1の範囲で指定してください")
+        self.before = before
+        self.after = after
+        self.mode = mode
+        self.split = split
+        self.block_size = block_size
+        self.max_error = max_error
+        self.max_source_tiles = max_source_tiles
+        if _before_tiles is None:
+            _before_tiles = _SourceTiles(before, max_source_tiles)
+        if _after_tiles is None:
+            _after_tiles = _SourceTiles(after, max_source_tiles)
+        self._before_tiles = _before_tiles
+        self._after_tiles = _after_tiles
+
+    @property
+    def tile_size(self) -> int:
+        return self.before.tile_size
+
+    @property
+    def size(self):
+        return self.before.size
+
+    def _copy(self, **changes) -> "ComparisonTiles":
+        values = dict(
+            before=self.before, after=self.after, mode=self.mode, split=self.split,
+            block_size=self.block_size, max_error=self.max_error,
+            max_source_tiles=self.max_source_tiles,
+            _before_tiles=self._before_tiles, _after_tiles=self._after_tiles,
+        )
+        values.update(changes)
+        return ComparisonTiles(**values)
+
+    def with_mode(self, mode: str) -> "ComparisonTiles":
+        """表示方法を変えたもの（比較元のタイルは共有する）"""
+        return self._copy(mode=mode)
+
+    def with_split(self, split: float) -> "ComparisonTiles":
+        """分割位置を変えたもの（比較元のタイルは共有する）"""
+        return self._copy(split=split)
+
+    def with_after(self, after: TilePyramid) -> "ComparisonTiles":
+        """エンコード結果を差し替えたもの（エンコード前のタイルは共有する）"""
+        return self._copy(after=after, _after_tiles=None)
+
+    def render_tile(self, key: TileKey) -> Image.Image:
+        """タイルを描画（ワーカーで実行）"""
+        before = self._before_tiles.get(key)
+        after = self._after_tiles.get(key)
+        if self.mode == COMPARE_HEATMAP:
+            blocks = block_error(pixel_error(before, after), self.block_size)
+            return heatmap_overlay(before, blocks, self.block_size, self.max_error)
+
+        # 分割位置より左がエンコード前、右がエンコード結果
+        zoom_step, col, _ = key
+        display_width = math.ceil(self.size[0] * zoom_for_step(zoom_step))
+        offset = round(self.split * display_width) - col * self.tile_size
+        if offset <= 0:
+            return after
+        if offset >= self.tile_size:
+            return before
+        tile = before.copy()
+        tile.paste(after.crop((offset, 0, self.tile_size, self.tile_size)), (offset, 0))
+        ImageDraw.Draw(tile).line([(offset, 0), (offset, self.tile_size - 1)],
+                                  fill=SPLIT_LINE_COLOR)
+        return tile
@@ -1,37 +1,166 @@
 """
 画像処理モデル
+
+処理そのものはmodels.processingの状態を持たない関数で行い、このクラスは
+読み込んだ画像・リサイズ結果・編集履歴を保持する。インスタンスは状態を持つため
+スレッド間で共有せず、共有する場合はprocessing.processを使う。
 """
 
-from typing import Tuple, Optional
+import io
+import os
+from typing import BinaryIO, List, Optional, Sequence, Tuple
 from PIL import Image
 from pathlib import Path
 
 from .settings import ResizeSettings, CompressionSettings
+from .banded_resize import BANDED_LOAD_THRESHOLD, BandedImageReader
+from .quality import AutoQualityResult
+from .output_savings import OptionSavings
+from .memory_scheduler import decoded_bytes
+from .format_selection import FormatSelection
+from utils.file_utils import open_atomic
+from .edit_pipeline import (
+    AutoOrientOp,
+    CropOp,
+    EditPipeline,
+    FlipOp,
+    Operation,
+    RotateOp,
+    get_orientation,
+    plan_operations,
+)
+# open_image_eagerly・ImageBuffer・Resamplerは従来どおりこのモジュールからも使える
+from .processing import (
+    EncodeDetails,
+    ImageBuffer,
+    LoadedImage,
+    Resampler,
+    create_preview,
+    encode,
+    fit_size,
+    load,
+    measure_savings,
+    open_image_eagerly,
+    render_preview,
+    requires_streaming,
+    resize,
+    save_banded,
+    save_result,
+    write_banded,
+    write_image,
+)
 
 
 class ImageProcessor:
     """画像処理を行うクラス"""
     
-    def __init__(self):
+    def __init__(self, banded_threshold: int = BANDED_LOAD_THRESHOLD,
+                 resampler: Optional[Resampler] = None):
         self.original_image: Optional[Image.Image] = None
         self.current_image: Optional[Image.Image] = None
         self.image_path: Optional[str] = None
+        # 巨大なTIFF/BMPは帯単位で処理し、original_imageは縮小版を保持する
+        self.banded_threshold = banded_threshold
+        self.banded_source: Optional[BandedImageReader] = None
+        # 直近の自動品質選択の結果
+        self.last_auto_quality: Optional[AutoQualityResult] = None
+        # 直近の出力形式の自動選択の結果
+        self.last_format_selection: Optional[FormatSelection] = None
+        # 直近に出力した形式（形式を自動選択した場合は選ばれた形式）
+        self.last_format_type: Optional[str] = None
+        # リサンプリングを別プロセスなどに委譲する場合に指定
+        self.resampler = resampler
+        # 切り抜き・回転などの編集（リサイズ時にまとめて評価する）
+        self.edits = EditPipeline()
+        # 画素データを解放しても編集後のサイズを計算できるよう保持する
+        self._source_size: Optional[Tuple[int, int]] = None
+        self._orientation = 1
     
     def load_image(self, file_path: str) -> bool:
         """画像を読み込み"""
-        try:
-            self.image_path = file_path
-            self.original_image = Image.open(file_path)
-            self.current_image = self.original_image.copy()
-            return True
-        except Exception as e:
-            raise ValueError(f"画像の読み込みに失敗しました: {str(e)}")
+        loaded = load(file_path, self.banded_threshold)
+        # 読み込みに成功してから前の画像を解放する
+        self.close()
+        self.image_path = file_path
+        self._set_pixels(loaded)
+        return True
+    
+    def _set_pixels(self, loaded: LoadedImage):
+        """読み込んだ画素データを保持"""
+        self.banded_source = loaded.banded_source
+        self.original_image = loaded.image
+        # 画像は変更せずに新しい画像を作って置き換えるため、コピーせずに共有する
+        self.current_image = loaded.image
+        self._source_size = loaded.size
+        self._orientation = get_orientation(loaded.image)
+    
+    def load_image_from_buffer(self, source: ImageBuffer,
+                               name: Optional[str] = None) -> bool:
+        """bytes・memoryview・ファイルライクオブジェクトから画像を読み込み
+        
+        nameを指定すると出力ファイル名の生成に使われる。
+        """
+        if isinstance(source, (str, os.PathLike)):
+            raise ValueError("画像の読み込みに失敗しました: ファイルパスはload_imageで読み込んでください")
+        loaded = load(source)
+        self.close()
+        self.image_path = name
+        self._set_pixels(loaded)
+        return True
     
     def get_original_size(self) -> Optional[Tuple[int, int]]:
-        """元の画像サイズを取得"""
-        if self.original_image:
-            return self.original_image.size
-        return None
+        """元の画像サイズを取得（画素データを解放した後も取得できる）"""
+        return self._source_size
+    
+    def get_edited_size(self) -> Optional[Tuple[int, int]]:
+        """編集（切り抜き・回転など）を適用した後のサイズを取得（画素データは使わない）"""
+        size = self.get_original_size()
+        if size is None or not self.edits.operations:
+            return size
+        return plan_operations(list(self.edits.operations), size, self._orientation).size
+    
+    def _loaded(self) -> LoadedImage:
+        """読み込んだ画像（processingの関数に渡す形）"""
+        return LoadedImage(self.original_image, self.banded_source)
+    
+    def apply_edit(self, operation: Operation):
+        """編集操作を追加（画素の処理は次のresize_imageまで行わない）
+        
+        画素データを解放した画像にも追加でき、読み直した後のリサイズで適用される。
+        """
+        if self.get_original_size() is None:
+            raise ValueError("編集する画像がありません")
+        self.edits.push(operation)
+        try:
+            # 範囲外の切り抜きなどはここで検出する
+            self.get_edited_size()
+        except ValueError:
+            self.edits.undo()
+            raise
+    
+    def crop(self, box: Tuple[int, int, int, int]):
+        """切り抜き（現在の編集結果の座標で指定）"""
+        self.apply_edit(CropOp(tuple(box)))
+    
+    def rotate(self, degrees: float):
+        """回転（反時計回り）"""
+        self.apply_edit(RotateOp(degrees))
+    
+    def flip(self, horizontal: bool = True):
+        """反転"""
+        self.apply_edit(FlipOp(horizontal))
+    
+    def auto_orient(self):
+        """EXIFの向き情報に従って正立させる"""
+        self.apply_edit(AutoOrientOp())
+    
+    def undo_edit(self) -> bool:
+        """最後の編集を取り消す"""
+        return self.edits.undo() is not None
+    
+    def redo_edit(self) -> bool:
+        """取り消した編集をやり直す"""
+        return self.edits.redo() is not None
     
     def get_current_size(self) -> Optional[Tuple[int, int]]:
         """現在の画像サイズを取得"""
@@ -45,58 +174,150 @@ class ImageProcessor:
         if not self.original_image:
             return target_width, target_height
         
-        if not maintain_ratio:
-            return target_width, target_height
-        
-        original_width, original_height = self.original_image.size
-        ratio = min(target_width / original_width, target_height / original_height)
-        new_width = int(original_width * ratio)
-        new_height = int(original_height * ratio)
-        
-        return new_width, new_height
+        return fit_size(self.get_edited_size(), (target_width, target_height), maintain_ratio)
     
     def resize_image(self, resize_settings: ResizeSettings) -> Image.Image:
         """画像をリサイズ"""
+        self.current_image = self.render_resized(resize_settings)
+        return self.current_image
+    
+    def render_resized(self, resize_settings: ResizeSettings,
+                       edits: Optional[Sequence[Operation]] = None) -> Image.Image:
+        """インスタンスの状態を変更せずにリサイズした新しい画像を作る
+        
+        editsを省略すると現在の編集履歴を使う。バックグラウンドの処理からは
+        依頼した時点の編集履歴を渡し、current_imageの読み書きを避ける。
+        """
         if not self.original_image:
             raise ValueError("リサイズする画像がありません")
+        if edits is None:
+            edits = self.edits.operations
+        return resize(self._loaded(), resize_settings, edits, self.resampler)
+    
+    def render_preview(self, resize_settings: ResizeSettings, preview_size: Tuple[int, int],
+                       edits: Optional[Sequence[Operation]] = None
+                       ) -> Tuple[Image.Image, Tuple[int, int]]:
+        """インスタンスの状態を変更せずにリサイズ結果のプレビューと出力サイズを作る
         
-        # サイズ計算
-        new_width, new_height = self.calculate_size_with_ratio(
-            resize_settings.width,
-            resize_settings.height,
-            resize_settings.maintain_ratio
-        )
+        帯単位で処理する画像は出力の解像度の画像を作らず、縮小版から作る。
+        """
+        if not self.original_image:
+            raise ValueError("リサイズする画像がありません")
+        if edits is None:
+            edits = self.edits.operations
+        return render_preview(self._loaded(), resize_settings, preview_size, edits)
+    
+    def requires_streaming(self, resize_settings: ResizeSettings,
+                           edits: Optional[Sequence[Operation]] = None) -> bool:
+        """出力が大きく、帯ごとに書き出す必要があるか（write_resizedなどで書き出す）"""
+        if not self.original_image:
+            return False
+        if edits is None:
+            edits = self.edits.operations
+        return requires_streaming(self._loaded(), resize_settings, edits)
+    
+    def save_streamed(self, file_path: str, resize_settings: ResizeSettings,
+                      compression_settings: CompressionSettings,
+                      edits: Sequence[Operation] = ()) -> Tuple[str, EncodeDetails]:
+        """インスタンスの状態を変更せずに帯ごとに書き出し、(保存したパス, 形式) を返す
         
-        # リサイズ実行
-        resample_method = resize_settings.get_pil_resample_method()
-        resized_image = self.original_image.resize(
-            (new_width, new_height), 
-            resample_method
-        )
+        requires_streamingが真の場合にバックグラウンドの処理から使う。
+        """
+        if not self.original_image:
+            raise ValueError("保存する画像がありません")
+        return save_banded(self._loaded(), resize_settings, compression_settings,
+                           file_path, edits)
+    
+    def write_resized(self, stream: BinaryIO, resize_settings: ResizeSettings,
+                      compression_settings: CompressionSettings) -> str:
+        """リサイズしてストリームに出力し、出力した形式を返す
         
-        self.current_image = resized_image
-        return resized_image
+        出力が大きい場合は1枚の画像に組み立てずに帯ごとに書き出す（PNGのみ）。
+        それ以外はresize_imageとsave_image_to_streamと同じ。
+        """
+        if not self.original_image:
+            raise ValueError("リサイズする画像がありません")
+        if self.requires_streaming(resize_settings):
+            details = write_banded(self._loaded(), resize_settings, stream,
+                                   compression_settings, self.edits.operations)
+            self._record(details)
+            return details.format_type
+        self.resize_image(resize_settings)
+        return self.save_image_to_stream(stream, compression_settings)
+    
+    def save_resized(self, file_path: str, resize_settings: ResizeSettings,
+                     compression_settings: CompressionSettings) -> str:
+        """リサイズして保存し、保存したパスを返す（出力が大きい場合は帯ごとに書き出す）"""
+        if not self.original_image:
+            raise ValueError("リサイズする画像がありません")
+        if not self.requires_streaming(resize_settings):
+            self.resize_image(resize_settings)
+            return self.save_image(file_path, compression_settings)
+        file_path, details = self.save_streamed(file_path, resize_settings,
+                                                compression_settings, self.edits.operations)
+        self._record(details)
+        return file_path
     
     def create_preview(self, preview_size: Tuple[int, int]) -> Optional[Image.Image]:
         """プレビュー用の画像を作成"""
         if not self.current_image:
             return None
+        return create_preview(self.current_image, preview_size)
+    
+    def save_image(self, file_path: str, compression_settings: CompressionSettings) -> str:
+        """画像を保存し、保存したパスを返す
         
-        preview_image = self.current_image.copy()
-        preview_image.thumbnail(preview_size, Image.LANCZOS)
-        return preview_image
+        出力形式を自動選択する場合は、拡張子を選ばれた形式のものに置き換える。
+        """
+        if not self.current_image:
+            raise ValueError("保存する画像がありません")
+        
+        if compression_settings.is_auto_format():
+            # 形式が決まるまでファイルを作らない
+            result = encode(self.current_image, compression_settings)
+            self._record(result)
+            return save_result(result, file_path, replace_extension=True)
+        
+        # 書きかけのファイルを残さず、書き終えてから置き換える
+        with open_atomic(file_path) as f:
+            self.save_image_to_stream(f, compression_settings)
+        return file_path
     
-    def save_image(self, file_path: str, compression_settings: CompressionSettings):
-        """画像を保存"""
+    def _record(self, details):
+        """直近の自動品質・形式の自動選択の結果を保持"""
+        self.last_auto_quality = details.auto_quality
+        self.last_format_selection = details.format_selection
+        self.last_format_type = details.format_type
+    
+    def save_image_to_stream(self, stream: BinaryIO,
+                             compression_settings: CompressionSettings) -> str:
+        """画像を書き込み可能なファイルライクオブジェクトに出力し、出力した形式を返す"""
         if not self.current_image:
             raise ValueError("保存する画像がありません")
         
-        save_kwargs = compression_settings.get_save_kwargs()
-        self.current_image.save(
-            file_path, 
-            format=compression_settings.format_type, 
-            **save_kwargs
+        details = write_image(self.current_image, stream, compression_settings)
+        self._record(details)
+        return details.format_type
+    
+    def encode_image(self, compression_settings: CompressionSettings) -> bytes:
+        """画像をメモリ上でエンコードしてbytesで取得"""
+        buffer = io.BytesIO()
+        self.save_image_to_stream(buffer, compression_settings)
+        return buffer.getvalue()
+    
+    def measure_option_savings(self, compression_settings: CompressionSettings
+                               ) -> List[OptionSavings]:
+        """出力オプションごとの削減バイト数を計測
+        
+        直前の保存で自動品質を使った場合は、選ばれた品質で計測する。
+        """
+        if not self.current_image:
+            raise ValueError("計測する画像がありません")
+        
+        details = EncodeDetails(
+            compression_settings.format_type, self.last_auto_quality, self.last_format_selection
         )
+        return measure_savings(self.current_image, compression_settings, details)
     
     def generate_output_filename(self, compression_settings: CompressionSettings, 
                                 suffix: str = "_resized") -> str:
@@ -110,14 +331,76 @@ class ImageProcessor:
     
     def reset_to_original(self):
         """元の画像に戻す"""
+        self.edits.clear()
         if self.original_image:
-            self.current_image = self.original_image.copy()
+            self.current_image = self.original_image
     
     def clear_images(self):
-        """画像をクリア"""
+        """画像をクリア
+        
+        保持している画像のメモリを解放する。resize_imageなどで
+        取得済みの画像も使用できなくなる。
+        """
+        for image in (self.current_image, self.original_image):
+            if image is not None:
+                image.close()
         self.original_image = None
         self.current_image = None
         self.image_path = None
+        self.banded_source = None
+        self._source_size = None
+        self._orientation = 1
+        self.edits.clear()
+    
+    def unload_pixels(self):
+        """画素データだけを解放（パスと編集履歴は残し、reload_pixelsで読み直せる）"""
+        if not self.image_path or not os.path.exists(self.image_path):
+            raise ValueError("ファイルから読み込んだ画像ではないため解放できません")
+        for image in (self.current_image, self.original_image):
+            if image is not None:
+                image.close()
+        self.original_image = None
+        self.current_image = None
+        self.banded_source = None
+    
+    def reload_pixels(self):
+        """unload_pixelsで解放した画像をファイルから読み直す（編集履歴は保持）"""
+        if self.has_image():
+            return
+        self.restore_pixels(self.read_pixels())
+    
+    def read_pixels(self) -> LoadedImage:
+        """解放した画像をファイルからデコードする（インスタンスの状態は変更しない）
+        
+        デコードに時間がかかるため、ロックを持たずに呼び、結果をrestore_pixelsで戻す。
+        """
+        if not self.image_path:
+            raise ValueError("読み直す画像がありません")
+        return load(self.image_path, self.banded_threshold)
+    
+    def restore_pixels(self, loaded: LoadedImage):
+        """read_pixelsでデコードした画素データを戻す（編集履歴は保持）"""
+        if self.has_image():
+            # 他の処理が先に読み直した
+            loaded.image.close()
+            return
+        self._set_pixels(loaded)
+    
+    def get_decoded_bytes(self) -> int:
+        """保持している展開済み画像のメモリ量（見積もり）"""
+        images = {id(image): image for image in (self.original_image, self.current_image)
+                  if image is not None}
+        return sum(decoded_bytes(image.size, image.mode) for image in images.values())
+    
+    def close(self):
+        """リソースを解放（clear_imagesと同じ）"""
+        self.clear_images()
+    
+    def __enter__(self) -> "ImageProcessor":
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
     
     def has_image(self) -> bool:
         """画像が読み込まれているかチェック"""
@@ -0,0 +1,248 @@
+"""
+複数画像のセッション
+
+開いている画像ごとにImageProcessorとプレビュー用の縮小画像を保持し、
+展開済み画像の合計がメモリ予算を超えた場合は、最も長く表示していない画像から
+画素データを解放してプレビューだけの状態にする。解放した画像は次に必要になったときに
+ファイルから読み直す。デコードはロックの外で行い、読み直しの間もGUIのスレッドからの
+切り替えや一覧の取得を待たせない。
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from .image_processor import ImageProcessor
+from .memory_scheduler import default_memory_budget
+
+# メモリ上限のうち開いている画像に割り当てる割合（バッチ処理の予算とは別に確保する）
+DEFAULT_SESSION_BUDGET_RATIO = 0.5
+
+
+@dataclass
+class SessionImage:
+    """セッション内の1画像"""
+    path: str
+    processor: ImageProcessor
+    # 画素データを解放しても残すプレビュー用の縮小画像
+    thumbnail: Optional[Image.Image] = None
+    original_size: Optional[Tuple[int, int]] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """画素データを保持しているか"""
+        return self.processor.has_image()
+
+
+@dataclass
+class SessionStats:
+    """セッションの統計"""
+    evictions: int = 0
+    reloads: int = 0
+
+
+class ImageSession:
+    """メモリ予算の範囲で複数の画像を開いておくセッション
+
+    GUIのスレッドとバックグラウンドの処理の両方から呼べる。ただし画素データを
+    読み直すensure_loadedはバックグラウンドの処理から呼ぶ。
+    処理中の画像はpin/unpinで解放の対象から外す。
+    """
+
+    def __init__(self, memory_budget: Optional[int] = None,
+                 thumbnail_size: Tuple[int, int] = (400, 300),
+                 processor_factory: Callable[[], ImageProcessor] = ImageProcessor):
+        self.memory_budget = memory_budget or int(
+            default_memory_budget() * DEFAULT_SESSION_BUDGET_RATIO
+        )
+        self.thumbnail_size = thumbnail_size
+        self.processor_factory = processor_factory
+        # 最近表示した順（末尾が最新）
+        self._images: "OrderedDict[str, SessionImage]" = OrderedDict()
+        # 開いた順（タブや一覧の表示順）
+        self._order: List[str] = []
+        self._pins: Dict[str, int] = {}
+        # 処理中に閉じられた画像（pinが解除されたときに解放する）
+        self._closing: Dict[str, SessionImage] = {}
+        self._lock = threading.RLock()
+        # 読み直し中の画像（同じ画像を読み直す他の処理は完了を待つ）
+        self._loading: Set[str] = set()
+        self._load_done = threading.Condition(self._lock)
+        self.active_path: Optional[str] = None
+        self.stats = SessionStats()
+        # 画像が開かれていないときに返す空のプロセッサー
+        self._empty = processor_factory()
+
+    @property
+    def paths(self) -> List[str]:
+        """開いている画像のパス（開いた順）"""
+        with self._lock:
+            return list(self._order)
+
+    def get(self, path: str) -> Optional[SessionImage]:
+        """開いている画像を取得"""
+        with self._lock:
+            return self._images.get(path)
+
+    def open(self, path: str) -> SessionImage:
+        """画像を開いて表示中にする（既に開いている場合は切り替えるだけ）"""
+        with self._lock:
+            if path in self._images:
+                return self.activate(path)
+
+        # デコードの間は他の処理がセッションを使えるようにロックを持たない
+        processor = self.processor_factory()
+        try:
+            processor.load_image(path)
+            thumbnail = processor.create_preview(self.thumbnail_size)
+        except Exception:
+            processor.close()
+            raise
+
+        with self._lock:
+            if path in self._images:
+                # 読み込みの間に他の処理が同じ画像を開いた
+                processor.close()
+                return self.activate(path)
+            entry = SessionImage(
+                path=path,
+                processor=processor,
+                thumbnail=thumbnail,
+                original_size=processor.get_original_size(),
+            )
+            self._images[path] = entry
+            self._order.append(path)
+            self.active_path = path
+            self.enforce_budget()
+            return entry
+
+    def activate(self, path: str) -> SessionImage:
+        """表示する画像を切り替える（画素データの読み直しは必要になるまで行わない）"""
+        with self._lock:
+            entry = self._images.get(path)
+            if entry is None:
+                raise ValueError(f"開いていない画像です: {path}")
+            self._images.move_to_end(path)
+            self.active_path = path
+            return entry
+
+    def ensure_loaded(self, path: str) -> ImageProcessor:
+        """画素データを保持した状態のプロセッサーを取得（バックグラウンドの処理から呼ぶ）
+
+        解放済みの画像はロックの外でデコードし、結果だけをロックを持って戻す。
+        同じ画像を読み直している処理があれば、その完了を待つ。
+        """
+        with self._lock:
+            while path in self._loading:
+                self._load_done.wait()
+            entry = self._images[path]
+            if entry.is_loaded:
+                return entry.processor
+            self._loading.add(path)
+
+        try:
+            loaded = entry.processor.read_pixels()
+        except Exception:
+            with self._lock:
+                self._loading.discard(path)
+                self._load_done.notify_all()
+            raise
+
+        with self._lock:
+            self._loading.discard(path)
+            self._load_done.notify_all()
+            if self._images.get(path) is not entry and self._closing.get(path) is not entry:
+                # 読み直しの間に閉じられた
+                loaded.image.close()
+                raise ValueError(f"開いていない画像です: {path}")
+            entry.processor.restore_pixels(loaded)
+            self.stats.reloads += 1
+            self.enforce_budget(keep=path)
+            return entry.processor
+
+    @property
+    def active_processor(self) -> ImageProcessor:
+        """表示中の画像のプロセッサー（画像がない場合は空のプロセッサー）
+
+        画素データは読み直さないため、解放済みの場合は編集履歴とサイズだけを使える。
+        """
+        with self._lock:
+            if self.active_path is None:
+                return self._empty
+            return self._images[self.active_path].processor
+
+    def close(self, path: str):
+        """画像を閉じる（表示中の場合は直前に表示していた画像に切り替える）"""
+        with self._lock:
+            entry = self._images.pop(path, None)
+            if entry is None:
+                return
+            self._order.remove(path)
+            if self._pins.get(path):
+                self._closing[path] = entry
+            else:
+                entry.processor.close()
+            if self.active_path == path:
+                self.active_path = next(reversed(self._images), None)
+
+    def close_all(self):
+        """すべての画像を閉じる"""
+        with self._lock:
+            for path in list(self._images):
+                self.close(path)
+            self._empty.close()
+
+    def pin(self, path: str):
+        """処理中の画像を解放の対象から外す"""
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path: str):
+        """pinを解除"""
+        with self._lock:
+            count = self._pins.pop(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+                return
+            closing = self._closing.pop(path, None)
+            if closing is not None:
+                closing.processor.close()
+            self.enforce_budget()
+
+    def memory_usage(self) -> int:
+        """展開済み画像の合計メモリ量（見積もり）"""
+        with self._lock:
+            return sum(entry.processor.get_decoded_bytes() for entry in self._images.values())
+
+    def enforce_budget(self, keep: Optional[str] = None):
+        """予算を超えている間、最も長く表示していない画像の画素データを解放
+
+        表示中・処理中の画像とkeepに指定した画像は解放しない。
+        """
+        with self._lock:
+            usage = self.memory_usage()
+            for path, entry in list(self._images.items()):
+                if usage <= self.memory_budget:
+                    break
+                if (path in (self.active_path, keep) or self._pins.get(path)
+                        or not entry.is_loaded):
+                    continue
+                released = entry.processor.get_decoded_bytes()
+                try:
+                    entry.processor.unload_pixels()
+                except ValueError:
+                    # 元のファイルがなくなった画像は読み直せないため保持する
+                    continue
+                usage -= released
+                self.stats.evictions += 1
+
+    def format_status(self) -> str:
+        """表示用の状態の文字列"""
+        with self._lock:
+            loaded = sum(1 for entry in self._images.values() if entry.is_loaded)
+            return (f"開いている画像: {len(self._images)}件（展開済み {loaded}件、"
+                    f"{self.memory_usage() / (1024 * 1024):.1f} / "
+                    f"{self.memory_budget / (1024 * 1024):.0f} MB）")
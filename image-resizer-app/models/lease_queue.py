@@ -0,0 +1,345 @@
+"""
+共有ディレクトリを使った作業キュー
+
+NFSなどの共有ディレクトリだけで複数のプロセス・ホストに作業を分配する。
+作業項目はitems/、実行中のリースはleases/、結果はresults/に置く。
+
+- リースはO_EXCLでの作成で取得し、実行中はハートビートで更新時刻を更新する
+- 更新が途絶えて期限切れになったリースは、renameで1つのワーカーだけが回収できる
+- 結果は最初に書かれたものだけを採用する（同じ項目を2回処理しても結果は1つ）
+"""
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+# 結果のステータス
+RESULT_DONE = "done"
+RESULT_FAILED = "failed"
+
+# リースの有効期間のデフォルト（秒）
+DEFAULT_LEASE_SECONDS = 60.0
+
+
+def default_worker_id() -> str:
+    """ホスト名とプロセスIDからワーカーIDを作成"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def write_json_atomic(path: str, payload: dict):
+    """一時ファイル経由でJSONを書き込み、置き換える"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_json(path: str) -> Optional[dict]:
+    """JSONを読み込む（存在しない・書きかけの場合はNone）"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass
+class Lease:
+    """取得したリース"""
+    item_id: str
+    worker_id: str
+    # リースファイルが自分のものか確認するための値
+    token: str
+    path: str
+
+
+@dataclass
+class QueueStatus:
+    """キューの状態"""
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    leased: int = 0
+
+    @property
+    def pending(self) -> int:
+        """未処理の件数（実行中を含まない）"""
+        return self.total - self.done - self.failed - self.leased
+
+    @property
+    def is_complete(self) -> bool:
+        """すべての項目の結果が記録されたか"""
+        return self.done + self.failed >= self.total
+
+    def format_status(self) -> str:
+        """表示用の文字列"""
+        return (f"全体: {self.total}件 / 完了: {self.done}件 / 失敗: {self.failed}件 / "
+                f"実行中: {self.leased}件 / 未処理: {self.pending}件")
+
+
+class LeaseQueue:
+    """共有ディレクトリ上の作業キュー"""
+
+    def __init__(self, root: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        if lease_seconds <= 0:
+            raise ValueError("リースの有効期間は正の値で指定してください")
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.items_dir = os.path.join(root, "items")
+        self.leases_dir = os.path.join(root, "leases")
+        self.results_dir = os.path.join(root, "results")
+        for directory in (self.items_dir, self.leases_dir, self.results_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _item_path(self, item_id: str) -> str:
+        return os.path.join(self.items_dir, f"{item_id}.json")
+
+    def _lease_path(self, item_id: str) -> str:
+        return os.path.join(self.leases_dir, f"{item_id}.lease")
+
+    def _result_path(self, item_id: str) -> str:
+        return os.path.join(self.results_dir, f"{item_id}.json")
+
+    def enqueue(self, item_id: str, payload: dict):
+        """作業項目を追加（同じIDの項目は上書き）"""
+        if not item_id or os.sep in item_id or item_id.startswith("."):
+            raise ValueError(f"不正な項目IDです: {item_id}")
+        write_json_atomic(self._item_path(item_id), payload)
+
+    def item_ids(self) -> List[str]:
+        """作業項目のID（名前順）"""
+        return sorted(name[:-len(".json")] for name in os.listdir(self.items_dir)
+                      if name.endswith(".json"))
+
+    def get_item(self, item_id: str) -> Optional[dict]:
+        """作業項目の内容を取得"""
+        return read_json(self._item_path(item_id))
+
+    def get_result(self, item_id: str) -> Optional[dict]:
+        """記録された結果を取得"""
+        return read_json(self._result_path(item_id))
+
+    def has_result(self, item_id: str) -> bool:
+        """結果が記録済みか"""
+        return os.path.exists(self._result_path(item_id))
+
+    def _is_expired(self, path: str) -> bool:
+        """リースファイルの更新が期限を過ぎているか"""
+        return time.time() - os.stat(path).st_mtime > self.lease_seconds
+
+    def try_acquire(self, item_id: str, worker_id: str) -> Optional[Lease]:
+        """リースの取得を試みる（他のワーカーが有効なリースを持つ場合はNone）"""
+        path = self._lease_path(item_id)
+        for _ in range(2):
+            lease = self._create_lease(item_id, worker_id, path)
+            if lease is not None:
+                return lease
+            if not self._reclaim_expired(path):
+                return None
+        return None
+
+    def _create_lease(self, item_id: str, worker_id: str, path: str) -> Optional[Lease]:
+        """リースファイルを排他的に作成"""
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"worker_id": worker_id, "token": token,
+                       "acquired_at": time.time()}, f)
+        return Lease(item_id=item_id, worker_id=worker_id, token=token, path=path)
+
+    def _reclaim_expired(self, path: str) -> bool:
+        """期限切れのリースを回収（回収できた場合はTrue）"""
+        try:
+            if not self._is_expired(path):
+                return False
+        except FileNotFoundError:
+            # 確認している間に解放された
+            return True
+        # renameは1つのワーカーだけが成功する
+        stale_path = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+        try:
+            if not self._is_expired(stale_path):
+                # 確認とrenameの間にハートビートで更新されたリースは元に戻す
+                try:
+                    os.link(stale_path, path)
+                except FileExistsError:
+                    pass
+                return False
+            return True
+        finally:
+            os.remove(stale_path)
+
+    def owns(self, lease: Lease) -> bool:
+        """リースがまだ自分のものか"""
+        content = read_json(lease.path)
+        return content is not None and content.get("token") == lease.token
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """リースの更新時刻を更新（リースを失っていた場合はFalse）"""
+        if not self.owns(lease):
+            return False
+        try:
+            os.utime(lease.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, lease: Lease):
+        """リースを解放（自分のものの場合のみ）"""
+        if self.owns(lease):
+            try:
+                os.remove(lease.path)
+            except FileNotFoundError:
+                pass
+
+    def record_result(self, item_id: str, result: dict) -> bool:
+        """結果を記録（既に記録済みの場合は何もせずFalse）"""
+        path = self._result_path(item_id)
+        if os.path.exists(path):
+            return False
+        fd, temp_path = tempfile.mkstemp(dir=self.results_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            # linkは既存のファイルを上書きしないため、最初の結果だけが残る
+            os.link(temp_path, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(temp_path)
+
+    def next_item(self, worker_id: str) -> Optional[Lease]:
+        """未処理の項目を1つ選んでリースを取得"""
+        for item_id in self.item_ids():
+            if self.has_result(item_id):
+                continue
+            lease = self.try_acquire(item_id, worker_id)
+            if lease is None:
+                continue
+            if self.has_result(item_id):
+                # 一覧の取得後に他のワーカーが完了させていた
+                self.release(lease)
+                continue
+            return lease
+        return None
+
+    def get_status(self) -> QueueStatus:
+        """キューの状態を集計"""
+        status = QueueStatus()
+        for item_id in self.item_ids():
+            status.total += 1
+            result = self.get_result(item_id)
+            if result is not None:
+                if result.get("status") == RESULT_FAILED:
+                    status.failed += 1
+                else:
+                    status.done += 1
+            elif os.path.exists(self._lease_path(item_id)):
+                status.leased += 1
+        return status
+
+    def get_results(self) -> Dict[str, dict]:
+        """記録済みの結果をすべて取得"""
+        results = {}
+        for item_id in self.item_ids():
+            result = self.get_result(item_id)
+            if result is not None:
+                results[item_id] = result
+        return results
+
+
+class LeaseWorker:
+    """キューから項目を取り出して処理するワーカー
+
+    processは項目の内容を受け取り、結果の辞書を返す。例外は失敗として記録する。
+    出力を書き出すprocessは、公開する直前にowns_leaseでリースを保持しているか確認する。
+    """
+
+    def __init__(self, queue: LeaseQueue, process: Callable[[dict], dict],
+                 worker_id: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = None,
+                 poll_interval: float = 1.0):
+        self.queue = queue
+        self.process = process
+        self.worker_id = worker_id or default_worker_id()
+        # 期限までに数回更新できる間隔にする
+        self.heartbeat_interval = heartbeat_interval or queue.lease_seconds / 4
+        self.poll_interval = poll_interval
+        # 処理した件数
+        self.processed = 0
+        # 処理中の項目のリース
+        self.current_lease: Optional[Lease] = None
+
+    def owns_lease(self) -> bool:
+        """処理中の項目のリースをまだ保持しているか（期限切れで回収されていればFalse）"""
+        lease = self.current_lease
+        return lease is not None and self.queue.owns(lease)
+
+    def run(self, max_items: Optional[int] = None, wait: bool = True) -> int:
+        """項目がなくなるまで処理し、処理した件数を返す
+
+        waitがTrueの場合、他のワーカーが実行中の項目が残っている間は
+        期限切れで回収できるようになるまで待つ。
+        """
+        while max_items is None or self.processed < max_items:
+            lease = self.queue.next_item(self.worker_id)
+            if lease is None:
+                if not wait or self.queue.get_status().is_complete:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self._process_leased(lease)
+        return self.processed
+
+    def _process_leased(self, lease: Lease):
+        """リースを保持したまま1項目を処理"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat_interval):
+                if not self.queue.heartbeat(lease):
+                    return
+
+        heartbeat = threading.Thread(target=beat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        self.current_lease = lease
+        started = time.time()
+        try:
+            payload = self.queue.get_item(lease.item_id) or {}
+            try:
+                result = dict(self.process(payload))
+                result.setdefault("status", RESULT_DONE)
+            except Exception as e:
+                result = {"status": RESULT_FAILED, "error": str(e)}
+            if not self.queue.owns(lease):
+                # 期限切れで回収された項目の結果は、回収したワーカーが記録する
+                return
+            result["worker_id"] = self.worker_id
+            result["started_at"] = started
+            result["finished_at"] = time.time()
+            self.queue.record_result(lease.item_id, result)
+            self.processed += 1
+        finally:
+            self.current_lease = None
+            stop.set()
+            heartbeat.join()
+            self.queue.release(lease)
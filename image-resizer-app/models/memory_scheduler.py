@@ -0,0 +1,196 @@
+"""
+メモリ予算に基づくバッチジョブのスケジューラー
+
+画像ヘッダーから展開後のメモリ量を見積もり、全体のメモリ予算を
+超えない範囲でジョブを投入する。大きいジョブから順に投入し、
+残り予算に収まる小さいジョブで隙間を埋める。
+"""
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .banded_resize import (
+    BANDED_LOAD_THRESHOLD,
+    DEFAULT_BAND_BYTES,
+    PROXY_MAX_SIZE,
+    open_banded_reader,
+)
+
+# Pillowの内部表現での1画素あたりのバイト数（RGBは4バイトで保持される）
+_DECODED_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2}
+
+# 1ジョブで同時に保持する展開済み画像の数（元画像と作業用のコピー）
+DECODED_COPIES = 2
+
+# メモリ上限のうちバッチ処理に割り当てる割合
+DEFAULT_BUDGET_RATIO = 0.5
+
+# cgroupのメモリ上限ファイル（v2, v1の順に参照）
+_CGROUP_LIMIT_FILES = (
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+)
+
+
+def decoded_bytes(size: Tuple[int, int], mode: str) -> int:
+    """展開後の画像のメモリ量を計算"""
+    return size[0] * size[1] * _DECODED_BYTES_PER_PIXEL.get(mode, 4)
+
+
+def estimate_job_memory(path: str, output_size: Tuple[int, int] = (0, 0)) -> int:
+    """画像ヘッダーから1ファイルの処理に必要なピークメモリを見積もる"""
+    output_bytes = decoded_bytes(output_size, "RGB")
+    reader = open_banded_reader(path)
+    if reader and reader.pixel_count >= BANDED_LOAD_THRESHOLD:
+        # 帯単位で処理する画像は縮小版と1帯分だけを保持する
+        proxy_bytes = decoded_bytes((PROXY_MAX_SIZE, PROXY_MAX_SIZE), reader.mode)
+        return DECODED_COPIES * proxy_bytes + DEFAULT_BAND_BYTES + output_bytes
+
+    with Image.open(path) as image:
+        return DECODED_COPIES * decoded_bytes(image.size, image.mode) + output_bytes
+
+
+def detect_memory_limit() -> int:
+    """コンテナ（cgroup）または物理メモリの上限を取得"""
+    for limit_file in _CGROUP_LIMIT_FILES:
+        try:
+            with open(limit_file) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # 制限なしの場合は "max" または非常に大きな値になる
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 4 * 1024 * 1024 * 1024
+
+
+def default_memory_budget() -> int:
+    """デフォルトのメモリ予算を取得"""
+    return int(detect_memory_limit() * DEFAULT_BUDGET_RATIO)
+
+
+@dataclass
+class ScheduledJob:
+    """スケジュール対象のジョブ"""
+    key: Hashable
+    memory_bytes: int
+
+
+class MemoryBudgetScheduler:
+    """メモリ予算内でジョブを並列実行するスケジューラー"""
+
+    def __init__(self, memory_budget: Optional[int] = None,
+                 max_workers: Optional[int] = None,
+                 executor: Optional[Executor] = None):
+        self.memory_budget = memory_budget or default_memory_budget()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # 共有のExecutor（優先度スケジューラーなど）を使う場合に指定
+        self.executor = executor
+        self._reserved = 0
+        # 実行中に予約したメモリの最大値
+        self.peak_reserved = 0
+        # acquireで空きを待つスレッドを起こすための条件変数
+        self._condition = threading.Condition()
+
+    @property
+    def reserved_bytes(self) -> int:
+        """現在予約しているメモリ量"""
+        return self._reserved
+
+    def order_jobs(self, jobs: Sequence[ScheduledJob]) -> List[ScheduledJob]:
+        """大きいジョブから順に並べる"""
+        return sorted(jobs, key=lambda job: job.memory_bytes, reverse=True)
+
+    def first_wave_bytes(self, jobs: Sequence[ScheduledJob]) -> int:
+        """最初に同時投入されるジョブの合計メモリ（大きい順に投入するためピークの見積もりになる）"""
+        pending = self.order_jobs(jobs)
+        if not pending:
+            return 0
+        # 予算より大きいジョブは他に何も実行していないときに単独で実行される
+        largest = pending[0].memory_bytes
+        total = 0
+        count = 0
+        while count < self.max_workers:
+            available = self.memory_budget - total
+            job = next((job for job in pending if job.memory_bytes <= available), None)
+            if job is None:
+                break
+            pending.remove(job)
+            total += job.memory_bytes
+            count += 1
+        return max(total, largest)
+
+    def _pick_next(self, pending: List[ScheduledJob], running: int) -> Optional[ScheduledJob]:
+        """残り予算に収まる最も大きいジョブを選ぶ"""
+        available = self.memory_budget - self._reserved
+        for index, job in enumerate(pending):
+            if job.memory_bytes <= available:
+                return pending.pop(index)
+        if running == 0 and pending:
+            # 予算より大きいジョブは他に何も実行していないときに単独で実行する
+            return pending.pop(0)
+        return None
+
+    def run(self, jobs: Sequence[ScheduledJob],
+            func: Callable[[Hashable], object]) -> Dict[Hashable, object]:
+        """ジョブを実行して キー -> 結果 の辞書を返す"""
+        pending = self.order_jobs(jobs)
+        if self.executor is not None:
+            return self._run_with(self.executor, pending, func)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return self._run_with(executor, pending, func)
+
+    def _run_with(self, executor: Executor, pending: List[ScheduledJob],
+                  func: Callable[[Hashable], object]) -> Dict[Hashable, object]:
+        """指定したExecutorでジョブを実行"""
+        results: Dict[Hashable, object] = {}
+        running: Dict[Future, ScheduledJob] = {}
+        while pending or running:
+            while len(running) < self.max_workers:
+                job = self._pick_next(pending, len(running))
+                if job is None:
+                    break
+                self._reserve(job.memory_bytes)
+                running[executor.submit(func, job.key)] = job
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                self._release(job.memory_bytes)
+                results[job.key] = future.result()
+        return results
+
+    def acquire(self, memory_bytes: int):
+        """予算に空きができるまで待ってメモリを予約（複数のスレッドから呼べる）
+
+        runを使わずに自前のスレッドで処理する場合に使い、処理後にreleaseを呼ぶ。
+        予算より大きいジョブは他に何も予約していないときに予約できる。
+        """
+        with self._condition:
+            while self._reserved and self._reserved + memory_bytes > self.memory_budget:
+                self._condition.wait()
+            self._reserve(memory_bytes)
+
+    def release(self, memory_bytes: int):
+        """acquireで予約したメモリを解放"""
+        with self._condition:
+            self._release(memory_bytes)
+            self._condition.notify_all()
+
+    def _reserve(self, memory_bytes: int):
+        """メモリを予約"""
+        self._reserved += memory_bytes
+        self.peak_reserved = max(self.peak_reserved, self._reserved)
+
+    def _release(self, memory_bytes: int):
+        """予約したメモリを解放"""
+        self._reserved -= memory_bytes
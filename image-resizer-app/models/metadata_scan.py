@@ -0,0 +1,160 @@
+"""
+画像ヘッダーのみを読むメタデータスキャナー
+
+画素データはデコードせず、ヘッダーから寸法・形式・モードを取得する。
+フォルダの一覧作成や、バッチ処理前の絞り込みに使う。
+"""
+
+import csv
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from typing import Iterable, List, Optional, Sequence, TextIO
+
+from PIL import Image, UnidentifiedImageError
+
+from utils.file_utils import get_directory_images
+
+# ヘッダー判定に使う先頭バイト数（Image.openと同じ）
+_PREFIX_SIZE = 16
+
+# スキャンのデフォルト並列数（I/O待ちが中心のためCPU数より多くする）
+DEFAULT_SCAN_WORKERS = 32
+
+
+@dataclass
+class ImageRecord:
+    """1ファイル分のメタデータ"""
+    path: str
+    file_size: int = 0
+    format: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    mode: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def pixel_count(self) -> int:
+        """画素数"""
+        return self.width * self.height
+
+
+def _open_header(fp, file_path: str):
+    """デコードせずにヘッダーだけを読み込む
+
+    Image.openは画素数が多い画像をDecompressionBombErrorで拒否するため、
+    登録済みのプラグインを直接使って寸法だけを取得する。
+    ヘッダーが途中で切れている場合にプラグインが送出する例外も読めない形式として扱う。
+    """
+    Image.init()
+    prefix = fp.read(_PREFIX_SIZE)
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        if accept:
+            result = accept(prefix)
+            if isinstance(result, str) or not result:
+                continue
+        fp.seek(0)
+        try:
+            return factory(fp, file_path)
+        except (SyntaxError, IndexError, TypeError, ValueError, OSError,
+                struct.error, EOFError):
+            continue
+    raise UnidentifiedImageError("画像形式を判別できません")
+
+
+def read_image_header(file_path: str) -> ImageRecord:
+    """1ファイルのヘッダーを読み込んでレコードを作成"""
+    record = ImageRecord(path=file_path)
+    try:
+        record.file_size = os.path.getsize(file_path)
+        with open(file_path, "rb") as fp:
+            image = _open_header(fp, file_path)
+            record.format = image.format
+            record.width, record.height = image.size
+            record.mode = image.mode
+    except Exception as e:
+        record.error = str(e)
+    return record
+
+
+def scan_images(paths: Sequence[str], max_workers: int = DEFAULT_SCAN_WORKERS) -> List[ImageRecord]:
+    """複数ファイルのヘッダーを並列に読み込む"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(read_image_header, paths))
+
+
+def scan_directory(directory: str, recursive: bool = False,
+                   max_workers: int = DEFAULT_SCAN_WORKERS) -> List[ImageRecord]:
+    """ディレクトリ内の画像をスキャン"""
+    return scan_images(get_directory_images(directory, recursive), max_workers)
+
+
+@dataclass
+class RecordFilter:
+    """レコードの絞り込み条件（Noneの条件は無視）"""
+    min_width: Optional[int] = None
+    max_width: Optional[int] = None
+    min_height: Optional[int] = None
+    max_height: Optional[int] = None
+    min_file_size: Optional[int] = None
+    max_file_size: Optional[int] = None
+    formats: Optional[Sequence[str]] = None
+    modes: Optional[Sequence[str]] = None
+
+    def matches(self, record: ImageRecord) -> bool:
+        """条件に一致するかチェック（読み込めなかったファイルは除外）"""
+        if record.error:
+            return False
+        ranges = [
+            (record.width, self.min_width, self.max_width),
+            (record.height, self.min_height, self.max_height),
+            (record.file_size, self.min_file_size, self.max_file_size),
+        ]
+        for value, minimum, maximum in ranges:
+            if minimum is not None and value < minimum:
+                return False
+            if maximum is not None and value > maximum:
+                return False
+        if self.formats and record.format not in [f.upper() for f in self.formats]:
+            return False
+        if self.modes and record.mode not in self.modes:
+            return False
+        return True
+
+    def apply(self, records: Iterable[ImageRecord]) -> List[ImageRecord]:
+        """条件に一致するレコードだけを返す"""
+        return [record for record in records if self.matches(record)]
+
+
+# 並べ替えに使えるキー
+SORT_KEYS = ["path", "file_size", "format", "width", "height", "mode", "pixel_count"]
+
+
+def sort_records(records: Iterable[ImageRecord], key: str = "path",
+                 descending: bool = False) -> List[ImageRecord]:
+    """指定したキーで並べ替え"""
+    if key not in SORT_KEYS:
+        raise ValueError(f"並べ替えに使えないキーです: {key}")
+
+    def sort_key(record: ImageRecord):
+        value = getattr(record, key)
+        # 形式・モードが不明なレコードは空文字として扱う
+        return "" if value is None else value
+
+    return sorted(records, key=sort_key, reverse=descending)
+
+
+def write_csv(records: Iterable[ImageRecord], stream: TextIO):
+    """CSV形式で書き出す"""
+    writer = csv.writer(stream)
+    writer.writerow([field.name for field in fields(ImageRecord)])
+    for record in records:
+        writer.writerow(["" if value is None else value for value in asdict(record).values()])
+
+
+def write_json(records: Iterable[ImageRecord], stream: TextIO):
+    """JSON形式で書き出す"""
+    json.dump([asdict(record) for record in records], stream, ensure_ascii=False, indent=2)
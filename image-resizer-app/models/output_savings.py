@@ -0,0 +1,105 @@
+"""
+出力オプションごとの削減バイト数の計測
+
+有効にしたオプション（メタデータ削除・プログレッシブ・サブサンプリング・
+ロスレス）を1つずつ元に戻してエンコードし、実際の出力との差を求める。
+"""
+
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List
+
+from PIL import Image
+
+from .quality import encode_to_bytes
+from .settings import CompressionSettings
+
+
+@dataclass
+class OptionSavings:
+    """1オプション分の削減量"""
+    option: str
+    label: str
+    baseline_bytes: int
+    output_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        """削減したバイト数（負の場合は増加）"""
+        return self.baseline_bytes - self.output_bytes
+
+
+def _encode_size(image: Image.Image, settings: CompressionSettings,
+                 metadata_kwargs: dict) -> int:
+    """指定した設定でエンコードしたサイズを取得"""
+    save_kwargs = settings.get_save_kwargs()
+    save_kwargs.update(metadata_kwargs)
+    return len(encode_to_bytes(image, settings.format_type, **save_kwargs))
+
+
+def _keep_all_metadata_kwargs(image: Image.Image) -> dict:
+    """元画像のメタデータをすべて残す場合のキーワード引数"""
+    kwargs = {'icc_profile': image.info.get("icc_profile")}
+    if image.info.get("exif"):
+        kwargs['exif'] = image.info["exif"]
+    return kwargs
+
+
+def measure_option_savings(image: Image.Image,
+                           compression_settings: CompressionSettings) -> List[OptionSavings]:
+    """有効なオプションごとの削減量を計測"""
+    settings = compression_settings
+    metadata_kwargs = settings.get_metadata_kwargs(image)
+    output_bytes = _encode_size(image, settings, metadata_kwargs)
+
+    # オプション名 -> (表示名, 元に戻した設定, メタデータ)
+    baselines: Dict[str, tuple] = {}
+    keep_all = _keep_all_metadata_kwargs(image)
+    if keep_all != metadata_kwargs and (keep_all['icc_profile'] or 'exif' in keep_all):
+        baselines["metadata"] = ("メタデータ削除", settings, keep_all)
+    if settings.format_type == "JPEG":
+        if settings.progressive:
+            baselines["progressive"] = (
+                "プログレッシブJPEG", replace(settings, progressive=False), metadata_kwargs
+            )
+        if settings.subsampling and settings.subsampling != "4:4:4":
+            baselines["subsampling"] = (
+                f"サブサンプリング {settings.subsampling}",
+                replace(settings, subsampling="4:4:4"), metadata_kwargs
+            )
+    elif settings.format_type == "WEBP" and settings.lossless:
+        baselines["lossless"] = (
+            "ロスレスWEBP", replace(settings, lossless=False), metadata_kwargs
+        )
+
+    return [
+        OptionSavings(
+            option=option,
+            label=label,
+            baseline_bytes=_encode_size(image, baseline, kwargs),
+            output_bytes=output_bytes,
+        )
+        for option, (label, baseline, kwargs) in baselines.items()
+    ]
+
+
+def combine_savings(savings_lists: Iterable[List[OptionSavings]]) -> List[OptionSavings]:
+    """複数ファイルの削減量をオプションごとに合算"""
+    totals: Dict[str, OptionSavings] = {}
+    for savings in savings_lists:
+        for item in savings:
+            total = totals.setdefault(item.option, OptionSavings(item.option, item.label, 0, 0))
+            total.baseline_bytes += item.baseline_bytes
+            total.output_bytes += item.output_bytes
+    return list(totals.values())
+
+
+def format_savings(savings: List[OptionSavings]) -> str:
+    """削減量を表示用の文字列に整形"""
+    lines = []
+    for item in savings:
+        ratio = abs(item.saved_bytes) / item.baseline_bytes * 100 if item.baseline_bytes else 0.0
+        direction = "削減" if item.saved_bytes >= 0 else "増加"
+        lines.append(
+            f"{item.label}: {abs(item.saved_bytes) / 1024:.1f} KB {direction} ({ratio:.1f}%)"
+        )
+    return "\n".join(lines)
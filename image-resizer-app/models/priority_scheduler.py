@@ -0,0 +1,220 @@
+"""
+優先度クラス付きの共有ジョブスケジューラー
+
+対話的な処理（プレビュー）、書き出し、先読みの3クラスを持ち、
+対話的な処理が待っている間は低い優先度のジョブを投入しない。
+また、ワーカーの一部を対話的な処理専用に確保し、大量の書き出しが
+実行中でもプレビューがすぐに開始できるようにする。
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# 優先度クラス（小さいほど優先）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EXPORT = 1
+PRIORITY_PREFETCH = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_EXPORT: "export",
+    PRIORITY_PREFETCH: "prefetch",
+}
+
+# 待ち時間のパーセンタイル計算に使う直近の件数
+_RECENT_WAITS = 1000
+
+
+@dataclass
+class ClassStats:
+    """優先度クラスごとの統計"""
+    name: str
+    submitted: int = 0
+    completed: int = 0
+    running: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    busy_seconds: float = 0.0
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=_RECENT_WAITS))
+
+    @property
+    def queued(self) -> int:
+        """待機中のジョブ数"""
+        return self.submitted - self.completed - self.running
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        """平均待ち時間"""
+        started = self.completed + self.running
+        return self.total_wait_seconds / started if started else 0.0
+
+    def percentile_wait(self, ratio: float) -> float:
+        """直近の待ち時間のパーセンタイル"""
+        if not self.recent_waits:
+            return 0.0
+        ordered = sorted(self.recent_waits)
+        return ordered[min(len(ordered) - 1, int(round(ratio * (len(ordered) - 1))))]
+
+
+class _WorkItem:
+    """キューに積まれたジョブ"""
+
+    def __init__(self, future: Future, fn: Callable, args: tuple, kwargs: dict):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.perf_counter()
+
+
+class PriorityScheduler(Executor):
+    """優先度クラス付きのスレッドプール
+
+    submitは書き出し（PRIORITY_EXPORT）として扱うため、通常のExecutorとしても使える。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, reserved_interactive: int = 1):
+        self.max_workers = max(2, max_workers or min(8, (os.cpu_count() or 1) + 1))
+        # 対話的な処理のために空けておくワーカー数
+        self.reserved_interactive = min(reserved_interactive, self.max_workers - 1)
+        self._queue: List[Tuple[int, int, _WorkItem]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self._started_at = time.perf_counter()
+        self._stats: Dict[int, ClassStats] = {
+            priority: ClassStats(name) for priority, name in PRIORITY_NAMES.items()
+        }
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """書き出しの優先度でジョブを投入"""
+        return self.submit_with_priority(PRIORITY_EXPORT, fn, *args, **kwargs)
+
+    def submit_with_priority(self, priority: int, fn: Callable, *args, **kwargs) -> Future:
+        """優先度を指定してジョブを投入"""
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"不明な優先度です: {priority}")
+        future: Future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("スケジューラーは終了しています")
+            heapq.heappush(self._queue, (priority, next(self._sequence),
+                                         _WorkItem(future, fn, args, kwargs)))
+            self._stats[priority].submitted += 1
+            self._start_threads()
+            self._condition.notify_all()
+        return future
+
+    def _start_threads(self):
+        """ワーカースレッドを起動（初回のみ）"""
+        if self._threads:
+            return
+        for index in range(self.max_workers):
+            thread = threading.Thread(target=self._worker, name=f"priority-worker-{index}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _background_running(self) -> int:
+        """対話的な処理以外の実行中ジョブ数"""
+        return sum(stats.running for priority, stats in self._stats.items()
+                   if priority != PRIORITY_INTERACTIVE)
+
+    def _pop_next(self) -> Optional[Tuple[int, _WorkItem]]:
+        """次に実行するジョブを取り出す（ロックを保持して呼ぶ）"""
+        if not self._queue:
+            return None
+        priority = self._queue[0][0]
+        # 先頭が対話的な処理でなければ、確保したワーカーは使わない
+        if (priority != PRIORITY_INTERACTIVE
+                and self._background_running() >= self.max_workers - self.reserved_interactive):
+            return None
+        _, _, item = heapq.heappop(self._queue)
+        return priority, item
+
+    def _worker(self):
+        """ワーカースレッドの処理"""
+        while True:
+            with self._condition:
+                while True:
+                    job = self._pop_next()
+                    if job is not None:
+                        break
+                    if self._shutdown and not self._queue:
+                        return
+                    self._condition.wait()
+                priority, item = job
+                stats = self._stats[priority]
+                wait_seconds = time.perf_counter() - item.enqueued_at
+                stats.running += 1
+                stats.total_wait_seconds += wait_seconds
+                stats.max_wait_seconds = max(stats.max_wait_seconds, wait_seconds)
+                stats.recent_waits.append(wait_seconds)
+
+            start = time.perf_counter()
+            run = item.future.set_running_or_notify_cancel()
+            result, error = None, None
+            if run:
+                try:
+                    result = item.fn(*item.args, **item.kwargs)
+                except BaseException as e:
+                    error = e
+
+            # 結果を受け取った側から統計が一致して見えるよう、先に統計を更新する
+            with self._condition:
+                stats.running -= 1
+                stats.completed += 1
+                stats.busy_seconds += time.perf_counter() - start
+                self._condition.notify_all()
+
+            if run:
+                if error is not None:
+                    item.future.set_exception(error)
+                else:
+                    item.future.set_result(result)
+            del item, result, error
+
+    def get_stats(self) -> Dict[str, ClassStats]:
+        """優先度クラスごとの統計を取得"""
+        with self._condition:
+            return {stats.name: stats for stats in self._stats.values()}
+
+    def utilization(self, name: str) -> float:
+        """優先度クラスごとのワーカー使用率（0〜1）"""
+        elapsed = time.perf_counter() - self._started_at
+        stats = self.get_stats()[name]
+        return stats.busy_seconds / (elapsed * self.max_workers) if elapsed > 0 else 0.0
+
+    def format_stats(self) -> str:
+        """統計を表示用の文字列に整形"""
+        lines = []
+        for name, stats in self.get_stats().items():
+            lines.append(
+                f"{name}: 完了 {stats.completed}件, 待機 {stats.queued}件, "
+                f"使用率 {self.utilization(name) * 100:.1f}%, "
+                f"待ち時間 平均 {stats.mean_wait_seconds * 1000:.1f} ms / "
+                f"p95 {stats.percentile_wait(0.95) * 1000:.1f} ms"
+            )
+        return "\n".join(lines)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """スケジューラーを終了"""
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for priority, _, item in self._queue:
+                    item.future.cancel()
+                    self._stats[priority].completed += 1
+                self._queue.clear()
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,425 @@
+"""
+状態を持たない画像処理
+
+読み込み・リサイズ・エンコードを、引数だけから結果を返す関数として提供する。
+引数の画像や設定は変更せず、設定は変更できないデータクラスのため、
+スレッドプール・プロセスプール・サーバーから同じ入力を共有して呼び出せる。
+ImageProcessorはこれらの関数に読み込んだ画像と編集履歴を持たせた薄いラッパー。
+"""
+
+import io
+import math
+import os
+from dataclasses import dataclass, replace
+from typing import BinaryIO, Callable, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+
+from .banded_resize import (
+    BANDED_LOAD_THRESHOLD,
+    FILTER_SUPPORT,
+    STREAMING_OUTPUT_THRESHOLD,
+    BandedImageReader,
+    iter_resized_bands,
+    open_banded_reader,
+    png_band_mode,
+    resize_banded,
+    write_png_bands,
+)
+from .color_profile import convert_to_srgb, get_srgb_profile_bytes
+from .edit_pipeline import (
+    FusedTransform,
+    Operation,
+    ResizeOp,
+    compose,
+    get_orientation,
+    plan_operations,
+    render,
+)
+from .format_selection import FormatSelection, prepare_for_format, select_smallest_format
+from .output_savings import OptionSavings, measure_option_savings
+from .quality import AutoQualityResult, find_auto_quality
+from .settings import AUTO_FORMAT, FORMAT_EXTENSIONS, CompressionSettings, ResizeSettings
+from utils.file_utils import open_atomic
+
+# メモリ上の画像データとして受け付ける型
+ImageBuffer = Union[bytes, bytearray, memoryview, BinaryIO]
+
+# processに渡せる入力（ファイルパス・画像データ・デコード済みの画像）
+ImageSource = Union[str, "os.PathLike[str]", ImageBuffer, Image.Image]
+
+# リサンプリング処理の型 (画像, 出力サイズ, リサンプリング方法) -> 画像
+Resampler = Callable[[Image.Image, Tuple[int, int], int], Image.Image]
+
+
+def open_image_eagerly(source: Union[str, BinaryIO]) -> Image.Image:
+    """画像を開いて即座にデコードし、ファイルハンドルを閉じる
+
+    Image.openは遅延読み込みのため、そのまま保持するとファイルが
+    ガベージコレクションまで開いたままになる。
+    """
+    with Image.open(source) as image:
+        image.load()
+        return image
+
+
+@dataclass(frozen=True)
+class LoadedImage:
+    """読み込んだ画像（巨大なTIFF/BMPはimageが縮小版で、画素はbanded_sourceから帯単位で読む）"""
+    image: Image.Image
+    banded_source: Optional[BandedImageReader] = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """元画像のサイズ"""
+        return (self.banded_source or self.image).size
+
+    @property
+    def info(self) -> dict:
+        """元画像の付加情報（ICCプロファイルなど）"""
+        return (self.banded_source or self.image).info
+
+
+@dataclass(frozen=True)
+class EncodeDetails:
+    """エンコードで選ばれた形式・品質"""
+    format_type: str
+    auto_quality: Optional[AutoQualityResult] = None
+    format_selection: Optional[FormatSelection] = None
+
+
+@dataclass(frozen=True)
+class ProcessResult:
+    """エンコード結果"""
+    data: bytes
+    size: Tuple[int, int]
+    format_type: str
+    auto_quality: Optional[AutoQualityResult] = None
+    format_selection: Optional[FormatSelection] = None
+
+    @property
+    def size_bytes(self) -> int:
+        """エンコード後のバイト数"""
+        return len(self.data)
+
+    def get_file_extension(self) -> str:
+        """出力した形式の拡張子"""
+        return FORMAT_EXTENSIONS[self.format_type]
+
+
+def _as_stream(source: ImageBuffer) -> BinaryIO:
+    """メモリ上の画像データをシーク可能なストリームにする"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if hasattr(source, "seekable") and source.seekable():
+        return source
+    # 標準入力などシークできないストリームは読み切る
+    return io.BytesIO(source.read())
+
+
+def load(source: ImageSource, banded_threshold: int = BANDED_LOAD_THRESHOLD) -> LoadedImage:
+    """画像を読み込む（デコード済みの画像はそのまま使う）"""
+    if isinstance(source, Image.Image):
+        return LoadedImage(source)
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            path = os.fspath(source)
+            reader = open_banded_reader(path)
+            if reader and reader.pixel_count >= banded_threshold:
+                return LoadedImage(reader.create_proxy(), reader)
+            return LoadedImage(open_image_eagerly(path))
+        # 呼び出し元がバッファを解放・クローズしても使えるようにデコードしておく
+        return LoadedImage(open_image_eagerly(_as_stream(source)))
+    except Exception as e:
+        raise ValueError(f"画像の読み込みに失敗しました: {str(e)}")
+
+
+def edited_size(source: Union[LoadedImage, Image.Image],
+                edits: Sequence[Operation] = ()) -> Tuple[int, int]:
+    """編集（切り抜き・回転など）を適用した後のサイズ"""
+    if isinstance(source, Image.Image):
+        source = LoadedImage(source)
+    if not edits:
+        return source.size
+    return plan_operations(list(edits), source.size, get_orientation(source.image)).size
+
+
+def fit_size(source_size: Tuple[int, int], target_size: Tuple[int, int],
+             maintain_ratio: bool) -> Tuple[int, int]:
+    """比率を考慮した出力サイズ（比率を保つ場合は指定した幅・高さに収める）"""
+    if not maintain_ratio:
+        return target_size
+    source_width, source_height = source_size
+    ratio = min(target_size[0] / source_width, target_size[1] / source_height)
+    return int(source_width * ratio), int(source_height * ratio)
+
+
+def output_size(source: Union[LoadedImage, Image.Image], resize_settings: ResizeSettings,
+                edits: Sequence[Operation] = ()) -> Tuple[int, int]:
+    """編集とリサイズを適用した出力サイズ"""
+    return fit_size(
+        edited_size(source, edits),
+        (resize_settings.width, resize_settings.height),
+        resize_settings.maintain_ratio,
+    )
+
+
+def requires_streaming(source: Union[LoadedImage, Image.Image], resize_settings: ResizeSettings,
+                       edits: Sequence[Operation] = ()) -> bool:
+    """出力が大きく、1枚の画像に組み立てずに帯ごとに書き出す必要があるか"""
+    if isinstance(source, Image.Image) or not source.banded_source:
+        return False
+    width, height = output_size(source, resize_settings, edits)
+    return width * height >= STREAMING_OUTPUT_THRESHOLD
+
+
+def _render_proxy(source: LoadedImage, edits: Sequence[Operation],
+                  size: Tuple[int, int], resample: int) -> Image.Image:
+    """帯単位で処理する画像の編集・リサイズ結果を縮小版から作る（プレビュー用）"""
+    operations = list(edits) + [ResizeOp(size)]
+    transform = plan_operations(operations, source.size, get_orientation(source.image))
+    proxy = source.image
+    width, height = source.size
+    scale = (proxy.width / width, 0.0, 0.0, 0.0, proxy.height / height, 0.0)
+    transform = replace(transform, matrix=compose(scale, transform.matrix))
+    return render(proxy, transform, resample)
+
+
+def _render_edits(source: LoadedImage, edits: Sequence[Operation],
+                  size: Tuple[int, int], resample: int) -> Image.Image:
+    """編集操作とリサイズをまとめて元画像に適用"""
+    operations = list(edits) + [ResizeOp(size)]
+    transform = plan_operations(operations, source.size, get_orientation(source.image))
+    if not source.banded_source:
+        return render(source.image, transform, resample)
+
+    # 巨大画像は出力が参照する範囲だけを、出力の解像度まで帯単位で縮小してから適用する
+    reader = source.banded_source
+    left, top, right, bottom = _source_region(transform, reader.size, resample)
+    ratio = min(1.0, 1 / min(transform.scale))
+    prescaled_size = (max(1, round((right - left) * ratio)),
+                      max(1, round((bottom - top) * ratio)))
+    prescaled = resize_banded(reader, prescaled_size, resample, box=(left, top, right, bottom))
+    prescaled.info = dict(reader.info)
+    scale_x = prescaled_size[0] / (right - left)
+    scale_y = prescaled_size[1] / (bottom - top)
+    scale = (scale_x, 0.0, -left * scale_x, 0.0, scale_y, -top * scale_y)
+    transform = replace(transform, matrix=compose(scale, transform.matrix))
+    return render(prescaled, transform, resample)
+
+
+def _source_region(transform: FusedTransform, source_size: Tuple[int, int],
+                   resample: int) -> Tuple[int, int, int, int]:
+    """出力が参照する元画像の範囲（フィルタのサポート幅の余白付き）"""
+    a, b, c, d, e, f = transform.matrix
+    width, height = transform.size
+    corners = [(a * x + b * y + c, d * x + e * y + f)
+               for x, y in ((0, 0), (width, 0), (0, height), (width, height))]
+    margin = math.ceil(FILTER_SUPPORT.get(resample, 3.0) * max(max(transform.scale), 1.0)) + 1
+    xs = [x for x, _ in corners]
+    ys = [y for _, y in corners]
+    return (
+        max(0, math.floor(min(xs)) - margin),
+        max(0, math.floor(min(ys)) - margin),
+        min(source_size[0], math.ceil(max(xs)) + margin),
+        min(source_size[1], math.ceil(max(ys)) + margin),
+    )
+
+
+def resize(source: Union[LoadedImage, Image.Image], resize_settings: ResizeSettings,
+           edits: Sequence[Operation] = (), resampler: Optional[Resampler] = None
+           ) -> Image.Image:
+    """編集を適用してリサイズした新しい画像を作る（元の画像は変更しない）"""
+    if isinstance(source, Image.Image):
+        source = LoadedImage(source)
+    size = output_size(source, resize_settings, edits)
+
+    resample_method = resize_settings.get_pil_resample_method()
+    if edits:
+        # 編集とリサイズを1回のリサンプリングで行う
+        resized_image = _render_edits(source, edits, size, resample_method)
+    elif source.banded_source:
+        # 巨大画像は元ファイルから帯単位でリサイズ
+        resized_image = resize_banded(source.banded_source, size, resample_method)
+    elif resampler:
+        resized_image = resampler(source.image, size, resample_method)
+    else:
+        resized_image = source.image.resize(size, resample_method)
+
+    if resize_settings.convert_to_srgb:
+        # 縮小後の少ない画素数で色変換する
+        resized_image = convert_to_srgb(resized_image, source.info.get("icc_profile"))
+    return resized_image
+
+
+def render_preview(source: Union[LoadedImage, Image.Image], resize_settings: ResizeSettings,
+                   preview_size: Tuple[int, int], edits: Sequence[Operation] = ()
+                   ) -> Tuple[Image.Image, Tuple[int, int]]:
+    """リサイズ結果のプレビューと出力サイズを取得
+
+    帯単位で処理する画像は出力の解像度まで元ファイルを読まず、縮小版から
+    プレビューの大きさで直接作る。
+    """
+    if isinstance(source, Image.Image):
+        source = LoadedImage(source)
+    if not source.banded_source:
+        resized = resize(source, resize_settings, edits)
+        try:
+            return create_preview(resized, preview_size), resized.size
+        finally:
+            resized.close()
+
+    size = output_size(source, resize_settings, edits)
+    ratio = min(1.0, preview_size[0] / size[0], preview_size[1] / size[1])
+    shown = (max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio)))
+    preview = _render_proxy(source, edits, shown, resize_settings.get_pil_resample_method())
+    if resize_settings.convert_to_srgb:
+        preview = convert_to_srgb(preview, source.info.get("icc_profile"))
+    return preview, size
+
+
+def create_preview(image: Image.Image, preview_size: Tuple[int, int]) -> Image.Image:
+    """プレビュー用に縮小した新しい画像を作る（元の画像は変更しない）"""
+    ratio = min(preview_size[0] / image.width, preview_size[1] / image.height)
+    if ratio >= 1:
+        return image.copy()
+    # thumbnailは画像全体をコピーしてから縮小するため、縮小した画像を直接作る
+    size = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+    return image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def write_image(image: Image.Image, stream: BinaryIO,
+                compression_settings: CompressionSettings) -> EncodeDetails:
+    """画像をエンコードしてストリームに書き込み、選ばれた形式・品質を返す"""
+    if compression_settings.is_auto_format():
+        selection = select_smallest_format(image, compression_settings)
+        stream.write(selection.chosen.data)
+        return EncodeDetails(selection.format_type, selection.chosen.auto_quality, selection)
+
+    save_kwargs = compression_settings.get_save_kwargs()
+    save_kwargs.update(compression_settings.get_metadata_kwargs(image))
+
+    if compression_settings.uses_auto_quality():
+        # 探索で得たエンコード結果をそのまま書き出す
+        result = find_auto_quality(
+            image,
+            compression_settings.format_type,
+            compression_settings.target_ssim,
+            save_kwargs
+        )
+        stream.write(result.data)
+        return EncodeDetails(compression_settings.format_type, result)
+
+    image.save(stream, format=compression_settings.format_type, **save_kwargs)
+    return EncodeDetails(compression_settings.format_type)
+
+
+def write_banded(source: LoadedImage, resize_settings: ResizeSettings,
+                 stream: BinaryIO, compression_settings: CompressionSettings,
+                 edits: Sequence[Operation] = ()) -> EncodeDetails:
+    """帯単位で処理する画像をリサイズしながら帯ごとにPNGとして書き出す
+
+    出力画像全体をメモリに持たないため、requires_streamingが真の場合に使う。
+    帯ごとに書き出せるのは編集なしのPNG出力だけで（形式の自動選択ではPNGになる）、
+    それ以外はValueErrorを送出する。
+    """
+    if not source.banded_source:
+        raise ValueError("帯単位で読み込んだ画像ではありません")
+    if compression_settings.format_type not in ("PNG", AUTO_FORMAT):
+        raise ValueError("大きすぎる出力はPNGでのみ帯ごとに書き出せます"
+                         f"（指定された形式: {compression_settings.format_type}）")
+    if edits:
+        raise ValueError("編集した画像は帯ごとに書き出せません。出力サイズを小さくしてください")
+
+    reader = source.banded_source
+    size = output_size(source, resize_settings)
+    icc_profile = source.info.get("icc_profile")
+    bands = iter_resized_bands(reader, size, resize_settings.get_pil_resample_method())
+    if resize_settings.convert_to_srgb and icc_profile:
+        bands = ((top, convert_to_srgb(band, icc_profile)) for top, band in bands)
+        icc_profile = get_srgb_profile_bytes()
+    if not compression_settings.keep_icc_profile:
+        icc_profile = None
+    write_png_bands(bands, size, png_band_mode(reader.mode), stream,
+                    icc_profile=icc_profile)
+    return EncodeDetails("PNG")
+
+
+def save_banded(source: LoadedImage, resize_settings: ResizeSettings,
+                compression_settings: CompressionSettings, file_path: str,
+                edits: Sequence[Operation] = ()) -> Tuple[str, EncodeDetails]:
+    """write_bandedでファイルに書き出し、(書き込んだパス, 形式) を返す
+
+    形式を自動選択する場合は拡張子をPNGのものに置き換える。
+    """
+    if compression_settings.is_auto_format():
+        file_path = os.path.splitext(file_path)[0] + FORMAT_EXTENSIONS["PNG"]
+    # 書きかけのファイルを残さず、書き終えてから置き換える
+    with open_atomic(file_path) as f:
+        details = write_banded(source, resize_settings, f, compression_settings, edits)
+    return file_path, details
+
+
+def encode(image: Image.Image, compression_settings: CompressionSettings) -> ProcessResult:
+    """画像をメモリ上でエンコード"""
+    buffer = io.BytesIO()
+    details = write_image(image, buffer, compression_settings)
+    return ProcessResult(
+        data=buffer.getvalue(),
+        size=image.size,
+        format_type=details.format_type,
+        auto_quality=details.auto_quality,
+        format_selection=details.format_selection,
+    )
+
+
+def save_result(result: ProcessResult, file_path: str,
+                replace_extension: bool = False) -> str:
+    """エンコード結果をファイルに書き込み、書き込んだパスを返す
+
+    replace_extensionを指定すると拡張子を出力した形式のものに置き換える。
+    """
+    if replace_extension:
+        file_path = os.path.splitext(file_path)[0] + result.get_file_extension()
+    # 書きかけのファイルを残さず、書き終えてから置き換える
+    with open_atomic(file_path) as f:
+        f.write(result.data)
+    return file_path
+
+
+def measure_savings(image: Image.Image, compression_settings: CompressionSettings,
+                    details: Union[EncodeDetails, ProcessResult]) -> List[OptionSavings]:
+    """出力オプションごとの削減バイト数を計測（自動選択した形式・品質はdetailsのものを使う）"""
+    if compression_settings.is_auto_format() and details.format_selection:
+        compression_settings = replace(
+            compression_settings, format_type=details.format_selection.format_type
+        )
+    if compression_settings.uses_auto_quality() and details.auto_quality:
+        compression_settings = replace(
+            compression_settings, quality=details.auto_quality.quality, auto_quality=False
+        )
+    image = prepare_for_format(image, compression_settings.format_type)
+    return measure_option_savings(image, compression_settings)
+
+
+def process(source: ImageSource, resize_settings: ResizeSettings,
+            compression_settings: CompressionSettings,
+            edits: Sequence[Operation] = (),
+            resampler: Optional[Resampler] = None) -> ProcessResult:
+    """画像を読み込み、編集・リサイズしてエンコードする
+
+    インスタンスの状態を使わないため、同じ入力・設定で複数のスレッドや
+    プロセスから同時に呼び出せる。デコード済みの画像を渡した場合はその画像を共有し、
+    変更も解放もしない。
+    """
+    loaded = load(source)
+    resized = None
+    try:
+        resized = resize(loaded, resize_settings, edits, resampler)
+        return encode(resized, compression_settings)
+    finally:
+        # この関数で開いた画像だけを解放する
+        if resized is not None and resized is not loaded.image:
+            resized.close()
+        if loaded.image is not source:
+            loaded.image.close()
@@ -0,0 +1,152 @@
+"""
+知覚品質に基づく自動品質選択
+
+輝度（Y）のSSIMをNumPyで計算し、目標値を下回らない範囲で
+最も低いJPEG/WEBP品質を探索する。
+"""
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# SSIMの定数（K1=0.01, K2=0.03, L=255）
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+# SSIMの窓サイズ
+SSIM_WINDOW_SIZE = 7
+
+# 自動品質で探索する品質の範囲
+AUTO_QUALITY_MIN = 10
+AUTO_QUALITY_MAX = 100
+
+
+@dataclass
+class AutoQualityResult:
+    """自動品質選択の結果"""
+    quality: int
+    ssim: float
+    size_bytes: int
+    data: bytes
+
+
+def _to_luma(image: Image.Image) -> np.ndarray:
+    """輝度チャンネルをfloat64配列として取得"""
+    if image.mode != "L":
+        image = image.convert("L")
+    return np.asarray(image, dtype=np.float64)
+
+
+def _box_filter(values: np.ndarray, size: int) -> np.ndarray:
+    """積分画像を用いた窓平均（validモード）"""
+    integral = np.cumsum(np.cumsum(values, axis=0), axis=1)
+    integral = np.pad(integral, ((1, 0), (1, 0)))
+    window_sum = (integral[size:, size:] - integral[:-size, size:]
+                  - integral[size:, :-size] + integral[:-size, :-size])
+    return window_sum / (size * size)
+
+
+def compute_ssim(reference: Image.Image, candidate: Image.Image,
+                 window_size: int = SSIM_WINDOW_SIZE) -> float:
+    """2つの画像の輝度SSIMを計算"""
+    if reference.size != candidate.size:
+        raise ValueError("比較する画像のサイズが一致しません")
+
+    x = _to_luma(reference)
+    y = _to_luma(candidate)
+    window_size = max(1, min(window_size, *x.shape))
+
+    mu_x = _box_filter(x, window_size)
+    mu_y = _box_filter(y, window_size)
+    sigma_xx = _box_filter(x * x, window_size) - mu_x * mu_x
+    sigma_yy = _box_filter(y * y, window_size) - mu_y * mu_y
+    sigma_xy = _box_filter(x * y, window_size) - mu_x * mu_y
+
+    numerator = (2 * mu_x * mu_y + _C1) * (2 * sigma_xy + _C2)
+    denominator = (mu_x ** 2 + mu_y ** 2 + _C1) * (sigma_xx + sigma_yy + _C2)
+    return float(np.mean(numerator / denominator))
+
+
+def encode_to_bytes(image: Image.Image, format_type: str, **save_kwargs) -> bytes:
+    """画像をメモリ上でエンコード"""
+    buffer = io.BytesIO()
+    image.save(buffer, format=format_type, **save_kwargs)
+    return buffer.getvalue()
+
+
+def _probe(image: Image.Image, format_type: str, quality: int,
+           save_kwargs: dict) -> Tuple[float, bytes]:
+    """指定品質でエンコード・デコードしてSSIMを測定"""
+    kwargs = dict(save_kwargs)
+    kwargs["quality"] = quality
+    data = encode_to_bytes(image, format_type, **kwargs)
+    with Image.open(io.BytesIO(data)) as decoded:
+        return compute_ssim(image, decoded), data
+
+
+def find_auto_quality(image: Image.Image, format_type: str, target_ssim: float,
+                      save_kwargs: Optional[dict] = None,
+                      min_quality: int = AUTO_QUALITY_MIN,
+                      max_quality: int = AUTO_QUALITY_MAX,
+                      max_workers: Optional[int] = None) -> AutoQualityResult:
+    """目標SSIMを満たす最も低い品質を探索
+
+    各ラウンドで未確定の区間をワーカー数+1等分する品質を並行してエンコードし、
+    区間を絞り込む（ワーカーが1つなら二分探索）。
+    目標に届かない場合は最大品質の結果を返す。
+    """
+    if format_type not in ("JPEG", "WEBP"):
+        raise ValueError(f"自動品質は{format_type}形式に対応していません")
+
+    save_kwargs = save_kwargs or {}
+    workers = max_workers or min(4, os.cpu_count() or 1)
+    results: Dict[int, Tuple[float, bytes]] = {}
+
+    low, high = min_quality, max_quality
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 最大品質は必ず評価し、到達不能な目標の判定に使う
+        results[high] = _probe(image, format_type, high, save_kwargs)
+        if results[high][0] < target_ssim:
+            ssim, data = results[high]
+            return AutoQualityResult(high, ssim, len(data), data)
+
+        # 不変条件: high は合格、low - 1 以下は不合格（または範囲外）
+        while low < high:
+            candidates = _spread(low, high, workers)
+            futures = {
+                quality: executor.submit(_probe, image, format_type, quality, save_kwargs)
+                for quality in candidates if quality not in results
+            }
+            for quality, future in futures.items():
+                results[quality] = future.result()
+
+            passed = [q for q in candidates if results[q][0] >= target_ssim]
+            failed = [q for q in candidates if results[q][0] < target_ssim]
+            if passed:
+                high = min(passed)
+            below = [q for q in failed if q < high]
+            if below:
+                low = max(below) + 1
+            elif not passed:
+                break
+
+    ssim, data = results[high]
+    return AutoQualityResult(high, ssim, len(data), data)
+
+
+def _spread(low: int, high: int, count: int) -> List[int]:
+    """未確定の品質 [low, high) から候補を選ぶ
+
+    low - 1（不合格）と high（合格）の間の開区間をcount+1等分する内側の点を選ぶため、
+    countが1なら中点になる。
+    """
+    if high - low <= count:
+        return list(range(low, high))
+    step = (high - low + 1) / (count + 1)
+    return sorted({min(high - 1, max(low, int(round(low - 1 + step * i))))
+                   for i in range(1, count + 1)})
@@ -1,19 +1,37 @@
 """
 アプリケーション設定管理モデル
+
+リサイズ設定・圧縮設定は変更できない（frozen）データクラスとし、ハッシュ可能で
+pickleも軽いため、スレッド・プロセス間でそのまま共有したりキャッシュのキーに使える。
+値を変える場合はdataclasses.replaceで新しいオブジェクトを作る。
 """
 
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Optional, Tuple
 from PIL import Image
 
+# EXIFの向き（Orientation）タグ
+EXIF_ORIENTATION_TAG = 0x0112
 
-@dataclass
+# JPEGのクロマサブサンプリングの選択肢
+SUBSAMPLING_OPTIONS = ["4:4:4", "4:2:2", "4:2:0"]
+
+# 候補の形式から最も小さい出力を自動で選ぶ形式指定
+AUTO_FORMAT = "AUTO"
+
+# 形式ごとの拡張子
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+
+@dataclass(frozen=True)
 class ResizeSettings:
     """リサイズ設定を管理するデータクラス"""
     width: int = 800
     height: int = 600
     maintain_ratio: bool = True
     method: str = "LANCZOS"
+    # 埋め込みICCプロファイルに従ってリサイズ後にsRGBへ変換する
+    convert_to_srgb: bool = True
     
     def get_pil_resample_method(self) -> int:
         """PIL用のリサンプリングメソッドを取得"""
@@ -26,16 +44,39 @@ class ResizeSettings:
         return method_map.get(self.method, Image.LANCZOS)
 
 
-@dataclass
+@dataclass(frozen=True)
 class CompressionSettings:
     """圧縮設定を管理するデータクラス"""
     format_type: str = "JPEG"
     quality: int = 85
+    # 自動品質: 目標SSIMを満たす最も低い品質を探索する（JPEG/WEBPのみ）
+    auto_quality: bool = False
+    target_ssim: float = 0.97
+    # JPEGの出力オプション（subsamplingがNoneの場合はエンコーダーの既定値）
+    progressive: bool = False
+    subsampling: Optional[str] = None
+    # WEBPをロスレスで保存する
+    lossless: bool = False
+    # メタデータは既定ですべて削除し、指定したものだけを残す
+    keep_icc_profile: bool = False
+    keep_exif_orientation: bool = False
+    # 形式の自動選択（format_typeがAUTOの場合）の候補と、非可逆形式に求める最低SSIM
+    auto_format_candidates: Tuple[str, ...] = ("JPEG", "WEBP", "PNG")
+    format_min_ssim: Optional[float] = None
+    
+    def __post_init__(self):
+        """ハッシュ可能にするため候補の形式をタプルにそろえる"""
+        if not isinstance(self.auto_format_candidates, tuple):
+            object.__setattr__(self, "auto_format_candidates",
+                               tuple(self.auto_format_candidates))
     
     def get_file_extension(self) -> str:
-        """ファイル拡張子を取得"""
-        format_ext = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
-        return format_ext.get(self.format_type, ".jpg")
+        """ファイル拡張子を取得（自動選択の場合は保存時に選ばれた形式に置き換わる）"""
+        return FORMAT_EXTENSIONS.get(self.format_type, ".jpg")
+    
+    def is_auto_format(self) -> bool:
+        """出力形式を自動で選択するかチェック"""
+        return self.format_type == AUTO_FORMAT
     
     def get_save_kwargs(self) -> dict:
         """保存時のキーワード引数を取得"""
@@ -46,8 +87,39 @@ class CompressionSettings:
             kwargs['optimize'] = True
         elif self.format_type == "PNG":
             kwargs['optimize'] = True
+        
+        if self.format_type == "JPEG":
+            if self.progressive:
+                kwargs['progressive'] = True
+            if self.subsampling:
+                if self.subsampling not in SUBSAMPLING_OPTIONS:
+                    raise ValueError(f"サポートされていないサブサンプリングです: {self.subsampling}")
+                kwargs['subsampling'] = self.subsampling
+        elif self.format_type == "WEBP" and self.lossless:
+            kwargs['lossless'] = True
             
         return kwargs
+    
+    def get_metadata_kwargs(self, image: Image.Image) -> dict:
+        """画像から残すメタデータの保存キーワード引数を取得"""
+        # PNGは指定しないと元のICCプロファイルを書き出すため明示的にNoneを渡す
+        kwargs = {'icc_profile': None}
+        if self.keep_icc_profile and image.info.get("icc_profile"):
+            kwargs['icc_profile'] = image.info["icc_profile"]
+        
+        if self.keep_exif_orientation:
+            orientation = image.getexif().get(EXIF_ORIENTATION_TAG)
+            if orientation and orientation != 1:
+                exif = Image.Exif()
+                exif[EXIF_ORIENTATION_TAG] = orientation
+                kwargs['exif'] = exif
+        return kwargs
+    
+    def uses_auto_quality(self) -> bool:
+        """自動品質を適用するかチェック"""
+        if self.format_type == "WEBP" and self.lossless:
+            return False
+        return self.auto_quality and self.format_type in ["JPEG", "WEBP"]
 
 
 @dataclass
@@ -56,6 +128,19 @@ class AppSettings:
     window_size: Tuple[int, int] = (800, 600)
     preview_size: Tuple[int, int] = (400, 300)
     
+    # UIの停止（ストール）とみなす応答遅延（ミリ秒）とログの出力先
+    ui_stall_threshold_ms: int = 200
+    ui_log_path: Optional[str] = None
+    
+    # 開いている画像の展開済みデータに使うメモリの上限（MB、Noneはメモリ上限から決定）
+    session_memory_budget_mb: Optional[int] = None
+    
+    # 起動時に用意するワーカープロセスの数（Noneは1コアを残した数）、
+    # 入れ替えまでに処理するジョブ数、ワーカーで読み込んでおく形式
+    worker_pool_size: Optional[int] = None
+    worker_max_jobs: int = 200
+    worker_preload_formats: Tuple[str, ...] = ("JPEG", "PNG", "WEBP")
+    
     # デフォルト設定
     resize_settings: ResizeSettings = None
     compression_settings: CompressionSettings = None
@@ -0,0 +1,200 @@
+"""
+共有メモリを使った画素データの受け渡し
+
+展開済みの画素を multiprocessing.shared_memory に置き、ワーカープロセスへは
+サイズ・モード・ストライドを持つ小さな記述子だけを渡す。受け取り側では
+Image.frombuffer で共有メモリを直接参照する画像を（コピーせずに）作成する。
+"""
+
+import os
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Iterator, Tuple
+
+from PIL import Image
+
+from .priority_scheduler import PRIORITY_INTERACTIVE
+
+# 共有できるモードと、共有メモリ上の画素形式（rawモード, 1画素のバイト数）
+# RGBはPillowの内部表現と同じく4バイト（RGBX）で保持する
+_SHARED_LAYOUTS = {
+    "L": ("L", 1),
+    "RGB": ("RGBX", 4),
+    "RGBA": ("RGBA", 4),
+    "CMYK": ("CMYK", 4),
+}
+
+# 共有メモリへ書き込む際の1回あたりのバイト数の目安
+_WRITE_BAND_BYTES = 16 * 1024 * 1024
+
+# ワーカープロセスでリサンプリングする画素数のしきい値（これより小さい画像は手元で処理）
+DEFAULT_OFFLOAD_THRESHOLD = 4 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SharedImageDescriptor:
+    """共有メモリ上の画像を表す記述子（プロセス間で受け渡す）"""
+    shm_name: str
+    size: Tuple[int, int]
+    mode: str
+    stride: int
+
+    @property
+    def raw_mode(self) -> str:
+        """共有メモリ上の画素形式"""
+        return _SHARED_LAYOUTS[self.mode][0]
+
+    @property
+    def nbytes(self) -> int:
+        """画素データのバイト数"""
+        return self.stride * self.size[1]
+
+
+def is_shareable_mode(mode: str) -> bool:
+    """変換せずに共有メモリに置けるモードか（画素がそのまま往復できるモードのみ）"""
+    return mode in _SHARED_LAYOUTS
+
+
+class SharedImage:
+    """共有メモリ上の画像を所有するクラス（close時に共有メモリを解放）"""
+
+    def __init__(self, size: Tuple[int, int], mode: str):
+        if mode not in _SHARED_LAYOUTS:
+            raise ValueError(f"共有メモリに置けないモードです: {mode}")
+        stride = size[0] * _SHARED_LAYOUTS[mode][1]
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, stride * size[1]))
+        self.descriptor = SharedImageDescriptor(
+            shm_name=self._shm.name, size=size, mode=mode, stride=stride
+        )
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "SharedImage":
+        """画像の画素を共有メモリにコピーして作成"""
+        shared = cls(image.size, image.mode)
+        shared.write(image)
+        return shared
+
+    def write(self, image: Image.Image):
+        """画像の画素を共有メモリに書き込む（一時コピーは帯単位に抑える）"""
+        write_shared_image(self._shm.buf, self.descriptor, image)
+
+    def to_image(self) -> Image.Image:
+        """共有メモリの内容をコピーした通常の画像を作成"""
+        with _frombuffer(self._shm.buf, self.descriptor) as view:
+            return _finish(view)
+
+    def close(self):
+        """共有メモリを解放"""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self) -> "SharedImage":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_shared_image(buffer: memoryview, descriptor: SharedImageDescriptor,
+                       image: Image.Image):
+    """画像の画素を記述子の形式で共有メモリに書き込む"""
+    if image.size != descriptor.size or image.mode != descriptor.mode:
+        raise ValueError("書き込む画像のサイズまたはモードが一致しません")
+    width, height = descriptor.size
+    rows = max(1, _WRITE_BAND_BYTES // max(1, descriptor.stride))
+    for top in range(0, height, rows):
+        bottom = min(height, top + rows)
+        data = image.crop((0, top, width, bottom)).tobytes("raw", descriptor.raw_mode)
+        buffer[top * descriptor.stride:bottom * descriptor.stride] = data
+
+
+@contextmanager
+def _frombuffer(buffer: memoryview, descriptor: SharedImageDescriptor) -> Iterator[Image.Image]:
+    """共有メモリを直接参照する画像を作成（ブロックを抜けたら使用不可）"""
+    view = Image.frombuffer(descriptor.raw_mode, descriptor.size, buffer,
+                            "raw", descriptor.raw_mode, descriptor.stride, 1)
+    try:
+        yield view
+    finally:
+        # 参照が残っていると共有メモリを閉じられないため明示的に解放する
+        view.close()
+        del view
+
+
+def _finish(image: Image.Image) -> Image.Image:
+    """共有メモリ上の形式（RGBX）から通常のモードの画像を作成"""
+    if image.mode == "RGBX":
+        return image.convert("RGB")
+    return image.copy()
+
+
+@contextmanager
+def attach_shared_image(descriptor: SharedImageDescriptor) -> Iterator[Image.Image]:
+    """記述子から共有メモリ上の画像をコピーせずに参照する
+
+    RGB画像はRGBXモードの画像として得られる。ブロックの外に画像を持ち出さないこと。
+    """
+    shm = shared_memory.SharedMemory(name=descriptor.shm_name)
+    try:
+        with _frombuffer(shm.buf, descriptor) as view:
+            yield view
+    finally:
+        shm.close()
+
+
+def resample_shared(source: SharedImageDescriptor, target: SharedImageDescriptor,
+                    resample: int = Image.LANCZOS):
+    """共有メモリ上の画像をリサンプリングして出力先の共有メモリに書き込む（ワーカーで実行）"""
+    with attach_shared_image(source) as image:
+        resized = image.resize(target.size, resample)
+    if resized.mode == "RGBX":
+        resized = resized.convert("RGB")
+    shm = shared_memory.SharedMemory(name=target.shm_name)
+    try:
+        write_shared_image(shm.buf, target, resized)
+    finally:
+        shm.close()
+
+
+class SharedMemoryResampler:
+    """ワーカープロセスで共有メモリ経由のリサンプリングを行う
+
+    ImageProcessorのresamplerとして使う。小さい画像は転送コストの方が
+    大きいため手元で処理する。共有メモリに置けないモード（P・I;16など）は
+    変換すると出力のモードやビット深度が変わるため、大きさによらず手元で処理する。
+    """
+
+    def __init__(self, executor: Executor,
+                 offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD):
+        self.executor = executor
+        self.offload_threshold = offload_threshold
+
+    def __call__(self, image: Image.Image, size: Tuple[int, int],
+                 resample: int = Image.LANCZOS) -> Image.Image:
+        """画像をリサンプリング"""
+        if (image.width * image.height < self.offload_threshold
+                or not is_shareable_mode(image.mode)):
+            return image.resize(size, resample)
+
+        with SharedImage.from_image(image) as source, \
+                SharedImage(size, image.mode) as target:
+            # 待っている一括処理のジョブより先にワーカーへ渡す
+            submit_with_priority = getattr(self.executor, "submit_with_priority", None)
+            args = (resample_shared, source.descriptor, target.descriptor, resample)
+            if submit_with_priority is not None:
+                future = submit_with_priority(PRIORITY_INTERACTIVE, *args)
+            else:
+                future = self.executor.submit(*args)
+            future.result()
+            resized = target.to_image()
+        resized.info = dict(image.info)
+        return resized
+
+
+def default_resample_workers() -> int:
+    """リサンプリング用ワーカープロセスの数（GUIのプロセスに1コア残す）"""
+    return max(1, (os.cpu_count() or 2) - 1)
@@ -0,0 +1,321 @@
+"""
+拡大表示用のタイルピラミッド
+
+表示倍率ごとに画面上の固定サイズのタイルを作り、表示範囲のタイルだけを描画する。
+縮小表示では画像全体を縮小した段（1/2, 1/4, ...）をキャッシュして使い、
+それより細かい段では元画像の該当範囲だけを直接リサンプリングする。
+画像全体の変換（モード変換・PhotoImage化）は行わない。
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from .priority_scheduler import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+
+# 画面上のタイルの大きさ（px）
+DEFAULT_TILE_SIZE = 256
+
+# 縮小した段をキャッシュする画素数の上限（これより大きい段は元画像から直接作る）
+DEFAULT_MAX_LEVEL_PIXELS = 4 * 1024 * 1024
+
+# タイルのキャッシュの上限（バイト）
+DEFAULT_TILE_CACHE_BYTES = 64 * 1024 * 1024
+
+# 表示倍率の刻み（1段で2の1/4乗倍）と上限
+ZOOM_STEPS_PER_OCTAVE = 4
+MAX_ZOOM_STEP = 4 * ZOOM_STEPS_PER_OCTAVE
+
+# 画像の外側の背景色
+BACKGROUND_COLOR = (128, 128, 128)
+
+# タイルのキー (倍率の段, 列, 行)
+TileKey = Tuple[int, int, int]
+
+
+def zoom_for_step(step: int) -> float:
+    """倍率の段から表示倍率を取得（0で等倍）"""
+    return 2.0 ** (step / ZOOM_STEPS_PER_OCTAVE)
+
+
+def step_for_zoom(zoom: float) -> int:
+    """表示倍率以下で最も近い倍率の段を取得"""
+    return math.floor(math.log2(zoom) * ZOOM_STEPS_PER_OCTAVE + 1e-9)
+
+
+@dataclass
+class Viewport:
+    """表示範囲（x, yは拡大後の画像上での表示範囲の左上）"""
+    image_size: Tuple[int, int]
+    width: int
+    height: int
+    zoom_step: int = 0
+    x: float = 0.0
+    y: float = 0.0
+
+    @property
+    def zoom(self) -> float:
+        """表示倍率"""
+        return zoom_for_step(self.zoom_step)
+
+    @property
+    def min_zoom_step(self) -> int:
+        """全体が収まる倍率の段（等倍より大きくはしない）"""
+        ratio = min(self.width / self.image_size[0], self.height / self.image_size[1])
+        return min(0, step_for_zoom(max(ratio, 1e-6)))
+
+    def display_size(self) -> Tuple[int, int]:
+        """拡大後の画像のサイズ"""
+        zoom = self.zoom
+        return (max(1, math.ceil(self.image_size[0] * zoom)),
+                max(1, math.ceil(self.image_size[1] * zoom)))
+
+    def resize(self, width: int, height: int):
+        """表示領域の大きさを変更"""
+        self.width = max(1, width)
+        self.height = max(1, height)
+        self.clamp()
+
+    def clamp(self):
+        """画像の外にはみ出さないよう表示範囲を補正（画像が小さい場合は中央に置く）"""
+        display_width, display_height = self.display_size()
+        if display_width <= self.width:
+            self.x = (display_width - self.width) / 2
+        else:
+            self.x = min(max(self.x, 0.0), display_width - self.width)
+        if display_height <= self.height:
+            self.y = (display_height - self.height) / 2
+        else:
+            self.y = min(max(self.y, 0.0), display_height - self.height)
+
+    def pan(self, dx: float, dy: float):
+        """表示範囲を移動"""
+        self.x += dx
+        self.y += dy
+        self.clamp()
+
+    def set_zoom_step(self, step: int, anchor: Optional[Tuple[float, float]] = None):
+        """倍率を変更（anchorの画面上の点が指す画像上の位置を保つ）"""
+        step = min(max(step, self.min_zoom_step), MAX_ZOOM_STEP)
+        ax, ay = anchor if anchor is not None else (self.width / 2, self.height / 2)
+        ratio = zoom_for_step(step) / self.zoom
+        self.x = (self.x + ax) * ratio - ax
+        self.y = (self.y + ay) * ratio - ay
+        self.zoom_step = step
+        self.clamp()
+
+    def fit(self):
+        """全体が収まる倍率にする"""
+        self.zoom_step = self.min_zoom_step
+        self.clamp()
+
+    def grid_size(self, tile_size: int) -> Tuple[int, int]:
+        """現在の倍率でのタイルの列数・行数"""
+        display_width, display_height = self.display_size()
+        return math.ceil(display_width / tile_size), math.ceil(display_height / tile_size)
+
+    def visible_tiles(self, tile_size: int, margin: int = 0) -> List[TileKey]:
+        """表示範囲にかかるタイル（marginで周囲のタイルも含める）"""
+        columns, rows = self.grid_size(tile_size)
+        first_col = max(0, math.floor(self.x / tile_size) - margin)
+        first_row = max(0, math.floor(self.y / tile_size) - margin)
+        last_col = min(columns - 1, math.floor((self.x + self.width - 1) / tile_size) + margin)
+        last_row = min(rows - 1, math.floor((self.y + self.height - 1) / tile_size) + margin)
+        return [(self.zoom_step, col, row)
+                for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+    def adjacent_tiles(self, tile_size: int, margin: int = 1) -> List[TileKey]:
+        """表示範囲のすぐ外側のタイル（先読みの対象）"""
+        visible = set(self.visible_tiles(tile_size))
+        return [key for key in self.visible_tiles(tile_size, margin) if key not in visible]
+
+
+class TilePyramid:
+    """画像から表示倍率ごとのタイルを作るクラス（複数のスレッドから呼べる）"""
+
+    def __init__(self, image: Image.Image, tile_size: int = DEFAULT_TILE_SIZE,
+                 max_level_pixels: int = DEFAULT_MAX_LEVEL_PIXELS):
+        self.image = image
+        self.tile_size = tile_size
+        self.max_level_pixels = max_level_pixels
+        # 段 -> 縮小した画像（1/2^段）
+        self._levels: Dict[int, Image.Image] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """元画像のサイズ"""
+        return self.image.size
+
+    def level_for_zoom(self, zoom: float) -> int:
+        """表示倍率に使う段（表示倍率以上の解像度を持つ最も粗い段）"""
+        if zoom >= 1:
+            return 0
+        return max(0, math.floor(math.log2(1 / zoom) + 1e-9))
+
+    def _level_source(self, level: int) -> Tuple[Image.Image, float]:
+        """段の描画に使う画像と、元画像に対するその画像の縮尺"""
+        width, height = self.image.size
+        factor = 2 ** level
+        if level == 0 or (width // factor) * (height // factor) > self.max_level_pixels:
+            # 細かい段は元画像の該当範囲を直接リサンプリングする
+            return self.image, 1.0
+        with self._lock:
+            cached = self._levels.get(level)
+            if cached is None:
+                # 一つ細かい段がキャッシュ済みならそこから作る
+                finer = self._levels.get(level - 1)
+                try:
+                    cached = finer.reduce(2) if finer is not None else self.image.reduce(factor)
+                except ValueError:
+                    # パレット画像などreduceできないモードは元画像から直接作る
+                    return self.image, 1.0
+                self._levels[level] = cached
+        return cached, cached.width / width
+
+    @property
+    def cached_levels(self) -> List[int]:
+        """キャッシュ済みの段"""
+        with self._lock:
+            return sorted(self._levels)
+
+    def render_tile(self, key: TileKey) -> Image.Image:
+        """タイルを描画（常にtile_size四方のRGB画像、画像の外側は背景色）"""
+        zoom_step, col, row = key
+        zoom = zoom_for_step(zoom_step)
+        size = self.tile_size
+        width, height = self.image.size
+        # タイルが表示する元画像上の範囲（画像の外側は切り詰める）
+        left = col * size / zoom
+        top = row * size / zoom
+        right = min(width, (col + 1) * size / zoom)
+        bottom = min(height, (row + 1) * size / zoom)
+        tile = Image.new("RGB", (size, size), BACKGROUND_COLOR)
+        if left >= right or top >= bottom:
+            return tile
+
+        source, scale = self._level_source(self.level_for_zoom(zoom))
+        output_size = (max(1, min(size, round((right - left) * zoom))),
+                       max(1, min(size, round((bottom - top) * zoom))))
+        # 拡大時は画素を確認できるよう補間しない
+        resample = Image.NEAREST if zoom >= 1 else Image.BOX
+        box = (left * scale, top * scale,
+               min(source.width, right * scale), min(source.height, bottom * scale))
+        region = source.resize(output_size, resample, box=box)
+
+        # モード変換はタイルの大きさでだけ行う
+        if region.mode in ("RGBA", "LA", "PA") or "transparency" in region.info:
+            region = region.convert("RGBA")
+            tile.paste(region, (0, 0), region)
+        else:
+            tile.paste(region.convert("RGB") if region.mode != "RGB" else region, (0, 0))
+        return tile
+
+
+def _submit(executor: Executor, priority: int, fn: Callable, *args):
+    """優先度付きのExecutorであれば優先度を指定して投入"""
+    submit_with_priority = getattr(executor, "submit_with_priority", None)
+    if submit_with_priority is not None:
+        return submit_with_priority(priority, fn, *args)
+    return executor.submit(fn, *args)
+
+
+class TileCache:
+    """描画済みタイルのキャッシュ（最近使っていないものから捨てる）
+
+    requestで表示範囲のタイルを対話的な優先度で、周囲のタイルを先読みの優先度で
+    バックグラウンドに描画させる。描画が終わるとon_readyがワーカーのスレッドから呼ばれる。
+    """
+
+    def __init__(self, pyramid: TilePyramid, executor: Executor,
+                 max_bytes: int = DEFAULT_TILE_CACHE_BYTES,
+                 on_ready: Optional[Callable[[TileKey], None]] = None):
+        self.pyramid = pyramid
+        self.executor = executor
+        self.max_bytes = max_bytes
+        self.on_ready = on_ready
+        self._tiles: "OrderedDict[TileKey, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._pending: Set[TileKey] = set()
+        # 直近に要求されたタイル（表示範囲から外れた先読みは描画しない）
+        self._wanted: Set[TileKey] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.rendered = 0
+
+    def get(self, key: TileKey) -> Optional[Image.Image]:
+        """描画済みのタイルを取得（未描画の場合はNone）"""
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def request(self, visible: List[TileKey], prefetch: List[TileKey] = ()):
+        """未描画のタイルの描画を依頼（以前の依頼で不要になったものは取り消す）"""
+        jobs = []
+        with self._lock:
+            if self._closed:
+                return
+            self._wanted = set(visible) | set(prefetch)
+            for priority, keys in ((PRIORITY_INTERACTIVE, visible),
+                                   (PRIORITY_PREFETCH, prefetch)):
+                for key in keys:
+                    if key in self._tiles or key in self._pending:
+                        continue
+                    self._pending.add(key)
+                    jobs.append((priority, key))
+        for priority, key in jobs:
+            _submit(self.executor, priority, self._render, key)
+
+    def _render(self, key: TileKey):
+        """タイルを描画してキャッシュに入れる（ワーカーで実行）"""
+        try:
+            with self._lock:
+                if self._closed or key not in self._wanted:
+                    return
+            tile = self.pyramid.render_tile(key)
+            with self._lock:
+                if self._closed:
+                    return
+                self._store(key, tile)
+                self.rendered += 1
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+        if self.on_ready is not None:
+            self.on_ready(key)
+
+    def _store(self, key: TileKey, tile: Image.Image):
+        """タイルを追加し、上限を超えた分を古いものから捨てる"""
+        tile_bytes = tile.width * tile.height * len(tile.getbands())
+        self._tiles[key] = tile
+        self._bytes += tile_bytes
+        while self._bytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self._bytes -= evicted.width * evicted.height * len(evicted.getbands())
+
+    @property
+    def cached_bytes(self) -> int:
+        """キャッシュしているタイルの合計バイト数"""
+        with self._lock:
+            return self._bytes
+
+    def close(self):
+        """キャッシュを破棄（描画待ちのタイルは描画しない）"""
+        with self._lock:
+            self._closed = True
+            self._wanted = set()
+            self._tiles.clear()
+            self._bytes = 0
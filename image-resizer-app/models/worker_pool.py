@@ -0,0 +1,417 @@
+"""
+起動済みのワーカープロセスを使い回すプール
+
+アプリの起動直後にバックグラウンドでワーカープロセスを起動し、Pillowと必要な
+コーデックのプラグインだけを読み込んでおく。最初の書き出しでプロセスの起動と
+プラグインの登録を待たずに済むようにする。
+
+- 各ワーカーは担当のスレッドがパイプで1ジョブずつ受け渡す
+- 待機中のワーカーには定期的に応答を確認し、応答しない・終了したワーカーは起動し直す
+- メモリの増加を抑えるため、一定数のジョブを処理したワーカーは新しいプロセスに入れ替える
+- 待っているジョブは優先度の順に渡し、プレビューのリサンプリングが一括処理の後ろで待たないようにする
+"""
+
+import importlib
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .priority_scheduler import PRIORITY_EXPORT, PRIORITY_NAMES
+
+# 形式ごとのPillowのプラグインモジュール
+CODEC_PLUGINS = {
+    "JPEG": "JpegImagePlugin",
+    "PNG": "PngImagePlugin",
+    "WEBP": "WebPImagePlugin",
+    "TIFF": "TiffImagePlugin",
+    "BMP": "BmpImagePlugin",
+    "GIF": "GifImagePlugin",
+}
+
+# デフォルトで読み込んでおく形式（アプリが出力する形式）
+DEFAULT_PRELOAD_FORMATS = ("JPEG", "PNG", "WEBP")
+
+# ワーカーを入れ替えるまでに処理するジョブ数のデフォルト
+DEFAULT_MAX_JOBS_PER_WORKER = 200
+
+# 待機中のワーカーの応答を確認する間隔（秒）
+DEFAULT_HEALTH_CHECK_INTERVAL = 10.0
+
+# ワーカーの起動（プラグインの読み込み）を待つ時間と、続けて失敗したら諦める回数
+STARTUP_TIMEOUT = 60.0
+MAX_SPAWN_ATTEMPTS = 3
+
+# ワーカーとの間で使うメッセージ
+_READY = "ready"
+_PING = "ping"
+_PONG = "pong"
+_STOP = None
+
+# 終了の指示はどの優先度のジョブよりも後に取り出す
+_STOP_PRIORITY = max(PRIORITY_NAMES) + 1
+
+
+def preload_codecs(formats: Sequence[str]):
+    """指定した形式のプラグインを読み込み、エンコーダーのライブラリも初期化する
+
+    Image.init()は全プラグインを読み込むため呼ばない。このビルドで使えない形式は飛ばす
+    （その形式のジョブは実行時にエラーになる）。
+    """
+    from PIL import Image
+
+    for format_type in formats:
+        try:
+            importlib.import_module(f"PIL.{CODEC_PLUGINS[format_type]}")
+            # 共有ライブラリ（libjpeg・libwebpなど）の読み込みを済ませておく
+            Image.new("RGB", (8, 8)).save(io.BytesIO(), format_type)
+        except (ImportError, OSError, KeyError):
+            continue
+
+
+def _worker_main(connection, formats: Sequence[str]):
+    """ワーカープロセスの処理（ジョブを受け取って実行し、結果を返す）"""
+    preload_codecs(formats)
+    connection.send(_READY)
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            return
+        if message is _STOP:
+            return
+        if message == _PING:
+            connection.send(_PONG)
+            continue
+        fn, args, kwargs = message
+        try:
+            reply = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            connection.send(reply)
+        except Exception as e:
+            # 結果や例外を送れない（pickleできない）場合は文字列にして返す
+            connection.send((False, RuntimeError(f"結果を返せませんでした: {e!r}")))
+
+
+@dataclass
+class WorkerPoolStats:
+    """プールの統計"""
+    # 起動したワーカープロセスの数（入れ替え・再起動を含む）
+    started: int = 0
+    # 処理したジョブ数で入れ替えた回数
+    recycled: int = 0
+    # 異常終了・無応答で起動し直した回数
+    restarted: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+class _Worker:
+    """1つのワーカープロセスとの接続"""
+
+    def __init__(self, context, formats: Sequence[str]):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, tuple(formats)),
+                                       name="warm-worker", daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def wait_ready(self, timeout: Optional[float]) -> bool:
+        """プラグインの読み込みが終わるまで待つ"""
+        return self._receive(timeout) == _READY
+
+    def _receive(self, timeout: Optional[float]):
+        """メッセージを受け取る（タイムアウト・異常終了の場合はNone）"""
+        try:
+            if not self.connection.poll(timeout):
+                return None
+            return self.connection.recv()
+        except (EOFError, OSError):
+            return None
+
+    def is_healthy(self, timeout: float) -> bool:
+        """応答を確認"""
+        if not self.process.is_alive():
+            return False
+        try:
+            self.connection.send(_PING)
+        except (OSError, ValueError):
+            return False
+        return self._receive(timeout) == _PONG
+
+    def run(self, fn: Callable, args: tuple, kwargs: dict):
+        """ジョブを実行して (成功したか, 結果または例外) を返す
+
+        実行中にプロセスが終了した場合はRuntimeErrorを送出する。
+        """
+        self.jobs += 1
+        self.connection.send((fn, args, kwargs))
+        while True:
+            try:
+                if self.connection.poll(0.5):
+                    return self.connection.recv()
+            except (EOFError, OSError):
+                pass
+            if not self.process.is_alive():
+                # 終了直前に送られた結果が残っていないか確認してから失敗とする
+                try:
+                    if self.connection.poll(0):
+                        return self.connection.recv()
+                except (EOFError, OSError):
+                    pass
+                raise RuntimeError(
+                    f"ワーカープロセスが異常終了しました（終了コード {self.process.exitcode}）"
+                )
+
+    def stop(self, timeout: float = 5.0):
+        """ワーカーを終了"""
+        try:
+            self.connection.send(_STOP)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class _Job:
+    """キューに積まれたジョブ"""
+
+    def __init__(self, future: Future, fn: Callable, args: tuple, kwargs: dict):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+
+class WarmWorkerPool(Executor):
+    """起動済みのワーカープロセスを使い回すExecutor
+
+    startはワーカーの起動をバックグラウンドで始めてすぐに戻る。
+    起動前にsubmitされたジョブは起動を待って実行する。
+    待っているジョブは優先度（PrioritySchedulerと同じ値）の順、同じ優先度では投入順に実行する。
+    ジョブの関数・引数・結果はpickleできる必要がある。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 max_jobs_per_worker: int = DEFAULT_MAX_JOBS_PER_WORKER,
+                 formats: Sequence[str] = DEFAULT_PRELOAD_FORMATS,
+                 health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+                 health_check_timeout: float = 5.0,
+                 mp_context=None):
+        unknown = [format_type for format_type in formats if format_type not in CODEC_PLUGINS]
+        if unknown:
+            raise ValueError(f"読み込めない形式が指定されました: {', '.join(unknown)}")
+        if max_jobs_per_worker < 1:
+            raise ValueError("入れ替えまでのジョブ数は1以上で指定してください")
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.formats = tuple(formats)
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        # Tkのプロセスはforkしない
+        self._context = mp_context or multiprocessing.get_context("spawn")
+        # (優先度, 投入順, ジョブ) を優先度の順に取り出す
+        self._jobs: "queue.PriorityQueue[Tuple[int, int, Optional[_Job]]]" = \
+            queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads: List[threading.Thread] = []
+        # 担当スレッドの番号 -> 現在のワーカー
+        self._workers: Dict[int, _Worker] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Semaphore(0)
+        self._shutdown = False
+        # ワーカーを起動できている担当スレッドの数と、すべて失敗した場合の理由
+        self._alive_slots = 0
+        self._broken: Optional[str] = None
+        self.stats = WorkerPoolStats()
+
+    def start(self):
+        """ワーカーの起動をバックグラウンドで開始（起動済みの場合は何もしない）"""
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("ワーカープールは終了しています")
+            if self._threads:
+                return
+            self._alive_slots = self.max_workers
+            for index in range(self.max_workers):
+                thread = threading.Thread(target=self._slot_loop, args=(index,),
+                                          name=f"warm-worker-slot-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """すべての担当スレッドでワーカーの起動（プラグインの読み込み）が終わるまで待つ"""
+        acquired = 0
+        for _ in range(self.max_workers):
+            if not self._ready.acquire(timeout=timeout):
+                break
+            acquired += 1
+        for _ in range(acquired):
+            self._ready.release()
+        return acquired == self.max_workers
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """書き出しの優先度でジョブを投入"""
+        return self.submit_with_priority(PRIORITY_EXPORT, fn, *args, **kwargs)
+
+    def submit_with_priority(self, priority: int, fn: Callable, *args, **kwargs) -> Future:
+        """優先度を指定してジョブを投入"""
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"不明な優先度です: {priority}")
+        future: Future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("ワーカープールは終了しています")
+            if self._broken:
+                raise RuntimeError(f"ワーカープールを使えません: {self._broken}")
+            self._put(priority, _Job(future, fn, args, kwargs))
+        self.start()
+        return future
+
+    def _put(self, priority: int, job: Optional[_Job]):
+        """ジョブをキューに積む"""
+        self._jobs.put((priority, next(self._sequence), job))
+
+    def _spawn(self, index: int) -> _Worker:
+        """ワーカーを起動し、プラグインの読み込みが終わるまで待つ
+
+        続けて起動に失敗した場合はRuntimeErrorを送出する。
+        """
+        for _ in range(MAX_SPAWN_ATTEMPTS):
+            worker = _Worker(self._context, self.formats)
+            with self._lock:
+                self.stats.started += 1
+            if worker.wait_ready(STARTUP_TIMEOUT):
+                with self._lock:
+                    self._workers[index] = worker
+                return worker
+            worker.stop()
+        raise RuntimeError("ワーカープロセスを起動できませんでした")
+
+    def _slot_loop(self, index: int):
+        """1つのワーカーを担当してジョブを渡す（担当スレッド）"""
+        try:
+            worker = self._spawn(index)
+        except RuntimeError as e:
+            self._slot_failed(e)
+            return
+        finally:
+            self._ready.release()
+        try:
+            self._serve(index, worker)
+        except RuntimeError as e:
+            # 入れ替え後のワーカーを起動できなかった
+            self._slot_failed(e)
+
+    def _serve(self, index: int, worker: _Worker):
+        """キューのジョブを担当のワーカーで順に実行"""
+        try:
+            while True:
+                try:
+                    _, _, job = self._jobs.get(timeout=self.health_check_interval)
+                except queue.Empty:
+                    if not worker.is_healthy(self.health_check_timeout):
+                        worker = self._replace(index, worker, restarted=True)
+                    continue
+                if job is _STOP:
+                    return
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                if not worker.process.is_alive():
+                    worker = self._replace(index, worker, restarted=True)
+                self._run_job(worker, job)
+                if not worker.process.is_alive():
+                    worker = self._replace(index, worker, restarted=True)
+                elif worker.jobs >= self.max_jobs_per_worker:
+                    worker = self._replace(index, worker, restarted=False)
+        finally:
+            with self._lock:
+                worker = self._workers.pop(index, worker)
+            worker.stop()
+
+    def _slot_failed(self, error: Exception):
+        """担当スレッドがワーカーを起動できなくなった
+
+        すべての担当スレッドが失敗した場合は、待っているジョブを失敗させる。
+        """
+        with self._lock:
+            self._alive_slots -= 1
+            if self._alive_slots > 0 or self._shutdown:
+                return
+            self._broken = str(error)
+            while True:
+                try:
+                    _, _, job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not _STOP and job.future.set_running_or_notify_cancel():
+                    job.future.set_exception(RuntimeError(str(error)))
+
+    def _run_job(self, worker: _Worker, job: _Job):
+        """ジョブを実行して結果をFutureに設定"""
+        try:
+            succeeded, value = worker.run(job.fn, job.args, job.kwargs)
+        except Exception as e:
+            succeeded, value = False, e
+        with self._lock:
+            if succeeded:
+                self.stats.completed += 1
+            else:
+                self.stats.failed += 1
+        if succeeded:
+            job.future.set_result(value)
+        else:
+            job.future.set_exception(value)
+
+    def _replace(self, index: int, worker: _Worker, restarted: bool) -> _Worker:
+        """ワーカーを新しいプロセスに入れ替える"""
+        worker.stop()
+        with self._lock:
+            if restarted:
+                self.stats.restarted += 1
+            else:
+                self.stats.recycled += 1
+        return self._spawn(index)
+
+    def worker_pids(self) -> List[int]:
+        """起動中のワーカーのプロセスID（テスト・診断用）"""
+        with self._lock:
+            return [worker.process.pid for worker in self._workers.values()]
+
+    def format_status(self) -> str:
+        """表示用の状態の文字列"""
+        with self._lock:
+            stats = self.stats
+            return (f"ワーカー: {self.max_workers}プロセス（起動 {stats.started}回、"
+                    f"入れ替え {stats.recycled}回、再起動 {stats.restarted}回）/ "
+                    f"完了 {stats.completed}件 / 失敗 {stats.failed}件")
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """プールを終了（ワーカープロセスも終了する）"""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        _, _, job = self._jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    job.future.cancel()
+            for _ in self._threads:
+                self._put(_STOP_PRIORITY, _STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+リサイズサーバーの負荷テストスクリプト
+
+使い方:
+    python cli.py serve ./photos --port 8080
+    python scripts/load_test.py --src photo.jpg --requests 500 --concurrency 32
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from urllib.parse import urlencode
+
+
+def build_urls(base_url: str, sources: List[str], widths: List[int],
+               format_type: str, total: int) -> List[str]:
+    """リクエストするURLの一覧を作成（バリアントを巡回）"""
+    variants = [
+        f"{base_url}/resize?" + urlencode({"src": src, "w": width, "fmt": format_type})
+        for src in sources for width in widths
+    ]
+    return [variants[i % len(variants)] for i in range(total)]
+
+
+def fetch(url: str, timeout: float) -> Tuple[int, float, int]:
+    """1リクエストを実行して (ステータス, 秒, バイト数) を返す"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = response.read()
+            return response.status, time.perf_counter() - start, len(body)
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - start, 0
+    except Exception:
+        return 0, time.perf_counter() - start, 0
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """パーセンタイルを計算"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(ratio * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="リサイズサーバーの負荷テスト")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="サーバーのURL")
+    parser.add_argument("--src", action="append", required=True,
+                        help="ルートディレクトリからの画像パス（複数指定可）")
+    parser.add_argument("--widths", default="320,640,1280", help="リクエストする幅（カンマ区切り）")
+    parser.add_argument("--format", dest="format_type", default="webp", help="出力形式")
+    parser.add_argument("--requests", type=int, default=200, help="総リクエスト数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時接続数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="タイムアウト（秒）")
+    args = parser.parse_args()
+
+    widths = [int(width) for width in args.widths.split(",")]
+    urls = build_urls(args.url.rstrip("/"), args.src, widths, args.format_type, args.requests)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda url: fetch(url, args.timeout), urls))
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [seconds * 1000 for _, seconds, _ in results]
+    total_bytes = sum(size for _, _, size in results)
+
+    print(f"リクエスト数: {len(results)}（同時接続 {args.concurrency}）")
+    print(f"経過時間: {elapsed:.2f} 秒 / スループット: {len(results) / elapsed:.1f} req/s")
+    print(f"転送量: {total_bytes / (1024 * 1024):.2f} MB")
+    print("ステータス: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+    print(f"レイテンシ(ms): 平均 {statistics.mean(latencies):.1f}, "
+          f"p50 {percentile(latencies, 0.5):.1f}, p95 {percentile(latencies, 0.95):.1f}, "
+          f"p99 {percentile(latencies, 0.99):.1f}, 最大 {max(latencies):.1f}")
+
+    try:
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/stats", timeout=args.timeout) as response:
+            print("サーバー統計: " + json.dumps(json.loads(response.read()), ensure_ascii=False))
+    except Exception:
+        pass
+
+    return 0 if statuses.get(200, 0) == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
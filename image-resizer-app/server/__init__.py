@@ -0,0 +1,3 @@
+"""
+画像リサイズ・圧縮アプリのサーバーパッケージ
+"""
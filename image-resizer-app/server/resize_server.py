@@ -0,0 +1,395 @@
+"""
+オンデマンドのリサイズHTTPサーバー（asyncio）
+
+`/resize?src=...&w=...&h=...&fmt=webp&q=80` のリクエストに対して、
+models.processingの状態を持たない関数でリサイズ・圧縮した画像を返す。CPU処理はプロセスプールで実行し、
+同時レンダリング数を制限する。結果はメモリとディスクにキャッシュし、
+ETagによる条件付きGETと、同一リクエストの同時実行の集約に対応する。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from models.processing import encode, load, resize
+from models.settings import AppSettings, CompressionSettings, ResizeSettings
+from utils.file_utils import is_supported_image_file
+from .variant_cache import DEFAULT_MEMORY_LIMIT, VariantCache
+
+# 出力サイズの上限（画素）
+MAX_DIMENSION = 10000
+
+# リクエストヘッダーの上限
+MAX_HEADER_LINES = 100
+
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+STATUS_TEXT = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class RequestError(Exception):
+    """HTTPステータス付きのリクエストエラー"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True)
+class VariantRequest:
+    """レンダリングするバリアントの指定"""
+    source_path: str
+    source_mtime_ns: int
+    source_size: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    maintain_ratio: bool = True
+    method: str = "LANCZOS"
+    format_type: str = "WEBP"
+    quality: int = 85
+    auto_quality: bool = False
+
+    def cache_key(self) -> str:
+        """キャッシュキー（元ファイルの更新日時・サイズを含む）を取得"""
+        payload = json.dumps(asdict(self), sort_keys=True).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def etag(self) -> str:
+        """ETagを取得"""
+        return f'"{self.cache_key()[:32]}"'
+
+    @property
+    def content_type(self) -> str:
+        """Content-Typeを取得"""
+        return CONTENT_TYPES[self.format_type]
+
+
+def _parse_dimension(value: Optional[str], name: str) -> Optional[int]:
+    """幅・高さのパラメータを解析"""
+    if value is None or value == "":
+        return None
+    try:
+        dimension = int(value)
+    except ValueError:
+        raise RequestError(400, f"{name}が不正です")
+    if not 0 < dimension <= MAX_DIMENSION:
+        raise RequestError(400, f"{name}は1〜{MAX_DIMENSION}で指定してください")
+    return dimension
+
+
+def parse_variant_request(query: Dict[str, str], root_dir: str) -> VariantRequest:
+    """クエリパラメータからバリアントの指定を作成"""
+    src = query.get("src")
+    if not src:
+        raise RequestError(400, "srcを指定してください")
+
+    # ルートディレクトリ外へのアクセスを禁止
+    root = os.path.realpath(root_dir)
+    source_path = os.path.realpath(os.path.join(root, src.lstrip("/")))
+    if os.path.commonpath([root, source_path]) != root:
+        raise RequestError(403, "ルートディレクトリ外のファイルは指定できません")
+    if not is_supported_image_file(source_path):
+        raise RequestError(400, "対応していないファイル形式です")
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        raise RequestError(404, "ファイルが見つかりません")
+
+    format_type = query.get("fmt", "webp").upper()
+    if format_type == "JPG":
+        format_type = "JPEG"
+    if format_type not in AppSettings.get_supported_output_formats():
+        raise RequestError(400, "fmtが不正です")
+
+    method = query.get("method", "LANCZOS").upper()
+    if method not in ("LANCZOS", "BICUBIC", "BILINEAR", "NEAREST"):
+        raise RequestError(400, "methodが不正です")
+
+    quality_value = query.get("q", str(CompressionSettings.quality))
+    auto_quality = quality_value == "auto"
+    quality = CompressionSettings.quality
+    if not auto_quality:
+        try:
+            quality = int(quality_value)
+        except ValueError:
+            raise RequestError(400, "qが不正です")
+        if not 1 <= quality <= 100:
+            raise RequestError(400, "qは1〜100で指定してください")
+
+    return VariantRequest(
+        source_path=source_path,
+        source_mtime_ns=stat.st_mtime_ns,
+        source_size=stat.st_size,
+        width=_parse_dimension(query.get("w"), "w"),
+        height=_parse_dimension(query.get("h"), "h"),
+        maintain_ratio=query.get("fit", "contain") != "fill",
+        method=method,
+        format_type=format_type,
+        quality=quality,
+        auto_quality=auto_quality,
+    )
+
+
+def render_variant(request: VariantRequest) -> bytes:
+    """バリアントをレンダリング（ワーカープロセスで実行）"""
+    loaded = load(request.source_path)
+    try:
+        original_width, original_height = loaded.size
+
+        width = request.width or original_width
+        height = request.height or original_height
+        if request.maintain_ratio:
+            # 片方だけ指定された場合は、指定された辺に合わせる
+            if request.width is None and request.height is not None:
+                width = MAX_DIMENSION
+            if request.height is None and request.width is not None:
+                height = MAX_DIMENSION
+
+        resized = resize(loaded, ResizeSettings(
+            width=width,
+            height=height,
+            maintain_ratio=request.maintain_ratio,
+            method=request.method,
+        ))
+        return encode(resized, CompressionSettings(
+            format_type=request.format_type,
+            quality=request.quality,
+            auto_quality=request.auto_quality,
+        )).data
+    finally:
+        loaded.image.close()
+
+
+class ResizeServer:
+    """オンデマンドのリサイズHTTPサーバー"""
+
+    def __init__(self, root_dir: str, host: str = "127.0.0.1", port: int = 8080,
+                 max_workers: Optional[int] = None,
+                 max_concurrency: Optional[int] = None,
+                 cache: Optional[VariantCache] = None,
+                 executor: Optional[Executor] = None):
+        self.root_dir = root_dir
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.max_workers
+        self.cache = cache or VariantCache()
+        self.executor = executor
+        self._owns_executor = executor is None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+        self.stats = {
+            "requests": 0,
+            "renders": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "not_modified": 0,
+            "errors": 0,
+        }
+
+    async def start(self):
+        """サーバーを開始"""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port
+        )
+        # ポート0を指定した場合に割り当てられたポートを反映
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """サーバーを実行し続ける"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """サーバーを停止"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.executor is not None and self._owns_executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def get_variant(self, request: VariantRequest) -> bytes:
+        """バリアントを取得（キャッシュ→集約→レンダリングの順）"""
+        loop = asyncio.get_running_loop()
+        key = request.cache_key()
+
+        data = await loop.run_in_executor(None, self.cache.get, key)
+        if data is not None:
+            self.stats["cache_hits"] += 1
+            return data
+
+        # 同じバリアントのレンダリング中なら結果を待つ
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future: "asyncio.Future[bytes]" = loop.create_future()
+        self._inflight[key] = future
+        try:
+            async with self._semaphore:
+                self.stats["renders"] += 1
+                data = await loop.run_in_executor(self.executor, render_variant, request)
+            await loop.run_in_executor(None, self.cache.put, key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            # 待機者がいない場合の未取得警告を抑止
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        """1接続分のリクエストを処理"""
+        try:
+            try:
+                method, target, headers = await self._read_request(reader)
+                self.stats["requests"] += 1
+                status, response_headers, body = await self.handle_request(
+                    method, target, headers
+                )
+            except RequestError as e:
+                status, response_headers, body = self._error_response(e.status, str(e))
+                method = "GET"
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except Exception as e:
+                self.stats["errors"] += 1
+                status, response_headers, body = self._error_response(
+                    500, f"リクエストの処理に失敗しました: {e}"
+                )
+                method = "GET"
+
+            await self._write_response(writer, status, response_headers,
+                                       b"" if method == "HEAD" else body, len(body))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_request(self, method: str, target: str,
+                             headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """リクエストを処理してレスポンスを作成"""
+        if method not in ("GET", "HEAD"):
+            return self._error_response(405, "GETまたはHEADのみ対応しています")
+
+        url = urlsplit(target)
+        if url.path == "/stats":
+            body = json.dumps(self.get_stats()).encode("utf-8")
+            return 200, {"Content-Type": "application/json"}, body
+        if url.path != "/resize":
+            return self._error_response(404, "見つかりません")
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            request = parse_variant_request(query, self.root_dir)
+        except RequestError as e:
+            return self._error_response(e.status, str(e))
+
+        etag = request.etag()
+        cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+        if_none_match = [tag.strip() for tag in headers.get("if-none-match", "").split(",")]
+        if etag in if_none_match or "*" in if_none_match:
+            self.stats["not_modified"] += 1
+            return 304, cache_headers, b""
+
+        try:
+            data = await self.get_variant(request)
+        except Exception as e:
+            self.stats["errors"] += 1
+            return self._error_response(500, f"レンダリングに失敗しました: {e}")
+
+        cache_headers["Content-Type"] = request.content_type
+        return 200, cache_headers, data
+
+    def get_stats(self) -> dict:
+        """統計情報を取得"""
+        stats = dict(self.stats)
+        stats["cache_entries"] = len(self.cache)
+        stats["cache_memory_bytes"] = self.cache.memory_bytes
+        stats["inflight"] = len(self._inflight)
+        return stats
+
+    def _error_response(self, status: int, message: str) -> Tuple[int, Dict[str, str], bytes]:
+        """エラーレスポンスを作成"""
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        return status, {"Content-Type": "application/json; charset=utf-8"}, body
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str]]:
+        """リクエスト行とヘッダーを読み込む"""
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise RequestError(400, "リクエスト行が不正です")
+        method, target, _ = parts
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                return method.upper(), target, headers
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise RequestError(400, "ヘッダーが多すぎます")
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int,
+                              headers: Dict[str, str], body: bytes, content_length: int):
+        """レスポンスを書き込む"""
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        if status != 304:
+            headers = dict(headers, **{"Content-Length": str(content_length)})
+        headers = dict(headers, Connection="close")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+
+def run_server(root_dir: str, host: str = "127.0.0.1", port: int = 8080,
+               max_workers: Optional[int] = None, max_concurrency: Optional[int] = None,
+               memory_limit: Optional[int] = None, cache_dir: Optional[str] = None):
+    """サーバーを起動してCtrl+Cまで実行"""
+    cache = VariantCache(memory_limit or DEFAULT_MEMORY_LIMIT, cache_dir)
+    server = ResizeServer(root_dir, host, port, max_workers, max_concurrency, cache)
+
+    async def main():
+        await server.start()
+        print(f"リサイズサーバーを起動しました: http://{server.host}:{server.port}/resize")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,100 @@
+"""
+レンダリング済みバリアントのキャッシュ
+
+メモリ上のLRUキャッシュと、任意でディスクキャッシュを併用する。
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# メモリキャッシュのデフォルト上限（バイト）
+DEFAULT_MEMORY_LIMIT = 128 * 1024 * 1024
+
+
+class VariantCache:
+    """メモリ＋ディスクの2段キャッシュ"""
+
+    def __init__(self, memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 cache_dir: Optional[str] = None):
+        self.memory_limit = memory_limit
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def memory_bytes(self) -> int:
+        """メモリキャッシュの使用量"""
+        return self._memory_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """キャッシュから取得（メモリ→ディスクの順）"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        data = self._read_disk(key)
+        if data is not None:
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """キャッシュに保存"""
+        self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        """メモリキャッシュに保存し、上限を超えた分を古い順に破棄"""
+        if len(data) > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._entries[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_limit:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        """ディスクキャッシュのパスを取得"""
+        if not self.cache_dir:
+            return None
+        return self.cache_dir / key[:2] / key
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        """ディスクキャッシュから読み込み"""
+        path = self._disk_path(key)
+        if not path:
+            return None
+        try:
+            return path.read_bytes()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        """ディスクキャッシュに書き込み（一時ファイル経由で置き換え）"""
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
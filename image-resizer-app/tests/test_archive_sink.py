@@ -0,0 +1,159 @@
+"""
+アーカイブ書き出しのユニットテスト
+"""
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import unittest
+import zipfile
+
+from PIL import Image
+
+from models.archive_sink import ArchiveSink, detect_archive_format
+from models.batch_processor import BatchProcessor, STATUS_DUPLICATE, STATUS_PROCESSED
+from models.settings import CompressionSettings, ResizeSettings
+
+
+class UnseekableStream(io.RawIOBase):
+    """標準出力のようにシークできない書き込み先"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        raise OSError("シークできません")
+
+
+class TestArchiveSink(unittest.TestCase):
+    """ArchiveSinkクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_zip_is_stored(self):
+        """ZIPが無圧縮で書き出されるテスト"""
+        path = os.path.join(self.temp_dir, "out.zip")
+        with ArchiveSink(path, "zip") as sink:
+            sink.put("a.jpg", b"a" * 1000)
+            sink.put("b.jpg", b"b" * 10)
+
+        self.assertEqual(sink.entry_count, 2)
+        self.assertEqual(sink.total_bytes, 1010)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(archive.namelist(), ["a.jpg", "b.jpg"])
+            self.assertEqual(archive.read("a.jpg"), b"a" * 1000)
+            self.assertEqual(archive.getinfo("a.jpg").compress_type, zipfile.ZIP_STORED)
+
+    def test_unseekable_streams(self):
+        """シークできない出力先に書き出すテスト"""
+        for archive_format in ["zip", "tar"]:
+            with self.subTest(archive_format=archive_format):
+                stream = UnseekableStream()
+                with ArchiveSink(stream, archive_format) as sink:
+                    sink.put("x.png", b"data")
+
+                data = io.BytesIO(stream.buffer.getvalue())
+                if archive_format == "zip":
+                    with zipfile.ZipFile(data) as archive:
+                        self.assertEqual(archive.read("x.png"), b"data")
+                else:
+                    with tarfile.open(fileobj=data) as archive:
+                        self.assertEqual(archive.extractfile("x.png").read(), b"data")
+
+    def test_concurrent_puts(self):
+        """複数スレッドから書き込むテスト"""
+        path = os.path.join(self.temp_dir, "out.tar")
+        with ArchiveSink(path, "tar", queue_size=2) as sink:
+            threads = [
+                threading.Thread(target=sink.put, args=(f"{i}.bin", bytes([i]) * 100))
+                for i in range(20)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        with tarfile.open(path) as archive:
+            self.assertEqual(len(archive.getnames()), 20)
+            self.assertEqual(archive.extractfile("7.bin").read(), bytes([7]) * 100)
+
+    def test_unique_name_and_errors(self):
+        """エントリ名の重複回避と不正な使い方のテスト"""
+        sink = ArchiveSink(os.path.join(self.temp_dir, "out.zip"))
+        self.assertEqual(sink.unique_name("a.jpg"), "a.jpg")
+        self.assertEqual(sink.unique_name("a.jpg"), "a_1.jpg")
+        sink.close()
+        with self.assertRaises(ValueError):
+            sink.put("a.jpg", b"")
+        with self.assertRaises(ValueError):
+            ArchiveSink(io.BytesIO(), "rar")
+
+    def test_detect_archive_format(self):
+        """拡張子からの形式判定のテスト"""
+        self.assertEqual(detect_archive_format("out.TAR"), "tar")
+        self.assertEqual(detect_archive_format("out.zip"), "zip")
+
+
+class TestBatchArchive(unittest.TestCase):
+    """バッチ処理結果のアーカイブ書き出しのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.input_dir = tempfile.mkdtemp()
+        photo = Image.effect_noise((200, 100), 50).convert('RGB')
+        photo.save(os.path.join(self.input_dir, "photo.jpg"), quality=95)
+        shutil.copy(os.path.join(self.input_dir, "photo.jpg"),
+                    os.path.join(self.input_dir, "photo_copy.jpg"))
+        Image.new('RGB', (80, 80), color='blue').save(os.path.join(self.input_dir, "blue.png"))
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.input_dir)
+
+    def test_batch_to_zip(self):
+        """ファイルを作らずZIPに書き出すテスト"""
+        buffer = io.BytesIO()
+        with ArchiveSink(buffer, "zip") as sink:
+            processor = BatchProcessor(
+                ResizeSettings(width=50, height=50),
+                CompressionSettings(format_type="JPEG", quality=80),
+                archive=sink,
+            )
+            summary = processor.process_directory(self.input_dir)
+
+        self.assertEqual(summary.count(STATUS_PROCESSED), 2)
+        self.assertEqual(summary.count(STATUS_DUPLICATE), 1)
+        self.assertEqual(sorted(os.listdir(self.input_dir)),
+                         ["blue.png", "photo.jpg", "photo_copy.jpg"])
+
+        with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+            self.assertEqual(sorted(archive.namelist()), [
+                "blue_resized.jpg", "photo_copy_resized.jpg", "photo_resized.jpg",
+            ])
+            self.assertEqual(archive.read("photo_resized.jpg"),
+                             archive.read("photo_copy_resized.jpg"))
+            with Image.open(io.BytesIO(archive.read("photo_resized.jpg"))) as saved:
+                self.assertEqual(saved.size, (50, 25))
+        self.assertEqual(summary.total_output_bytes, sink.total_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+帯単位リサイズのユニットテスト
+"""
+
+import io
+import unittest
+import tempfile
+import os
+import shutil
+from unittest import mock
+from PIL import Image, ImageChops
+
+from models.banded_resize import (
+    BandedImageReader,
+    iter_resized_bands,
+    open_banded_reader,
+    resize_banded,
+    calculate_band_height,
+    write_png_bands,
+)
+from models.image_processor import ImageProcessor
+from models.settings import CompressionSettings, ResizeSettings
+
+
+def _max_difference(image_a: Image.Image, image_b: Image.Image) -> int:
+    """2つの画像の最大画素差を取得"""
+    extrema = ImageChops.difference(image_a, image_b).getextrema()
+    return max(high for _, high in extrema)
+
+
+class TestBandedResize(unittest.TestCase):
+    """帯単位リサイズのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+        # グラデーションとノイズのテスト画像（帯の境界のずれを検出しやすい）
+        gradient = Image.linear_gradient('L').resize((301, 403))
+        self.source = Image.merge('RGB', [
+            gradient,
+            gradient.transpose(Image.FLIP_LEFT_RIGHT),
+            Image.effect_noise((301, 403), 64),
+        ])
+
+        self.tiff_path = os.path.join(self.temp_dir, "large.tiff")
+        self.strips_path = os.path.join(self.temp_dir, "strips.tiff")
+        self.bmp_path = os.path.join(self.temp_dir, "large.bmp")
+        self.png_path = os.path.join(self.temp_dir, "large.png")
+        self.source.save(self.tiff_path)
+        self.source.save(self.strips_path, strip_size=301 * 3 * 7)
+        self.source.save(self.bmp_path)
+        self.source.save(self.png_path)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_open_banded_reader(self):
+        """帯単位リーダーの判定テスト"""
+        for path in (self.tiff_path, self.strips_path, self.bmp_path):
+            reader = open_banded_reader(path)
+            self.assertIsNotNone(reader)
+            self.assertEqual(reader.size, (301, 403))
+            self.assertEqual(reader.mode, "RGB")
+
+        # TIFF/BMP以外は対象外
+        self.assertIsNone(open_banded_reader(self.png_path))
+
+    def test_read_rows(self):
+        """指定行のみの読み込みテスト"""
+        expected = self.source.crop((0, 17, 301, 58))
+        for path in (self.tiff_path, self.strips_path, self.bmp_path):
+            band = BandedImageReader(path).read_rows(17, 58)
+            self.assertEqual(band.size, (301, 41))
+            self.assertEqual(_max_difference(band, expected), 0)
+
+    def test_resize_banded_matches_full_resize(self):
+        """帯単位リサイズが一括リサイズと一致するかのテスト"""
+        # 帯を細かくして境界を多数発生させる
+        band_bytes = 301 * 3 * 20
+        for path in (self.tiff_path, self.strips_path, self.bmp_path):
+            reader = BandedImageReader(path)
+            for resample in (Image.LANCZOS, Image.BICUBIC, Image.NEAREST):
+                for size in ((97, 131), (500, 620)):
+                    result = resize_banded(reader, size, resample, band_bytes)
+                    expected = self.source.resize(size, resample)
+                    self.assertEqual(result.size, size)
+                    self.assertLessEqual(_max_difference(result, expected), 1)
+
+    def test_calculate_band_height(self):
+        """帯の高さ計算のテスト"""
+        reader = BandedImageReader(self.tiff_path)
+        # 1行 = 301 * 3バイト、10行分の予算で等倍なら10行
+        self.assertEqual(calculate_band_height(reader, 403, 301 * 3 * 10), 10)
+        # 縮小時は入力行数を倍率で割る
+        self.assertEqual(calculate_band_height(reader, 403 // 2, 301 * 3 * 10), 4)
+
+    def test_image_processor_uses_banded_source(self):
+        """しきい値を超える画像で帯単位処理になるかのテスト"""
+        processor = ImageProcessor(banded_threshold=1000)
+        processor.load_image(self.tiff_path)
+
+        self.assertIsNotNone(processor.banded_source)
+        self.assertEqual(processor.get_original_size(), (301, 403))
+
+        resize_settings = ResizeSettings(width=150, height=150, maintain_ratio=True)
+        resized = processor.resize_image(resize_settings)
+        self.assertEqual(resized.size, (112, 150))
+        expected = self.source.resize((112, 150), Image.LANCZOS)
+        self.assertLessEqual(_max_difference(resized, expected), 1)
+
+        processor.clear_images()
+        self.assertIsNone(processor.banded_source)
+
+    def test_write_png_bands(self):
+        """帯ごとに書き出したPNGが一括リサイズと一致するテスト"""
+        reader = BandedImageReader(self.tiff_path)
+        for mode in ("RGB", "L"):
+            stream = io.BytesIO()
+            bands = iter_resized_bands(reader, (150, 201), Image.LANCZOS, 301 * 3 * 20)
+            write_png_bands(bands, (150, 201), mode, stream)
+
+            written = Image.open(io.BytesIO(stream.getvalue()))
+            self.assertEqual((written.format, written.mode), ("PNG", mode))
+            self.assertEqual(written.size, (150, 201))
+            expected = self.source.resize((150, 201), Image.LANCZOS).convert(mode)
+            self.assertLessEqual(_max_difference(written.convert("RGB"),
+                                                 expected.convert("RGB")), 1)
+
+    def test_large_output_is_not_assembled(self):
+        """大きい出力は1枚の画像に組み立てず、PNG以外はエラーになるテスト"""
+        reader = BandedImageReader(self.tiff_path)
+        with self.assertRaises(ValueError):
+            resize_banded(reader, (301, 403), max_output_pixels=1000)
+
+        resize_settings = ResizeSettings(width=301, height=403)
+        output_path = os.path.join(self.temp_dir, "output.png")
+        with mock.patch("models.processing.STREAMING_OUTPUT_THRESHOLD", 1000), \
+                ImageProcessor(banded_threshold=1000) as processor:
+            processor.load_image(self.tiff_path)
+            self.assertTrue(processor.requires_streaming(resize_settings))
+
+            saved = processor.save_resized(output_path, resize_settings,
+                                           CompressionSettings(format_type="PNG"))
+            with Image.open(saved) as written:
+                self.assertEqual(_max_difference(written, self.source), 0)
+
+            jpeg_path = os.path.join(self.temp_dir, "output.jpg")
+            with self.assertRaises(ValueError):
+                processor.save_resized(jpeg_path, resize_settings,
+                                       CompressionSettings(format_type="JPEG"))
+            self.assertFalse(os.path.exists(jpeg_path))
+
+    def test_preview_uses_proxy(self):
+        """帯単位で処理する画像のプレビューが元ファイルを読まずに縮小版から作られるテスト"""
+        with ImageProcessor(banded_threshold=1000) as processor:
+            processor.load_image(self.tiff_path)
+            with mock.patch.object(BandedImageReader, "read_rows",
+                                   side_effect=AssertionError("元ファイルを読みました")):
+                preview, size = processor.render_preview(
+                    ResizeSettings(width=301, height=403), (100, 100)
+                )
+        self.assertEqual(size, (301, 403))
+        self.assertEqual(preview.size, (75, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+バッチ処理の見積もりのユニットテスト
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from models.batch_estimate import (
+    BatchEstimator,
+    SampleMeasurement,
+    coefficient_of_variation,
+    estimate_total,
+    required_sample_size,
+)
+from models.batch_processor import BatchProcessor
+from models.memory_scheduler import MemoryBudgetScheduler, ScheduledJob
+from models.settings import CompressionSettings, ResizeSettings
+
+
+class TestStatistics(unittest.TestCase):
+    """標本数と信頼区間の計算のテスト"""
+
+    def test_required_sample_size(self):
+        """有限母集団修正を行った標本数のテスト"""
+        self.assertEqual(required_sample_size(0), 0)
+        self.assertEqual(required_sample_size(10), 10)
+        self.assertEqual(required_sample_size(50000), 96)
+        self.assertLess(required_sample_size(200), 96)
+        self.assertGreater(required_sample_size(50000, margin_of_error=0.05), 96)
+        # 出力サイズのばらつきが小さいほど少ない標本で済む
+        self.assertEqual(required_sample_size(50000, coefficient_of_variation=0.25), 24)
+        self.assertGreater(required_sample_size(50000, coefficient_of_variation=1.0), 96)
+
+    def test_coefficient_of_variation(self):
+        """変動係数のテスト"""
+        self.assertIsNone(coefficient_of_variation([10]))
+        self.assertIsNone(coefficient_of_variation([0, 0]))
+        self.assertAlmostEqual(coefficient_of_variation([10, 20, 30]), 0.5)
+
+    def test_estimate_total(self):
+        """合計の推定と信頼区間のテスト"""
+        estimate = estimate_total([10, 20, 30], population=300, confidence=0.95)
+
+        self.assertAlmostEqual(estimate.value, 6000)
+        self.assertLess(estimate.low, 6000)
+        self.assertGreater(estimate.high, 6000)
+        # 全数を処理した場合は区間の幅がない
+        exact = estimate_total([10, 20, 30], population=3, confidence=0.95)
+        self.assertEqual((exact.low, exact.high), (60, 60))
+
+
+class TestFirstWave(unittest.TestCase):
+    """ピークメモリの見積もりのテスト"""
+
+    def test_first_wave_bytes(self):
+        """最初に同時投入されるジョブの合計のテスト"""
+        jobs = [ScheduledJob(key=i, memory_bytes=size) for i, size in enumerate([50, 40, 30, 5])]
+
+        self.assertEqual(MemoryBudgetScheduler(100, 2).first_wave_bytes(jobs), 90)
+        self.assertEqual(MemoryBudgetScheduler(100, 4).first_wave_bytes(jobs), 95)
+        self.assertEqual(MemoryBudgetScheduler(10, 4).first_wave_bytes(jobs), 50)
+
+
+class TestBatchEstimator(unittest.TestCase):
+    """BatchEstimatorクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.input_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        for index in range(12):
+            photo = Image.effect_noise((120 + index * 10, 90), 40 + index).convert('RGB')
+            photo.save(os.path.join(self.input_dir, f"photo{index}.jpg"), quality=90)
+        self.paths = sorted(os.path.join(self.input_dir, name)
+                            for name in os.listdir(self.input_dir))
+        self.resize_settings = ResizeSettings(width=60, height=60)
+        self.compression_settings = CompressionSettings(format_type="JPEG", quality=80)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.input_dir)
+        shutil.rmtree(self.output_dir)
+
+    def test_estimate_matches_actual_batch(self):
+        """見積もりの信頼区間に実際の出力サイズが入るテスト"""
+        estimator = BatchEstimator(self.resize_settings, self.compression_settings,
+                                   sample_size=6, seed=1)
+        estimate = estimator.estimate(self.paths, worker_counts=(1, 4))
+
+        summary = BatchProcessor(self.resize_settings, self.compression_settings,
+                                 detect_duplicates=False).process_files(self.paths,
+                                                                        self.output_dir)
+        self.assertEqual(len(estimate.samples), 6)
+        self.assertEqual(estimate.file_count, 12)
+        self.assertLessEqual(estimate.output_bytes.low, summary.total_output_bytes)
+        self.assertGreaterEqual(estimate.output_bytes.high, summary.total_output_bytes)
+        self.assertLessEqual(estimate.seconds_by_workers[4].value,
+                             estimate.seconds_by_workers[1].value)
+        self.assertGreater(estimate.peak_memory_by_workers[4],
+                           estimate.peak_memory_by_workers[1])
+        # ドライランではファイルを出力しない
+        self.assertEqual(len(os.listdir(self.input_dir)), 12)
+
+        report = estimate.format_report()
+        self.assertIn("対象: 12件（標本 6件、うち失敗 0件）", report)
+        self.assertIn("4並列", report)
+
+    def test_failed_samples(self):
+        """壊れたファイルが失敗として数えられるテスト"""
+        broken = os.path.join(self.input_dir, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+
+        estimate = BatchEstimator(self.resize_settings, self.compression_settings,
+                                  sample_size=1).estimate([broken])
+
+        self.assertEqual(estimate.failed_count, 1)
+        self.assertEqual(estimate.output_bytes.value, 0)
+
+    def test_failed_samples_excluded_from_output(self):
+        """失敗した標本が出力合計の推定に含まれず、失敗率が別に報告されるテスト"""
+        broken = os.path.join(self.input_dir, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        paths = self.paths + [broken]
+
+        estimate = BatchEstimator(self.resize_settings, self.compression_settings,
+                                  sample_size=len(paths)).estimate(paths)
+
+        succeeded = sum(s.output_bytes for s in estimate.samples if not s.error)
+        self.assertEqual(estimate.output_bytes.value, succeeded)
+        self.assertAlmostEqual(estimate.failure_rate, 1 / 13)
+        self.assertIn("推定失敗件数: 1件", estimate.format_report())
+
+    def test_sample_grows_with_variation(self):
+        """標本数を指定しない場合、最初の標本のばらつきが大きければ標本を追加するテスト"""
+        # ファイルごとに桁の違う出力サイズを返し、どの標本でも変動係数が大きくなるようにする
+        output_bytes = {path: 10 ** index for index, path in enumerate(self.paths)}
+
+        class VaryingEstimator(BatchEstimator):
+            def measure(self, path):
+                return SampleMeasurement(path, output_bytes=output_bytes[path], seconds=0.01)
+
+        estimator = VaryingEstimator(self.resize_settings, self.compression_settings,
+                                     margin_of_error=0.5, seed=1)
+        first = required_sample_size(len(self.paths), margin_of_error=0.5)
+        estimate = estimator.estimate(self.paths)
+
+        self.assertGreater(len(estimate.samples), first)
+        self.assertEqual(len({s.path for s in estimate.samples}), len(estimate.samples))
+
+    def test_invalid_confidence(self):
+        """不正な信頼水準のテスト"""
+        with self.assertRaises(ValueError):
+            BatchEstimator(self.resize_settings, self.compression_settings, confidence=1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
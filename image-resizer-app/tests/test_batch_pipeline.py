@@ -0,0 +1,285 @@
+"""
+バッチ処理パイプラインのユニットテスト
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+
+from PIL import Image
+
+from models.archive_sink import ArchiveSink
+from models.batch_pipeline import BatchPipeline, StageStats
+from models.batch_processor import (
+    BatchProcessor,
+    STATUS_DUPLICATE,
+    STATUS_FAILED,
+    STATUS_PROCESSED,
+)
+from models.settings import CompressionSettings, ResizeSettings
+
+
+class TestBatchPipeline(unittest.TestCase):
+    """BatchPipelineクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.temp_dir, f"{i}.bin")
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * 100)
+            self.paths.append(path)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def items(self):
+        return [(path, path + ".out") for path in self.paths]
+
+    def test_stages_pass_data(self):
+        """先読みしたデータが変換・書き出しに渡されるテスト"""
+        stored = {}
+
+        def encode(path, data):
+            return data[::-1] + b"!", "PNG", []
+
+        def store(source, output, data, format_type):
+            stored[output] = data
+            return output
+
+        results = BatchPipeline(encode, store, io_workers=2, cpu_workers=2).run(self.items())
+
+        self.assertEqual(len(results), 6)
+        for path in self.paths:
+            self.assertIsNone(results[path].error)
+            self.assertEqual(results[path].input_bytes, 100)
+            self.assertEqual(results[path].output_bytes, 101)
+            self.assertEqual(results[path].format_type, "PNG")
+            # エンコード結果は書き出し後に解放される
+            self.assertIsNone(results[path].encoded)
+            self.assertEqual(stored[path + ".out"][-1:], b"!")
+
+    def test_errors_are_recorded(self):
+        """読み込み・変換・書き出しの失敗がその項目だけの結果になるテスト"""
+        os.remove(self.paths[0])
+
+        def encode(path, data):
+            if path == self.paths[1]:
+                raise ValueError("変換エラー")
+            return b"x", "JPEG", []
+
+        def store(source, output, data, format_type):
+            if source == self.paths[2]:
+                raise OSError("書き込みエラー")
+            return output
+
+        results = BatchPipeline(encode, store).run(self.items())
+
+        self.assertIsNotNone(results[self.paths[0]].error)
+        self.assertEqual(results[self.paths[1]].error, "変換エラー")
+        self.assertEqual(results[self.paths[2]].error, "書き込みエラー")
+        self.assertEqual(results[self.paths[2]].output_bytes, 0)
+        for path in self.paths[3:]:
+            self.assertIsNone(results[path].error)
+
+    def test_backpressure(self):
+        """書き出しが遅い場合に先読みが上限を超えて進まないテスト"""
+        lock = threading.Lock()
+        outstanding = [0, 0]
+
+        def encode(path, data):
+            return b"x", "JPEG", []
+
+        def store(source, output, data, format_type):
+            time.sleep(0.02)
+            with lock:
+                outstanding[0] -= 1
+            return output
+
+        pipeline = BatchPipeline(encode, store, io_workers=1, cpu_workers=1, queue_size=1)
+        original_read = pipeline._pass
+
+        def counting_pass(destination, item, stats):
+            if stats.name == "読み込み":
+                with lock:
+                    outstanding[0] += 1
+                    outstanding[1] = max(outstanding[1], outstanding[0])
+            original_read(destination, item, stats)
+
+        pipeline._pass = counting_pass
+        pipeline.run(self.items() * 3)
+
+        # 読み込みキュー1 + 変換中1 + 書き出しキュー1 + 書き出し中1 + 受け渡し中1
+        self.assertLessEqual(outstanding[1], 5)
+        writer = pipeline.stages[2]
+        reader = pipeline.stages[0]
+        self.assertGreater(writer.utilization(pipeline.elapsed_seconds), 0.5)
+        # 読み込みは書き出しを待っていた
+        self.assertGreater(reader.blocked_seconds, 0)
+
+    def test_stages_overlap(self):
+        """変換と書き出しが重なって実行されるテスト"""
+        def encode(path, data):
+            time.sleep(0.05)
+            return b"x", "JPEG", []
+
+        def store(source, output, data, format_type):
+            time.sleep(0.05)
+            return output
+
+        pipeline = BatchPipeline(encode, store, io_workers=1, cpu_workers=1)
+        pipeline.run(self.items())
+
+        # 順番に処理すると0.6秒かかる
+        self.assertLess(pipeline.elapsed_seconds, 0.5)
+        self.assertEqual([stage.items for stage in pipeline.stages], [6, 6, 6])
+        self.assertIn("変換: 1スレッド", pipeline.format_stats())
+
+    def test_large_files_are_not_prefetched(self):
+        """上限を超えるファイルは先読みせずにパスだけ渡すテスト"""
+        received = []
+
+        def encode(path, data):
+            received.append(data)
+            return b"x", "JPEG", []
+
+        BatchPipeline(encode, lambda *args: args[1], max_prefetch_bytes=10).run(self.items())
+
+        self.assertEqual(received, [None] * 6)
+
+    def test_invalid_arguments(self):
+        """不正な引数のテスト"""
+        with self.assertRaises(ValueError):
+            BatchPipeline(lambda *args: None, lambda *args: None, io_workers=0)
+
+    def test_stage_utilization(self):
+        """使用率の計算のテスト"""
+        stats = StageStats("変換", workers=2, busy_seconds=3.0)
+
+        self.assertAlmostEqual(stats.utilization(2.0), 0.75)
+        self.assertEqual(stats.utilization(0), 0.0)
+
+
+class TestPipelinedBatchProcessor(unittest.TestCase):
+    """パイプラインを使ったBatchProcessorのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.input_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        photo = Image.effect_noise((200, 100), 50).convert('RGB')
+        photo.save(os.path.join(self.input_dir, "photo.jpg"), quality=95)
+        shutil.copy(os.path.join(self.input_dir, "photo.jpg"),
+                    os.path.join(self.input_dir, "photo_copy.jpg"))
+        Image.new('RGB', (80, 80), color='blue').save(os.path.join(self.input_dir, "blue.png"))
+        with open(os.path.join(self.input_dir, "broken.jpg"), "wb") as f:
+            f.write(b"not an image")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.input_dir)
+        shutil.rmtree(self.output_dir)
+
+    def test_process_directory(self):
+        """パイプラインでも通常と同じ結果になるテスト"""
+        processor = BatchProcessor(
+            ResizeSettings(width=50, height=50),
+            CompressionSettings(format_type="JPEG", quality=80),
+            pipelined=True,
+            io_workers=2,
+        )
+        summary = processor.process_directory(self.input_dir, self.output_dir)
+
+        self.assertEqual(summary.count(STATUS_PROCESSED), 2)
+        self.assertEqual(summary.count(STATUS_DUPLICATE), 1)
+        self.assertEqual(summary.count(STATUS_FAILED), 1)
+        with Image.open(os.path.join(self.output_dir, "photo_resized.jpg")) as saved:
+            self.assertEqual(saved.size, (50, 25))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "photo_copy_resized.jpg")))
+        self.assertEqual(len(summary.stage_stats), 3)
+        self.assertGreater(summary.peak_memory_bytes, 0)
+        text = summary.format_summary()
+        self.assertIn("段階ごとの稼働状況", text)
+        self.assertIn("読み込み: 2スレッド", text)
+
+    def test_memory_budget(self):
+        """変換ワーカーがメモリ予算を超えて同時にデコードしないテスト"""
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0, "order": []}
+
+        class TrackingProcessor(BatchProcessor):
+            def encode_file(self, source_path, data=None):
+                with lock:
+                    state["current"] += 1
+                    state["peak"] = max(state["peak"], state["current"])
+                    state["order"].append(os.path.basename(source_path))
+                time.sleep(0.02)
+                try:
+                    return super().encode_file(source_path, data)
+                finally:
+                    with lock:
+                        state["current"] -= 1
+
+        processor = TrackingProcessor(
+            ResizeSettings(width=50, height=50),
+            CompressionSettings(format_type="JPEG"),
+            detect_duplicates=False,
+            # どの画像も予算を超えるため1枚ずつ処理される
+            memory_budget=1,
+            max_workers=4,
+            pipelined=True,
+            io_workers=1,
+        )
+        paths = [os.path.join(self.input_dir, name) for name in ("blue.png", "photo.jpg")]
+        summary = processor.process_files(paths, self.output_dir)
+
+        self.assertEqual(summary.count(STATUS_PROCESSED), 2)
+        self.assertEqual(state["peak"], 1)
+        # 大きい画像から順に処理し、実際に予約した最大値を報告する
+        self.assertEqual(state["order"], ["photo.jpg", "blue.png"])
+        jobs = processor.build_jobs(paths)
+        self.assertEqual(summary.peak_memory_bytes, max(job.memory_bytes for job in jobs))
+
+    def test_auto_format_extension(self):
+        """形式を自動選択した場合に選ばれた形式の拡張子で書き出すテスト"""
+        processor = BatchProcessor(
+            ResizeSettings(width=50, height=50),
+            CompressionSettings(format_type="AUTO", auto_format_candidates=("PNG",)),
+            detect_duplicates=False,
+            pipelined=True,
+        )
+        summary = processor.process_files([os.path.join(self.input_dir, "blue.png")],
+                                          self.output_dir)
+
+        self.assertEqual(summary.results[0].format_type, "PNG")
+        self.assertTrue(summary.results[0].output_path.endswith(".png"))
+        self.assertTrue(os.path.exists(summary.results[0].output_path))
+
+    def test_archive(self):
+        """パイプラインからアーカイブに書き出すテスト"""
+        archive_path = os.path.join(self.output_dir, "out.zip")
+        with ArchiveSink(archive_path) as sink:
+            processor = BatchProcessor(
+                ResizeSettings(width=50, height=50),
+                CompressionSettings(format_type="JPEG"),
+                archive=sink,
+                pipelined=True,
+            )
+            summary = processor.process_directory(self.input_dir)
+
+        self.assertEqual(summary.count(STATUS_FAILED), 1)
+        with zipfile.ZipFile(archive_path) as archive:
+            self.assertEqual(sorted(archive.namelist()), [
+                "blue_resized.jpg", "photo_copy_resized.jpg", "photo_resized.jpg",
+            ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+バッチ処理モデルのユニットテスト
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from dataclasses import replace
+from PIL import Image, ImageDraw
+
+from models.batch_processor import (
+    BatchProcessor,
+    STATUS_PROCESSED,
+    STATUS_DUPLICATE,
+    STATUS_FAILED,
+)
+from models.settings import ResizeSettings, CompressionSettings
+
+
+class TestBatchProcessor(unittest.TestCase):
+    """BatchProcessorクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.input_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+
+        photo = Image.effect_noise((200, 100), 50).convert('RGB')
+        photo.save(os.path.join(self.input_dir, "photo.jpg"), quality=95)
+        shutil.copy(os.path.join(self.input_dir, "photo.jpg"),
+                    os.path.join(self.input_dir, "photo_copy.jpg"))
+        Image.new('RGB', (80, 80), color='blue').save(os.path.join(self.input_dir, "blue.png"))
+        # 壊れたファイル
+        with open(os.path.join(self.input_dir, "broken.jpg"), "wb") as f:
+            f.write(b"not an image")
+
+        self.processor = BatchProcessor(
+            ResizeSettings(width=50, height=50),
+            CompressionSettings(format_type="JPEG", quality=80),
+        )
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.input_dir)
+        shutil.rmtree(self.output_dir)
+
+    def test_process_directory(self):
+        """ディレクトリ処理のテスト"""
+        summary = self.processor.process_directory(self.input_dir, self.output_dir)
+
+        self.assertEqual(len(summary.results), 4)
+        self.assertEqual(summary.count(STATUS_PROCESSED), 2)
+        self.assertEqual(summary.count(STATUS_DUPLICATE), 1)
+        self.assertEqual(summary.count(STATUS_FAILED), 1)
+
+        output_path = os.path.join(self.output_dir, "photo_resized.jpg")
+        with Image.open(output_path) as saved:
+            self.assertEqual(saved.size, (50, 25))
+        self.assertGreater(summary.total_output_bytes, 0)
+        self.assertIn("処理: 2件", summary.format_summary())
+        self.assertGreater(summary.peak_memory_bytes, 0)
+
+    def test_duplicates_reuse_output(self):
+        """重複ファイルの出力再利用のテスト"""
+        summary = self.processor.process_directory(self.input_dir, self.output_dir)
+
+        duplicate = [r for r in summary.results if r.status == STATUS_DUPLICATE][0]
+        self.assertEqual(duplicate.duplicate_of, os.path.join(self.input_dir, "photo.jpg"))
+        with open(duplicate.output_path, "rb") as f:
+            reused = f.read()
+        with open(os.path.join(self.output_dir, "photo_resized.jpg"), "rb") as f:
+            self.assertEqual(reused, f.read())
+
+    def test_process_without_dedup(self):
+        """重複検出なしの処理テスト"""
+        self.processor.detect_duplicates = False
+        summary = self.processor.process_directory(self.input_dir, self.output_dir)
+
+        self.assertEqual(summary.count(STATUS_PROCESSED), 3)
+        self.assertEqual(summary.count(STATUS_DUPLICATE), 0)
+        self.assertIsNone(summary.duplicate_report)
+
+    def test_measure_savings(self):
+        """出力オプションの削減量の集計テスト"""
+        self.processor.compression_settings = replace(
+            self.processor.compression_settings, progressive=True
+        )
+        self.processor.measure_savings = True
+        summary = self.processor.process_directory(self.input_dir, self.output_dir)
+
+        savings = summary.get_option_savings()
+        self.assertEqual([item.option for item in savings], ["progressive"])
+        self.assertIn("出力オプションによる削減:", summary.format_summary())
+
+    def test_auto_format(self):
+        """出力形式の自動選択で選ばれた形式が集計されるテスト"""
+        text = Image.new('RGB', (120, 80), color='white')
+        draw = ImageDraw.Draw(text)
+        for row in range(0, 80, 10):
+            draw.text((2, row), "Hello world 12345", fill="black")
+        text.save(os.path.join(self.input_dir, "text.png"))
+        self.processor.resize_settings = ResizeSettings(width=120, height=80, method="NEAREST")
+        self.processor.compression_settings = replace(
+            self.processor.compression_settings, format_type="AUTO"
+        )
+        summary = self.processor.process_directory(self.input_dir, self.output_dir)
+
+        results = {os.path.basename(r.source_path): r for r in summary.results}
+        # 文字だけの画像はPNG、ノイズの多い写真は非可逆形式が小さくなる
+        self.assertEqual(results["text.png"].format_type, "PNG")
+        self.assertTrue(results["text.png"].output_path.endswith("text_resized.png"))
+        photo = results["photo.jpg"]
+        self.assertIn(photo.format_type, ["JPEG", "WEBP"])
+        self.assertTrue(os.path.exists(photo.output_path))
+        # 重複は代表ファイルと同じ形式で再利用する
+        duplicate = results["photo_copy.jpg"]
+        self.assertEqual(os.path.splitext(duplicate.output_path)[1],
+                         os.path.splitext(photo.output_path)[1])
+        self.assertTrue(os.path.exists(duplicate.output_path))
+
+        self.assertEqual(sum(summary.get_format_counts().values()), 4)
+        self.assertIn("出力形式: ", summary.format_summary())
+        self.assertIn("PNG ", summary.format_summary())
+
+    def test_build_output_paths(self):
+        """出力パスが重複しないかのテスト"""
+        paths = ["/a/image.png", "/b/image.jpg"]
+        output_paths = self.processor.build_output_paths(paths, "/out")
+
+        self.assertEqual(output_paths["/a/image.png"], os.path.join("/out", "image_resized.jpg"))
+        self.assertEqual(output_paths["/b/image.jpg"], os.path.join("/out", "image_resized_1.jpg"))
+
+
+if __name__ == '__main__':
+    unittest.main()
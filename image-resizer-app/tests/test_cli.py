@@ -0,0 +1,93 @@
+"""
+コマンドライン版のユニットテスト
+"""
+
+import io
+import unittest
+import tempfile
+import os
+import shutil
+from contextlib import redirect_stdout
+from unittest import mock
+from PIL import Image
+
+import cli
+
+
+class TestCli(unittest.TestCase):
+    """コマンドライン版のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.temp_dir, "input.png")
+        Image.new('RGB', (200, 100), color='green').save(self.input_path)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_convert_file(self):
+        """ファイル間の変換テスト"""
+        output_path = os.path.join(self.temp_dir, "output.webp")
+        exit_code = cli.main(["convert", self.input_path, output_path,
+                              "--width", "50", "--height", "50", "--format", "WEBP"])
+
+        self.assertEqual(exit_code, 0)
+        with Image.open(output_path) as converted:
+            self.assertEqual(converted.format, "WEBP")
+            self.assertEqual(converted.size, (50, 25))
+
+    def test_convert_stdin_stdout(self):
+        """標準入出力を使った変換テスト"""
+        with open(self.input_path, "rb") as f:
+            stdin = io.TextIOWrapper(io.BytesIO(f.read()))
+        stdout = io.TextIOWrapper(io.BytesIO())
+
+        with mock.patch("sys.stdin", stdin), mock.patch("sys.stdout", stdout):
+            exit_code = cli.main(["convert", "-", "-", "--width", "20", "--height", "20"])
+
+        self.assertEqual(exit_code, 0)
+        converted = Image.open(io.BytesIO(stdout.buffer.getvalue()))
+        self.assertEqual(converted.format, "JPEG")
+        self.assertEqual(converted.size, (20, 10))
+
+    def test_batch(self):
+        """バッチ処理のテスト"""
+        output_dir = os.path.join(self.temp_dir, "output")
+        os.mkdir(output_dir)
+
+        with redirect_stdout(io.StringIO()) as stdout:
+            exit_code = cli.main(["batch", self.temp_dir, "-o", output_dir, "--width", "40"])
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn("処理: 1件", stdout.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "input_resized.jpg")))
+
+
+    def test_scan(self):
+        """スキャンと絞り込みのテスト"""
+        Image.new('RGB', (20, 20)).save(os.path.join(self.temp_dir, "small.png"))
+
+        with redirect_stdout(io.StringIO()) as stdout:
+            exit_code = cli.main(["scan", self.temp_dir, "--min-width", "100"])
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn("input.png\t200x100\tRGB\tPNG", stdout.getvalue())
+        self.assertNotIn("small.png", stdout.getvalue())
+        self.assertIn("1件", stdout.getvalue())
+
+    def test_batch_with_filter(self):
+        """絞り込み条件付きのバッチ処理テスト"""
+        Image.new('RGB', (20, 20)).save(os.path.join(self.temp_dir, "small.png"))
+
+        with redirect_stdout(io.StringIO()) as stdout:
+            exit_code = cli.main(["batch", self.temp_dir, "--max-width", "50", "--width", "10"])
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn("処理: 1件", stdout.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "small_resized.jpg")))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "input_resized.jpg")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+ICCプロファイル変換のユニットテスト
+"""
+
+import io
+import struct
+import unittest
+from PIL import Image
+
+from models.color_profile import TransformCache, convert_to_srgb, get_srgb_profile_bytes
+from models.image_processor import ImageProcessor
+from models.settings import ResizeSettings
+
+
+def _s15_fixed16(value: float) -> bytes:
+    """s15Fixed16Number形式に変換"""
+    return struct.pack(">i", int(round(value * 65536)))
+
+
+def _xyz_tag(x: float, y: float, z: float) -> bytes:
+    """XYZタグを作成"""
+    return b"XYZ " + b"\0" * 4 + _s15_fixed16(x) + _s15_fixed16(y) + _s15_fixed16(z)
+
+
+def make_display_p3_profile() -> bytes:
+    """Display P3相当（ガンマ2.2）のICCプロファイルを作成"""
+    text = b"Display P3 test\0"
+    desc = (b"desc" + b"\0" * 4 + struct.pack(">I", len(text)) + text
+            + b"\0" * 11 + b"\0" * 67)
+    curve = b"curv" + b"\0" * 4 + struct.pack(">IH", 1, 563) + b"\0\0"
+    tags = [
+        (b"desc", desc),
+        (b"wtpt", _xyz_tag(0.9642, 1.0, 0.8249)),
+        (b"rXYZ", _xyz_tag(0.5151, 0.2412, -0.0011)),
+        (b"gXYZ", _xyz_tag(0.2920, 0.6922, 0.0419)),
+        (b"bXYZ", _xyz_tag(0.1571, 0.0666, 0.7841)),
+        (b"rTRC", curve),
+        (b"gTRC", curve),
+        (b"bTRC", curve),
+    ]
+
+    offset = 128 + 4 + 12 * len(tags)
+    table = struct.pack(">I", len(tags))
+    data = b""
+    for signature, body in tags:
+        table += signature + struct.pack(">II", offset + len(data), len(body))
+        data += body + b"\0" * (-len(body) % 4)
+
+    header = (struct.pack(">I", offset + len(data)) + b"\0" * 4
+              + struct.pack(">I", 0x02100000) + b"mntrRGB XYZ " + b"\0" * 12
+              + b"acsp" + b"\0" * 28
+              + _xyz_tag(0.9642, 1.0, 0.8249)[8:] + b"\0" * 48)
+    return header + table + data
+
+
+class TestColorProfile(unittest.TestCase):
+    """sRGB変換のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.profile = make_display_p3_profile()
+        self.image = Image.new('RGB', (64, 64), color=(200, 100, 50))
+        self.image.info["icc_profile"] = self.profile
+
+    def test_convert_wide_gamut_to_srgb(self):
+        """広色域の画像がsRGBに変換されるかのテスト"""
+        converted = convert_to_srgb(self.image, cache=TransformCache())
+
+        self.assertEqual(converted.mode, 'RGB')
+        self.assertNotEqual(converted.getpixel((0, 0)), (200, 100, 50))
+        self.assertEqual(converted.info["icc_profile"], get_srgb_profile_bytes())
+
+    def test_images_without_conversion(self):
+        """変換不要な画像はそのまま返るかのテスト"""
+        cache = TransformCache()
+        plain = Image.new('RGB', (8, 8))
+        self.assertIs(convert_to_srgb(plain, cache=cache), plain)
+
+        srgb = Image.new('RGB', (8, 8))
+        srgb.info["icc_profile"] = get_srgb_profile_bytes()
+        self.assertIs(convert_to_srgb(srgb, cache=cache), srgb)
+
+        broken = Image.new('RGB', (8, 8))
+        broken.info["icc_profile"] = b"broken profile"
+        self.assertIs(convert_to_srgb(broken, cache=cache), broken)
+
+    def test_transform_cache(self):
+        """変換がプロファイルごとに1回だけ構築されるかのテスト"""
+        cache = TransformCache(max_entries=2)
+        for _ in range(5):
+            convert_to_srgb(self.image, cache=cache)
+        self.assertEqual(cache.stats, {"hits": 4, "misses": 1})
+
+        # 上限を超えると古いものから破棄される
+        convert_to_srgb(self.image.convert('RGBA'), self.profile, cache=cache)
+        convert_to_srgb(self.image.convert('CMYK'), self.profile, cache=cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_resize_image_converts_to_srgb(self):
+        """リサイズ時にsRGBへ変換されるかのテスト"""
+        processor = ImageProcessor()
+        processor.load_image_from_buffer(self._encode_png())
+
+        resized = processor.resize_image(ResizeSettings(width=32, height=32))
+        self.assertEqual(resized.info["icc_profile"], get_srgb_profile_bytes())
+        self.assertNotEqual(resized.getpixel((0, 0)), (200, 100, 50))
+
+        resized = processor.resize_image(ResizeSettings(width=32, height=32,
+                                                        convert_to_srgb=False))
+        self.assertEqual(resized.getpixel((0, 0)), (200, 100, 50))
+        processor.close()
+
+    def _encode_png(self) -> bytes:
+        """ICCプロファイル付きのPNGを作成"""
+        buffer = io.BytesIO()
+        self.image.save(buffer, format="PNG", icc_profile=self.profile)
+        return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
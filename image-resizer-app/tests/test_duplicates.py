@@ -0,0 +1,124 @@
+"""
+重複・類似画像検出のユニットテスト
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, ImageDraw
+
+from models.duplicates import (
+    compute_content_hash,
+    compute_dhash,
+    compute_phash,
+    compare_hashes,
+    find_exact_duplicates,
+    find_near_duplicates,
+    find_duplicates,
+    _hamming_distances,
+)
+
+
+class TestDuplicates(unittest.TestCase):
+    """重複検出のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.photo = self._create_photo()
+
+        # 完全一致・再圧縮・別画像を用意
+        self.original = self._path("original.jpg")
+        self.copy = self._path("copy.jpg")
+        self.resaved = self._path("resaved.jpg")
+        self.other = self._path("other.png")
+        self.photo.save(self.original, quality=95)
+        shutil.copy(self.original, self.copy)
+        self.photo.save(self.resaved, quality=70)
+        Image.linear_gradient('L').save(self.other)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def _create_photo(self) -> Image.Image:
+        """構図のあるテスト画像を作成"""
+        photo = Image.merge('RGB', [
+            Image.linear_gradient('L').resize((200, 150)),
+            Image.effect_noise((200, 150), 30),
+            Image.radial_gradient('L').resize((200, 150)),
+        ])
+        draw = ImageDraw.Draw(photo)
+        draw.ellipse((20, 30, 90, 120), fill=(250, 240, 20))
+        draw.rectangle((120, 20, 180, 60), fill=(10, 20, 200))
+        return photo
+
+    def _path(self, name: str) -> str:
+        """一時ディレクトリ内のパスを取得"""
+        return os.path.join(self.temp_dir, name)
+
+    def test_compute_content_hash(self):
+        """内容ハッシュのテスト"""
+        self.assertEqual(compute_content_hash(self.original), compute_content_hash(self.copy))
+        self.assertNotEqual(compute_content_hash(self.original), compute_content_hash(self.resaved))
+
+    def test_perceptual_hashes(self):
+        """知覚ハッシュのテスト"""
+        resized = self.photo.resize((100, 75))
+        different = Image.linear_gradient('L')
+        for hash_function in (compute_dhash, compute_phash):
+            base = hash_function(self.photo)
+            self.assertLess(base, 2 ** 64)
+            # 縮小しただけの画像は近く、別画像は遠い
+            self.assertLessEqual(compare_hashes(base, hash_function(resized)), 6)
+            self.assertGreater(compare_hashes(base, hash_function(different)), 6)
+
+    def test_find_exact_duplicates(self):
+        """完全一致の検出テスト"""
+        groups = find_exact_duplicates([self.original, self.copy, self.resaved, self.other])
+        self.assertEqual(groups, [sorted([self.original, self.copy])])
+
+    def test_find_near_duplicates(self):
+        """類似の検出テスト"""
+        for method in ("dhash", "phash"):
+            groups = find_near_duplicates([self.original, self.resaved, self.other], method=method)
+            self.assertEqual(groups, [sorted([self.original, self.resaved])])
+
+        with self.assertRaises(ValueError):
+            find_near_duplicates([self.original], method="unknown")
+
+    def test_hamming_distances(self):
+        """まとめて計算したハミング距離が1組ずつの計算と一致するテスト"""
+        hashes = [0, 1, 0xFF, 0xFFFFFFFFFFFFFFFF, 0x8000000000000001, 0x0123456789ABCDEF]
+        values = np.array(hashes, dtype=np.uint64)
+
+        distances = _hamming_distances(values[:3], values)
+
+        self.assertEqual(distances.shape, (3, len(hashes)))
+        for row, hash_a in enumerate(hashes[:3]):
+            for col, hash_b in enumerate(hashes):
+                self.assertEqual(distances[row, col], compare_hashes(hash_a, hash_b))
+
+    def test_find_duplicates_report(self):
+        """重複レポートのテスト"""
+        paths = [self.copy, self.original, self.resaved, self.other]
+        # 類似の検出は指定した場合だけ行う
+        self.assertEqual(find_duplicates(paths).near_groups, [])
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            report = find_duplicates(paths, detect_near=True, executor=executor)
+
+        # 完全一致の重複は代表にまとめられ、類似判定は代表だけで行う
+        self.assertEqual(report.get_duplicate_map(), {self.original: self.copy})
+        self.assertEqual(report.near_groups, [sorted([self.copy, self.resaved])])
+
+        report_path = self._path("report.json")
+        report.write_json(report_path)
+        self.assertTrue(os.path.exists(report_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+"""
+編集パイプラインのユニットテスト
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from models.banded_resize import BandedImageReader
+from models.edit_pipeline import (
+    AutoOrientOp,
+    CropOp,
+    EditPipeline,
+    FlipOp,
+    ResizeOp,
+    RotateOp,
+    plan_operations,
+    render,
+)
+from models.image_processor import ImageProcessor
+from models.settings import EXIF_ORIENTATION_TAG, ResizeSettings
+
+
+def create_noise_image(size=(60, 40), mode="RGB"):
+    """画素ごとに値が異なるテスト用画像を作成"""
+    rng = np.random.default_rng(0)
+    channels = len(mode)
+    array = rng.integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(array if channels > 1 else array[:, :, 0], mode)
+
+
+def mean_difference(first, second):
+    """2枚の画像の画素の平均絶対差"""
+    a = np.asarray(first, dtype=np.int16)
+    b = np.asarray(second, dtype=np.int16)
+    return float(np.abs(a - b).mean())
+
+
+class TestPlanAndRender(unittest.TestCase):
+    """変換の合成と適用のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.image = create_noise_image()
+
+    def render_ops(self, operations, resample=Image.NEAREST):
+        transform = plan_operations(operations, self.image.size)
+        return render(self.image, transform, resample)
+
+    def test_transposes_match_pillow(self):
+        """90度単位の回転・反転がPillowと一致するテスト"""
+        cases = [
+            ([RotateOp(90)], Image.Transpose.ROTATE_90),
+            ([RotateOp(180)], Image.Transpose.ROTATE_180),
+            ([RotateOp(-90)], Image.Transpose.ROTATE_270),
+            ([FlipOp(horizontal=True)], Image.Transpose.FLIP_LEFT_RIGHT),
+            ([FlipOp(horizontal=False)], Image.Transpose.FLIP_TOP_BOTTOM),
+        ]
+        for operations, method in cases:
+            with self.subTest(method=method):
+                expected = self.image.transpose(method)
+                self.assertEqual(self.render_ops(operations).tobytes(), expected.tobytes())
+
+    def test_crop_rotate_flip_sequence(self):
+        """複数の操作を順に適用した結果と一致するテスト"""
+        operations = [CropOp((5, 3, 45, 33)), RotateOp(90), FlipOp(), CropOp((2, 4, 20, 30))]
+        expected = (self.image.crop((5, 3, 45, 33))
+                    .transpose(Image.Transpose.ROTATE_90)
+                    .transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+                    .crop((2, 4, 20, 30)))
+
+        result = self.render_ops(operations)
+
+        self.assertEqual(result.size, expected.size)
+        self.assertEqual(result.tobytes(), expected.tobytes())
+
+    def test_crop_and_resize_fused(self):
+        """切り抜きとリサイズが1回のresizeになるテスト"""
+        expected = self.image.resize((20, 10), Image.LANCZOS, box=(10, 10, 50, 30))
+
+        result = self.render_ops([CropOp((10, 10, 50, 30)), ResizeOp((20, 10))], Image.LANCZOS)
+
+        self.assertEqual(result.tobytes(), expected.tobytes())
+
+    def test_rotate_then_resize(self):
+        """回転後のリサイズが縮小後の回転と一致するテスト"""
+        expected = self.image.resize((40, 30), Image.BILINEAR).transpose(Image.Transpose.ROTATE_90)
+
+        result = self.render_ops([RotateOp(90), ResizeOp((30, 40))], Image.BILINEAR)
+
+        self.assertEqual(result.size, (30, 40))
+        self.assertEqual(result.tobytes(), expected.tobytes())
+
+    def test_arbitrary_rotation(self):
+        """任意角度の回転がImage.rotateと同等になるテスト"""
+        image = Image.linear_gradient("L").resize((80, 60))
+        expected = image.rotate(30, Image.BICUBIC, expand=True)
+
+        transform = plan_operations([RotateOp(30)], image.size)
+        result = render(image, transform, Image.LANCZOS)
+
+        self.assertFalse(transform.is_axis_aligned)
+        self.assertEqual(result.size, expected.size)
+        self.assertLess(mean_difference(result, expected), 2)
+
+    def test_large_downscale_with_rotation(self):
+        """大きく縮小する回転で先に整数倍の縮小を行うテスト"""
+        image = Image.new("RGB", (400, 300), (200, 100, 50))
+
+        transform = plan_operations([RotateOp(45), ResizeOp((50, 50))], image.size)
+        result = render(image, transform, Image.BICUBIC)
+
+        self.assertEqual(result.size, (50, 50))
+        self.assertEqual(result.getpixel((25, 25)), (200, 100, 50))
+
+    def test_invalid_crop(self):
+        """範囲外の切り抜きのテスト"""
+        with self.assertRaises(ValueError):
+            plan_operations([CropOp((0, 0, 100, 10))], self.image.size)
+        with self.assertRaises(ValueError):
+            plan_operations([RotateOp(90), CropOp((0, 0, 50, 10))], self.image.size)
+
+    def test_auto_orient(self):
+        """EXIFの向き情報による正立のテスト"""
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = 6
+        self.image.info["exif"] = exif.tobytes()
+
+        transform = plan_operations([AutoOrientOp()], self.image.size, orientation=6)
+        result = render(self.image, transform, Image.NEAREST)
+
+        expected = self.image.transpose(Image.Transpose.ROTATE_270)
+        self.assertEqual(result.tobytes(), expected.tobytes())
+        self.assertNotIn(EXIF_ORIENTATION_TAG, result.getexif())
+
+    def test_auto_orient_keeps_source_exif(self):
+        """向きの補正を繰り返しても元画像の向き情報が消えないテスト"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "oriented.jpg")
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = 6
+        create_noise_image((200, 100)).save(path, exif=exif.tobytes())
+
+        with ImageProcessor() as processor:
+            processor.load_image(path)
+            processor.auto_orient()
+            self.assertEqual(processor.get_edited_size(), (100, 200))
+
+            settings = ResizeSettings(width=1000, height=1000)
+            for _ in range(2):
+                self.assertEqual(processor.render_resized(settings).size, (500, 1000))
+            self.assertEqual(processor.original_image.getexif()[EXIF_ORIENTATION_TAG], 6)
+
+
+class TestEditPipeline(unittest.TestCase):
+    """EditPipelineクラスのテスト"""
+
+    def test_undo_redo(self):
+        """元に戻す・やり直しのテスト"""
+        pipeline = EditPipeline()
+        pipeline.push(RotateOp(90))
+        pipeline.push(FlipOp())
+
+        self.assertEqual(pipeline.undo(), FlipOp())
+        self.assertEqual(pipeline.operations, [RotateOp(90)])
+        self.assertTrue(pipeline.can_redo())
+        self.assertEqual(pipeline.redo(), FlipOp())
+        self.assertEqual(len(pipeline), 2)
+
+        pipeline.undo()
+        pipeline.push(CropOp((0, 0, 1, 1)))
+        self.assertFalse(pipeline.can_redo())
+        self.assertIsNone(pipeline.redo())
+
+    def test_plan_size(self):
+        """合成後のサイズのテスト"""
+        pipeline = EditPipeline()
+        pipeline.push(CropOp((0, 0, 60, 20)))
+        pipeline.push(RotateOp(270))
+
+        self.assertEqual(pipeline.plan((100, 50)).size, (20, 60))
+        self.assertEqual(pipeline.plan((100, 50), output_size=(10, 30)).size, (10, 30))
+
+
+class TestImageProcessorEdits(unittest.TestCase):
+    """ImageProcessorの編集機能のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.image = create_noise_image((200, 100))
+        self.path = os.path.join(self.temp_dir, "source.tif")
+        self.image.save(self.path, compression=None)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_edits_are_lazy_and_fused(self):
+        """編集がリサイズまで評価されないテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.path)
+            current = processor.current_image
+            processor.crop((0, 0, 100, 100))
+            processor.rotate(90)
+
+            # 画素はまだ処理されていない
+            self.assertIs(processor.current_image, current)
+            self.assertEqual(processor.get_edited_size(), (100, 100))
+
+            result = processor.resize_image(ResizeSettings(width=50, height=50, method="NEAREST"))
+
+            expected = (self.image.crop((0, 0, 100, 100))
+                        .resize((50, 50), Image.NEAREST)
+                        .transpose(Image.Transpose.ROTATE_90))
+            self.assertEqual(result.tobytes(), expected.tobytes())
+
+    def test_ratio_uses_edited_size(self):
+        """比率維持の計算で編集後のサイズを使うテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.path)
+            processor.rotate(90)
+
+            self.assertEqual(processor.calculate_size_with_ratio(50, 50, True), (25, 50))
+
+    def test_invalid_edit_is_rejected(self):
+        """範囲外の切り抜きが履歴に残らないテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.path)
+            with self.assertRaises(ValueError):
+                processor.crop((0, 0, 300, 10))
+            self.assertEqual(len(processor.edits), 0)
+
+    def test_undo_redo_and_reset(self):
+        """編集の取り消し・やり直し・リセットのテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.path)
+            processor.rotate(90)
+            self.assertEqual(processor.get_edited_size(), (100, 200))
+
+            self.assertTrue(processor.undo_edit())
+            self.assertEqual(processor.get_edited_size(), (200, 100))
+            self.assertFalse(processor.undo_edit())
+            self.assertTrue(processor.redo_edit())
+            self.assertEqual(processor.get_edited_size(), (100, 200))
+
+            processor.reset_to_original()
+            self.assertEqual(processor.get_edited_size(), (200, 100))
+
+    def test_banded_source_with_edits(self):
+        """帯単位で処理する画像に編集を適用するテスト"""
+        with ImageProcessor(banded_threshold=1) as processor:
+            processor.load_image(self.path)
+            self.assertIsNotNone(processor.banded_source)
+            processor.crop((100, 0, 200, 100))
+            processor.flip()
+
+            result = processor.resize_image(ResizeSettings(width=50, height=50, method="BILINEAR"))
+
+            expected = (self.image.crop((100, 0, 200, 100))
+                        .transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+                        .resize((50, 50), Image.BILINEAR))
+            self.assertEqual(result.size, (50, 50))
+            self.assertLess(mean_difference(result, expected), 30)
+
+    def test_banded_crop_reads_only_region(self):
+        """帯単位で処理する画像の切り抜きで、切り抜く範囲の行だけを読み込むテスト"""
+        rows = []
+        read_rows = BandedImageReader.read_rows
+
+        def record(reader, top, bottom):
+            rows.append((top, bottom))
+            return read_rows(reader, top, bottom)
+
+        with ImageProcessor(banded_threshold=1) as processor:
+            processor.load_image(self.path)
+            processor.crop((20, 40, 80, 70))
+            with mock.patch.object(BandedImageReader, "read_rows", record):
+                result = processor.resize_image(
+                    ResizeSettings(width=60, height=30, method="NEAREST")
+                )
+            self.assertEqual(result.tobytes(), self.image.crop((20, 40, 80, 70)).tobytes())
+
+        self.assertGreaterEqual(min(top for top, _ in rows), 30)
+        self.assertLessEqual(max(bottom for _, bottom in rows), 80)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,7 +14,8 @@ from utils.file_utils import (
     ensure_unique_filename,
     create_backup_filename,
     get_directory_images,
-    validate_output_path
+    validate_output_path,
+    open_atomic
 )
 
 
@@ -163,6 +164,16 @@ class TestFileUtils(unittest.TestCase):
         self.assertEqual(len(result), 3)
         self.assertEqual(result, expected_paths)
         
+        # サブフォルダを含める
+        os.makedirs(os.path.join(self.temp_dir, "sub"))
+        nested = os.path.join(self.temp_dir, "sub", "nested.webp")
+        Path(nested).touch()
+        self.assertEqual(get_directory_images(self.temp_dir), expected_paths)
+        self.assertEqual(get_directory_images(self.temp_dir, recursive=True),
+                         sorted(expected_paths + [nested]))
+        os.remove(nested)
+        os.rmdir(os.path.join(self.temp_dir, "sub"))
+
         # 存在しないディレクトリ
         result = get_directory_images("/non/existent/directory")
         self.assertEqual(result, [])
@@ -183,6 +194,22 @@ class TestFileUtils(unittest.TestCase):
         
         # 無効なパス形式
         self.assertFalse(validate_output_path(""))
+    
+    def test_open_atomic(self):
+        """書き終えたときだけファイルが置き換わるテスト"""
+        path = os.path.join(self.temp_dir, "output.jpg")
+        with open_atomic(path) as f:
+            f.write(b"first")
+        
+        with self.assertRaises(RuntimeError):
+            with open_atomic(path) as f:
+                f.write(b"partial")
+                raise RuntimeError("書き込み中の失敗")
+        
+        # 失敗した書き込みは反映されず、一時ファイルも残らない
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"first")
+        self.assertEqual(os.listdir(self.temp_dir), ["output.jpg"])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+"""
+出力形式の自動選択のユニットテスト
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from dataclasses import replace
+from PIL import Image, ImageDraw
+
+from models.format_selection import has_transparency, select_smallest_format
+from models.image_processor import ImageProcessor
+from models.settings import CompressionSettings
+
+
+def create_text_graphic(size=(120, 80)):
+    """文字だけの平坦なグラフィックを作成"""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(0, size[1], 10):
+        draw.text((2, row), "Hello world 12345", fill="black")
+    return image
+
+
+class TestSelectSmallestFormat(unittest.TestCase):
+    """select_smallest_format関数のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.photo = Image.effect_noise((120, 80), 40).convert("RGB")
+        self.flat = create_text_graphic()
+        self.settings = CompressionSettings(format_type="AUTO", quality=80)
+
+    def test_smallest_wins(self):
+        """最も小さい形式が選ばれるテスト"""
+        selection = select_smallest_format(self.photo, self.settings)
+
+        sizes = {c.format_type: c.size_bytes for c in selection.candidates}
+        self.assertEqual(set(sizes), {"JPEG", "WEBP", "PNG"})
+        self.assertEqual(selection.chosen.size_bytes, min(sizes.values()))
+        self.assertNotEqual(selection.format_type, "PNG")
+        with Image.open(io.BytesIO(selection.chosen.data)) as decoded:
+            self.assertEqual(decoded.format, selection.format_type)
+        # 選ばれなかった候補のデータは保持しない
+        self.assertTrue(all(not c.data for c in selection.candidates if c is not selection.chosen))
+
+    def test_flat_graphic_prefers_png(self):
+        """平坦なグラフィックではPNGが選ばれるテスト"""
+        selection = select_smallest_format(self.flat, self.settings)
+
+        self.assertEqual(selection.format_type, "PNG")
+
+    def test_transparency_rejects_jpeg(self):
+        """透過を含む画像ではJPEGが除外されるテスト"""
+        image = self.photo.convert("RGBA")
+        image.putpixel((0, 0), (0, 0, 0, 0))
+
+        selection = select_smallest_format(image, self.settings)
+
+        jpeg = [c for c in selection.candidates if c.format_type == "JPEG"][0]
+        self.assertFalse(jpeg.accepted)
+        self.assertNotEqual(selection.format_type, "JPEG")
+
+    def test_opaque_rgba_allows_jpeg(self):
+        """不透明なRGBA画像はJPEGに変換して比較されるテスト"""
+        image = self.photo.convert("RGBA")
+
+        self.assertFalse(has_transparency(image))
+        selection = select_smallest_format(image, self.settings)
+        jpeg = [c for c in selection.candidates if c.format_type == "JPEG"][0]
+        self.assertTrue(jpeg.accepted)
+        self.assertGreater(jpeg.size_bytes, 0)
+
+    def test_min_ssim_rejects_low_quality(self):
+        """最低SSIMを満たさない非可逆形式が除外されるテスト"""
+        self.settings = replace(self.settings, quality=10, format_min_ssim=0.99)
+
+        selection = select_smallest_format(self.photo, self.settings)
+
+        self.assertEqual(selection.format_type, "PNG")
+        rejected = [c for c in selection.candidates if not c.accepted]
+        self.assertEqual({c.format_type for c in rejected}, {"JPEG", "WEBP"})
+        self.assertIn("SSIM", selection.format_report())
+
+    def test_no_acceptable_format(self):
+        """条件を満たす形式がない場合のテスト"""
+        image = Image.new("RGBA", (10, 10), (0, 0, 0, 0))
+        self.settings = replace(self.settings, auto_format_candidates=("JPEG",))
+
+        with self.assertRaises(ValueError):
+            select_smallest_format(image, self.settings)
+
+
+class TestImageProcessorAutoFormat(unittest.TestCase):
+    """ImageProcessorの形式自動選択のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_save_replaces_extension(self):
+        """保存時に選ばれた形式の拡張子に置き換わるテスト"""
+        source = os.path.join(self.temp_dir, "flat.png")
+        create_text_graphic().save(source)
+        settings = CompressionSettings(format_type="AUTO")
+
+        with ImageProcessor() as processor:
+            processor.load_image(source)
+            output_path = processor.save_image(os.path.join(self.temp_dir, "out.jpg"), settings)
+
+            self.assertEqual(output_path, os.path.join(self.temp_dir, "out.png"))
+            self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "out.jpg")))
+            with Image.open(output_path) as saved:
+                self.assertEqual(saved.format, "PNG")
+            self.assertEqual(processor.last_format_selection.format_type, "PNG")
+            # 選ばれた形式で削減量を計測できる
+            self.assertIsInstance(processor.measure_option_savings(settings), list)
+
+    def test_encode_image(self):
+        """メモリ上のエンコードで自動選択されるテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image_from_buffer(self._encode(create_text_graphic()))
+            data = processor.encode_image(CompressionSettings(format_type="AUTO"))
+
+        with Image.open(io.BytesIO(data)) as decoded:
+            self.assertEqual(decoded.format, "PNG")
+
+    def _encode(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+出力前後の画像の比較のユニットテスト
+"""
+
+import math
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from models.image_compare import (
+    COMPARE_HEATMAP, COMPARE_SIDE_BY_SIDE, COMPARE_SPLIT, SPLIT_LINE_COLOR,
+    ComparisonTiles, block_error, encode_candidate, error_stats, heatmap_overlay, pixel_error,
+)
+from models.settings import CompressionSettings
+from models.tile_pyramid import TilePyramid
+
+
+class CountingPyramid(TilePyramid):
+    """描画したタイルの数を数えるTilePyramid"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rendered = 0
+
+    def render_tile(self, key):
+        self.rendered += 1
+        return super().render_tile(key)
+
+
+class TestErrorMaps(unittest.TestCase):
+    """誤差の計算のテスト"""
+
+    def test_pixel_error_uses_largest_channel(self):
+        """画素ごとの誤差がチャンネルの差の最大になるテスト"""
+        before = Image.new('RGB', (4, 2), (100, 100, 100))
+        after = before.copy()
+        after.putpixel((1, 0), (90, 130, 100))
+        after.putpixel((3, 1), (255, 0, 100))
+
+        error = pixel_error(before, after)
+
+        self.assertEqual(error.shape, (2, 4))
+        self.assertEqual(error[0, 1], 30)
+        self.assertEqual(error[1, 3], 155)
+        self.assertEqual(int(error.sum()), 185)
+
+    def test_pixel_error_requires_same_size(self):
+        """サイズが異なる画像は比較できないテスト"""
+        with self.assertRaises(ValueError):
+            pixel_error(Image.new('RGB', (4, 4)), Image.new('RGB', (4, 5)))
+
+    def test_block_error_averages_partial_blocks(self):
+        """端の半端なブロックは含まれる画素だけで平均するテスト"""
+        error = np.full((10, 12), 8, dtype=np.uint8)
+        error[:8, :8] = 0
+
+        blocks = block_error(error, 8)
+
+        self.assertEqual(blocks.shape, (2, 2))
+        self.assertEqual(blocks[0, 0], 0)
+        np.testing.assert_allclose(blocks[[0, 1, 1], [1, 0, 1]], 8)
+
+    def test_heatmap_colors_error_blocks(self):
+        """誤差の大きいブロックが赤く、誤差のないブロックがグレーになるテスト"""
+        base = Image.new('RGB', (16, 8), (200, 200, 200))
+        blocks = np.array([[0.0, 100.0]])
+
+        heatmap = heatmap_overlay(base, blocks, block_size=8, max_error=32)
+
+        self.assertEqual(heatmap.size, (16, 8))
+        self.assertEqual(heatmap.getpixel((0, 0)), (100, 100, 100))
+        self.assertEqual(heatmap.getpixel((15, 7)), (255, 0, 0))
+
+    def test_error_stats(self):
+        """帯単位で計算した画像全体の誤差のテスト"""
+        before = Image.effect_noise((64, 50), 40).convert('RGB')
+        self.assertTrue(math.isinf(error_stats(before, before.copy()).psnr))
+
+        after = Image.eval(before, lambda value: min(255, value + 4))
+        stats = error_stats(before, after, band_rows=7)
+        expected = np.abs(np.asarray(before, dtype=np.int16) - np.asarray(after, dtype=np.int16))
+        self.assertAlmostEqual(stats.mean_error, float(expected.mean()))
+        self.assertEqual(stats.max_error, 4)
+        mse = float(np.square(expected.astype(np.float64)).mean())
+        self.assertAlmostEqual(stats.psnr, 10 * math.log10(255 ** 2 / mse))
+        self.assertIn("PSNR", stats.format())
+
+    def test_encode_candidate(self):
+        """メモリ上でエンコードした結果が保存時の設定で劣化するテスト"""
+        image = Image.effect_noise((96, 64), 60).convert('RGB')
+
+        low = encode_candidate(image, CompressionSettings(format_type="JPEG", quality=10))
+        high = encode_candidate(image, CompressionSettings(format_type="JPEG", quality=95))
+        lossless = encode_candidate(image, CompressionSettings(format_type="PNG"))
+
+        self.assertEqual(low.image.size, image.size)
+        self.assertLess(low.size_bytes, high.size_bytes)
+        self.assertLess(error_stats(image, high.image).mean_error,
+                        error_stats(image, low.image).mean_error)
+        self.assertEqual(error_stats(image, lossless.image).max_error, 0)
+
+
+class TestComparisonTiles(unittest.TestCase):
+    """ComparisonTilesクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.before = CountingPyramid(Image.new('RGB', (400, 100), (0, 0, 255)), tile_size=64)
+        self.after = CountingPyramid(Image.new('RGB', (400, 100), (255, 0, 0)), tile_size=64)
+
+    def test_split_tile(self):
+        """分割位置の左がエンコード前、右がエンコード後になるテスト"""
+        tiles = ComparisonTiles(self.before, self.after, mode=COMPARE_SPLIT, split=0.25)
+
+        # 分割位置は100px（2列目のタイルの36px目）
+        self.assertEqual(tiles.render_tile((0, 0, 0)).getpixel((10, 10)), (0, 0, 255))
+        split_tile = tiles.render_tile((0, 1, 0))
+        self.assertEqual(split_tile.getpixel((35, 10)), (0, 0, 255))
+        self.assertEqual(split_tile.getpixel((36, 10)), SPLIT_LINE_COLOR)
+        self.assertEqual(split_tile.getpixel((37, 10)), (255, 0, 0))
+        self.assertEqual(tiles.render_tile((0, 2, 0)).getpixel((10, 10)), (255, 0, 0))
+
+    def test_heatmap_tile(self):
+        """差分のタイルがエンコード前後の差から作られるテスト"""
+        after = CountingPyramid(self.before.image.copy(), tile_size=64)
+        after.image.paste((0, 0, 0), (0, 0, 8, 8))
+        tiles = ComparisonTiles(self.before, after, mode=COMPARE_HEATMAP)
+
+        tile = tiles.render_tile((0, 0, 0))
+
+        self.assertEqual(tile.getpixel((0, 0)), (255, 0, 0))
+        gray = int(Image.new('RGB', (1, 1), (0, 0, 255)).convert('L').getpixel((0, 0)) * 0.5)
+        self.assertEqual(tile.getpixel((20, 20)), (gray, gray, gray))
+
+    def test_source_tiles_are_reused(self):
+        """分割位置の変更やエンコード結果の差し替えで変わらない側を描画し直さないテスト"""
+        tiles = ComparisonTiles(self.before, self.after)
+        tiles.render_tile((0, 0, 0))
+        tiles.with_split(0.8).render_tile((0, 0, 0))
+        tiles.with_mode(COMPARE_HEATMAP).render_tile((0, 0, 0))
+        self.assertEqual((self.before.rendered, self.after.rendered), (1, 1))
+
+        new_after = CountingPyramid(self.after.image, tile_size=64)
+        tiles.with_after(new_after).render_tile((0, 0, 0))
+        self.assertEqual((self.before.rendered, new_after.rendered), (1, 1))
+
+    def test_invalid_arguments(self):
+        """不正な引数のテスト"""
+        with self.assertRaises(ValueError):
+            ComparisonTiles(self.before, self.after, mode=COMPARE_SIDE_BY_SIDE)
+        with self.assertRaises(ValueError):
+            ComparisonTiles(self.before, self.after, split=1.5)
+        with self.assertRaises(ValueError):
+            ComparisonTiles(self.before, TilePyramid(Image.new('RGB', (10, 10)), tile_size=64))
+        with self.assertRaises(ValueError):
+            ComparisonTiles(self.before, TilePyramid(self.after.image, tile_size=128))
+
+
+if __name__ == '__main__':
+    unittest.main()
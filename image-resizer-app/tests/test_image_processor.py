@@ -2,6 +2,7 @@
 画像処理モデルのユニットテスト
 """
 
+import io
 import unittest
 import tempfile
 import os
@@ -88,6 +89,17 @@ class TestImageProcessor(unittest.TestCase):
         self.assertEqual(resized_image.size, (50, 50))
         self.assertEqual(self.processor.get_current_size(), (50, 50))
     
+    def test_render_resized_keeps_state(self):
+        """状態を変更せずに、渡した編集履歴でリサイズするテスト"""
+        self.processor.load_image(self.test_image_path)
+        self.processor.crop((0, 0, 100, 50))
+        current = self.processor.current_image
+        
+        resize_settings = ResizeSettings(width=50, height=50)
+        self.assertEqual(self.processor.render_resized(resize_settings).size, (50, 25))
+        self.assertEqual(self.processor.render_resized(resize_settings, ()).size, (50, 50))
+        self.assertIs(self.processor.current_image, current)
+    
     def test_resize_image_without_loaded_image(self):
         """画像未読み込み時のリサイズエラーテスト"""
         resize_settings = ResizeSettings()
@@ -171,6 +183,46 @@ class TestImageProcessor(unittest.TestCase):
         self.processor.reset_to_original()
         self.assertEqual(self.processor.get_current_size(), (100, 100))
     
+    def test_load_image_from_buffer(self):
+        """bytes・memoryview・ファイルライクオブジェクトからの読み込みテスト"""
+        with open(self.test_image_path, "rb") as f:
+            data = f.read()
+        
+        for source in (data, bytearray(data), memoryview(data), io.BytesIO(data)):
+            processor = ImageProcessor()
+            self.assertTrue(processor.load_image_from_buffer(source, name=self.test_image_path))
+            self.assertEqual(processor.get_original_size(), (100, 100))
+            self.assertEqual(processor.image_path, self.test_image_path)
+        
+        # 名前なしでも読み込めるが、出力ファイル名は生成できない
+        processor = ImageProcessor()
+        processor.load_image_from_buffer(data)
+        with self.assertRaises(ValueError):
+            processor.generate_output_filename(CompressionSettings())
+    
+    def test_load_image_from_invalid_buffer(self):
+        """不正なデータからの読み込み失敗のテスト"""
+        with self.assertRaises(ValueError):
+            self.processor.load_image_from_buffer(b"not an image")
+    
+    def test_encode_image(self):
+        """メモリ上へのエンコードのテスト"""
+        self.processor.load_image(self.test_image_path)
+        self.processor.resize_image(ResizeSettings(width=40, height=40))
+        
+        data = self.processor.encode_image(CompressionSettings(format_type="WEBP"))
+        encoded = Image.open(io.BytesIO(data))
+        self.assertEqual(encoded.format, "WEBP")
+        self.assertEqual(encoded.size, (40, 40))
+    
+    def test_save_image_to_stream(self):
+        """ファイルライクオブジェクトへの保存のテスト"""
+        self.processor.load_image(self.test_image_path)
+        
+        buffer = io.BytesIO()
+        self.processor.save_image_to_stream(buffer, CompressionSettings(format_type="PNG"))
+        self.assertEqual(Image.open(io.BytesIO(buffer.getvalue())).format, "PNG")
+    
     def test_clear_images(self):
         """画像クリアのテスト"""
         self.processor.load_image(self.test_image_path)
@@ -184,5 +236,69 @@ class TestImageProcessor(unittest.TestCase):
         self.assertFalse(self.processor.has_image())
 
 
+class TestImageProcessorLifecycle(unittest.TestCase):
+    """ImageProcessorのリソース管理のテスト"""
+    
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_image_path = os.path.join(self.temp_dir, "small.png")
+        Image.new('RGB', (8, 8), color='blue').save(self.test_image_path)
+    
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        if os.path.exists(self.test_image_path):
+            os.remove(self.test_image_path)
+        os.rmdir(self.temp_dir)
+    
+    def _count_open_fds(self) -> int:
+        """プロセスが開いているファイルディスクリプタ数を取得"""
+        return len(os.listdir("/proc/self/fd"))
+    
+    def test_file_released_after_load(self):
+        """読み込み直後にファイルを削除できるかのテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.test_image_path)
+            os.remove(self.test_image_path)
+            
+            # ファイル削除後も画像は使用できる
+            resized = processor.resize_image(ResizeSettings(width=4, height=4))
+            self.assertEqual(resized.size, (4, 4))
+    
+    def test_context_manager_closes(self):
+        """コンテキストマネージャー終了時の解放テスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.test_image_path)
+            self.assertTrue(processor.has_image())
+        
+        self.assertFalse(processor.has_image())
+        self.assertIsNone(processor.image_path)
+    
+    def test_failed_load_keeps_previous_image(self):
+        """読み込みに失敗しても前の画像が残るかのテスト"""
+        processor = ImageProcessor()
+        processor.load_image(self.test_image_path)
+        
+        with self.assertRaises(ValueError):
+            processor.load_image(os.path.join(self.temp_dir, "missing.png"))
+        
+        self.assertEqual(processor.image_path, self.test_image_path)
+        self.assertEqual(processor.get_original_size(), (8, 8))
+        processor.close()
+    
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "/proc/self/fd が必要です")
+    def test_many_loads_do_not_leak_fds(self):
+        """大量の読み込みでファイルディスクリプタが増えないかのテスト"""
+        processor = ImageProcessor()
+        processor.load_image(self.test_image_path)
+        baseline = self._count_open_fds()
+        
+        for _ in range(20000):
+            processor.load_image(self.test_image_path)
+        
+        self.assertLessEqual(self._count_open_fds(), baseline)
+        processor.close()
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+複数画像のセッションのユニットテスト
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+from models.image_processor import ImageProcessor
+from models.image_session import ImageSession
+from models.settings import ResizeSettings
+
+# 100x100のRGB画像1枚分の展開後のメモリ量
+IMAGE_BYTES = 100 * 100 * 4
+
+
+class SlowReloadProcessor(ImageProcessor):
+    """読み直しのデコードをreleaseが呼ばれるまで止めるImageProcessor"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.reads = 0
+
+    def read_pixels(self):
+        self.reads += 1
+        self.started.set()
+        self.release.wait(5)
+        return super().read_pixels()
+
+
+class TestImageSession(unittest.TestCase):
+    """ImageSessionクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for name, color in [("red", "red"), ("green", "green"), ("blue", "blue")]:
+            path = os.path.join(self.temp_dir, f"{name}.png")
+            Image.new('RGB', (100, 100), color=color).save(path)
+            self.paths.append(path)
+        # 2枚分まで展開したまま保持できる予算
+        self.session = ImageSession(memory_budget=IMAGE_BYTES * 2, thumbnail_size=(20, 20))
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.session.close_all()
+        shutil.rmtree(self.temp_dir)
+
+    def test_open_and_switch(self):
+        """開いた画像の切り替えで読み直しが起きないテスト"""
+        red, green, _ = self.paths
+        self.session.open(red)
+        self.session.open(green)
+
+        processor = self.session.active_processor
+        self.assertEqual(self.session.activate(red).path, red)
+        self.assertEqual(self.session.active_processor.original_image.getpixel((0, 0)),
+                         (255, 0, 0))
+        self.assertIsNot(self.session.active_processor, processor)
+        self.assertEqual(self.session.stats.reloads, 0)
+        self.assertEqual(self.session.paths, [red, green])
+        # 既に開いている画像はもう一度開いても追加されない
+        self.session.open(green)
+        self.assertEqual(self.session.paths, [red, green])
+
+    def test_least_recently_viewed_is_evicted(self):
+        """予算を超えると最も長く表示していない画像が縮小画像だけになるテスト"""
+        red, green, blue = self.paths
+        self.session.open(red)
+        self.session.open(green)
+        self.session.activate(red)
+        self.session.open(blue)
+
+        self.assertFalse(self.session.get(green).is_loaded)
+        self.assertTrue(self.session.get(red).is_loaded)
+        self.assertEqual(self.session.stats.evictions, 1)
+        self.assertLessEqual(self.session.memory_usage(), IMAGE_BYTES * 2)
+        # 縮小画像は残る
+        self.assertEqual(self.session.get(green).thumbnail.size, (20, 20))
+        self.assertEqual(self.session.get(green).original_size, (100, 100))
+
+    def test_evicted_image_reloads_lazily_with_edits(self):
+        """解放した画像が必要になったときに編集履歴付きで読み直されるテスト"""
+        red, green, blue = self.paths
+        self.session.open(red)
+        self.session.active_processor.rotate(90)
+        self.session.open(green)
+        self.session.open(blue)
+        self.assertFalse(self.session.get(red).is_loaded)
+
+        entry = self.session.activate(red)
+        # 切り替えただけでは読み直さない
+        self.assertFalse(entry.is_loaded)
+
+        processor = self.session.ensure_loaded(red)
+        self.assertEqual(self.session.stats.reloads, 1)
+        self.assertEqual(len(processor.edits), 1)
+        self.assertLessEqual(self.session.memory_usage(), IMAGE_BYTES * 2)
+        result = processor.resize_image(ResizeSettings(width=50, height=50))
+        self.assertEqual(result.getpixel((0, 0)), (255, 0, 0))
+
+    def test_reload_does_not_block_session(self):
+        """読み直しのデコード中も切り替えや一覧の取得が待たされないテスト"""
+        session = ImageSession(memory_budget=IMAGE_BYTES, thumbnail_size=(20, 20),
+                               processor_factory=SlowReloadProcessor)
+        self.addCleanup(session.close_all)
+        red, green, _ = self.paths
+        session.open(red)
+        session.open(green)
+        processor = session.get(red).processor
+        self.assertFalse(session.get(red).is_loaded)
+
+        results = []
+        workers = [threading.Thread(target=lambda: results.append(session.ensure_loaded(red)))
+                   for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        self.assertTrue(processor.started.wait(5))
+
+        # デコード中でもロックを待たずに使える
+        checked = threading.Event()
+
+        def use_session():
+            session.activate(green)
+            session.get(red)
+            session.paths
+            session.format_status()
+            checked.set()
+
+        threading.Thread(target=use_session, daemon=True).start()
+        self.assertTrue(checked.wait(2))
+        self.assertFalse(session.get(red).is_loaded)
+
+        processor.release.set()
+        for worker in workers:
+            worker.join(5)
+        # 同時に読み直しを求めてもデコードは1回
+        self.assertEqual(results, [processor, processor])
+        self.assertEqual(processor.reads, 1)
+        self.assertEqual(session.stats.reloads, 1)
+        self.assertTrue(session.get(red).is_loaded)
+
+    def test_edit_evicted_image(self):
+        """解放済みの画像も読み直さずに編集でき、読み直し後のリサイズに反映されるテスト"""
+        red, green, blue = self.paths
+        Image.new('RGB', (100, 50), color='red').save(red)
+        self.session.open(red)
+        self.session.open(green)
+        self.session.open(blue)
+        entry = self.session.activate(red)
+        self.assertFalse(entry.is_loaded)
+
+        processor = self.session.active_processor
+        self.assertFalse(processor.has_image())
+        processor.rotate(90)
+        self.assertEqual(processor.get_edited_size(), (50, 100))
+        self.assertFalse(entry.is_loaded)
+
+        processor = self.session.ensure_loaded(red)
+        resized = processor.render_resized(ResizeSettings(width=40, height=40),
+                                           tuple(processor.edits.operations))
+        self.assertEqual(resized.size, (20, 40))
+
+    def test_pinned_image_is_not_evicted(self):
+        """処理中の画像が解放されないテスト"""
+        red, green, blue = self.paths
+        self.session.open(red)
+        self.session.pin(red)
+        self.session.open(green)
+        self.session.open(blue)
+
+        self.assertTrue(self.session.get(red).is_loaded)
+        self.assertFalse(self.session.get(green).is_loaded)
+
+        # 読み直した画像はその場では解放されず、予算の超過はpinの解除まで続く
+        self.session.ensure_loaded(green)
+        self.assertTrue(self.session.get(green).is_loaded)
+        self.assertGreater(self.session.memory_usage(), IMAGE_BYTES * 2)
+
+        self.session.unpin(red)
+        self.assertFalse(self.session.get(red).is_loaded)
+        self.assertLessEqual(self.session.memory_usage(), IMAGE_BYTES * 2)
+
+    def test_close(self):
+        """画像を閉じると直前に表示していた画像に戻るテスト"""
+        red, green, _ = self.paths
+        self.session.open(red)
+        self.session.open(green)
+        processor = self.session.active_processor
+
+        self.session.close(green)
+
+        self.assertEqual(self.session.active_path, red)
+        self.assertEqual(self.session.paths, [red])
+        self.assertFalse(processor.has_image())
+        self.session.close(red)
+        self.assertIsNone(self.session.active_path)
+        self.assertFalse(self.session.active_processor.has_image())
+
+    def test_close_while_pinned(self):
+        """処理中に閉じた画像はpinの解除時に解放されるテスト"""
+        red = self.paths[0]
+        self.session.open(red)
+        processor = self.session.active_processor
+        self.session.pin(red)
+
+        self.session.close(red)
+        self.assertTrue(processor.has_image())
+        self.session.unpin(red)
+        self.assertFalse(processor.has_image())
+
+    def test_format_status(self):
+        """状態の文字列のテスト"""
+        self.session.open(self.paths[0])
+        self.assertIn("開いている画像: 1件（展開済み 1件", self.session.format_status())
+
+
+class TestImageProcessorUnload(unittest.TestCase):
+    """ImageProcessorの画素データの解放のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "image.png")
+        Image.new('RGB', (40, 30), color='red').save(self.path)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_unload_and_reload(self):
+        """解放と読み直しのテスト"""
+        with ImageProcessor() as processor:
+            processor.load_image(self.path)
+            processor.flip()
+            self.assertEqual(processor.get_decoded_bytes(), 40 * 30 * 4)
+
+            processor.unload_pixels()
+            self.assertFalse(processor.has_image())
+            self.assertEqual(processor.get_decoded_bytes(), 0)
+            self.assertEqual(processor.image_path, self.path)
+
+            processor.reload_pixels()
+            self.assertTrue(processor.has_image())
+            self.assertEqual(len(processor.edits), 1)
+
+    def test_unload_buffer_image(self):
+        """ファイルから読み込んでいない画像は解放できないテスト"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with ImageProcessor() as processor:
+            processor.load_image_from_buffer(data)
+            with self.assertRaises(ValueError):
+                processor.unload_pixels()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+"""
+共有ディレクトリの作業キューのユニットテスト
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from models.batch_processor import BatchProcessor
+from models.distributed_batch import collect_summary, create_job, item_id_for, run_worker
+from models.lease_queue import RESULT_FAILED, LeaseQueue, LeaseWorker
+from models.settings import CompressionSettings, ResizeSettings
+
+
+def expire(path, seconds=3600):
+    """ファイルの更新時刻を過去にしてリースを期限切れにする"""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+class TestLeaseQueue(unittest.TestCase):
+    """LeaseQueueクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.queue = LeaseQueue(self.temp_dir, lease_seconds=30)
+        for index in range(3):
+            self.queue.enqueue(f"item{index}", {"value": index})
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_lease_is_exclusive(self):
+        """有効なリースは1つのワーカーだけが持てるテスト"""
+        lease = self.queue.try_acquire("item0", "a")
+
+        self.assertIsNotNone(lease)
+        self.assertIsNone(self.queue.try_acquire("item0", "b"))
+        self.assertEqual(self.queue.next_item("b").item_id, "item1")
+
+        self.queue.release(lease)
+        self.assertIsNotNone(self.queue.try_acquire("item0", "b"))
+
+    def test_expired_lease_is_reclaimed(self):
+        """ハートビートが途絶えたリースを他のワーカーが回収するテスト"""
+        lease = self.queue.try_acquire("item0", "crashed")
+        expire(lease.path)
+
+        reclaimed = self.queue.try_acquire("item0", "b")
+
+        self.assertIsNotNone(reclaimed)
+        self.assertEqual(reclaimed.worker_id, "b")
+        # 元の持ち主はリースを失ったことを検出でき、解放しても他人のリースを消さない
+        self.assertFalse(self.queue.heartbeat(lease))
+        self.queue.release(lease)
+        self.assertTrue(self.queue.owns(reclaimed))
+        self.assertEqual(os.listdir(self.queue.leases_dir), ["item0.lease"])
+
+    def test_heartbeat_keeps_lease(self):
+        """ハートビートで期限が延びるテスト"""
+        lease = self.queue.try_acquire("item0", "a")
+        expire(lease.path)
+
+        self.assertTrue(self.queue.heartbeat(lease))
+        self.assertIsNone(self.queue.try_acquire("item0", "b"))
+
+    def test_record_result_is_idempotent(self):
+        """最初の結果だけが記録されるテスト"""
+        self.assertTrue(self.queue.record_result("item0", {"status": "done", "n": 1}))
+        self.assertFalse(self.queue.record_result("item0", {"status": "done", "n": 2}))
+
+        self.assertEqual(self.queue.get_result("item0")["n"], 1)
+        self.assertEqual(os.listdir(self.queue.results_dir), ["item0.json"])
+        # 結果のある項目は取り出されない
+        self.assertEqual(self.queue.next_item("a").item_id, "item1")
+
+    def test_worker_records_failures(self):
+        """処理の例外が失敗として記録されるテスト"""
+        def process(item):
+            if item["value"] == 1:
+                raise ValueError("処理できません")
+            return {"double": item["value"] * 2}
+
+        processed = LeaseWorker(self.queue, process, worker_id="w").run()
+
+        self.assertEqual(processed, 3)
+        self.assertEqual(self.queue.get_result("item2")["double"], 4)
+        self.assertEqual(self.queue.get_result("item1")["status"], RESULT_FAILED)
+        self.assertEqual(self.queue.get_result("item1")["error"], "処理できません")
+        status = self.queue.get_status()
+        self.assertEqual((status.done, status.failed, status.leased), (2, 1, 0))
+        self.assertTrue(status.is_complete)
+        self.assertEqual(os.listdir(self.queue.leases_dir), [])
+
+    def test_lost_lease_result_is_not_recorded(self):
+        """処理中にリースを回収された項目の結果を記録しないテスト"""
+        owned = []
+
+        def process(item):
+            if item["value"] == 0:
+                # 処理中に期限切れになり、他のワーカーが回収した
+                expire(worker.current_lease.path)
+                self.queue.try_acquire("item0", "other")
+            owned.append(worker.owns_lease())
+            return {"value": item["value"]}
+
+        worker = LeaseWorker(self.queue, process, worker_id="w")
+        worker.run(max_items=3, wait=False)
+
+        self.assertEqual(owned, [False, True, True])
+        self.assertIsNone(self.queue.get_result("item0"))
+        self.assertEqual(worker.processed, 2)
+        # 回収したワーカーのリースは残る
+        self.assertEqual(self.queue.get_status().leased, 1)
+
+    def test_invalid_arguments(self):
+        """不正な引数のテスト"""
+        with self.assertRaises(ValueError):
+            self.queue.enqueue("../escape", {})
+        with self.assertRaises(ValueError):
+            LeaseQueue(self.temp_dir, lease_seconds=0)
+
+
+class TestDistributedBatch(unittest.TestCase):
+    """複数プロセスでの分散バッチ処理のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, "input")
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        self.queue_dir = os.path.join(self.temp_dir, "queue")
+        os.mkdir(self.input_dir)
+        os.mkdir(self.output_dir)
+        self.paths = []
+        for index in range(8):
+            path = os.path.join(self.input_dir, f"photo{index}.png")
+            Image.new('RGB', (80, 40), color=(index * 30, 0, 0)).save(path)
+            self.paths.append(path)
+        broken = os.path.join(self.input_dir, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        self.paths.append(broken)
+        create_job(self.queue_dir, self.paths, self.output_dir,
+                   ResizeSettings(width=40, height=40),
+                   CompressionSettings(format_type="AUTO", auto_format_candidates=("PNG", "JPEG")))
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_worker_processes(self):
+        """複数のワーカープロセスで全項目が1回ずつ処理されるテスト"""
+        # クラッシュしたワーカーのリースを残しておく
+        queue = LeaseQueue(self.queue_dir)
+        crashed = queue.try_acquire(item_id_for(self.paths[0]), "crashed")
+        expire(crashed.path)
+
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=run_worker, args=(self.queue_dir, f"worker{index}", 5.0, 0.1))
+            for index in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+        status = queue.get_status()
+        self.assertEqual((status.total, status.done, status.failed), (9, 8, 1))
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         sorted(f"photo{index}_resized.png" for index in range(8)))
+        workers = {result["worker_id"] for result in queue.get_results().values()}
+        self.assertTrue(workers <= {"worker0", "worker1", "worker2"})
+
+        summary = collect_summary(self.queue_dir)
+        self.assertEqual(summary.count("processed"), 8)
+        self.assertEqual(summary.count("failed"), 1)
+        self.assertEqual(summary.get_format_counts(), {"PNG": 8})
+
+    def test_lost_lease_discards_output(self):
+        """リースを失ったワーカーが出力を公開せずに破棄するテスト"""
+        queue = LeaseQueue(self.queue_dir)
+        process_file = BatchProcessor.process_file
+        stolen = []
+
+        def process_and_lose_lease(processor, source_path, output_path):
+            result = process_file(processor, source_path, output_path)
+            if source_path == self.paths[0]:
+                # 書き出しの後、公開する前に他のワーカーが回収して処理を終えた
+                item_id = item_id_for(source_path)
+                expire(os.path.join(queue.leases_dir, f"{item_id}.lease"))
+                thief = queue.try_acquire(item_id, "thief")
+                queue.record_result(item_id, {"status": "done", "worker_id": "thief"})
+                queue.release(thief)
+                stolen.append(result.output_path)
+            return result
+
+        with mock.patch.object(BatchProcessor, "process_file", process_and_lose_lease):
+            processed = run_worker(self.queue_dir, "slow", poll_interval=0.1)
+
+        self.assertEqual(processed, 8)
+        self.assertEqual(queue.get_result(item_id_for(self.paths[0]))["worker_id"], "thief")
+        self.assertFalse(os.path.exists(stolen[0]))
+        # 回収された項目の出力は公開されず、一時ファイルも残らない
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         sorted(f"photo{index}_resized.png" for index in range(1, 8)))
+
+    def test_rerun_is_idempotent(self):
+        """処理済みのキューを再実行しても何も処理しないテスト"""
+        self.assertEqual(run_worker(self.queue_dir, "first", poll_interval=0.1), 9)
+        create_job(self.queue_dir, self.paths, self.output_dir,
+                   ResizeSettings(width=40, height=40), CompressionSettings())
+
+        self.assertEqual(run_worker(self.queue_dir, "second", poll_interval=0.1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+画像処理のメモリ回帰テスト
+
+tracemallocでPythonの割り当てを、RSSのサンプリングでPillowの画素バッファを計測し、
+操作ごとのピークがtests/memory_budgets.jsonの予算に収まることを確認する。
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+
+from PIL import Image
+
+from models.image_processor import ImageProcessor
+from models.settings import CompressionSettings, ResizeSettings
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_budgets.json")
+
+_STATM_PATH = "/proc/self/statm"
+_MB = 1024 * 1024
+
+
+def load_budgets() -> dict:
+    """メモリ予算を読み込み"""
+    with open(BUDGETS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_rss() -> int:
+    """現在のRSS（バイト）を取得"""
+    with open(_STATM_PATH) as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def release_free_memory():
+    """解放済みのメモリをOSに返して計測の基準値を安定させる"""
+    gc.collect()
+    libc_name = ctypes.util.find_library("c")
+    if libc_name:
+        libc = ctypes.CDLL(libc_name)
+        if hasattr(libc, "malloc_trim"):
+            libc.malloc_trim(0)
+
+
+class MemoryProbe:
+    """処理中のRSSの増加とPythonの割り当てのピークを計測する"""
+
+    def __init__(self, interval: float = 0.0005):
+        self.interval = interval
+        self.rss_peak_bytes = 0
+        self.python_peak_bytes = 0
+
+    def measure(self, func):
+        """funcを実行してピークを記録し、funcの戻り値を返す"""
+        release_free_memory()
+        baseline = read_rss()
+        peak = [baseline]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.is_set():
+                peak[0] = max(peak[0], read_rss())
+                time.sleep(self.interval)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        tracemalloc.start()
+        try:
+            return func()
+        finally:
+            _, self.python_peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stop.set()
+            sampler.join()
+            self.rss_peak_bytes = max(peak[0], read_rss()) - baseline
+
+
+def decoded_bytes(size) -> int:
+    """RGB画像を展開したときのバイト数（Pillowは1画素4バイトで保持する）"""
+    return size[0] * size[1] * 4
+
+
+@unittest.skipUnless(os.path.exists(_STATM_PATH), "RSSの計測には/procが必要です")
+class TestOperationBudgets(unittest.TestCase):
+    """操作ごとのメモリ予算のテスト"""
+
+    @classmethod
+    def setUpClass(cls):
+        """テスト画像の作成"""
+        cls.budgets = load_budgets()
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.image_paths = {}
+        for width, height in cls.budgets["sizes"]:
+            path = os.path.join(cls.temp_dir, f"photo_{width}x{height}.jpg")
+            Image.effect_noise((width, height), 30).convert("RGB").save(path, quality=90)
+            cls.image_paths[(width, height)] = path
+
+    @classmethod
+    def tearDownClass(cls):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(cls.temp_dir)
+
+    def assert_within_budget(self, operation, size, probe):
+        """計測したピークが予算内か確認"""
+        budget = self.budgets["operations"][operation]
+        rss_limit = (decoded_bytes(size) * budget["rss_ratio"]
+                     + self.budgets["rss_slack_mb"] * _MB)
+        self.assertLessEqual(
+            probe.rss_peak_bytes, rss_limit,
+            f"{operation} {size}: RSSの増加 {probe.rss_peak_bytes / _MB:.1f} MB "
+            f"が予算 {rss_limit / _MB:.1f} MB を超えました"
+        )
+        self.assertLessEqual(
+            probe.python_peak_bytes, budget["python_mb"] * _MB,
+            f"{operation} {size}: Pythonの割り当て {probe.python_peak_bytes / _MB:.2f} MB "
+            f"が予算 {budget['python_mb']} MB を超えました"
+        )
+
+    def test_operations(self):
+        """読み込み・リサイズ・プレビュー・保存・リセットのピークのテスト"""
+        output_path = os.path.join(self.temp_dir, "output.jpg")
+        for size, path in self.image_paths.items():
+            with self.subTest(size=size), ImageProcessor() as processor:
+                probe = MemoryProbe()
+                operations = [
+                    ("load", lambda: processor.load_image(path)),
+                    ("resize", lambda: processor.resize_image(
+                        ResizeSettings(width=size[0] // 2, height=size[1] // 2))),
+                    ("reset", processor.reset_to_original),
+                    ("preview", lambda: processor.create_preview((400, 400))),
+                    ("save", lambda: processor.save_image(output_path, CompressionSettings())),
+                ]
+                for operation, func in operations:
+                    probe.measure(func)
+                    self.assert_within_budget(operation, size, probe)
+
+
+@unittest.skipUnless(os.path.exists(_STATM_PATH), "RSSの計測には/procが必要です")
+class TestLoadClearLeak(unittest.TestCase):
+    """読み込みと解放の繰り返しによるリークのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.budget = load_budgets()["leak"]
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "photo.jpg")
+        Image.effect_noise(tuple(self.budget["size"]), 30).convert("RGB").save(self.path)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_clear_cycles(self):
+        """load_image/clear_imagesを繰り返してもメモリが増え続けないテスト"""
+        processor = ImageProcessor()
+
+        def cycle(count):
+            for _ in range(count):
+                processor.load_image(self.path)
+                processor.create_preview((200, 200))
+                processor.clear_images()
+
+        cycle(self.budget["warmup_cycles"])
+        release_free_memory()
+        rss_before = read_rss()
+        tracemalloc.start()
+        try:
+            python_before, _ = tracemalloc.get_traced_memory()
+            cycle(self.budget["cycles"])
+            gc.collect()
+            python_after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        release_free_memory()
+        rss_growth = read_rss() - rss_before
+
+        self.assertLessEqual(rss_growth, self.budget["max_rss_growth_mb"] * _MB)
+        self.assertLessEqual(python_after - python_before,
+                             self.budget["max_python_growth_mb"] * _MB)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+メモリ予算スケジューラーのユニットテスト
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from PIL import Image
+
+from models.memory_scheduler import (
+    DECODED_COPIES,
+    MemoryBudgetScheduler,
+    ScheduledJob,
+    decoded_bytes,
+    estimate_job_memory,
+)
+
+
+class TestEstimateJobMemory(unittest.TestCase):
+    """メモリ見積もりのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_decoded_bytes(self):
+        """展開後のメモリ量のテスト"""
+        self.assertEqual(decoded_bytes((100, 50), "RGB"), 100 * 50 * 4)
+        self.assertEqual(decoded_bytes((100, 50), "L"), 100 * 50)
+
+    def test_estimate_from_header(self):
+        """ヘッダーからの見積もりのテスト"""
+        path = os.path.join(self.temp_dir, "gray.png")
+        Image.new('L', (300, 200)).save(path)
+
+        expected = DECODED_COPIES * 300 * 200 + decoded_bytes((10, 10), "RGB")
+        self.assertEqual(estimate_job_memory(path, (10, 10)), expected)
+
+
+class TestMemoryBudgetScheduler(unittest.TestCase):
+    """MemoryBudgetSchedulerクラスのテスト"""
+
+    def _run_tracking(self, scheduler, jobs):
+        """実行中のメモリ量と実行順を記録しながらジョブを実行"""
+        sizes = {job.key: job.memory_bytes for job in jobs}
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0, "order": []}
+
+        def work(key):
+            with lock:
+                state["current"] += sizes[key]
+                state["peak"] = max(state["peak"], state["current"])
+                state["order"].append(key)
+            time.sleep(0.01)
+            with lock:
+                state["current"] -= sizes[key]
+            return key * 2
+
+        results = scheduler.run(jobs, work)
+        return results, state
+
+    def test_respects_memory_budget(self):
+        """メモリ予算を超えて同時実行しないかのテスト"""
+        jobs = [ScheduledJob(key=i, memory_bytes=size)
+                for i, size in enumerate([60, 50, 40, 10, 10, 10, 5, 5])]
+        scheduler = MemoryBudgetScheduler(memory_budget=100, max_workers=4)
+
+        results, state = self._run_tracking(scheduler, jobs)
+
+        self.assertEqual(results, {i: i * 2 for i in range(8)})
+        self.assertLessEqual(state["peak"], 100)
+        self.assertLessEqual(scheduler.peak_reserved, 100)
+        self.assertEqual(scheduler.reserved_bytes, 0)
+        # 大きいジョブから順に投入する
+        self.assertEqual([job.key for job in scheduler.order_jobs(jobs)][:3], [0, 1, 2])
+
+    def test_small_jobs_fill_gaps(self):
+        """大きいジョブの隙間に小さいジョブが入るかのテスト"""
+        jobs = [ScheduledJob("large1", 70), ScheduledJob("large2", 70),
+                ScheduledJob("small1", 20), ScheduledJob("small2", 10)]
+        scheduler = MemoryBudgetScheduler(memory_budget=100, max_workers=4)
+
+        _, state = self._run_tracking(scheduler, jobs)
+
+        # large2は予算に収まらないため、先に小さいジョブが実行される
+        self.assertEqual(set(state["order"][:3]), {"large1", "small1", "small2"})
+        self.assertEqual(state["order"][3], "large2")
+
+    def test_oversized_job_runs_alone(self):
+        """予算を超えるジョブが単独で実行されるかのテスト"""
+        jobs = [ScheduledJob("huge", 500), ScheduledJob("small", 10)]
+        scheduler = MemoryBudgetScheduler(memory_budget=100, max_workers=4)
+
+        results, state = self._run_tracking(scheduler, jobs)
+
+        self.assertEqual(set(results), {"huge", "small"})
+        self.assertEqual(state["peak"], 500)
+
+    def test_acquire_waits_for_budget(self):
+        """acquireが予算に空きができるまで待つテスト"""
+        scheduler = MemoryBudgetScheduler(memory_budget=100, max_workers=4)
+        scheduler.acquire(70)
+        acquired = threading.Event()
+
+        def acquire_more():
+            scheduler.acquire(40)
+            acquired.set()
+
+        threading.Thread(target=acquire_more, daemon=True).start()
+        self.assertFalse(acquired.wait(0.1))
+        scheduler.release(70)
+        self.assertTrue(acquired.wait(5))
+        self.assertEqual(scheduler.reserved_bytes, 40)
+        self.assertEqual(scheduler.peak_reserved, 70)
+
+        # 予算より大きい予約は他に何も予約していないときにできる
+        scheduler.release(40)
+        scheduler.acquire(500)
+        self.assertEqual(scheduler.peak_reserved, 500)
+        scheduler.release(500)
+        self.assertEqual(scheduler.reserved_bytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+メタデータスキャナーのユニットテスト
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import warnings
+import zlib
+from unittest import mock
+from PIL import Image
+
+from models.metadata_scan import (
+    RecordFilter,
+    read_image_header,
+    scan_directory,
+    scan_images,
+    sort_records,
+    write_csv,
+    write_json,
+)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """PNGのチャンクを作成"""
+    crc = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+class TestMetadataScan(unittest.TestCase):
+    """メタデータスキャナーのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        Image.new('RGB', (4000, 10)).save(os.path.join(self.temp_dir, "wide.jpg"))
+        Image.new('L', (100, 200)).save(os.path.join(self.temp_dir, "gray.png"))
+        os.makedirs(os.path.join(self.temp_dir, "sub"))
+        Image.new('RGBA', (50, 50)).save(os.path.join(self.temp_dir, "sub", "icon.webp"))
+        with open(os.path.join(self.temp_dir, "broken.png"), "wb") as f:
+            f.write(b"not an image")
+        with open(os.path.join(self.temp_dir, "notes.txt"), "w") as f:
+            f.write("text")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_scan_directory(self):
+        """ディレクトリのスキャンテスト"""
+        records = {os.path.basename(r.path): r for r in scan_directory(self.temp_dir)}
+
+        self.assertEqual(set(records), {"wide.jpg", "gray.png", "broken.png"})
+        self.assertEqual((records["wide.jpg"].width, records["wide.jpg"].height), (4000, 10))
+        self.assertEqual(records["wide.jpg"].format, "JPEG")
+        self.assertEqual(records["gray.png"].mode, "L")
+        self.assertGreater(records["gray.png"].file_size, 0)
+        self.assertIsNotNone(records["broken.png"].error)
+
+        recursive = scan_directory(self.temp_dir, recursive=True)
+        self.assertIn(os.path.join(self.temp_dir, "sub", "icon.webp"),
+                      [record.path for record in recursive])
+
+    def test_truncated_headers_are_recorded(self):
+        """ヘッダーの途中で切れたファイルをエラーとして記録し、スキャンを続けるテスト"""
+        paths = []
+        for format_type, extension in (("PNG", "png"), ("JPEG", "jpg"), ("GIF", "gif"),
+                                       ("BMP", "bmp"), ("TIFF", "tif"), ("WEBP", "webp")):
+            buffer = io.BytesIO()
+            Image.new('RGB', (10, 10)).save(buffer, format_type)
+            path = os.path.join(self.temp_dir, f"truncated.{extension}")
+            with open(path, "wb") as f:
+                f.write(buffer.getvalue()[:20])
+            paths.append(path)
+        gray = os.path.join(self.temp_dir, "gray.png")
+
+        with warnings.catch_warnings():
+            # TIFFプラグインの「EXIFが壊れている」警告
+            warnings.simplefilter("ignore")
+            records = scan_images(paths + [gray], max_workers=2)
+
+        for record in records[:-1]:
+            self.assertIsNotNone(record.error, record.path)
+        self.assertEqual((records[-1].width, records[-1].height), (100, 200))
+
+        # プラグインが途中で切れたデータから送出する例外
+        for error in (struct.error("unpack requires a buffer"), EOFError()):
+            def factory(fp, filename, error=error):
+                raise error
+
+            with mock.patch.dict(Image.OPEN, {"PNG": (factory, Image.OPEN["PNG"][1])}):
+                record = read_image_header(gray)
+            self.assertIsNotNone(record.error)
+            self.assertEqual(record.width, 0)
+
+    def test_header_only_for_huge_image(self):
+        """画素数が多い画像もヘッダーだけで読めるかのテスト"""
+        path = os.path.join(self.temp_dir, "huge.png")
+        header = struct.pack(">IIBBBBB", 30000, 20000, 8, 2, 0, 0, 0)
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+                    + _png_chunk(b"IDAT", b"") + _png_chunk(b"IEND", b""))
+
+        record = read_image_header(path)
+        self.assertIsNone(record.error)
+        self.assertEqual(record.pixel_count, 30000 * 20000)
+
+    def test_filter_and_sort(self):
+        """絞り込みと並べ替えのテスト"""
+        records = scan_directory(self.temp_dir, recursive=True)
+
+        wide = RecordFilter(min_width=3000).apply(records)
+        self.assertEqual([os.path.basename(r.path) for r in wide], ["wide.jpg"])
+
+        small_png = RecordFilter(max_width=150, formats=["png", "webp"]).apply(records)
+        self.assertEqual({os.path.basename(r.path) for r in small_png}, {"gray.png", "icon.webp"})
+
+        ordered = sort_records(RecordFilter().apply(records), "pixel_count", descending=True)
+        self.assertEqual([os.path.basename(r.path) for r in ordered],
+                         ["wide.jpg", "gray.png", "icon.webp"])
+        with self.assertRaises(ValueError):
+            sort_records(records, "unknown")
+
+    def test_write_csv_and_json(self):
+        """CSV・JSON出力のテスト"""
+        records = RecordFilter().apply(scan_directory(self.temp_dir))
+
+        csv_stream = io.StringIO()
+        write_csv(records, csv_stream)
+        rows = list(csv.DictReader(io.StringIO(csv_stream.getvalue())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["width"], str(records[0].width))
+
+        json_stream = io.StringIO()
+        write_json(records, json_stream)
+        data = json.loads(json_stream.getvalue())
+        self.assertEqual(data[0]["path"], records[0].path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+出力オプションの削減量計測のユニットテスト
+"""
+
+import io
+import unittest
+from PIL import Image, ImageCms
+
+from models.image_processor import ImageProcessor
+from models.output_savings import (
+    OptionSavings,
+    combine_savings,
+    format_savings,
+    measure_option_savings,
+)
+from models.settings import CompressionSettings
+
+
+class TestOutputSavings(unittest.TestCase):
+    """出力オプションの削減量計測のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        gradient = Image.linear_gradient('L').resize((128, 128))
+        noise = Image.effect_noise((128, 128), 40)
+        self.image = Image.merge('RGB', (gradient, noise, gradient.rotate(90)))
+        # ICCプロファイルとEXIFを持つ画像
+        profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+        self.image.info["icc_profile"] = profile.tobytes()
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010E] = "x" * 2000
+        self.image.info["exif"] = exif.tobytes()
+
+    def test_metadata_strip_savings(self):
+        """メタデータ削除の削減量のテスト"""
+        savings = measure_option_savings(self.image, CompressionSettings(format_type="JPEG"))
+
+        self.assertEqual([item.option for item in savings], ["metadata"])
+        self.assertGreater(savings[0].saved_bytes, 2000)
+
+    def test_enabled_options_are_measured(self):
+        """有効にしたオプションのみ計測されるかのテスト"""
+        settings = CompressionSettings(format_type="JPEG", progressive=True, subsampling="4:2:0",
+                                       keep_icc_profile=True, keep_exif_orientation=True)
+        savings = {item.option: item for item in measure_option_savings(self.image, settings)}
+
+        self.assertEqual(set(savings), {"metadata", "progressive", "subsampling"})
+        # 4:4:4と比べて4:2:0は小さくなる
+        self.assertGreater(savings["subsampling"].saved_bytes, 0)
+
+        webp = measure_option_savings(self.image, CompressionSettings(format_type="WEBP",
+                                                                      lossless=True))
+        self.assertIn("lossless", [item.option for item in webp])
+
+    def test_saved_file_metadata(self):
+        """保存したファイルのメタデータのテスト"""
+        processor = ImageProcessor()
+        processor.load_image_from_buffer(self._encode_with_metadata())
+
+        stripped = processor.encode_image(CompressionSettings(format_type="JPEG"))
+        with Image.open(io.BytesIO(stripped)) as saved:
+            self.assertNotIn("icc_profile", saved.info)
+            self.assertEqual(len(saved.getexif()), 0)
+
+        kept = processor.encode_image(CompressionSettings(format_type="JPEG", keep_icc_profile=True,
+                                                          keep_exif_orientation=True))
+        with Image.open(io.BytesIO(kept)) as saved:
+            self.assertEqual(saved.info["icc_profile"], self.image.info["icc_profile"])
+            self.assertEqual(dict(saved.getexif()), {0x0112: 6})
+        processor.close()
+
+    def _encode_with_metadata(self) -> bytes:
+        """メタデータ付きのJPEGを作成"""
+        buffer = io.BytesIO()
+        self.image.save(buffer, format="JPEG", icc_profile=self.image.info["icc_profile"],
+                        exif=self.image.info["exif"])
+        return buffer.getvalue()
+
+    def test_combine_and_format_savings(self):
+        """削減量の合算と整形のテスト"""
+        combined = combine_savings([
+            [OptionSavings("metadata", "メタデータ削除", 2048, 1024)],
+            [OptionSavings("metadata", "メタデータ削除", 1024, 0),
+             OptionSavings("lossless", "ロスレスWEBP", 1024, 2048)],
+        ])
+
+        self.assertEqual(combined[0].saved_bytes, 2048)
+        self.assertEqual(format_savings(combined),
+                         "メタデータ削除: 2.0 KB 削減 (66.7%)\nロスレスWEBP: 1.0 KB 増加 (100.0%)")
+
+
+if __name__ == '__main__':
+    unittest.main()
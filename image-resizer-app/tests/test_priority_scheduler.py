@@ -0,0 +1,144 @@
+"""
+優先度スケジューラーのユニットテスト
+"""
+
+import threading
+import time
+import unittest
+
+from models.memory_scheduler import MemoryBudgetScheduler, ScheduledJob
+from models.priority_scheduler import (
+    PRIORITY_EXPORT,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_PREFETCH,
+    PriorityScheduler,
+)
+
+
+class TestPriorityScheduler(unittest.TestCase):
+    """PrioritySchedulerクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.scheduler = PriorityScheduler(max_workers=3, reserved_interactive=1)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.scheduler.shutdown(wait=True, cancel_futures=True)
+
+    def test_submit_returns_result(self):
+        """通常のExecutorとして結果を返すテスト"""
+        self.assertEqual(self.scheduler.submit(lambda x: x * 2, 21).result(timeout=5), 42)
+        self.assertEqual(self.scheduler.get_stats()["export"].completed, 1)
+
+    def test_exception_is_propagated(self):
+        """ジョブの例外がFutureに伝わるテスト"""
+        def fail():
+            raise ValueError("失敗")
+
+        future = self.scheduler.submit_with_priority(PRIORITY_INTERACTIVE, fail)
+        with self.assertRaises(ValueError):
+            future.result(timeout=5)
+
+    def test_unknown_priority(self):
+        """不明な優先度のテスト"""
+        with self.assertRaises(ValueError):
+            self.scheduler.submit_with_priority(99, lambda: None)
+
+    def test_interactive_runs_during_export_flood(self):
+        """大量の書き出し中でも対話的な処理がすぐに開始されるテスト"""
+        release = threading.Event()
+        exports = [self.scheduler.submit(release.wait) for _ in range(200)]
+
+        start = time.perf_counter()
+        self.scheduler.submit_with_priority(PRIORITY_INTERACTIVE, lambda: None).result(timeout=5)
+        latency = time.perf_counter() - start
+
+        # 確保したワーカーで実行されるため書き出しの完了を待たない
+        self.assertLess(latency, 0.5)
+        self.assertFalse(any(future.done() for future in exports))
+        release.set()
+        for future in exports:
+            future.result(timeout=5)
+
+    def test_background_limited_to_unreserved_workers(self):
+        """書き出しが確保されたワーカーを使わないテスト"""
+        release = threading.Event()
+        futures = [self.scheduler.submit(release.wait) for _ in range(10)]
+        time.sleep(0.2)
+
+        stats = self.scheduler.get_stats()
+        self.assertEqual(stats["export"].running, 2)
+        self.assertEqual(stats["export"].queued, 8)
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+
+    def test_priority_order(self):
+        """待機中のジョブが優先度順に実行されるテスト"""
+        scheduler = PriorityScheduler(max_workers=2, reserved_interactive=1)
+        release = threading.Event()
+        order = []
+        try:
+            blocker = scheduler.submit(release.wait)
+            time.sleep(0.1)
+            # 書き出し用のワーカーは埋まっているため以下はすべて待機する
+            futures = [
+                scheduler.submit_with_priority(PRIORITY_PREFETCH, order.append, "prefetch"),
+                scheduler.submit_with_priority(PRIORITY_EXPORT, order.append, "export"),
+            ]
+            release.set()
+            blocker.result(timeout=5)
+            for future in futures:
+                future.result(timeout=5)
+        finally:
+            scheduler.shutdown()
+
+        self.assertEqual(order, ["export", "prefetch"])
+
+    def test_stats_and_utilization(self):
+        """統計と使用率のテスト"""
+        for _ in range(3):
+            self.scheduler.submit_with_priority(
+                PRIORITY_INTERACTIVE, time.sleep, 0.05
+            ).result(timeout=5)
+
+        stats = self.scheduler.get_stats()["interactive"]
+        self.assertEqual(stats.submitted, 3)
+        self.assertEqual(stats.completed, 3)
+        self.assertEqual(stats.queued, 0)
+        self.assertGreaterEqual(stats.busy_seconds, 0.15)
+        self.assertGreater(self.scheduler.utilization("interactive"), 0)
+        self.assertEqual(self.scheduler.utilization("prefetch"), 0)
+        self.assertIn("interactive: 完了 3件", self.scheduler.format_stats())
+
+    def test_shutdown_cancels_queued(self):
+        """終了時に待機中のジョブを取り消すテスト"""
+        release = threading.Event()
+        running = [self.scheduler.submit(release.wait) for _ in range(2)]
+        time.sleep(0.1)
+        queued = self.scheduler.submit(lambda: None)
+
+        self.scheduler.shutdown(wait=False, cancel_futures=True)
+        release.set()
+        for future in running:
+            future.result(timeout=5)
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(self.scheduler.get_stats()["export"].queued, 0)
+        with self.assertRaises(RuntimeError):
+            self.scheduler.submit(lambda: None)
+
+    def test_memory_scheduler_uses_shared_executor(self):
+        """メモリ予算スケジューラーが共有のExecutorを使うテスト"""
+        jobs = [ScheduledJob(key=i, memory_bytes=1) for i in range(5)]
+        scheduler = MemoryBudgetScheduler(memory_budget=100, max_workers=2,
+                                          executor=self.scheduler)
+
+        results = scheduler.run(jobs, lambda key: key * 10)
+
+        self.assertEqual(results, {i: i * 10 for i in range(5)})
+        self.assertEqual(self.scheduler.get_stats()["export"].completed, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+状態を持たない画像処理のユニットテスト
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+from models.edit_pipeline import CropOp, RotateOp
+from models.processing import (
+    LoadedImage, create_preview, encode, fit_size, load, measure_savings, process, resize,
+    save_result,
+)
+from models.settings import CompressionSettings, ResizeSettings
+
+
+class TestProcess(unittest.TestCase):
+    """process関数のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.test_dir = tempfile.mkdtemp()
+        self.image = Image.effect_noise((240, 160), 60).convert('RGB')
+        self.path = os.path.join(self.test_dir, "photo.png")
+        self.image.save(self.path)
+        self.resize_settings = ResizeSettings(width=120, height=120)
+        self.compression_settings = CompressionSettings(format_type="JPEG", quality=80)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.test_dir)
+
+    def test_sources(self):
+        """パス・bytes・ファイルライクオブジェクト・画像から同じ結果になるテスト"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        sources = [self.path, data, io.BytesIO(data), self.image]
+
+        results = [process(source, self.resize_settings, self.compression_settings)
+                   for source in sources]
+
+        self.assertEqual(len({result.data for result in results}), 1)
+        result = results[0]
+        self.assertEqual((result.size, result.format_type), ((120, 80), "JPEG"))
+        self.assertEqual(result.get_file_extension(), ".jpg")
+        with Image.open(io.BytesIO(result.data)) as decoded:
+            self.assertEqual(decoded.size, (120, 80))
+
+    def test_source_image_is_not_modified(self):
+        """渡した画像を変更・解放しないテスト"""
+        pixels = self.image.tobytes()
+        process(self.image, self.resize_settings, self.compression_settings,
+                edits=(RotateOp(90),))
+        self.assertEqual(self.image.size, (240, 160))
+        self.assertEqual(self.image.tobytes(), pixels)
+
+    def test_shared_inputs_across_threads(self):
+        """同じ画像と設定を複数のスレッドから同時に使っても結果が変わらないテスト"""
+        settings = [CompressionSettings(format_type=format_type, quality=quality)
+                    for format_type in ("JPEG", "WEBP") for quality in (40, 80)]
+        expected = [process(self.image, self.resize_settings, cs).data for cs in settings]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for _ in range(3):
+                results = list(executor.map(
+                    lambda cs: process(self.image, self.resize_settings, cs).data, settings
+                ))
+                self.assertEqual(results, expected)
+
+    def test_process_pool(self):
+        """設定と入力をプロセスプールに渡して処理できるテスト"""
+        expected = process(self.path, self.resize_settings, self.compression_settings)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(
+                process, self.path, self.resize_settings, self.compression_settings
+            ).result(timeout=60)
+        self.assertEqual(result, expected)
+
+    def test_auto_format_and_quality(self):
+        """自動選択・自動品質の結果が返されるテスト"""
+        auto_format = process(self.image, self.resize_settings,
+                              CompressionSettings(format_type="AUTO"))
+        self.assertIn(auto_format.format_type, ("JPEG", "WEBP", "PNG"))
+        self.assertEqual(auto_format.format_selection.format_type, auto_format.format_type)
+
+        auto_quality = process(self.image, self.resize_settings,
+                               CompressionSettings(format_type="JPEG", auto_quality=True))
+        self.assertIsNotNone(auto_quality.auto_quality)
+        self.assertEqual(auto_quality.data, auto_quality.auto_quality.data)
+        self.assertIsNone(auto_quality.format_selection)
+
+    def test_edits(self):
+        """編集を適用してからリサイズするテスト"""
+        result = process(self.image, self.resize_settings, self.compression_settings,
+                         edits=(CropOp((0, 0, 120, 160)), RotateOp(90)))
+        self.assertEqual(result.size, (120, 90))
+
+    def test_invalid_source(self):
+        """読み込めない入力のテスト"""
+        with self.assertRaises(ValueError):
+            process(b"not an image", self.resize_settings, self.compression_settings)
+        with self.assertRaises(ValueError):
+            process(os.path.join(self.test_dir, "missing.png"),
+                    self.resize_settings, self.compression_settings)
+
+
+class TestProcessingSteps(unittest.TestCase):
+    """読み込み・リサイズ・エンコードの各関数のテスト"""
+
+    def test_fit_size(self):
+        """比率を考慮した出力サイズのテスト"""
+        self.assertEqual(fit_size((400, 200), (100, 100), True), (100, 50))
+        self.assertEqual(fit_size((400, 200), (100, 100), False), (100, 100))
+        self.assertEqual(fit_size((200, 400), (300, 100), True), (50, 100))
+
+    def test_load_keeps_decoded_image(self):
+        """デコード済みの画像はそのまま使うテスト"""
+        image = Image.new('RGB', (10, 10))
+        loaded = load(image)
+        self.assertIs(loaded.image, image)
+        self.assertEqual(loaded.size, (10, 10))
+
+    def test_resize_and_encode(self):
+        """リサイズとエンコードを別々に呼べるテスト"""
+        image = Image.new('RGB', (100, 50), 'red')
+        resized = resize(LoadedImage(image), ResizeSettings(width=40, height=40))
+        self.assertIsNot(resized, image)
+        self.assertEqual(resized.size, (40, 20))
+
+        result = encode(resized, CompressionSettings(format_type="PNG"))
+        self.assertEqual(result.size_bytes, len(result.data))
+        with Image.open(io.BytesIO(result.data)) as decoded:
+            self.assertEqual(decoded.getpixel((0, 0)), (255, 0, 0))
+
+    def test_create_preview(self):
+        """元の画像を変更せずにプレビューを作るテスト"""
+        image = Image.new('RGB', (200, 100))
+        preview = create_preview(image, (50, 50))
+        self.assertEqual(preview.size, (50, 25))
+        self.assertEqual(image.size, (200, 100))
+        self.assertIsNot(create_preview(image, (400, 400)), image)
+
+    def test_save_result_and_savings(self):
+        """エンコード結果の保存と、自動選択した形式での削減量の計測のテスト"""
+        image = Image.effect_noise((64, 64), 60).convert('RGB')
+        settings = CompressionSettings(format_type="AUTO")
+        result = encode(image, settings)
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = save_result(result, os.path.join(test_dir, "out.img"), replace_extension=True)
+            self.assertEqual(os.path.splitext(path)[1], result.get_file_extension())
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), result.data)
+        finally:
+            shutil.rmtree(test_dir)
+        self.assertIsInstance(measure_savings(image, settings, result), list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+自動品質選択のユニットテスト
+"""
+
+import io
+import unittest
+import tempfile
+import os
+import shutil
+from unittest import mock
+from PIL import Image
+
+from models import quality
+from models.quality import compute_ssim, find_auto_quality, encode_to_bytes
+from models.image_processor import ImageProcessor
+from models.settings import CompressionSettings
+
+
+def _create_photo_like_image(size=(160, 120)) -> Image.Image:
+    """圧縮で劣化が出やすいテスト画像を作成"""
+    gradient = Image.linear_gradient('L').resize(size)
+    return Image.merge('RGB', [
+        gradient,
+        Image.effect_noise(size, 40),
+        gradient.transpose(Image.FLIP_TOP_BOTTOM),
+    ])
+
+
+class TestComputeSsim(unittest.TestCase):
+    """SSIM計算のテスト"""
+
+    def test_identical_images(self):
+        """同一画像のSSIMが1になるかのテスト"""
+        image = _create_photo_like_image()
+        self.assertAlmostEqual(compute_ssim(image, image.copy()), 1.0, places=6)
+
+    def test_degraded_image(self):
+        """劣化画像のSSIMが1未満になるかのテスト"""
+        image = _create_photo_like_image()
+        noisy = Image.blend(image, Image.effect_noise(image.size, 80).convert('RGB'), 0.5)
+        ssim = compute_ssim(image, noisy)
+        self.assertLess(ssim, 0.9)
+        self.assertGreater(ssim, -1.0)
+
+    def test_size_mismatch(self):
+        """サイズ不一致時のエラーテスト"""
+        with self.assertRaises(ValueError):
+            compute_ssim(Image.new('L', (10, 10)), Image.new('L', (11, 10)))
+
+
+class TestFindAutoQuality(unittest.TestCase):
+    """自動品質探索のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.image = _create_photo_like_image()
+
+    def test_selects_lowest_passing_quality(self):
+        """目標を満たす最小品質が選ばれるかのテスト"""
+        target = 0.9
+        result = find_auto_quality(self.image, "JPEG", target, max_workers=3)
+
+        self.assertGreaterEqual(result.ssim, target)
+        self.assertEqual(result.size_bytes, len(result.data))
+
+        # 1つ下の品質では目標を下回る
+        if result.quality > 10:
+            lower = encode_to_bytes(self.image, "JPEG", quality=result.quality - 1)
+            with Image.open(io.BytesIO(lower)) as decoded:
+                self.assertLess(compute_ssim(self.image, decoded), target)
+
+    def test_probe_count_is_logarithmic(self):
+        """ワーカー数が少なくても探索のエンコード回数が二分探索程度に収まるテスト"""
+        # 品質10〜100の91通り: 1ワーカーは二分探索、2ワーカーは3等分で絞り込む
+        limits = {1: 9, 2: 12}
+        chosen = set()
+        for workers, limit in limits.items():
+            with mock.patch.object(quality, "_probe", wraps=quality._probe) as probe:
+                result = find_auto_quality(self.image, "JPEG", 0.95, max_workers=workers)
+            self.assertLessEqual(probe.call_count, limit)
+            chosen.add(result.quality)
+        # ワーカー数によらず同じ品質が選ばれる
+        self.assertEqual(len(chosen), 1)
+
+    def test_higher_target_needs_higher_quality(self):
+        """目標が高いほど品質が上がるかのテスト"""
+        low = find_auto_quality(self.image, "WEBP", 0.85)
+        high = find_auto_quality(self.image, "WEBP", 0.97)
+        self.assertLessEqual(low.quality, high.quality)
+        self.assertLessEqual(low.size_bytes, high.size_bytes)
+
+    def test_unreachable_target(self):
+        """到達不能な目標では最大品質になるかのテスト"""
+        result = find_auto_quality(self.image, "JPEG", 1.01)
+        self.assertEqual(result.quality, 100)
+
+    def test_unsupported_format(self):
+        """非対応形式のエラーテスト"""
+        with self.assertRaises(ValueError):
+            find_auto_quality(self.image, "PNG", 0.9)
+
+
+class TestImageProcessorAutoQuality(unittest.TestCase):
+    """ImageProcessorの自動品質保存のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.processor = ImageProcessor()
+        self.processor.current_image = _create_photo_like_image()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_save_with_auto_quality(self):
+        """自動品質での保存テスト"""
+        output_path = os.path.join(self.temp_dir, "auto.jpg")
+        settings = CompressionSettings(format_type="JPEG", auto_quality=True, target_ssim=0.9)
+
+        self.processor.save_image(output_path, settings)
+
+        result = self.processor.last_auto_quality
+        self.assertIsNotNone(result)
+        self.assertEqual(os.path.getsize(output_path), result.size_bytes)
+        with Image.open(output_path) as saved:
+            self.assertEqual(saved.size, self.processor.current_image.size)
+
+    def test_auto_quality_ignored_for_png(self):
+        """PNGでは自動品質が無視されるかのテスト"""
+        output_path = os.path.join(self.temp_dir, "auto.png")
+        settings = CompressionSettings(format_type="PNG", auto_quality=True)
+
+        self.processor.save_image(output_path, settings)
+        self.assertIsNone(self.processor.last_auto_quality)
+        self.assertTrue(os.path.exists(output_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
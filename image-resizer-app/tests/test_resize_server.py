@@ -0,0 +1,203 @@
+"""
+リサイズHTTPサーバーのユニットテスト
+"""
+
+import asyncio
+import unittest
+import tempfile
+import os
+import io
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from server.resize_server import (
+    RequestError,
+    ResizeServer,
+    parse_variant_request,
+    render_variant,
+)
+from server.variant_cache import VariantCache
+
+
+class TestParseVariantRequest(unittest.TestCase):
+    """クエリ解析のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.root_dir = tempfile.mkdtemp()
+        Image.new('RGB', (200, 100), color='red').save(os.path.join(self.root_dir, "photo.png"))
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.root_dir)
+
+    def test_parse_valid_request(self):
+        """正常なクエリの解析テスト"""
+        request = parse_variant_request(
+            {"src": "photo.png", "w": "50", "fmt": "jpg", "q": "70"}, self.root_dir
+        )
+        self.assertEqual(request.width, 50)
+        self.assertIsNone(request.height)
+        self.assertEqual(request.format_type, "JPEG")
+        self.assertEqual(request.quality, 70)
+        self.assertEqual(request.content_type, "image/jpeg")
+
+        # 同じ指定なら同じキー、異なる指定なら異なるキー
+        same = parse_variant_request(
+            {"src": "photo.png", "w": "50", "fmt": "jpeg", "q": "70"}, self.root_dir
+        )
+        other = parse_variant_request({"src": "photo.png", "w": "60"}, self.root_dir)
+        self.assertEqual(request.etag(), same.etag())
+        self.assertNotEqual(request.cache_key(), other.cache_key())
+
+    def test_parse_invalid_requests(self):
+        """不正なクエリのエラーテスト"""
+        cases = [
+            ({}, 400),
+            ({"src": "../outside.png"}, 403),
+            ({"src": "missing.png"}, 404),
+            ({"src": "photo.png", "w": "0"}, 400),
+            ({"src": "photo.png", "fmt": "gif"}, 400),
+            ({"src": "photo.png", "q": "high"}, 400),
+        ]
+        for query, status in cases:
+            with self.assertRaises(RequestError) as context:
+                parse_variant_request(query, self.root_dir)
+            self.assertEqual(context.exception.status, status)
+
+    def test_render_variant(self):
+        """バリアントのレンダリングテスト"""
+        request = parse_variant_request({"src": "photo.png", "w": "50"}, self.root_dir)
+        data = render_variant(request)
+        with Image.open(io.BytesIO(data)) as rendered:
+            self.assertEqual(rendered.format, "WEBP")
+            self.assertEqual(rendered.size, (50, 25))
+
+
+class TestVariantCache(unittest.TestCase):
+    """VariantCacheクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.cache_dir)
+
+    def test_memory_lru_eviction(self):
+        """メモリ上限を超えたときの破棄テスト"""
+        cache = VariantCache(memory_limit=10)
+        cache.put("aa", b"12345")
+        cache.put("bb", b"12345")
+        cache.get("aa")  # aaを最近使用に
+        cache.put("cc", b"12345")
+
+        self.assertEqual(cache.get("aa"), b"12345")
+        self.assertIsNone(cache.get("bb"))
+        self.assertLessEqual(cache.memory_bytes, 10)
+
+    def test_disk_cache(self):
+        """ディスクキャッシュのテスト"""
+        VariantCache(cache_dir=self.cache_dir).put("abcdef", b"data")
+
+        # 新しいインスタンス（再起動相当）でもディスクから取得できる
+        cache = VariantCache(cache_dir=self.cache_dir)
+        self.assertEqual(cache.get("abcdef"), b"data")
+        self.assertEqual(len(cache), 1)
+
+
+class TestResizeServer(unittest.TestCase):
+    """ResizeServerクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.root_dir = tempfile.mkdtemp()
+        Image.new('RGB', (200, 100), color='blue').save(os.path.join(self.root_dir, "photo.png"))
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.server = ResizeServer(self.root_dir, port=0, executor=self.executor)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.executor.shutdown()
+        shutil.rmtree(self.root_dir)
+
+    async def _fetch(self, target: str, headers: str = ""):
+        """サーバーにGETリクエストを送信"""
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        response_headers = dict(line.split(": ", 1) for line in lines[1:])
+        return status, response_headers, body
+
+    def test_http_resize_and_conditional_get(self):
+        """HTTP経由のリサイズと条件付きGETのテスト"""
+        async def scenario():
+            await self.server.start()
+            try:
+                status, headers, body = await self._fetch("/resize?src=photo.png&w=40&fmt=png")
+                self.assertEqual(status, 200)
+                self.assertEqual(headers["Content-Type"], "image/png")
+                with Image.open(io.BytesIO(body)) as rendered:
+                    self.assertEqual(rendered.size, (40, 20))
+
+                etag = headers["ETag"]
+                status, _, body = await self._fetch(
+                    "/resize?src=photo.png&w=40&fmt=png", f"If-None-Match: {etag}\r\n"
+                )
+                self.assertEqual(status, 304)
+                self.assertEqual(body, b"")
+
+                status, _, _ = await self._fetch("/unknown")
+                self.assertEqual(status, 404)
+            finally:
+                await self.server.close()
+
+        asyncio.run(scenario())
+
+    def test_concurrent_requests_are_coalesced(self):
+        """同一リクエストの集約テスト"""
+        async def scenario():
+            await self.server.start()
+            try:
+                request = parse_variant_request({"src": "photo.png", "w": "30"}, self.root_dir)
+                results = await asyncio.gather(*[self.server.get_variant(request) for _ in range(8)])
+                self.assertEqual(len(set(results)), 1)
+                self.assertEqual(self.server.stats["renders"], 1)
+
+                # 2回目以降はキャッシュから返る
+                await self.server.get_variant(request)
+                self.assertEqual(self.server.stats["renders"], 1)
+                self.assertGreaterEqual(self.server.stats["cache_hits"], 1)
+            finally:
+                await self.server.close()
+
+        asyncio.run(scenario())
+
+    def test_unexpected_error_returns_500(self):
+        """想定外の例外でも500を返して接続を閉じるテスト"""
+        async def failing_request(method, target, headers):
+            raise RuntimeError("broken")
+
+        async def scenario():
+            await self.server.start()
+            try:
+                self.server.handle_request = failing_request
+                status, _, body = await self._fetch("/resize?src=photo.png&w=40")
+                self.assertEqual(status, 500)
+                self.assertIn("broken", body.decode("utf-8"))
+                self.assertEqual(self.server.stats["errors"], 1)
+            finally:
+                await self.server.close()
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
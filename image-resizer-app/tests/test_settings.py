@@ -2,7 +2,9 @@
 設定モデルのユニットテスト
 """
 
+import pickle
 import unittest
+from dataclasses import FrozenInstanceError, replace
 from PIL import Image
 
 from models.settings import ResizeSettings, CompressionSettings, AppSettings
@@ -31,20 +33,20 @@ class TestResizeSettings(unittest.TestCase):
         """PILリサンプリングメソッド変換のテスト"""
         settings = ResizeSettings()
         
-        settings.method = "LANCZOS"
+        settings = replace(settings, method="LANCZOS")
         self.assertEqual(settings.get_pil_resample_method(), Image.LANCZOS)
         
-        settings.method = "BICUBIC"
+        settings = replace(settings, method="BICUBIC")
         self.assertEqual(settings.get_pil_resample_method(), Image.BICUBIC)
         
-        settings.method = "BILINEAR"
+        settings = replace(settings, method="BILINEAR")
         self.assertEqual(settings.get_pil_resample_method(), Image.BILINEAR)
         
-        settings.method = "NEAREST"
+        settings = replace(settings, method="NEAREST")
         self.assertEqual(settings.get_pil_resample_method(), Image.NEAREST)
         
         # 無効な値の場合はデフォルト（LANCZOS）を返す
-        settings.method = "INVALID"
+        settings = replace(settings, method="INVALID")
         self.assertEqual(settings.get_pil_resample_method(), Image.LANCZOS)
 
 
@@ -67,17 +69,17 @@ class TestCompressionSettings(unittest.TestCase):
         """ファイル拡張子取得のテスト"""
         settings = CompressionSettings()
         
-        settings.format_type = "JPEG"
+        settings = replace(settings, format_type="JPEG")
         self.assertEqual(settings.get_file_extension(), ".jpg")
         
-        settings.format_type = "PNG"
+        settings = replace(settings, format_type="PNG")
         self.assertEqual(settings.get_file_extension(), ".png")
         
-        settings.format_type = "WEBP"
+        settings = replace(settings, format_type="WEBP")
         self.assertEqual(settings.get_file_extension(), ".webp")
         
         # 無効な値の場合はデフォルト（.jpg）を返す
-        settings.format_type = "INVALID"
+        settings = replace(settings, format_type="INVALID")
         self.assertEqual(settings.get_file_extension(), ".jpg")
     
     def test_get_save_kwargs_jpeg(self):
@@ -103,6 +105,85 @@ class TestCompressionSettings(unittest.TestCase):
         
         expected = {'optimize': True}
         self.assertEqual(kwargs, expected)
+    
+    def test_uses_auto_quality(self):
+        """自動品質の適用判定のテスト"""
+        self.assertFalse(CompressionSettings().uses_auto_quality())
+        self.assertTrue(CompressionSettings(format_type="JPEG", auto_quality=True).uses_auto_quality())
+        self.assertTrue(CompressionSettings(format_type="WEBP", auto_quality=True).uses_auto_quality())
+        # PNGは品質の概念がないため対象外
+        self.assertFalse(CompressionSettings(format_type="PNG", auto_quality=True).uses_auto_quality())
+        # ロスレスWEBPも対象外
+        self.assertFalse(CompressionSettings(format_type="WEBP", auto_quality=True,
+                                             lossless=True).uses_auto_quality())
+    
+    def test_get_save_kwargs_output_options(self):
+        """出力オプションのキーワード引数のテスト"""
+        settings = CompressionSettings(format_type="JPEG", quality=75,
+                                       progressive=True, subsampling="4:2:0")
+        expected = {'quality': 75, 'optimize': True, 'progressive': True, 'subsampling': "4:2:0"}
+        self.assertEqual(settings.get_save_kwargs(), expected)
+        
+        settings = CompressionSettings(format_type="WEBP", quality=80, lossless=True)
+        expected = {'quality': 80, 'optimize': True, 'lossless': True}
+        self.assertEqual(settings.get_save_kwargs(), expected)
+        
+        with self.assertRaises(ValueError):
+            CompressionSettings(subsampling="4:1:1").get_save_kwargs()
+    
+    def test_get_metadata_kwargs(self):
+        """メタデータのキーワード引数のテスト"""
+        image = Image.new('RGB', (10, 10))
+        image.info["icc_profile"] = b"icc"
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = "Camera"
+        image.info["exif"] = exif.tobytes()
+        
+        # 既定ではすべて削除
+        self.assertEqual(CompressionSettings().get_metadata_kwargs(image), {'icc_profile': None})
+        
+        kwargs = CompressionSettings(keep_icc_profile=True,
+                                     keep_exif_orientation=True).get_metadata_kwargs(image)
+        self.assertEqual(kwargs['icc_profile'], b"icc")
+        self.assertEqual(dict(kwargs['exif']), {0x0112: 6})
+
+
+class TestSettingsImmutability(unittest.TestCase):
+    """設定が変更できずキャッシュのキーに使えることのテスト"""
+    
+    def test_frozen(self):
+        """設定を変更できないテスト"""
+        settings = ResizeSettings()
+        with self.assertRaises(FrozenInstanceError):
+            settings.width = 100
+        with self.assertRaises(FrozenInstanceError):
+            CompressionSettings().quality = 10
+        
+        # 変更はreplaceで新しいオブジェクトを作る
+        changed = replace(settings, width=100)
+        self.assertEqual((settings.width, changed.width), (800, 100))
+    
+    def test_hashable(self):
+        """同じ値の設定が同じキーになるテスト"""
+        cache = {
+            (ResizeSettings(width=100), CompressionSettings(quality=70)): "a",
+        }
+        self.assertEqual(cache[(ResizeSettings(width=100), CompressionSettings(quality=70))], "a")
+        self.assertNotIn((ResizeSettings(width=101), CompressionSettings(quality=70)), cache)
+        
+        # リストで渡した候補の形式もタプルにそろえる
+        settings = CompressionSettings(auto_format_candidates=["JPEG", "PNG"])
+        self.assertEqual(settings.auto_format_candidates, ("JPEG", "PNG"))
+        self.assertEqual(hash(settings),
+                         hash(CompressionSettings(auto_format_candidates=("JPEG", "PNG"))))
+    
+    def test_pickle(self):
+        """pickleで復元した設定が元の設定と等しいテスト"""
+        settings = CompressionSettings(format_type="WEBP", quality=60, subsampling="4:2:0")
+        restored = pickle.loads(pickle.dumps(settings))
+        self.assertEqual(restored, settings)
+        self.assertEqual(hash(restored), hash(settings))
 
 
 class TestAppSettings(unittest.TestCase):
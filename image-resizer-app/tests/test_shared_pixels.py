@@ -0,0 +1,92 @@
+"""
+共有メモリによる画素受け渡しのユニットテスト
+"""
+
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from models.image_processor import ImageProcessor
+from models.settings import ResizeSettings
+from models.shared_pixels import (
+    DEFAULT_OFFLOAD_THRESHOLD,
+    SharedImage,
+    SharedMemoryResampler,
+    attach_shared_image,
+    is_shareable_mode,
+    resample_shared,
+)
+
+
+class TestSharedPixels(unittest.TestCase):
+    """共有メモリ上の画像のテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.image = Image.effect_noise((120, 80), 60).convert('RGB')
+
+    def test_round_trip(self):
+        """共有メモリへの書き込みと読み出しのテスト"""
+        for mode in ["L", "RGB", "RGBA", "CMYK"]:
+            image = self.image.convert(mode)
+            with SharedImage.from_image(image) as shared:
+                restored = shared.to_image()
+            self.assertEqual(restored.mode, mode)
+            self.assertEqual(restored.tobytes(), image.tobytes())
+
+    def test_attach_without_copy(self):
+        """記述子からの参照がコピーでないかのテスト"""
+        with SharedImage.from_image(self.image) as shared:
+            with attach_shared_image(shared.descriptor) as view:
+                self.assertEqual(view.size, (120, 80))
+                self.assertEqual(view.getpixel((3, 4))[:3], self.image.getpixel((3, 4)))
+                # 共有メモリへの書き込みがそのまま見える
+                shared.write(Image.new('RGB', (120, 80), color=(1, 2, 3)))
+                self.assertEqual(view.getpixel((3, 4))[:3], (1, 2, 3))
+
+    def test_unsupported_modes_are_rejected(self):
+        """画素がそのまま往復できないモードは共有メモリに置かないテスト"""
+        for mode in ["P", "LA", "1", "I;16", "I", "F"]:
+            self.assertFalse(is_shareable_mode(mode))
+        with self.assertRaises(ValueError):
+            SharedImage((10, 10), "P")
+        with self.assertRaises(ValueError):
+            SharedImage.from_image(self.image.convert("P"))
+
+    def test_resample_shared(self):
+        """共有メモリ上でのリサンプリングのテスト"""
+        expected = self.image.resize((30, 20), Image.LANCZOS)
+        with SharedImage.from_image(self.image) as source, \
+                SharedImage((30, 20), "RGB") as target:
+            resample_shared(source.descriptor, target.descriptor, Image.LANCZOS)
+            self.assertEqual(target.to_image().tobytes(), expected.tobytes())
+
+    def test_resampler_in_worker_process(self):
+        """ワーカープロセスでのリサンプリングのテスト"""
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            processor = ImageProcessor(
+                resampler=SharedMemoryResampler(executor, offload_threshold=0)
+            )
+            processor.original_image = self.image
+            resized = processor.resize_image(ResizeSettings(width=60, height=60))
+
+        expected = self.image.resize((60, 40), Image.LANCZOS)
+        self.assertEqual(resized.mode, 'RGB')
+        self.assertEqual(resized.tobytes(), expected.tobytes())
+
+    def test_unsupported_modes_keep_mode(self):
+        """しきい値以上の大きさでも共有メモリに置けないモードはモードを保つテスト"""
+        side = int(DEFAULT_OFFLOAD_THRESHOLD ** 0.5)
+        noise = Image.effect_noise((side, side), 60)
+        images = [noise.convert('P'), noise.convert('I;16')]
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            resampler = SharedMemoryResampler(executor)
+            for image in images:
+                resized = resampler(image, (64, 64), Image.LANCZOS)
+                self.assertEqual(resized.mode, image.mode)
+                self.assertEqual(resized.tobytes(),
+                                 image.resize((64, 64), Image.LANCZOS).tobytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
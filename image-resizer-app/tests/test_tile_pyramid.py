@@ -0,0 +1,272 @@
+"""
+拡大表示用タイルピラミッドのユニットテスト
+"""
+
+import threading
+import unittest
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+from PIL import Image
+
+from models.priority_scheduler import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+from models.tile_pyramid import (
+    BACKGROUND_COLOR, MAX_ZOOM_STEP, ZOOM_STEPS_PER_OCTAVE,
+    TileCache, TilePyramid, Viewport, step_for_zoom, zoom_for_step,
+)
+
+
+class RecordingExecutor(Executor):
+    """投入されたジョブを記録し、runで実行するExecutor"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit_with_priority(self, priority, fn, *args):
+        future = Future()
+        self.jobs.append((priority, fn, args, future))
+        return future
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_with_priority(PRIORITY_INTERACTIVE, fn, *args)
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for _, fn, args, future in jobs:
+            future.set_result(fn(*args))
+
+
+class TestViewport(unittest.TestCase):
+    """Viewportクラスのテスト"""
+
+    def test_zoom_steps(self):
+        """倍率の段と表示倍率の変換のテスト"""
+        self.assertEqual(zoom_for_step(0), 1.0)
+        self.assertEqual(zoom_for_step(ZOOM_STEPS_PER_OCTAVE), 2.0)
+        self.assertEqual(zoom_for_step(-ZOOM_STEPS_PER_OCTAVE), 0.5)
+        self.assertEqual(step_for_zoom(1.0), 0)
+        self.assertEqual(step_for_zoom(0.3), -7)
+
+    def test_fit_centers_image(self):
+        """全体表示で画像が収まり中央に置かれるテスト"""
+        viewport = Viewport((4000, 2000), 800, 600)
+        viewport.fit()
+
+        self.assertEqual(viewport.zoom_step, -10)
+        display_width, display_height = viewport.display_size()
+        self.assertLessEqual(display_width, 800)
+        self.assertAlmostEqual(viewport.x, (display_width - 800) / 2)
+        self.assertAlmostEqual(viewport.y, (display_height - 600) / 2)
+
+    def test_small_image_is_not_enlarged_by_fit(self):
+        """小さい画像は全体表示でも等倍のままのテスト"""
+        viewport = Viewport((100, 50), 800, 600)
+        viewport.fit()
+        self.assertEqual(viewport.zoom_step, 0)
+
+    def test_zoom_keeps_anchor(self):
+        """拡大縮小でカーソルの下の画像上の位置が変わらないテスト"""
+        viewport = Viewport((4000, 3000), 800, 600)
+        viewport.pan(1000, 1000)
+        anchor = (200, 150)
+        before = ((viewport.x + anchor[0]) / viewport.zoom, (viewport.y + anchor[1]) / viewport.zoom)
+
+        viewport.set_zoom_step(3, anchor)
+
+        after = ((viewport.x + anchor[0]) / viewport.zoom, (viewport.y + anchor[1]) / viewport.zoom)
+        self.assertAlmostEqual(before[0], after[0])
+        self.assertAlmostEqual(before[1], after[1])
+
+    def test_zoom_and_pan_are_clamped(self):
+        """倍率と表示範囲が画像の範囲に制限されるテスト"""
+        viewport = Viewport((1000, 1000), 400, 300)
+        viewport.set_zoom_step(MAX_ZOOM_STEP + 10)
+        self.assertEqual(viewport.zoom_step, MAX_ZOOM_STEP)
+        viewport.set_zoom_step(-100)
+        self.assertEqual(viewport.zoom_step, viewport.min_zoom_step)
+
+        viewport.set_zoom_step(0)
+        viewport.pan(-5000, 5000)
+        self.assertEqual((viewport.x, viewport.y), (0.0, 700.0))
+
+    def test_visible_tiles(self):
+        """表示範囲にかかるタイルだけが対象になるテスト"""
+        viewport = Viewport((10000, 10000), 500, 300)
+        viewport.pan(300, 0)
+
+        visible = viewport.visible_tiles(256)
+        self.assertEqual(visible, [(0, col, row) for row in (0, 1) for col in (1, 2, 3)])
+
+        adjacent = viewport.adjacent_tiles(256)
+        self.assertNotIn((0, 1, 0), adjacent)
+        self.assertIn((0, 0, 0), adjacent)
+        self.assertIn((0, 4, 2), adjacent)
+        self.assertTrue(all(row >= 0 for _, _, row in adjacent))
+
+
+class TestTilePyramid(unittest.TestCase):
+    """TilePyramidクラスのテスト"""
+
+    def test_tile_at_actual_size(self):
+        """等倍のタイルが元画像の該当範囲と一致するテスト"""
+        image = Image.effect_noise((600, 400), 50).convert('RGB')
+        pyramid = TilePyramid(image, tile_size=256)
+
+        tile = pyramid.render_tile((0, 1, 0))
+
+        self.assertEqual(tile.size, (256, 256))
+        self.assertEqual(tile.crop((0, 0, 256, 256)).tobytes(),
+                         image.crop((256, 0, 512, 256)).tobytes())
+
+    def test_edge_tile_is_padded(self):
+        """画像の端のタイルの外側が背景色になるテスト"""
+        image = Image.new('RGB', (300, 300), (255, 0, 0))
+        pyramid = TilePyramid(image, tile_size=256)
+
+        tile = pyramid.render_tile((0, 1, 1))
+
+        self.assertEqual(tile.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(tile.getpixel((43, 43)), (255, 0, 0))
+        self.assertEqual(tile.getpixel((44, 0)), BACKGROUND_COLOR)
+        self.assertEqual(pyramid.render_tile((0, 5, 5)).getpixel((0, 0)), BACKGROUND_COLOR)
+
+    def test_enlarged_tile_keeps_pixels_sharp(self):
+        """拡大したタイルで画素が補間されないテスト"""
+        image = Image.new('L', (2, 1))
+        image.putpixel((1, 0), 255)
+        pyramid = TilePyramid(image, tile_size=64)
+
+        tile = pyramid.render_tile((2 * ZOOM_STEPS_PER_OCTAVE, 0, 0))
+
+        self.assertEqual(tile.getpixel((3, 0)), (0, 0, 0))
+        self.assertEqual(tile.getpixel((4, 0)), (255, 255, 255))
+
+    def test_reduced_levels_are_cached(self):
+        """縮小表示で縮小した段がキャッシュされ、大きすぎる段は作らないテスト"""
+        image = Image.effect_noise((1024, 1024), 50).convert('RGB')
+        pyramid = TilePyramid(image, tile_size=128, max_level_pixels=300 * 300)
+
+        pyramid.render_tile((-ZOOM_STEPS_PER_OCTAVE, 0, 0))
+        self.assertEqual(pyramid.cached_levels, [])
+
+        tile = pyramid.render_tile((-2 * ZOOM_STEPS_PER_OCTAVE, 0, 0))
+        self.assertEqual(pyramid.cached_levels, [2])
+        expected = image.reduce(4).crop((0, 0, 128, 128))
+        self.assertEqual(tile.tobytes(), expected.tobytes())
+
+    def test_modes_are_converted_per_tile(self):
+        """RGB以外の画像もタイル単位でRGBに変換されるテスト"""
+        base = Image.effect_noise((300, 200), 50)
+        images = [base, base.convert('P'), base.convert('1'), base.convert('I;16'),
+                  base.convert('CMYK'), Image.new('RGBA', (300, 200), (255, 0, 0, 0))]
+        for image in images:
+            with self.subTest(mode=image.mode):
+                pyramid = TilePyramid(image, tile_size=128)
+                for key in ((0, 0, 0), (-ZOOM_STEPS_PER_OCTAVE, 0, 0)):
+                    tile = pyramid.render_tile(key)
+                    self.assertEqual((tile.mode, tile.size), ('RGB', (128, 128)))
+                self.assertEqual(image.mode, pyramid.image.mode)
+
+        # 透明な部分は背景色になる
+        self.assertEqual(pyramid.render_tile((0, 0, 0)).getpixel((0, 0)), BACKGROUND_COLOR)
+
+
+class TestTileCache(unittest.TestCase):
+    """TileCacheクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.pyramid = TilePyramid(Image.effect_noise((1024, 1024), 50).convert('RGB'),
+                                   tile_size=64)
+        self.executor = RecordingExecutor()
+
+    def test_request_uses_priorities(self):
+        """表示範囲は対話的な優先度、先読みは低い優先度で描画されるテスト"""
+        ready = []
+        cache = TileCache(self.pyramid, self.executor, on_ready=ready.append)
+
+        cache.request([(0, 0, 0)], [(0, 1, 0)])
+
+        self.assertEqual([job[0] for job in self.executor.jobs],
+                         [PRIORITY_INTERACTIVE, PRIORITY_PREFETCH])
+        self.assertIsNone(cache.get((0, 0, 0)))
+        self.executor.run()
+        self.assertEqual(ready, [(0, 0, 0), (0, 1, 0)])
+        self.assertEqual(cache.get((0, 0, 0)).size, (64, 64))
+
+    def test_duplicate_requests_are_merged(self):
+        """描画中や描画済みのタイルは再度依頼しないテスト"""
+        cache = TileCache(self.pyramid, self.executor)
+        cache.request([(0, 0, 0)])
+        cache.request([(0, 0, 0)])
+        self.assertEqual(len(self.executor.jobs), 1)
+
+        self.executor.run()
+        cache.request([(0, 0, 0)])
+        self.assertEqual(self.executor.jobs, [])
+        self.assertEqual(cache.rendered, 1)
+
+    def test_stale_requests_are_skipped(self):
+        """表示範囲から外れたタイルは描画しないテスト"""
+        ready = []
+        cache = TileCache(self.pyramid, self.executor, on_ready=ready.append)
+        cache.request([(0, 0, 0)])
+        cache.request([(0, 5, 5)])
+
+        self.executor.run()
+
+        self.assertEqual(ready, [(0, 5, 5)])
+        self.assertIsNone(cache.get((0, 0, 0)))
+        # 再び表示範囲に入れば描画し直す
+        cache.request([(0, 0, 0)])
+        self.assertEqual(len(self.executor.jobs), 1)
+
+    def test_least_recently_used_tiles_are_evicted(self):
+        """上限を超えると最近使っていないタイルから捨てるテスト"""
+        tile_bytes = 64 * 64 * 3
+        cache = TileCache(self.pyramid, self.executor, max_bytes=tile_bytes * 2)
+        cache.request([(0, 0, 0), (0, 1, 0)])
+        self.executor.run()
+        cache.get((0, 0, 0))
+
+        cache.request([(0, 0, 0), (0, 1, 0), (0, 2, 0)])
+        self.executor.run()
+
+        self.assertEqual(cache.cached_bytes, tile_bytes * 2)
+        self.assertIsNotNone(cache.get((0, 0, 0)))
+        self.assertIsNone(cache.get((0, 1, 0)))
+
+    def test_close_discards_pending_tiles(self):
+        """閉じた後は描画待ちのタイルを描画しないテスト"""
+        ready = []
+        cache = TileCache(self.pyramid, self.executor, on_ready=ready.append)
+        cache.request([(0, 0, 0)])
+        cache.close()
+        self.executor.run()
+
+        self.assertEqual(ready, [])
+        self.assertEqual(cache.cached_bytes, 0)
+
+    def test_concurrent_rendering(self):
+        """複数のスレッドで描画しても全タイルが揃うテスト"""
+        viewport = Viewport(self.pyramid.size, 300, 300)
+        viewport.fit()
+        done = threading.Event()
+        visible = viewport.visible_tiles(64)
+        ready = []
+
+        def on_ready(key):
+            ready.append(key)
+            if len(ready) == len(visible):
+                done.set()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            cache = TileCache(self.pyramid, executor, on_ready=on_ready)
+            cache.request(visible)
+            self.assertTrue(done.wait(timeout=30))
+
+        self.assertEqual(sorted(ready), sorted(visible))
+        self.assertTrue(all(cache.get(key) is not None for key in visible))
+
+
+if __name__ == '__main__':
+    unittest.main()
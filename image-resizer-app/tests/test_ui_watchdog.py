@@ -0,0 +1,154 @@
+"""
+UI停止監視のユニットテスト
+"""
+
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import traceback
+import unittest
+
+from utils.ui_watchdog import LatencyHistogram, UIWatchdog, describe_handler
+
+
+class FakeRoot:
+    """afterだけを持つ簡易的なイベントループ"""
+
+    def __init__(self):
+        self._timers = []
+        self._ids = itertools.count()
+
+    def after(self, delay_ms, callback):
+        timer_id = next(self._ids)
+        heapq.heappush(self._timers, (time.perf_counter() + delay_ms / 1000, timer_id, callback))
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        self._timers = [timer for timer in self._timers if timer[1] != timer_id]
+        heapq.heapify(self._timers)
+
+    def run_for(self, seconds, handler=None):
+        """指定した時間イベントループを回す（handlerは途中で1回実行）"""
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            if handler is not None and time.perf_counter() > end - seconds / 2:
+                handler()
+                handler = None
+            if self._timers and self._timers[0][0] <= time.perf_counter():
+                _, _, callback = heapq.heappop(self._timers)
+                callback()
+            else:
+                time.sleep(0.001)
+
+
+def slow_handler():
+    """UIを止めるハンドラー"""
+    time.sleep(0.3)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """LatencyHistogramクラスのテスト"""
+
+    def test_record_and_percentile(self):
+        """記録とパーセンタイルのテスト"""
+        histogram = LatencyHistogram(buckets_ms=(10, 100))
+        for latency in [1, 2, 3, 50, 500]:
+            histogram.record(latency)
+
+        self.assertEqual(histogram.counts, [3, 1, 1])
+        self.assertEqual(histogram.total, 5)
+        self.assertEqual(histogram.percentile(0.5), 10)
+        self.assertEqual(histogram.percentile(0.8), 100)
+        self.assertEqual(histogram.percentile(1.0), 500)
+        self.assertEqual(LatencyHistogram().percentile(0.5), 0)
+
+    def test_format(self):
+        """表示用の文字列のテスト"""
+        histogram = LatencyHistogram(buckets_ms=(10, 100))
+        histogram.record(5)
+        lines = histogram.format(width=10).splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertIn("#" * 10, lines[0])
+
+
+class TestDescribeHandler(unittest.TestCase):
+    """ハンドラー名の作成のテスト"""
+
+    def test_frames_after_event_loop(self):
+        """イベントループより内側のアプリ内フレームを使うテスト"""
+        app = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        lib = os.path.join(os.sep, "usr", "lib")
+        frames = [
+            traceback.FrameSummary(os.path.join(app, "main.py"), 1, "main"),
+            traceback.FrameSummary(os.path.join(lib, "tkinter", "__init__.py"), 1, "__call__"),
+            traceback.FrameSummary(os.path.join(app, "views", "main_window.py"), 1,
+                                   "_update_preview"),
+            traceback.FrameSummary(os.path.join(app, "controllers", "app_controller.py"), 1,
+                                   "update_preview"),
+            traceback.FrameSummary(os.path.join(lib, "PIL", "Image.py"), 1, "resize"),
+        ]
+
+        self.assertEqual(describe_handler(frames), "_update_preview > update_preview")
+        self.assertEqual(describe_handler(frames[4:]), "不明")
+
+
+class TestUIWatchdog(unittest.TestCase):
+    """UIWatchdogクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, "ui.log")
+        self.root = FakeRoot()
+        self.watchdog = UIWatchdog(self.root, interval_ms=20, stall_threshold_ms=100,
+                                   log_path=self.log_path)
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.watchdog.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_heartbeats_recorded(self):
+        """ハートビートの遅延が記録されるテスト"""
+        self.watchdog.start()
+        self.root.run_for(0.3)
+
+        self.assertGreater(self.watchdog.histogram.total, 5)
+        self.assertEqual(self.watchdog.get_stalls(), [])
+
+    def test_stall_records_handler_stack(self):
+        """ストール時に実行中のハンドラーが記録されるテスト"""
+        self.watchdog.start()
+        self.root.run_for(0.6, handler=slow_handler)
+
+        stalls = self.watchdog.get_stalls()
+        self.assertEqual(len(stalls), 1)
+        self.assertIn("slow_handler", stalls[0].handler)
+        self.assertGreaterEqual(stalls[0].duration_ms, 200)
+        self.assertTrue(any("time.sleep" in line for line in stalls[0].stack))
+        self.assertGreater(self.watchdog.histogram.max_ms, 200)
+
+        report = self.watchdog.format_report()
+        self.assertIn("ストール（100 ms 超）: 1件", report)
+        self.assertIn("slow_handler", report)
+
+        self.watchdog.stop()
+        with open(self.log_path, encoding="utf-8") as f:
+            log = f.read()
+        self.assertIn("slow_handler", log)
+
+    def test_stop_cancels_heartbeat(self):
+        """終了時にハートビートが取り消されるテスト"""
+        self.watchdog.start()
+        self.watchdog.stop()
+
+        self.assertFalse(self.watchdog.running)
+        self.assertEqual(self.root._timers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+"""
+起動済みワーカープールのユニットテスト
+"""
+
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+from models.batch_processor import STATUS_DUPLICATE, STATUS_FAILED, BatchProcessor
+from models.priority_scheduler import PRIORITY_INTERACTIVE
+from models.settings import CompressionSettings, ResizeSettings
+from models.worker_pool import WarmWorkerPool
+
+
+def loaded_plugins():
+    """ワーカーで読み込まれているPillowのプラグイン（ワーカーで実行）"""
+    return sorted(name for name in sys.modules
+                  if name.startswith("PIL.") and name.endswith("ImagePlugin"))
+
+
+def fail():
+    """例外を送出する（ワーカーで実行）"""
+    raise ValueError("失敗しました")
+
+
+class BrokenContext:
+    """起動してもすぐに終了するワーカーを作るコンテキスト"""
+
+    def __init__(self):
+        self._context = multiprocessing.get_context("spawn")
+
+    def Pipe(self):
+        return self._context.Pipe()
+
+    def Process(self, target, args, name, daemon):
+        return self._context.Process(target=os._exit, args=(1,), name=name, daemon=daemon)
+
+
+class TestWarmWorkerPool(unittest.TestCase):
+    """WarmWorkerPoolクラスのテスト"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.pools = []
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        for pool in self.pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def create_pool(self, **kwargs) -> WarmWorkerPool:
+        pool = WarmWorkerPool(**kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def test_workers_are_started_in_background(self):
+        """startがすぐに戻り、起動済みのワーカーが使い回されるテスト"""
+        pool = self.create_pool(max_workers=1)
+        started = time.perf_counter()
+        pool.start()
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertTrue(pool.wait_ready(timeout=60))
+
+        pids = {pool.submit(os.getpid).result(timeout=30) for _ in range(5)}
+
+        self.assertEqual(pids, set(pool.worker_pids()))
+        self.assertEqual(pool.stats.started, 1)
+        self.assertEqual(pool.stats.completed, 5)
+
+    def test_only_requested_plugins_are_preloaded(self):
+        """指定した形式のプラグインだけが読み込まれるテスト"""
+        pool = self.create_pool(max_workers=1, formats=("JPEG", "PNG"))
+        plugins = pool.submit(loaded_plugins).result(timeout=60)
+        self.assertIn("PIL.JpegImagePlugin", plugins)
+        self.assertNotIn("PIL.WebPImagePlugin", plugins)
+
+        pool = self.create_pool(max_workers=1, formats=("WEBP",))
+        self.assertIn("PIL.WebPImagePlugin", pool.submit(loaded_plugins).result(timeout=60))
+
+    def test_recycle_after_max_jobs(self):
+        """指定した件数を処理したワーカーが入れ替わるテスト"""
+        pool = self.create_pool(max_workers=1, max_jobs_per_worker=2)
+        pids = [pool.submit(os.getpid).result(timeout=60) for _ in range(5)]
+
+        self.assertEqual(len(set(pids)), 3)
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pool.stats.recycled, 2)
+
+    def test_exception_is_propagated(self):
+        """ジョブの例外がFutureに伝わるテスト"""
+        pool = self.create_pool(max_workers=1)
+        with self.assertRaises(ValueError):
+            pool.submit(fail).result(timeout=60)
+        self.assertEqual(pool.submit(abs, -3).result(timeout=30), 3)
+        self.assertEqual(pool.stats.failed, 1)
+
+    def test_crashed_worker_is_restarted(self):
+        """ジョブの実行中に終了したワーカーが起動し直されるテスト"""
+        pool = self.create_pool(max_workers=1)
+        with self.assertRaises(RuntimeError):
+            pool.submit(os._exit, 3).result(timeout=60)
+
+        self.assertEqual(pool.submit(abs, -1).result(timeout=60), 1)
+        self.assertEqual(pool.stats.restarted, 1)
+
+    @unittest.skipUnless(hasattr(signal, "SIGKILL"), "SIGKILLが使えない環境")
+    def test_health_check_replaces_dead_worker(self):
+        """待機中に終了したワーカーが応答の確認で入れ替わるテスト"""
+        pool = self.create_pool(max_workers=1, health_check_interval=0.1)
+        pool.start()
+        self.assertTrue(pool.wait_ready(timeout=60))
+        old_pid = pool.worker_pids()[0]
+
+        os.kill(old_pid, signal.SIGKILL)
+        deadline = time.monotonic() + 60
+        while pool.stats.restarted == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(pool.stats.restarted, 1)
+        self.assertNotEqual(pool.submit(os.getpid).result(timeout=60), old_pid)
+
+    def test_broken_pool(self):
+        """ワーカーを起動できない場合にジョブが失敗するテスト"""
+        pool = self.create_pool(max_workers=1, mp_context=BrokenContext())
+        future = pool.submit(abs, -1)
+
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=60)
+        with self.assertRaises(RuntimeError):
+            pool.submit(abs, -1)
+
+    def test_interactive_jobs_run_first(self):
+        """待っている書き出しのジョブより対話的なジョブが先に実行されるテスト"""
+        pool = self.create_pool(max_workers=1)
+        pool.start()
+        self.assertTrue(pool.wait_ready(timeout=60))
+
+        # ワーカーを塞いでいる間に書き出し、対話的の順でジョブを積む
+        blocker = pool.submit(time.sleep, 0.5)
+        exports = [pool.submit(time.monotonic) for _ in range(3)]
+        interactive = pool.submit_with_priority(PRIORITY_INTERACTIVE, time.monotonic)
+
+        blocker.result(timeout=30)
+        started = interactive.result(timeout=30)
+        self.assertTrue(all(started < future.result(timeout=30) for future in exports))
+        with self.assertRaises(ValueError):
+            pool.submit_with_priority(99, time.monotonic)
+
+    def test_invalid_arguments(self):
+        """不正な引数のテスト"""
+        with self.assertRaises(ValueError):
+            WarmWorkerPool(formats=("XYZ",))
+        with self.assertRaises(ValueError):
+            WarmWorkerPool(max_jobs_per_worker=0)
+
+    def test_shutdown(self):
+        """終了後はジョブを受け付けないテスト"""
+        pool = self.create_pool(max_workers=1)
+        pool.submit(abs, -1).result(timeout=60)
+        pool.shutdown(wait=True)
+
+        self.assertEqual(pool.worker_pids(), [])
+        with self.assertRaises(RuntimeError):
+            pool.submit(abs, -1)
+
+    def test_batch_processor_uses_pool(self):
+        """一括処理のファイルごとの処理がワーカーで行われるテスト"""
+        input_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, input_dir)
+        photo = Image.effect_noise((200, 100), 50).convert('RGB')
+        photo.save(os.path.join(input_dir, "photo.jpg"), quality=95)
+        shutil.copy(os.path.join(input_dir, "photo.jpg"), os.path.join(input_dir, "copy.jpg"))
+        with open(os.path.join(input_dir, "broken.jpg"), "wb") as f:
+            f.write(b"not an image")
+
+        pool = self.create_pool(max_workers=2)
+        processor = BatchProcessor(
+            ResizeSettings(width=50, height=50),
+            CompressionSettings(format_type="JPEG"),
+            process_pool=pool,
+        )
+        summary = processor.process_directory(input_dir)
+
+        self.assertEqual(summary.count(STATUS_DUPLICATE), 1)
+        self.assertEqual(summary.count(STATUS_FAILED), 1)
+        with Image.open(os.path.join(input_dir, "photo_resized.jpg")) as saved:
+            self.assertEqual(saved.size, (50, 25))
+        self.assertEqual(pool.stats.completed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
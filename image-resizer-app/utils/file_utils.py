@@ -3,8 +3,11 @@
 """
 
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Iterator, List, Optional
 
 
 def is_supported_image_file(file_path: str) -> bool:
@@ -60,18 +63,21 @@ def create_backup_filename(file_path: str) -> str:
     return str(path.parent / backup_name)
 
 
-def get_directory_images(directory: str) -> List[str]:
-    """ディレクトリ内の画像ファイル一覧を取得"""
+def get_directory_images(directory: str, recursive: bool = False) -> List[str]:
+    """ディレクトリ内の画像ファイル一覧を取得（recursiveならサブフォルダも含める）"""
     images = []
-    try:
-        dir_path = Path(directory)
-        if dir_path.is_dir():
-            for file_path in dir_path.iterdir():
-                if file_path.is_file() and is_supported_image_file(str(file_path)):
-                    images.append(str(file_path))
-    except (OSError, PermissionError):
-        pass
-    
+    pending = [directory]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_file() and is_supported_image_file(entry.name):
+                        images.append(entry.path)
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+        except OSError:
+            continue
+
     return sorted(images)
 
 
@@ -87,4 +93,38 @@ def validate_output_path(file_path: str) -> bool:
         parent_dir = path.parent
         return parent_dir.exists() and os.access(parent_dir, os.W_OK)
     except (OSError, ValueError):
-        return False 
\ No newline at end of file
+        return False
+
+
+def link_or_copy(source_path: str, destination_path: str) -> str:
+    """ハードリンクを作成し、できない場合はコピー
+
+    作成方法（"link" または "copy"）を返す。
+    """
+    if os.path.exists(destination_path):
+        os.remove(destination_path)
+    try:
+        os.link(source_path, destination_path)
+        return "link"
+    except OSError:
+        shutil.copy2(source_path, destination_path)
+        return "copy"
+
+
+@contextmanager
+def open_atomic(file_path: str) -> Iterator[BinaryIO]:
+    """同じディレクトリの一時ファイルに書き込み、完了したらfile_pathに置き換える
+
+    書き込みに失敗した場合は一時ファイルを削除し、file_pathは変更しない。
+    他のプロセスが同じパスに書き込んでも、途中までのファイルが混ざらない。
+    """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,257 @@
+"""
+Tkイベントループの停止（ストール）監視
+
+root.after で一定間隔のハートビートを登録し、予定時刻からの遅れを
+UIの応答遅延として記録する。遅れがしきい値を超えている間は監視スレッドが
+メインスレッドのスタックを取得し、どのハンドラーがUIを止めているかを記録する。
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional, Sequence
+
+# 応答遅延のヒストグラムの区切り（ミリ秒、上限値）
+LATENCY_BUCKETS_MS = (16, 33, 50, 100, 250, 500, 1000, 2000, 5000)
+
+# ハートビートの間隔（ミリ秒）
+DEFAULT_INTERVAL_MS = 50
+
+# ストールとみなす遅延（ミリ秒）
+DEFAULT_STALL_THRESHOLD_MS = 200
+
+# 保持するストールの件数
+_MAX_STALLS = 100
+
+# ハンドラー名として表示するアプリ内のフレーム数
+_HANDLER_DEPTH = 3
+
+# アプリケーションのルートディレクトリ（ハンドラーの特定に使う）
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """応答遅延のヒストグラム"""
+
+    def __init__(self, buckets_ms: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        # 最後の要素は最大の区切りを超えた件数
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.max_ms = 0.0
+
+    @property
+    def total(self) -> int:
+        """記録した件数"""
+        return sum(self.counts)
+
+    def record(self, latency_ms: float):
+        """遅延を記録"""
+        index = len(self.buckets_ms)
+        for i, upper in enumerate(self.buckets_ms):
+            if latency_ms <= upper:
+                index = i
+                break
+        self.counts[index] += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, ratio: float) -> float:
+        """パーセンタイルの遅延（該当する区切りの上限値、超過分は最大値）"""
+        total = self.total
+        if total == 0:
+            return 0.0
+        threshold = ratio * total
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold and count:
+                return float(self.buckets_ms[i]) if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def format(self, width: int = 30) -> str:
+        """ヒストグラムを表示用の文字列に整形"""
+        peak = max(self.counts) or 1
+        labels = [f"<= {upper} ms" for upper in self.buckets_ms]
+        labels.append(f" > {self.buckets_ms[-1]} ms")
+        lines = []
+        for label, count in zip(labels, self.counts):
+            bar = "#" * int(round(width * count / peak))
+            lines.append(f"{label:>11}: {count:6d} {bar}")
+        return "\n".join(lines)
+
+
+@dataclass
+class StallRecord:
+    """1回分のストールの記録"""
+    started_at: float
+    duration_ms: float = 0.0
+    handler: str = "不明"
+    stack: List[str] = field(default_factory=list)
+
+    def format(self) -> str:
+        """表示用の文字列に整形"""
+        started = time.strftime("%H:%M:%S", time.localtime(self.started_at))
+        return f"[{started}] {self.duration_ms:.0f} ms: {self.handler}"
+
+
+def _is_app_frame(filename: str) -> bool:
+    """アプリケーション内のフレームかどうか（監視自身は除く）"""
+    if filename.startswith("<"):
+        return False  # <frozen ...> など実体のないファイル
+    path = os.path.abspath(filename)
+    return path.startswith(_APP_ROOT + os.sep) and path != os.path.abspath(__file__)
+
+
+def describe_handler(frames: Sequence[traceback.FrameSummary]) -> str:
+    """スタックから実行中のハンドラー名を作成
+
+    イベントループ（tkinterなどアプリ外のコード）から最後に呼ばれた
+    アプリ内の関数から順に並べる。
+    """
+    app_frames = [_is_app_frame(frame.filename) for frame in frames]
+    start = 0
+    for i in range(1, len(frames)):
+        if app_frames[i] and not app_frames[i - 1]:
+            start = i
+    names = [frame.name for frame, is_app in zip(frames[start:], app_frames[start:]) if is_app]
+    return " > ".join(names[:_HANDLER_DEPTH]) or "不明"
+
+
+class UIWatchdog:
+    """Tkのイベントループの応答遅延とストールを監視するクラス
+
+    rootにはafter/after_cancelを持つオブジェクト（tk.Tkなど）を渡す。
+    startはメインスレッド（イベントループのスレッド）から呼ぶこと。
+    """
+
+    def __init__(self, root, interval_ms: int = DEFAULT_INTERVAL_MS,
+                 stall_threshold_ms: int = DEFAULT_STALL_THRESHOLD_MS,
+                 log_path: Optional[str] = None):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.stall_threshold_ms = stall_threshold_ms
+        self.log_path = log_path
+        self.histogram = LatencyHistogram()
+        self.stalls: Deque[StallRecord] = deque(maxlen=_MAX_STALLS)
+        self._lock = threading.Lock()
+        self._after_id = None
+        self._expected: Optional[float] = None
+        self._current_stall: Optional[StallRecord] = None
+        self._main_thread_id: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+        self._log_handler: Optional[logging.Handler] = None
+
+    @property
+    def running(self) -> bool:
+        """監視中かどうか"""
+        return self._monitor is not None
+
+    def start(self):
+        """監視を開始"""
+        if self.running:
+            return
+        if self.log_path:
+            self._log_handler = logging.FileHandler(self.log_path, encoding="utf-8")
+            self._log_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(self._log_handler)
+            logger.setLevel(logging.INFO)
+
+        self._main_thread_id = threading.get_ident()
+        self._stop_event.clear()
+        self._schedule()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="ui-watchdog",
+                                         daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        """監視を終了"""
+        if not self.running:
+            return
+        self._stop_event.set()
+        self._monitor.join()
+        self._monitor = None
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass  # ウィンドウが既に破棄されている
+            self._after_id = None
+        if self._log_handler is not None:
+            logger.removeHandler(self._log_handler)
+            self._log_handler.close()
+            self._log_handler = None
+
+    def _schedule(self):
+        """次のハートビートを登録"""
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self._after_id = self.root.after(self.interval_ms, self._beat)
+
+    def _beat(self):
+        """ハートビート（メインスレッドで実行）"""
+        latency_ms = max(0.0, (time.perf_counter() - self._expected) * 1000)
+        with self._lock:
+            self.histogram.record(latency_ms)
+            stall = self._current_stall
+            self._current_stall = None
+            if stall is not None:
+                stall.duration_ms = latency_ms
+                self.stalls.append(stall)
+        if stall is not None:
+            logger.info("UIが %.0f ms 停止しました: %s\n%s", stall.duration_ms,
+                        stall.handler, "".join(stall.stack))
+        if not self._stop_event.is_set():
+            self._schedule()
+
+    def _monitor_loop(self):
+        """ハートビートの遅れを監視し、ストール中のスタックを取得（監視スレッド）"""
+        poll = self.interval_ms / 2000
+        while not self._stop_event.wait(poll):
+            expected = self._expected
+            if expected is None:
+                continue
+            overdue_ms = (time.perf_counter() - expected) * 1000
+            with self._lock:
+                if overdue_ms < self.stall_threshold_ms or self._current_stall is not None:
+                    continue
+                self._current_stall = self._capture_stall()
+
+    def _capture_stall(self) -> StallRecord:
+        """メインスレッドのスタックを取得"""
+        record = StallRecord(started_at=time.time())
+        frame = sys._current_frames().get(self._main_thread_id)
+        if frame is not None:
+            frames = traceback.extract_stack(frame)
+            record.handler = describe_handler(frames)
+            record.stack = traceback.format_list(frames)
+        return record
+
+    def get_stalls(self) -> List[StallRecord]:
+        """記録したストール（古い順）"""
+        with self._lock:
+            return list(self.stalls)
+
+    def format_report(self) -> str:
+        """診断情報を表示用の文字列に整形"""
+        with self._lock:
+            histogram = self.histogram
+            lines = [
+                f"ハートビート: {histogram.total}回 (間隔 {self.interval_ms} ms)",
+                f"遅延 p50 {histogram.percentile(0.5):.0f} ms / "
+                f"p95 {histogram.percentile(0.95):.0f} ms / "
+                f"最大 {histogram.max_ms:.0f} ms",
+                "",
+                histogram.format(),
+                "",
+                f"ストール（{self.stall_threshold_ms} ms 超）: {len(self.stalls)}件",
+            ]
+            lines.extend(stall.format() for stall in reversed(self.stalls))
+        if self.log_path:
+            lines.extend(["", f"ログ: {self.log_path}"])
+        return "\n".join(lines)
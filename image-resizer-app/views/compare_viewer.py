@@ -0,0 +1,163 @@
+"""
+比較表示ウィンドウ
+
+エンコード前の画像とエンコード結果を、並べて・分割スライダーで・差分のヒートマップで比較する。
+表示範囲は両方の画像で共有し、拡大縮小と移動は拡大表示ウィンドウと同じ操作で行う。
+"""
+
+import tkinter as tk
+from concurrent.futures import Executor
+from tkinter import ttk
+from typing import Callable, Optional
+
+from PIL import Image
+
+from models.image_compare import (
+    COMPARE_HEATMAP, COMPARE_SIDE_BY_SIDE, COMPARE_SPLIT, ComparisonTiles,
+)
+from models.tile_pyramid import TilePyramid, Viewport
+from views.zoom_viewer import TileView
+
+# 表示方法の選択肢（表示名, 値）
+COMPARE_MODE_LABELS = (
+    ("並べて表示", COMPARE_SIDE_BY_SIDE),
+    ("分割", COMPARE_SPLIT),
+    ("差分", COMPARE_HEATMAP),
+)
+
+
+class CompareViewer:
+    """エンコード前後の画像を比較するウィンドウ"""
+
+    def __init__(self, root: tk.Misc, before: Image.Image, after: Image.Image,
+                 executor: Executor, title: str = "比較表示", description: str = "",
+                 on_close: Optional[Callable[[], None]] = None):
+        self.before_image = before
+        self.before_pyramid = TilePyramid(before)
+        self.after_pyramid = TilePyramid(after)
+        self.comparison = ComparisonTiles(self.before_pyramid, self.after_pyramid)
+        self.viewport = Viewport(before.size, 800, 600)
+        self.description = description
+        self.on_close = on_close
+        self.closed = False
+
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.geometry("1000x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.window, padding="5")
+        toolbar.pack(side=tk.TOP, fill=tk.X)
+        self.mode_var = tk.StringVar(value=COMPARE_SPLIT)
+        for label, mode in COMPARE_MODE_LABELS:
+            ttk.Radiobutton(toolbar, text=label, value=mode, variable=self.mode_var,
+                            command=self._apply_mode).pack(side=tk.LEFT, padx=(0, 5))
+        self.split_var = tk.DoubleVar(value=50)
+        self.split_scale = ttk.Scale(toolbar, from_=0, to=100, variable=self.split_var,
+                                     orient=tk.HORIZONTAL, length=160,
+                                     command=self._on_split_change)
+        self.split_scale.pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="全体表示", command=self.fit).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(toolbar, text="100%", command=self.actual_size).pack(side=tk.LEFT, padx=(5, 0))
+
+        self.status_label = ttk.Label(self.window, text="", padding=(5, 0, 5, 5))
+        self.status_label.pack(side=tk.TOP, fill=tk.X)
+
+        body = ttk.Frame(self.window)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.primary = TileView(body, self.viewport, self.comparison, executor,
+                                on_viewport_change=self.redraw)
+        # 並べて表示の右側（エンコード結果）
+        self.secondary = TileView(body, self.viewport, self.after_pyramid, executor,
+                                  on_viewport_change=self.redraw, fit_on_first_resize=False)
+        self.window.bind("<plus>", lambda event: self.primary.zoom_by(1))
+        self.window.bind("<minus>", lambda event: self.primary.zoom_by(-1))
+        self.window.bind("0", lambda event: self.fit())
+        self.window.bind("1", lambda event: self.actual_size())
+
+        self.viewport.fit()
+        self._apply_mode()
+
+    @property
+    def mode(self) -> str:
+        return self.mode_var.get()
+
+    def _apply_mode(self):
+        """表示方法の切り替え"""
+        self.primary.canvas.pack_forget()
+        self.secondary.canvas.pack_forget()
+        if self.mode == COMPARE_SIDE_BY_SIDE:
+            self.primary.set_source(self.before_pyramid)
+            self.secondary.set_source(self.after_pyramid)
+            self.primary.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 2))
+            self.secondary.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        else:
+            self.comparison = self.comparison.with_mode(self.mode)
+            self.primary.set_source(self.comparison)
+            self.primary.canvas.pack(fill=tk.BOTH, expand=True)
+        self.split_scale.configure(state='normal' if self.mode == COMPARE_SPLIT else 'disabled')
+        self._update_status()
+
+    def _on_split_change(self, value=None):
+        """分割位置の変更（エンコード前後のタイルは描画し直さず組み合わせだけ作り直す）"""
+        self.comparison = self.comparison.with_split(self.split_var.get() / 100)
+        if self.mode == COMPARE_SPLIT:
+            self.primary.set_source(self.comparison)
+
+    def set_after(self, after: Image.Image, description: str):
+        """エンコード結果を差し替える（エンコード前のタイルはそのまま使う）"""
+        if self.closed:
+            return
+        self.after_pyramid = TilePyramid(after)
+        self.comparison = self.comparison.with_after(self.after_pyramid)
+        self.description = description
+        if self.mode == COMPARE_SIDE_BY_SIDE:
+            self.secondary.set_source(self.after_pyramid)
+        else:
+            self.primary.set_source(self.comparison)
+        self._update_status()
+
+    def set_status(self, description: str):
+        """状態の表示を変更"""
+        if self.closed:
+            return
+        self.description = description
+        self._update_status()
+
+    def fit(self):
+        """全体が収まる倍率で表示"""
+        self.viewport.fit()
+        self.redraw()
+
+    def actual_size(self):
+        """等倍で表示（表示中の中心を保つ）"""
+        self.viewport.set_zoom_step(0)
+        self.redraw()
+
+    def redraw(self):
+        """表示中のキャンバスを再描画"""
+        self.primary.redraw()
+        if self.mode == COMPARE_SIDE_BY_SIDE:
+            self.secondary.redraw()
+        self._update_status()
+
+    def _update_status(self):
+        """倍率と比較結果の表示を更新"""
+        if self.mode == COMPARE_SIDE_BY_SIDE:
+            layout = "左: エンコード前 / 右: エンコード後"
+        elif self.mode == COMPARE_SPLIT:
+            layout = "境界の左: エンコード前 / 右: エンコード後"
+        else:
+            layout = "誤差の大きいブロックほど赤"
+        self.status_label.configure(
+            text=f"{self.viewport.zoom * 100:.0f}%  {layout}  {self.description}"
+        )
+
+    def close(self):
+        """ウィンドウを閉じる"""
+        self.closed = True
+        self.primary.close()
+        self.secondary.close()
+        self.window.destroy()
+        if self.on_close:
+            self.on_close()
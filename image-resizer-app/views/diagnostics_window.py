@@ -0,0 +1,51 @@
+"""
+診断情報ウィンドウ
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Optional
+
+from utils.ui_watchdog import UIWatchdog
+
+# 表示の更新間隔（ミリ秒）
+REFRESH_INTERVAL_MS = 1000
+
+
+class DiagnosticsWindow:
+    """UIの応答遅延とストールを表示するウィンドウ"""
+
+    def __init__(self, root: tk.Misc, watchdog: UIWatchdog):
+        self.watchdog = watchdog
+        self._after_id: Optional[str] = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("診断情報")
+        self.window.geometry("560x480")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        frame = ttk.Frame(self.window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.text = tk.Text(frame, wrap=tk.NONE, font=('Courier', 10))
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.text.yview)
+        self.text.configure(yscrollcommand=scrollbar.set)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.refresh()
+
+    def refresh(self):
+        """表示を更新"""
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, self.watchdog.format_report())
+        self.text.configure(state=tk.DISABLED)
+        self._after_id = self.window.after(REFRESH_INTERVAL_MS, self.refresh)
+
+    def close(self):
+        """ウィンドウを閉じる"""
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        self.window.destroy()
@@ -2,13 +2,18 @@
 メインウィンドウビュー
 """
 
+import dataclasses
+import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import tkinterdnd2 as tkdnd
-from typing import Optional, Callable
+from typing import Callable, List, Optional
 from PIL import ImageTk
 
-from models.settings import AppSettings
+from models.settings import AUTO_FORMAT, AppSettings, SUBSAMPLING_OPTIONS
+
+# サブサンプリングを指定しない場合の表示
+SUBSAMPLING_DEFAULT_LABEL = "既定"
 
 
 class MainWindow:
@@ -27,6 +32,14 @@ class MainWindow:
         self.on_save_as: Optional[Callable[[], None]] = None
         self.on_reset: Optional[Callable[[], None]] = None
         self.on_settings_change: Optional[Callable[[], None]] = None
+        self.on_batch: Optional[Callable[[str], None]] = None
+        self.on_show_diagnostics: Optional[Callable[[], None]] = None
+        self.on_zoom_view: Optional[Callable[[], None]] = None
+        self.on_compare: Optional[Callable[[], None]] = None
+        self.on_compression_change: Optional[Callable[[], None]] = None
+        self.on_edit: Optional[Callable[[str], None]] = None
+        self.on_image_switch: Optional[Callable[[str], None]] = None
+        self.on_close_image: Optional[Callable[[], None]] = None
         
         self.setup_window()
         self.setup_ui()
@@ -85,6 +98,25 @@ class MainWindow:
         ttk.Button(control_frame, text="プレビュー更新", 
                   command=self._update_preview).grid(row=3, column=0, columnspan=2, 
                                                    sticky=(tk.W, tk.E), pady=5)
+        
+        # 診断情報ボタン
+        ttk.Button(control_frame, text="診断情報", 
+                  command=self._show_diagnostics).grid(row=4, column=0, columnspan=2, 
+                                                     sticky=(tk.W, tk.E))
+        
+        # 開いている画像の切り替え
+        images_frame = ttk.LabelFrame(control_frame, text="開いている画像", padding="5")
+        images_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        images_frame.columnconfigure(0, weight=1)
+        self.open_images_var = tk.StringVar()
+        self.open_images_combo = ttk.Combobox(images_frame, textvariable=self.open_images_var,
+                                              state="readonly")
+        self.open_images_combo.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.open_images_combo.bind('<<ComboboxSelected>>', self._on_image_switch)
+        ttk.Button(images_frame, text="閉じる", width=6,
+                  command=self._close_image).grid(row=0, column=1, padx=(5, 0))
+        # コンボボックスの項目に対応するパス
+        self._open_image_paths: List[str] = []
     
     def setup_resize_controls(self, parent):
         """リサイズ設定UIを設定"""
@@ -118,6 +150,27 @@ class MainWindow:
                                    values=["LANCZOS", "BICUBIC", "BILINEAR", "NEAREST"],
                                    state="readonly", width=12)
         method_combo.grid(row=3, column=1, padx=5)
+        
+        # 色空間の変換
+        self.convert_srgb_var = tk.BooleanVar(value=self.settings.resize_settings.convert_to_srgb)
+        ttk.Checkbutton(resize_frame, text="sRGBに変換 (ICCプロファイル)",
+                       variable=self.convert_srgb_var,
+                       command=self._update_preview).grid(row=4, column=0, columnspan=2,
+                                                         sticky=tk.W, pady=(5, 0))
+        
+        # 編集（回転・反転・元に戻す）
+        edit_frame = ttk.Frame(resize_frame)
+        edit_frame.grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        edit_buttons = [
+            ("左回転", "rotate_left"),
+            ("右回転", "rotate_right"),
+            ("反転", "flip"),
+            ("元に戻す", "undo"),
+            ("やり直し", "redo"),
+        ]
+        for column, (text, action) in enumerate(edit_buttons):
+            ttk.Button(edit_frame, text=text, width=6,
+                      command=lambda a=action: self._edit(a)).grid(row=0, column=column)
     
     def setup_compression_controls(self, parent):
         """圧縮設定UIを設定"""
@@ -128,7 +181,7 @@ class MainWindow:
         ttk.Label(compress_frame, text="出力形式:").grid(row=0, column=0, sticky=tk.W)
         self.format_var = tk.StringVar(value=self.settings.compression_settings.format_type)
         format_combo = ttk.Combobox(compress_frame, textvariable=self.format_var,
-                                   values=self.settings.get_supported_output_formats(),
+                                   values=self.settings.get_supported_output_formats() + [AUTO_FORMAT],
                                    state="readonly", width=12)
         format_combo.grid(row=0, column=1, padx=5)
         format_combo.bind("<<ComboboxSelected>>", self._on_format_change)
@@ -143,6 +196,47 @@ class MainWindow:
         self.quality_label = ttk.Label(compress_frame, text=f"{self.quality_var.get()}%")
         self.quality_label.grid(row=1, column=2, padx=5)
         self.quality_scale.configure(command=self._update_quality_label)
+        
+        # 自動品質（目標SSIMを満たす最小の品質を探索）
+        self.auto_quality_var = tk.BooleanVar(value=self.settings.compression_settings.auto_quality)
+        self.auto_quality_check = ttk.Checkbutton(compress_frame, text="自動品質 (SSIM)",
+                                                  variable=self.auto_quality_var,
+                                                  command=self._on_format_change)
+        self.auto_quality_check.grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        self.target_ssim_var = tk.StringVar(value=str(self.settings.compression_settings.target_ssim))
+        self.target_ssim_entry = ttk.Entry(compress_frame, textvariable=self.target_ssim_var, width=8)
+        self.target_ssim_entry.grid(row=2, column=1, padx=5, pady=(5, 0), sticky=tk.W)
+        
+        # JPEGの出力オプション
+        compression_settings = self.settings.compression_settings
+        self.progressive_var = tk.BooleanVar(value=compression_settings.progressive)
+        self.progressive_check = ttk.Checkbutton(compress_frame, text="プログレッシブ",
+                                                 variable=self.progressive_var)
+        self.progressive_check.grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        self.subsampling_var = tk.StringVar(
+            value=compression_settings.subsampling or SUBSAMPLING_DEFAULT_LABEL
+        )
+        self.subsampling_combo = ttk.Combobox(compress_frame, textvariable=self.subsampling_var,
+                                              values=[SUBSAMPLING_DEFAULT_LABEL] + SUBSAMPLING_OPTIONS,
+                                              state="readonly", width=12)
+        self.subsampling_combo.grid(row=3, column=1, padx=5, pady=(5, 0), sticky=tk.W)
+        
+        # WEBPのロスレス
+        self.lossless_var = tk.BooleanVar(value=compression_settings.lossless)
+        self.lossless_check = ttk.Checkbutton(compress_frame, text="ロスレス (WEBP)",
+                                              variable=self.lossless_var,
+                                              command=self._on_format_change)
+        self.lossless_check.grid(row=4, column=0, sticky=tk.W, pady=(5, 0))
+        
+        # メタデータ（既定ではすべて削除）
+        self.keep_icc_var = tk.BooleanVar(value=compression_settings.keep_icc_profile)
+        ttk.Checkbutton(compress_frame, text="ICCプロファイルを残す",
+                        variable=self.keep_icc_var).grid(row=5, column=0, sticky=tk.W, pady=(5, 0))
+        self.keep_orientation_var = tk.BooleanVar(value=compression_settings.keep_exif_orientation)
+        ttk.Checkbutton(compress_frame, text="EXIFの向きを残す",
+                        variable=self.keep_orientation_var).grid(row=5, column=1, sticky=tk.W,
+                                                                 pady=(5, 0))
+        self._on_format_change()
     
     def setup_preview_panel(self, parent):
         """右側のプレビューパネルを設定"""
@@ -182,6 +276,18 @@ class MainWindow:
         
         ttk.Button(bottom_frame, text="リセット", 
                   command=self._reset).grid(row=1, column=2, padx=(5, 0))
+        
+        ttk.Button(bottom_frame, text="フォルダを一括処理", 
+                  command=self._batch).grid(row=2, column=0, columnspan=3, 
+                                          sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        ttk.Button(bottom_frame, text="拡大表示（出力を等倍で確認）", 
+                  command=self._zoom_view).grid(row=3, column=0, columnspan=3, 
+                                              sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        ttk.Button(bottom_frame, text="比較表示（エンコード前後・差分）", 
+                  command=self._compare).grid(row=4, column=0, columnspan=3, 
+                                            sticky=(tk.W, tk.E), pady=(5, 0))
     
     def setup_drag_drop(self):
         """ドラッグ&ドロップを設定"""
@@ -225,6 +331,43 @@ class MainWindow:
         if self.on_reset:
             self.on_reset()
     
+    def _batch(self):
+        """フォルダの一括処理"""
+        directory = filedialog.askdirectory(title="一括処理するフォルダを選択")
+        if directory and self.on_batch:
+            self.on_batch(directory)
+    
+    def _edit(self, action: str):
+        """編集操作"""
+        if self.on_edit:
+            self.on_edit(action)
+    
+    def _on_image_switch(self, event=None):
+        """開いている画像の切り替え"""
+        index = self.open_images_combo.current()
+        if index >= 0 and self.on_image_switch:
+            self.on_image_switch(self._open_image_paths[index])
+    
+    def _close_image(self):
+        """表示中の画像を閉じる"""
+        if self.on_close_image:
+            self.on_close_image()
+    
+    def _show_diagnostics(self):
+        """診断情報の表示"""
+        if self.on_show_diagnostics:
+            self.on_show_diagnostics()
+    
+    def _zoom_view(self):
+        """拡大表示"""
+        if self.on_zoom_view:
+            self.on_zoom_view()
+    
+    def _compare(self):
+        """比較表示"""
+        if self.on_compare:
+            self.on_compare()
+    
     def _on_width_change(self, event=None):
         """幅変更時の処理"""
         if self.maintain_ratio_var.get() and self.on_settings_change:
@@ -238,24 +381,67 @@ class MainWindow:
     def _on_format_change(self, event=None):
         """出力形式変更時の処理"""
         format_type = self.format_var.get()
-        # PNGの場合は品質設定を無効化
-        if format_type == "PNG":
+        # 自動選択ではJPEG・WEBPの候補にそれぞれのオプションを使う
+        uses_jpeg = format_type in ("JPEG", AUTO_FORMAT)
+        uses_webp = format_type in ("WEBP", AUTO_FORMAT)
+        jpeg_state = 'readonly' if uses_jpeg else 'disabled'
+        self.progressive_check.configure(state='normal' if uses_jpeg else 'disabled')
+        self.subsampling_combo.configure(state=jpeg_state)
+        self.lossless_check.configure(state='normal' if uses_webp else 'disabled')
+        
+        # PNG・ロスレスWEBPの場合は品質設定を無効化
+        if format_type == "WEBP" and self.lossless_var.get():
+            self.quality_scale.configure(state='disabled')
+            self.quality_label.configure(text="N/A")
+            self.auto_quality_check.configure(state='disabled')
+            self.target_ssim_entry.configure(state='disabled')
+        elif format_type == "PNG":
             self.quality_scale.configure(state='disabled')
             self.quality_label.configure(text="N/A")
+            self.auto_quality_check.configure(state='disabled')
+            self.target_ssim_entry.configure(state='disabled')
+        elif self.auto_quality_var.get():
+            # 自動品質の場合は品質スライダーの代わりに目標SSIMを使う
+            self.quality_scale.configure(state='disabled')
+            self.quality_label.configure(text="自動")
+            self.auto_quality_check.configure(state='normal')
+            self.target_ssim_entry.configure(state='normal')
         else:
             self.quality_scale.configure(state='normal')
+            self.auto_quality_check.configure(state='normal')
+            self.target_ssim_entry.configure(state='disabled')
             self._update_quality_label()
+        self._notify_compression_change()
     
     def _update_quality_label(self, value=None):
         """品質ラベルを更新"""
-        if self.format_var.get() != "PNG":
+        if self.format_var.get() == "WEBP" and self.lossless_var.get():
+            return
+        if self.format_var.get() != "PNG" and not self.auto_quality_var.get():
             self.quality_label.configure(text=f"{int(self.quality_var.get())}%")
+            if value is not None:
+                # スライダーの操作中
+                self._notify_compression_change()
+    
+    def _notify_compression_change(self):
+        """圧縮設定の変更を通知"""
+        if self.on_compression_change:
+            self.on_compression_change()
     
     def update_preview_image(self, pil_image):
         """プレビュー画像を更新"""
         self.preview_image = ImageTk.PhotoImage(pil_image)
         self.drop_area.configure(image=self.preview_image, text="")
     
+    def update_open_images(self, paths: List[str], active_path: Optional[str]):
+        """開いている画像の一覧を更新"""
+        self._open_image_paths = list(paths)
+        self.open_images_combo.configure(values=[os.path.basename(path) for path in paths])
+        if active_path in self._open_image_paths:
+            self.open_images_combo.current(self._open_image_paths.index(active_path))
+        else:
+            self.open_images_var.set("")
+    
     def clear_preview(self):
         """プレビューをクリア"""
         self.drop_area.configure(image="", 
@@ -270,17 +456,41 @@ class MainWindow:
     def get_resize_settings_from_ui(self):
         """UIからリサイズ設定を取得"""
         try:
-            self.settings.resize_settings.width = int(self.width_var.get())
-            self.settings.resize_settings.height = int(self.height_var.get())
-            self.settings.resize_settings.maintain_ratio = self.maintain_ratio_var.get()
-            self.settings.resize_settings.method = self.resize_method_var.get()
+            width = int(self.width_var.get())
+            height = int(self.height_var.get())
         except ValueError:
             raise ValueError("無効なサイズが指定されました")
+        self.settings.resize_settings = dataclasses.replace(
+            self.settings.resize_settings,
+            width=width,
+            height=height,
+            maintain_ratio=self.maintain_ratio_var.get(),
+            method=self.resize_method_var.get(),
+            convert_to_srgb=self.convert_srgb_var.get(),
+        )
     
     def get_compression_settings_from_ui(self):
         """UIから圧縮設定を取得"""
-        self.settings.compression_settings.format_type = self.format_var.get()
-        self.settings.compression_settings.quality = int(self.quality_var.get())
+        try:
+            target_ssim = float(self.target_ssim_var.get())
+        except ValueError:
+            raise ValueError("無効な目標SSIMが指定されました")
+        if not 0.0 < target_ssim <= 1.0:
+            raise ValueError("目標SSIMは0より大きく1以下で指定してください")
+        
+        subsampling = self.subsampling_var.get()
+        self.settings.compression_settings = dataclasses.replace(
+            self.settings.compression_settings,
+            format_type=self.format_var.get(),
+            quality=int(self.quality_var.get()),
+            auto_quality=self.auto_quality_var.get(),
+            target_ssim=target_ssim,
+            progressive=self.progressive_var.get(),
+            subsampling=None if subsampling == SUBSAMPLING_DEFAULT_LABEL else subsampling,
+            lossless=self.lossless_var.get(),
+            keep_icc_profile=self.keep_icc_var.get(),
+            keep_exif_orientation=self.keep_orientation_var.get(),
+        )
     
     def show_message(self, title: str, message: str, msg_type: str = "info"):
         """メッセージを表示"""
@@ -0,0 +1,218 @@
+"""
+拡大表示ウィンドウ
+
+キャンバスに表示範囲のタイルだけを並べ、ホイールで拡大縮小、ドラッグで移動する。
+タイルのPhotoImageは使い回し、表示範囲の周囲のタイルはバックグラウンドで先読みする。
+"""
+
+import tkinter as tk
+from concurrent.futures import Executor
+from tkinter import ttk
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import ImageTk
+
+from models.tile_pyramid import TileCache, TileKey, TilePyramid, Viewport
+
+
+class _TileSlot:
+    """キャンバス上の1タイル分の表示（PhotoImageとキャンバスの項目）"""
+
+    def __init__(self, canvas: tk.Canvas, tile_size: int):
+        self.photo = ImageTk.PhotoImage("RGB", (tile_size, tile_size))
+        self.item = canvas.create_image(0, 0, image=self.photo, anchor=tk.NW, state=tk.HIDDEN)
+        # 描画元が差し替えられ、新しいタイルの描画を待っている
+        self.stale = False
+
+
+class TileView:
+    """タイルを並べて表示するキャンバス（表示範囲は他のTileViewと共有できる）
+
+    sourceはTilePyramidと同じくtile_sizeとrender_tileを持つもの。
+    表示範囲を変更する操作の後はon_viewport_changeが呼ばれる（既定では自身を再描画）。
+    """
+
+    def __init__(self, parent: tk.Misc, viewport: Viewport, source: TilePyramid,
+                 executor: Executor, on_viewport_change: Optional[Callable[[], None]] = None,
+                 fit_on_first_resize: bool = True):
+        self.viewport = viewport
+        self.source = source
+        self.executor = executor
+        self.tile_size = source.tile_size
+        self.cache = TileCache(source, executor, on_ready=self._on_tile_ready)
+        self.on_viewport_change = on_viewport_change or self.redraw
+        # タイルのキー -> 表示中のスロット
+        self._slots: Dict[TileKey, _TileSlot] = {}
+        # 使い回すために空けてあるスロット
+        self._free_slots: List[_TileSlot] = []
+        self._drag_start: Optional[Tuple[int, int]] = None
+        self._redraw_pending = False
+        self._fitted = not fit_on_first_resize
+        self._closed = False
+
+        self.canvas = tk.Canvas(parent, bg="#808080", highlightthickness=0)
+        self.canvas.bind("<Configure>", self._on_configure)
+        self.canvas.bind("<ButtonPress-1>", self._on_drag_start)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self._on_drag_end)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        # X11のホイール
+        self.canvas.bind("<Button-4>", lambda event: self.zoom_by(1, event))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom_by(-1, event))
+
+    def set_source(self, source: TilePyramid):
+        """描画元を差し替える（新しいタイルが揃うまでは前のタイルを表示しておく）"""
+        self.cache.close()
+        self.source = source
+        self.cache = TileCache(source, self.executor, on_ready=self._on_tile_ready)
+        for slot in self._slots.values():
+            slot.stale = True
+        self.redraw()
+
+    def _on_configure(self, event):
+        """キャンバスの大きさの変更"""
+        self.viewport.resize(event.width, event.height)
+        if not self._fitted:
+            # 最初に大きさが決まった時点で全体を表示する
+            self._fitted = True
+            self.viewport.fit()
+        self.on_viewport_change()
+
+    def _on_drag_start(self, event):
+        self._drag_start = (event.x, event.y)
+        self.canvas.configure(cursor="fleur")
+
+    def _on_drag(self, event):
+        """ドラッグで表示範囲を移動"""
+        if self._drag_start is None:
+            return
+        dx = self._drag_start[0] - event.x
+        dy = self._drag_start[1] - event.y
+        self._drag_start = (event.x, event.y)
+        self.viewport.pan(dx, dy)
+        self.on_viewport_change()
+
+    def _on_drag_end(self, event):
+        self._drag_start = None
+        self.canvas.configure(cursor="")
+
+    def _on_wheel(self, event):
+        """ホイールで拡大縮小（Windows・macOS）"""
+        self.zoom_by(1 if event.delta > 0 else -1, event)
+
+    def zoom_by(self, steps: int, event=None):
+        """倍率を段単位で変更（マウスの位置を中心にする）"""
+        anchor = (event.x, event.y) if event is not None else None
+        self.viewport.set_zoom_step(self.viewport.zoom_step + steps, anchor)
+        self.on_viewport_change()
+
+    def _on_tile_ready(self, key: TileKey):
+        """タイルの描画完了（ワーカーのスレッドから呼ばれる）"""
+        if not self._closed:
+            self.canvas.after(0, self._schedule_redraw)
+
+    def _schedule_redraw(self):
+        """複数のタイルの完了をまとめて1回の再描画にする"""
+        if self._redraw_pending or self._closed:
+            return
+        self._redraw_pending = True
+        self.canvas.after_idle(self.redraw)
+
+    def redraw(self):
+        """表示範囲のタイルを配置"""
+        self._redraw_pending = False
+        if self._closed:
+            return
+        viewport = self.viewport
+        visible = viewport.visible_tiles(self.tile_size)
+        self.cache.request(visible, viewport.adjacent_tiles(self.tile_size))
+
+        # 表示範囲から外れたスロットを空ける
+        visible_set = set(visible)
+        for key in [key for key in self._slots if key not in visible_set]:
+            slot = self._slots.pop(key)
+            self.canvas.itemconfigure(slot.item, state=tk.HIDDEN)
+            self._free_slots.append(slot)
+
+        for key in visible:
+            slot = self._slots.get(key)
+            if slot is None or slot.stale:
+                tile = self.cache.get(key)
+                if tile is not None:
+                    if slot is None:
+                        slot = self._free_slots.pop() if self._free_slots else _TileSlot(
+                            self.canvas, self.tile_size
+                        )
+                        self._slots[key] = slot
+                        self.canvas.itemconfigure(slot.item, state=tk.NORMAL)
+                    # PhotoImageを作り直さずに画素だけ書き換える
+                    slot.photo.paste(tile)
+                    slot.stale = False
+            if slot is None:
+                # 描画が終わったら_on_tile_readyで再描画される
+                continue
+            _, col, row = key
+            self.canvas.coords(slot.item, col * self.tile_size - viewport.x,
+                               row * self.tile_size - viewport.y)
+
+    def close(self):
+        """描画待ちのタイルを破棄"""
+        self._closed = True
+        self.cache.close()
+        self._slots.clear()
+        self._free_slots.clear()
+
+
+class ZoomViewer:
+    """画像を等倍まで拡大して確認するウィンドウ"""
+
+    def __init__(self, root: tk.Misc, pyramid: TilePyramid, executor: Executor,
+                 title: str = "拡大表示"):
+        self.pyramid = pyramid
+        self.viewport = Viewport(pyramid.size, 800, 600)
+
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.geometry("820x660")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.window, padding="5")
+        toolbar.pack(side=tk.TOP, fill=tk.X)
+        ttk.Button(toolbar, text="全体表示", command=self.fit).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="100%", command=self.actual_size).pack(side=tk.LEFT, padx=(5, 0))
+        self.status_label = ttk.Label(toolbar, text="")
+        self.status_label.pack(side=tk.RIGHT)
+
+        self.view = TileView(self.window, self.viewport, pyramid, executor,
+                             on_viewport_change=self.redraw)
+        self.view.canvas.pack(fill=tk.BOTH, expand=True)
+        self.window.bind("<plus>", lambda event: self.view.zoom_by(1))
+        self.window.bind("<minus>", lambda event: self.view.zoom_by(-1))
+        self.window.bind("0", lambda event: self.fit())
+        self.window.bind("1", lambda event: self.actual_size())
+
+        self.viewport.fit()
+
+    def fit(self):
+        """全体が収まる倍率で表示"""
+        self.viewport.fit()
+        self.redraw()
+
+    def actual_size(self):
+        """等倍で表示（表示中の中心を保つ）"""
+        self.viewport.set_zoom_step(0)
+        self.redraw()
+
+    def redraw(self):
+        """タイルと状態の表示を更新"""
+        self.view.redraw()
+        width, height = self.pyramid.size
+        cached_mb = self.view.cache.cached_bytes / (1024 * 1024)
+        self.status_label.configure(
+            text=f"{self.viewport.zoom * 100:.0f}%（{width} x {height}）  キャッシュ {cached_mb:.0f} MB"
+        )
+
+    def close(self):
+        """ウィンドウを閉じる"""
+        self.view.close()
+        self.window.destroy()